@@ -21,15 +21,25 @@ import warnings
 import random
 import sys
 import time
+from timeit import default_timer
 from numpy import *
 from scipy import stats
 
 
 class PsiObject(object):
 
-    """Special class to handle internal array and functions of Psi adaptive psychophysical method (Kontsevich & Tyler, 1999)."""
+    """Special class to handle internal array and functions of Psi adaptive psychophysical method (Kontsevich & Tyler, 1999).
+
+    The posterior over lambda = (alpha, beta) is kept in log space as a 2D [alpha, beta] array and only the
+    likelihood at the presented intensity is used to update it. The expected entropy of every candidate
+    intensity is computed from two tables over [lambda, x] that are built once (P(r=1|lambda,x) and the
+    response entropy) so no 4D [r, alpha, beta, x] arrays are created per trial. `dtype` sets the precision of
+    those tables (float32 halves their size; the posterior itself is always float64). If `candidates` (indices
+    or a boolean mask over `x`) is set, only those intensities are considered for the next trial.
+    The duration of the last update (in seconds) is stored in `updateDuration`.
+    """
     
-    def __init__(self, x, alpha, beta, xPrecision, aPrecision, bPrecision, delta=0, stepType='lin', TwoAFC=False, prior=None):
+    def __init__(self, x, alpha, beta, xPrecision, aPrecision, bPrecision, delta=0, stepType='lin', TwoAFC=False, prior=None, dtype='float64'):
         self._TwoAFC = TwoAFC
         #Save dimensions
         if stepType == 'lin':
@@ -42,54 +52,90 @@ class PsiObject(object):
         self.beta = linspace(beta[0], beta[1], round((beta[1]-beta[0])/bPrecision)+1, True)
         self.r = array(range(2))
         self.delta = delta
+        self.candidates = None
+        self.updateDuration = 0.0
         
-        # Change x,a,b,r arrays to matrix computation compatible orthogonal 4D arrays
-        # ALWAYS use the order for P(r|lambda,x); i.e. [r,a,b,x]
-        self._r = self.r.reshape((self.r.size,1,1,1))
-        self._alpha = self.alpha.reshape((1,self.alpha.size,1,1))
-        self._beta = self.beta.reshape((1,1,self.beta.size,1))
-        self._x = self.x.reshape((1,1,1,self.x.size))
+        # Orthogonal arrays for the [a,b,x] computations
+        self._alpha = self.alpha.reshape((self.alpha.size,1,1))
+        self._beta = self.beta.reshape((1,self.beta.size,1))
+        self._x = self.x.reshape((1,1,self.x.size))
         
-        #Create P(lambda)
-        if prior is None or prior.shape != (1, len(self.alpha),len(self.beta), 1):
+        #Create log P(lambda) as a 2D [a,b] array
+        if prior is None or prior.size != len(self.alpha)*len(self.beta):
             if prior is not None:
                 warnings.warn("Prior has incompatible dimensions. Using uniform (1/N) probabilities.")
-            self._probLambda = ndarray(shape=(1,len(self.alpha),len(self.beta),1))
-            self._probLambda.fill(1/(len(self.alpha)*len(self.beta)))
+            self._logProbLambda = ndarray(shape=(len(self.alpha),len(self.beta)))
+            self._logProbLambda.fill(-log(len(self.alpha)*len(self.beta)))
         else:
-            if prior.shape == (1, len(self.alpha), len(self.beta), 1):
-                self._probLambda = prior
-            else:
-                self._probLambda = prior.reshape(1, len(self.alpha), len(self.beta), 1)
+            with errstate(divide='ignore'):
+                self._logProbLambda = log(asarray(prior, dtype=float64).reshape((len(self.alpha),len(self.beta))))
             
-        #Create P(r | lambda, x)
+        #Create P(r=1 | lambda, x) as a 2D [a*b, x] table (P(r=0|...) is 1 minus this)
         if TwoAFC:
-            self._probResponseGivenLambdaX = (1-self._r) + (2*self._r-1) * ((.5 + .5 * stats.norm.cdf(self._x, self._alpha, self._beta)) * (1 - self.delta) + self.delta / 2)
+            p1 = (.5 + .5 * stats.norm.cdf(self._x, self._alpha, self._beta)) * (1 - self.delta) + self.delta / 2
         else: # Yes/No
-            self._probResponseGivenLambdaX = (1-self._r) + (2*self._r-1) * (stats.norm.cdf(self._x, self._alpha, self._beta)*(1-self.delta)+self.delta/2)
+            p1 = stats.norm.cdf(self._x, self._alpha, self._beta)*(1-self.delta)+self.delta/2
+        p1 = p1.reshape((-1, len(self.x)))
+        # sum over r of P(r|lambda,x)*log(P(r|lambda,x)), i.e. minus the response entropy (0*log(0) is 0)
+        with errstate(divide='ignore', invalid='ignore'):
+            negEntropy = where(p1 > 0, p1*log(p1), 0) + where(p1 < 1, (1-p1)*log(1-p1), 0)
+        self._negEntropyGivenLambdaX = negEntropy.astype(dtype)
+        self._p1 = p1.astype(dtype)
+
+    @property
+    def _probLambda(self):
+        """The posterior P(lambda) with shape [1,a,b,1] (as saved by savePosterior)"""
+        return exp(self._logProbLambda).reshape((1,len(self.alpha),len(self.beta),1))
         
     def update(self, response=None):
+        t0 = default_timer()
         if response is not None:    #response should only be None when Psi is first initialized
-            self._probLambda = self._probLambdaGivenXResponse[response,:,:,self.nextIntensityIndex].reshape((1,len(self.alpha),len(self.beta),1))
-            
-        #Create P(r | x)
-        self._probResponseGivenX = sum(self._probResponseGivenLambdaX * self._probLambda, axis=(1,2)).reshape((len(self.r),1,1,len(self.x)))
-        
-        #Create P(lambda | x, r)
-        self._probLambdaGivenXResponse = self._probLambda*self._probResponseGivenLambdaX/self._probResponseGivenX
+            p1 = self._p1[:, self.nextIntensityIndex].astype(float64)
+            with errstate(divide='ignore'):
+                if response:
+                    self._logProbLambda += log(p1).reshape(self._logProbLambda.shape)
+                else:
+                    self._logProbLambda += log(1-p1).reshape(self._logProbLambda.shape)
+            # normalise (log-sum-exp)
+            m = self._logProbLambda.max()
+            self._logProbLambda -= m + log(sum(exp(self._logProbLambda - m)))
+        self.chooseNext()
+        self.updateDuration = default_timer() - t0
+
+    def chooseNext(self):
+        """Select the intensity (among `candidates` if set) with the minimum expected entropy of the posterior"""
+        if self.candidates is None:
+            xIndices = arange(len(self.x))
+        else:
+            xIndices = arange(len(self.x))[self.candidates]
+        p1, negEntropy = self._p1, self._negEntropyGivenLambdaX
+        if len(xIndices) < len(self.x):
+            p1, negEntropy = p1[:, xIndices], negEntropy[:, xIndices]
+        logProb = self._logProbLambda.ravel()
+        prob = exp(logProb)
         
-        #Create H(x, r)
-        self._entropyXResponse = -1* sum(self._probLambdaGivenXResponse * log10(self._probLambdaGivenXResponse), axis=(1,2)).reshape((len(self.r),1,1,len(self.x)))
+        #P(r | x)
+        probR1 = dot(prob.astype(p1.dtype), p1).astype(float64)
+        probR0 = 1 - probR1
         
-        #Create E[H(x)]
-        self._expectedEntropyX = sum(self._entropyXResponse * self._probResponseGivenX, axis=0).reshape((1,1,1,len(self.x)))
+        #E[H(x)] = H(lambda) - I(x), with the mutual information between lambda and the response
+        #I(x) = sum_lambda P(lambda) sum_r P(r|lambda,x)log(P(r|lambda,x)) - sum_r P(r|x)log(P(r|x))
+        #Written this way no term involves log(P(lambda)) so there is no cancellation (safe in float32)
+        with errstate(divide='ignore', invalid='ignore'):
+            info = (dot(prob.astype(p1.dtype), negEntropy).astype(float64) -
+                    where(probR1 > 0, probR1*log(probR1), 0) - where(probR0 > 0, probR0*log(probR0), 0))
+            entropy = -sum(where(prob > 0, prob*logProb, 0))
+        expected = entropy - info
+        self._probResponseGivenX = array([probR0, probR1])
+        self._expectedEntropyX = expected / log(10)  # in the same units as log10-based entropy
         
         #Generate next intensity
-        self.nextIntensityIndex = argmin(self._expectedEntropyX, axis=3)[0][0][0]
+        self.nextIntensityIndex = xIndices[argmin(expected)]
         self.nextIntensity = self.x[self.nextIntensityIndex]
         
     def estimateLambda(self):
-        return (sum(sum(self._alpha.reshape((len(self.alpha),1))*self._probLambda.squeeze(), axis=1)), sum(sum(self._beta.reshape((1,len(self.beta)))*self._probLambda.squeeze(), axis=1)))
+        probLambda = exp(self._logProbLambda)
+        return (sum(self.alpha.reshape((len(self.alpha),1))*probLambda), sum(self.beta.reshape((1,len(self.beta)))*probLambda))
         
     def estimateThreshold(self, thresh, lam):
         if lam is None:
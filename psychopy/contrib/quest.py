@@ -31,7 +31,7 @@
 # OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
 # DAMAGE.
 
-__all__ = ['QuestObject']
+__all__ = ['QuestObject', 'simulateObservers']
 
 import math
 import copy
@@ -44,7 +44,12 @@ import numpy as num
 
 def getinf(x):
     return num.nonzero( num.isinf( num.atleast_1d(x) ) )
-    
+
+def _round(x):
+    """Round half away from zero (like the builtin round), elementwise"""
+    x = num.asarray(x, dtype=float)
+    return num.sign(x)*num.floor(num.abs(x)+0.5)
+
 
 class QuestObject(object):
     
@@ -100,6 +105,11 @@ class QuestObject(object):
     intensities outside of this interval have zero prior probability,
     i.e. they are impossible.
 
+    The posterior is accumulated in the log domain (logPdf) using a
+    cached table of log(s2), so that replaying the history in
+    recompute() is a single vectorized sum rather than a loop over
+    trials. pdf is kept as exp(logPdf).
+
     """
     def __init__(self,tGuess,tGuessSd,pThreshold,beta,delta,gamma,grain=0.01,range=None):
         """Initialize Quest parameters.
@@ -290,8 +300,9 @@ class QuestObject(object):
             self.gamma = 0.5
         self.i = num.arange(-self.dim/2,self.dim/2+1)
         self.x = self.i * self.grain
-        self.pdf = num.exp(-0.5*(self.x/self.tGuessSd)**2)
-        self.pdf = self.pdf/num.sum(self.pdf)
+        self.logPdf = -0.5*(self.x/self.tGuessSd)**2
+        self.logPdf -= num.log(num.sum(num.exp(self.logPdf)))
+        self.pdf = num.exp(self.logPdf)
         i2 = num.arange(-self.dim,self.dim+1)
         self.x2 = i2*self.grain
         self.p2 = self.delta*self.gamma+(1-self.delta)*(1-(1-self.gamma)*num.exp(-10**(self.beta*self.x2)))
@@ -312,6 +323,8 @@ class QuestObject(object):
             self.response = []
         if len(getinf(self.s2)[0]):
             raise RuntimeError('psychometric function s2 is not finite')
+        with num.errstate(divide='ignore'):
+            self._logS2 = num.log(self.s2)
 
         eps = 1e-14
 
@@ -325,24 +338,46 @@ class QuestObject(object):
             raise RuntimeError('prior pdf is not finite')
 
         # recompute the pdf from the historical record of trials
-        for intensity, response in zip(self.intensity,self.response):
-            inten = max(-1e10,min(1e10,intensity)) # make intensity finite
-            ii = len(self.pdf) + self.i-round((inten-self.tGuess)/self.grain)-1
-            if ii[0]<0:
-                ii = ii-ii[0]
-            if ii[-1]>=self.s2.shape[1]:
-                ii = ii+self.s2.shape[1]-ii[-1]-1
-            iii = ii.astype(num.int_)
-            if not num.allclose(ii,iii):
-                raise ValueError('truncation error')
-            self.pdf = self.pdf*self.s2[response,iii]
-            if self.normalizePdf and k%100==0:
-                self.pdf = self.pdf/num.sum(self.pdf) # avoid underflow; keep the pdf normalized
-        if self.normalizePdf:
-            self.pdf = self.pdf/num.sum(self.pdf) # avoid underflow; keep the pdf normalized
+        self.logPdf = self.logPdf + self._logLikelihood(self.intensity, self.response)
+        self._updatePdf()
         if len(getinf(self.pdf)[0]):
             raise RuntimeError('prior pdf is not finite')
 
+    def _offsets(self, intensities):
+        """Index into s2 of the first pdf element for each intensity
+        (clipped so that the whole pdf falls within s2)"""
+        inten = num.clip(num.asarray(intensities, dtype=float), -1e10, 1e10) # make intensity finite
+        offsets = len(self.pdf) + self.i[0] - _round((inten-self.tGuess)/self.grain) - 1
+        offsets = num.clip(offsets, 0, self.s2.shape[1]-len(self.pdf))
+        return offsets.astype(num.int_)
+
+    def _logLikelihood(self, intensities, responses):
+        """Sum of log(s2) over the trials, for each element of the pdf.
+
+        Trials with the same (response, intensity) contribute the same
+        shifted row of log(s2), so only distinct pairs are gathered,
+        weighted by how often they occur."""
+        logL = num.zeros(len(self.pdf))
+        if len(intensities) == 0:
+            return logL
+        responses = num.asarray(responses, dtype=num.int_)
+        offsets = self._offsets(intensities)
+        nCols = self._logS2.shape[1]
+        pairs, counts = num.unique(responses*nCols + offsets, return_counts=True)
+        rows, starts = pairs // nCols, pairs % nCols
+        cols = starts[:, None] + num.arange(len(self.pdf))
+        logL += num.sum(self._logS2[rows[:, None], cols]*counts[:, None], axis=0)
+        return logL
+
+    def _updatePdf(self):
+        """Set pdf from logPdf (normalized if normalizePdf is set or if
+        it would otherwise underflow)"""
+        if self.normalizePdf or num.max(self.logPdf) < -700:
+            # log-sum-exp, so the normalization itself can't underflow
+            m = num.max(self.logPdf)
+            self.logPdf = self.logPdf - m - num.log(num.sum(num.exp(self.logPdf - m)))
+        self.pdf = num.exp(self.logPdf)
+
     def update(self,intensity,response):
         """Update Quest posterior pdf.
 
@@ -354,12 +389,12 @@ class QuestObject(object):
 
         This was converted from the Psychtoolbox's QuestUpdate function."""
         
-        if response < 0 or response > self.s2.shape[0]:
-            raise RuntimeError('response %g out of range 0 to %d'%(response,self.s2.shape[0]))
+        if response < 0 or response >= self.s2.shape[0]:
+            raise RuntimeError('response %g out of range 0 to %d'%(response,self.s2.shape[0]-1))
         if self.updatePdf:
             inten = max(-1e10,min(1e10,intensity)) # make intensity finite
             ii = len(self.pdf) + self.i-round((inten-self.tGuess)/self.grain)-1
-            if ii[0]<0 or ii[-1] > self.s2.shape[1]:
+            if ii[0]<0 or ii[-1] >= self.s2.shape[1]:
                 if self.warnPdf:
                     low=(1-len(self.pdf)-self.i[0])*self.grain+self.tGuess
                     high=(self.s2.shape[1]-len(self.pdf)-self.i[-1])*self.grain+self.tGuess
@@ -372,13 +407,96 @@ class QuestObject(object):
             iii = ii.astype(num.int_)
             if not num.allclose(ii,iii):
                 raise ValueError('truncation error')
-            self.pdf = self.pdf*self.s2[response,iii]
-            if self.normalizePdf:
-                self.pdf=self.pdf/num.sum(self.pdf)
+            self.logPdf = self.logPdf + self._logS2[response,iii]
+            self._updatePdf()
         # keep a historical record of the trials
         self.intensity.append(intensity)
         self.response.append(response)
+
+    def updateMany(self,intensities,responses):
+        """Update Quest posterior pdf with the results of many trials at
+        once (e.g. data from an earlier session).
+
+        Equivalent to calling update() for each trial in turn, but the
+        likelihood of all the trials is summed in one vectorized step."""
+        responses = list(responses)
+        intensities = list(intensities)
+        if len(intensities) != len(responses):
+            raise ValueError('intensities and responses must have the same length')
+        for response in responses:
+            if response < 0 or response >= self.s2.shape[0]:
+                raise RuntimeError('response %g out of range 0 to %d'%(response,self.s2.shape[0]-1))
+        if self.updatePdf:
+            self.logPdf = self.logPdf + self._logLikelihood(intensities, responses)
+            self._updatePdf()
+        self.intensity.extend(intensities)
+        self.response.extend(responses)
         
+def simulateObservers(q,tActual,nTrials,method='quantile',minVal=None,maxVal=None,rng=None):
+    """Simulate many QUEST staircases at once, one per simulated observer.
+
+    intensities,responses,estimates=simulateObservers(q,tActual,nTrials)
+
+    Every staircase starts from the current state (parameters, pdf) of the
+    QuestObject 'q' (which is left unchanged) and the observers have the
+    thresholds in the array 'tActual' (one staircase per value). On each
+    trial the test intensity of all staircases is chosen by 'method'
+    ('quantile', 'mean' or 'mode'), clipped to [minVal, maxVal] if given,
+    the responses are simulated as in simulate() and the pdfs updated, all
+    as array operations over the staircases.
+
+    Returns arrays (nObservers x nTrials) of the intensities and responses
+    and the final mean threshold estimate of each staircase.
+
+    rng is None (use numpy.random), a seed or a numpy RandomState."""
+    if rng is None:
+        rng = num.random
+    elif isinstance(rng, (int, long)):
+        rng = num.random.RandomState(rng)
+    tActual = num.atleast_1d(num.asarray(tActual, dtype=float))
+    nObs = len(tActual)
+    logPdf = num.tile(q.logPdf, (nObs, 1))
+    obsN = num.arange(nObs)[:, None]
+    cols = num.arange(len(q.pdf))
+    intensities = num.zeros((nObs, nTrials))
+    responses = num.zeros((nObs, nTrials), dtype=num.int_)
+    for trialN in range(nTrials):
+        # keep each row's maximum at 0 so exp() can't underflow
+        logPdf -= num.max(logPdf, axis=1)[:, None]
+        pdf = num.exp(logPdf)
+        if method == 'quantile':
+            tTest = _quantiles(pdf, q.x, q.quantileOrder) + q.tGuess
+        elif method == 'mean':
+            tTest = q.tGuess + num.sum(pdf*q.x, axis=1)/num.sum(pdf, axis=1)
+        elif method == 'mode':
+            tTest = q.tGuess + q.x[num.argmax(pdf, axis=1)]
+        else:
+            raise ValueError('unknown method %r' % method)
+        if minVal is not None or maxVal is not None:
+            tTest = num.clip(tTest, minVal, maxVal)
+        t = num.clip(tTest-tActual, q.x2[0], q.x2[-1])
+        resp = (num.interp(t, q.x2, q.p2) > rng.random_sample(nObs)).astype(num.int_)
+        intensities[:, trialN] = tTest
+        responses[:, trialN] = resp
+        offsets = q._offsets(tTest)
+        logPdf = logPdf + q._logS2[resp[:, None], offsets[:, None] + cols]
+    pdf = num.exp(logPdf - num.max(logPdf, axis=1)[:, None])
+    estimates = q.tGuess + num.sum(pdf*q.x, axis=1)/num.sum(pdf, axis=1)
+    return intensities, responses, estimates
+
+def _quantiles(pdf, x, quantileOrder):
+    """QuestObject.quantile() for each row of a 2D array of pdfs"""
+    p = num.cumsum(pdf, axis=1)
+    target = quantileOrder*p[:, -1]
+    rows = num.arange(len(pdf))
+    # first point at or above the target, and the first point of the
+    # (possibly flat, where pdf==0) stretch of the cumsum before it
+    hi = num.clip(num.sum(p < target[:, None], axis=1), 1, p.shape[1]-1)
+    lo = num.sum(p < p[rows, hi-1][:, None], axis=1)
+    pLo, pHi = p[rows, lo], p[rows, hi]
+    frac = num.clip((target-pLo)/(pHi-pLo), 0, 1)
+    return x[lo] + frac*(x[hi]-x[lo])
+
 def demo():
     """Demo script for Quest routines.
 
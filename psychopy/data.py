@@ -14,6 +14,7 @@ import sys
 import os
 import time
 import copy
+import shutil
 import numpy
 from scipy import optimize, special
 import inspect  # so that Handlers can find the script that called them
@@ -22,6 +23,12 @@ import weakref
 import re
 import warnings
 import collections
+import threading
+import Queue
+import multiprocessing
+import json
+import itertools
+import hashlib
 from distutils.version import StrictVersion
 
 try:
@@ -38,11 +45,12 @@ except ImportError:
     haveOpenpyxl = False
 
 from psychopy import logging
-from psychopy.tools.arraytools import extendArr, shuffleArray
+from psychopy.tools.arraytools import shuffleArray
 from psychopy.tools.fileerrortools import handleFileCollision
 from psychopy.tools.filetools import openOutputFile, genDelimiter
 import psychopy
-from psychopy.contrib.quest import QuestObject  # used for QuestHandler
+# used for QuestHandler
+from psychopy.contrib.quest import QuestObject, simulateObservers
 from psychopy.contrib.psi import PsiObject  # used for PsiHandler
 
 _experiments = weakref.WeakValueDictionary()
@@ -70,7 +78,8 @@ class ExperimentHandler(object):
                  savePickle=True,
                  saveWideText=True,
                  dataFileName='',
-                 autoLog=True):
+                 autoLog=True,
+                 streamWideText=False):
         """
         :parameters:
 
@@ -105,6 +114,16 @@ class ExperimentHandler(object):
             saveWideText : True (default) or False
 
             autoLog : True (default) or False
+
+            streamWideText : True or False (default)
+                If True (and a dataFileName is given) each entry is written
+                to the wide-text file by a background thread as soon as
+                nextEntry() is called, rather than all at the end. Entries
+                are then not kept in memory (`.entries` stays empty), a
+                crash loses at most the current trial and there is nothing
+                left to save when the handler is discarded. Columns that
+                first appear part-way through are added to the right of
+                the existing ones.
         """
         self.loops = []
         self.loopsUnfinished = []
@@ -124,6 +143,7 @@ class ExperimentHandler(object):
         self._paramNamesSoFar = []
         self.dataNames = []  # names of all the data (eg. resp.keys)
         self.autoLog = autoLog
+        self._stream = None
         if dataFileName in ['', None]:
             logging.warning('ExperimentHandler created with no dataFileName'
                             ' parameter. No data will be saved in the event '
@@ -131,6 +151,9 @@ class ExperimentHandler(object):
         else:
             # fail now if we fail at all!
             checkValidFilePath(dataFileName, makeValid=True)
+            if streamWideText:
+                self._stream = _WideTextStream(dataFileName + '.csv',
+                                               delim=',')
 
     def __del__(self):
         if self.dataFileName not in ['', None]:
@@ -139,9 +162,23 @@ class ExperimentHandler(object):
                     'Saving data for %s ExperimentHandler' % self.name)
             if self.savePickle == True:
                 self.saveAsPickle(self.dataFileName)
-            if self.saveWideText == True:
+            if self._stream is not None:
+                # rows are already on disk, just finish the file
+                self.closeStream()
+            elif self.saveWideText == True:
                 self.saveAsWideText(self.dataFileName + '.csv', delim=',')
 
+    def __getstate__(self):
+        # the stream (open file and thread) can't be pickled
+        state = self.__dict__.copy()
+        state['_stream'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_stream' not in state:  # pickled by an older version
+            self._stream = None
+
     def addLoop(self, loopHandler):
         """Add a loop such as a :class:`~psychopy.data.TrialHandler`
         or :class:`~psychopy.data.StairHandler`
@@ -267,9 +304,27 @@ class ExperimentHandler(object):
         # add the extraInfo dict to the data
         if type(self.extraInfo) == dict:
             this.update(self.extraInfo)
-        self.entries.append(this)
+        if self._stream is not None:
+            names = self._getAllParamNames()
+            names.extend(self.dataNames)
+            names.extend(self._getExtraInfo()[0])
+            self._stream.write(this, names)
+        else:
+            self.entries.append(this)
         self.thisEntry = {}
 
+    def closeStream(self):
+        """Finish writing the streamed wide-text file (if streamWideText
+        was set). Blocks until all pending entries are on disk.
+
+        This is called automatically when the handler is discarded or
+        aborted, so is not typically needed by the user.
+        """
+        if self._stream is not None:
+            stream, self._stream = self._stream, None
+            stream.close()
+            logging.info('saved data to %r' % stream.fileName)
+
     def saveAsWideText(self, fileName, delim=None,
                        matrixOnly=False,
                        appendFile=False,
@@ -314,20 +369,8 @@ class ExperimentHandler(object):
                 f.write(u'%s%s' % (heading, delim))
             f.write('\n')
         # write the data for each entry
-
         for entry in self.entries:
-            for name in names:
-                entry.keys()
-                if name in entry.keys():
-                    ename = unicode(entry[name])
-                    if ',' in ename or '\n' in ename:
-                        fmt = u'"%s"%s'
-                    else:
-                        fmt = u'%s%s'
-                    f.write(fmt % (entry[name], delim))
-                else:
-                    f.write(delim)
-            f.write('\n')
+            f.write(_wideTextRow(entry, names, delim))
         if f != sys.stdout:
             f.close()
         logging.info('saved data to %r' % f.name)
@@ -382,6 +425,120 @@ class ExperimentHandler(object):
         """
         self.savePickle = False
         self.saveWideText = False
+        # anything already streamed stays on disk but stop writing
+        self.closeStream()
+
+
+def _wideTextRow(entry, names, delim):
+    """Format one entry of an ExperimentHandler as a line of a wide-text
+    file (each value followed by the delimiter)
+    """
+    line = []
+    for name in names:
+        if name in entry:
+            ename = unicode(entry[name])
+            if ',' in ename or '\n' in ename:
+                fmt = u'"%s"%s'
+            else:
+                fmt = u'%s%s'
+            line.append(fmt % (entry[name], delim))
+        else:
+            line.append(delim)
+    line.append(u'\n')
+    return u''.join(line)
+
+
+class _WideTextStream(object):
+    """Appends entries to a wide-text file from a background thread, so
+    that the experiment never waits for the disk.
+
+    Each row is flushed as soon as it has been written. Columns discovered
+    after the header was written are appended to the right; in that case
+    the header line alone is replaced when the stream is closed.
+
+    An error raised while writing stops the stream and is re-raised by the
+    next call to write() or close().
+    """
+
+    def __init__(self, fileName, delim=None, encoding='utf-8',
+                 fileCollisionMethod='rename'):
+        if delim is None:
+            delim = genDelimiter(fileName)
+        self.delim = delim
+        self.encoding = encoding
+        self._file = openOutputFile(
+            fileName, append=False, delim=delim,
+            fileCollisionMethod=fileCollisionMethod, encoding=encoding)
+        self.fileName = self._file.name
+        self._header = None  # names written to the header line
+        self._names = []  # all names, in column order
+        self._error = None  # the exception that stopped the writer thread
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, entry, names):
+        """Queue an entry (dict) whose columns are given by `names`
+        """
+        self._raiseError()
+        self._queue.put((entry, names))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+                if self._error is not None:
+                    continue  # discard entries queued before write() noticed
+                self._writeEntry(*item)
+            except Exception as err:
+                self._error = err
+                logging.error('streaming data to %r failed: %s' %
+                              (self.fileName, err))
+            finally:
+                self._queue.task_done()
+
+    def _writeEntry(self, entry, names):
+        newNames = [name for name in names if name not in self._names]
+        self._names.extend(newNames)
+        if self._header is None:
+            self._header = list(self._names)
+            self._file.write(self._headerLine(self._header))
+        self._file.write(_wideTextRow(entry, self._names, self.delim))
+        self._file.flush()
+
+    def _headerLine(self, names):
+        return u''.join(u'%s%s' % (name, self.delim) for name in names) + u'\n'
+
+    def _raiseError(self):
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Write any pending entries and close the file
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._raiseError()
+        if self._header is not None and self._header != self._names:
+            self._rewriteHeader()
+
+    def _rewriteHeader(self):
+        """Replace the first line with the full list of names, copying
+        the rows across unchanged
+        """
+        header = self._headerLine(self._names)
+        tmpName = self.fileName + '.tmp'
+        with open(self.fileName, 'rb') as src:
+            src.readline()  # the old header
+            with open(tmpName, 'wb') as dst:
+                dst.write(header.encode(self.encoding))
+                shutil.copyfileobj(src, dst)
+        os.remove(self.fileName)
+        os.rename(tmpName, self.fileName)
 
 
 class TrialType(dict):
@@ -1322,7 +1479,6 @@ class TrialHandler(_BaseTrialHandler):
         if self.extraInfo is not None:
             for key in self.extraInfo:
                 header.insert(0, key)
-        df = DataFrame(columns=header)
 
         # loop through each trial, gathering the actual values:
         dataOut = []
@@ -1371,7 +1527,6 @@ class TrialHandler(_BaseTrialHandler):
 
                 # store this trial's data
                 dataOut.append(nextEntry)
-                df = df.append(nextEntry, ignore_index=True)
 
         if not matrixOnly:
             # write the header row:
@@ -1394,6 +1549,9 @@ class TrialHandler(_BaseTrialHandler):
             f.close()
             logging.info('saved wide-format data to %s' % f.name)
 
+        # build the DataFrame in one go (appending row by row copies the
+        # whole frame on every trial)
+        df = DataFrame(dataOut, columns=header, dtype=object)
         # Converts numbers to numeric, such as float64, boolean to bool.
         # Otherwise they all are "object" type, i.e. strings
         df = df.convert_objects()
@@ -2592,6 +2750,195 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
         - slice(-10, 2, None)  # the same as above
         - random(5) * 8  # five random vals 0-8
 
+    The parsed file is cached (in memory and as a binary file in the user
+    prefs folder) against its path, modification time and size, so calling
+    this repeatedly for the same file, e.g. from nested loops, only parses
+    it once. The `selection` is applied to the cached rows and only the
+    selected conditions are built into dicts. Each call returns new dicts.
+    """
+    if fileName in ['None', 'none', None]:
+        if returnFieldNames:
+            return [], []
+        return []
+    if not os.path.isfile(fileName):
+        msg = 'Conditions file not found: %s'
+        raise ImportError(msg % os.path.abspath(fileName))
+
+    fieldNames, rows, mutableCols = _getConditionsRows(fileName)
+
+    # if we have a selection then try to parse it
+    if isinstance(selection, basestring) and len(selection) > 0:
+        selection = indicesFromString(selection)
+        if not isinstance(selection, slice):
+            for n in selection:
+                try:
+                    assert n == int(n)
+                except Exception:
+                    raise TypeError("importConditions() was given some "
+                                    "`indices` but could not parse them")
+    # the selection might now be a slice or a series of indices
+    if isinstance(selection, slice):
+        rows = rows[selection]
+    elif len(selection) > 0:
+        rows = [rows[int(round(ii))] for ii in selection]
+
+    # build the dicts only for the selected rows; values that could be
+    # mutated in place (e.g. lists) are copied so the cache stays intact
+    trialList = []
+    for row in rows:
+        if mutableCols:
+            row = list(row)
+            for colN in mutableCols:
+                row[colN] = copy.deepcopy(row[colN])
+        trialList.append(dict(zip(fieldNames, row)))
+
+    logging.exp('Imported %s as conditions, %d conditions, %d params' %
+                (fileName, len(trialList), len(fieldNames)))
+    if returnFieldNames:
+        return (trialList, fieldNames)
+    else:
+        return trialList
+
+
+# abspath: (mtime, size, fieldNames, rows, mutableCols), least recently
+# used first
+_conditionsCache = collections.OrderedDict()
+# the least recently used files beyond this are dropped from memory
+_conditionsCacheMaxEntries = 32
+_conditionsCacheVersion = 1
+# folder for the binary cache files (None for the user prefs folder)
+_conditionsCacheDir = None
+# the least recently used cache files beyond these limits are removed
+_conditionsCacheMaxFiles = 200
+_conditionsCacheMaxBytes = 50 * 1024 * 1024
+
+
+def _conditionsCacheName(path):
+    """Name of the binary cache file for the conditions file at `path`
+    (or None if there is no user prefs folder to put it in)
+    """
+    cacheDir = _conditionsCacheDir
+    if cacheDir is None:
+        try:
+            cacheDir = os.path.join(psychopy.prefs.paths['userPrefsDir'],
+                                    'conditionsCache')
+        except Exception:
+            return None
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    digest = hashlib.md5(path).hexdigest()
+    return os.path.join(cacheDir, digest + '.psycache')
+
+
+def _pruneConditionsCache(cacheDir):
+    """Removes the least recently used cache files from `cacheDir` while
+    there are more than `_conditionsCacheMaxFiles` of them or they take
+    more than `_conditionsCacheMaxBytes`
+    """
+    entries = []
+    for name in os.listdir(cacheDir):
+        if name.endswith('.psycache'):
+            try:
+                stat = os.stat(os.path.join(cacheDir, name))
+            except OSError:
+                continue  # removed by another process
+            entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort(reverse=True)  # most recently used first
+    nBytes = 0
+    for n, (mtime, size, name) in enumerate(entries):
+        nBytes += size
+        if n >= _conditionsCacheMaxFiles or nBytes > _conditionsCacheMaxBytes:
+            try:
+                os.remove(os.path.join(cacheDir, name))
+            except OSError:
+                logging.debug('Could not remove conditions cache %s' % name)
+
+
+def _storeConditions(path, cached):
+    """Adds (or moves) `path` to the most recently used end of the
+    in-memory conditions cache, dropping the least recently used files
+    beyond `_conditionsCacheMaxEntries`
+    """
+    _conditionsCache.pop(path, None)
+    _conditionsCache[path] = cached
+    while len(_conditionsCache) > _conditionsCacheMaxEntries:
+        _conditionsCache.popitem(last=False)
+
+
+def _getConditionsRows(fileName):
+    """Returns (fieldNames, rows, mutableCols) for a conditions file,
+    parsing it only if it isn't already cached (in memory or on disk)
+    for this modification time and size.
+    """
+    path = os.path.abspath(fileName)
+    stat = os.stat(path)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _conditionsCache.get(path)
+    if cached is not None and cached[:2] == key:
+        _storeConditions(path, cached)
+        return cached[2:]
+
+    # pickle files are already in a binary format so they skip the sidecar
+    cacheName = None
+    if not fileName.endswith('.pkl'):
+        cacheName = _conditionsCacheName(path)
+    if cacheName and os.path.isfile(cacheName):
+        try:
+            with open(cacheName, 'rb') as f:
+                stored = cPickle.load(f)
+            if (stored['version'] == _conditionsCacheVersion and
+                    stored['path'] == path and
+                    (stored['mtime'], stored['size']) == key):
+                rows = zip(*[list(col) for col in stored['columns']])
+                cached = key + (stored['fieldNames'], rows,
+                                stored['mutableCols'])
+                _storeConditions(path, cached)
+                os.utime(cacheName, None)  # mark as recently used
+                return cached[2:]
+        except Exception:
+            logging.debug('Ignoring unreadable conditions cache %s'
+                          % cacheName)
+
+    fieldNames, rows = _loadConditionsFile(fileName)
+    mutableCols = [colN for colN in range(len(fieldNames))
+                   if any(isinstance(row[colN],
+                                     (list, dict, set, numpy.ndarray))
+                          for row in rows)]
+    cached = key + (fieldNames, rows, mutableCols)
+    _storeConditions(path, cached)
+
+    if cacheName:
+        # store by column, with columns of numpy scalars as arrays, which
+        # is far more compact (and quicker to load) than pickled scalars
+        columns = []
+        for col in zip(*rows):
+            if (len(col) and isinstance(col[0], numpy.generic) and
+                    all(type(val) is type(col[0]) for val in col)):
+                col = numpy.array(col)
+            columns.append(col)
+        stored = {'version': _conditionsCacheVersion, 'path': path,
+                  'mtime': key[0], 'size': key[1],
+                  'fieldNames': fieldNames, 'columns': columns,
+                  'mutableCols': mutableCols}
+        try:
+            if not os.path.isdir(os.path.dirname(cacheName)):
+                os.makedirs(os.path.dirname(cacheName))
+            # write then rename so a half-written cache is never read
+            tmpName = cacheName + '.%i.tmp' % os.getpid()
+            with open(tmpName, 'wb') as f:
+                cPickle.dump(stored, f, cPickle.HIGHEST_PROTOCOL)
+            if os.path.isfile(cacheName):
+                os.remove(cacheName)
+            os.rename(tmpName, cacheName)
+            _pruneConditionsCache(os.path.dirname(cacheName))
+        except Exception:
+            logging.debug('Could not write conditions cache %s' % cacheName)
+    return cached[2:]
+
+
+def _loadConditionsFile(fileName):
+    """Parses a conditions file (.csv, .pkl or .xlsx) into its field names
+    and a list of row tuples (one per condition, in field name order)
     """
     def _assertValidVarNames(fieldNames, fileName):
         """screens a list of names as candidate variable names. if all
@@ -2609,14 +2956,6 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
                 raise ImportError('Conditions file %s: %s%s"%s"' %
                                   (fileName, msg, os.linesep * 2, name))
 
-    if fileName in ['None', 'none', None]:
-        if returnFieldNames:
-            return [], []
-        return []
-    if not os.path.isfile(fileName):
-        msg = 'Conditions file not found: %s'
-        raise ImportError(msg % os.path.abspath(fileName))
-
     if fileName.endswith('.csv'):
         with open(fileName, 'rU') as fileUniv:
             # use pandas reader, which can handle commas in fields, etc
@@ -2628,27 +2967,35 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
             trialsArr = trialsArr[numpy.newaxis]
         fieldNames = trialsArr.dtype.names
         _assertValidVarNames(fieldNames, fileName)
-        # convert the record array into a list of dicts
-        trialList = []
-        for trialN, trialType in enumerate(trialsArr):
-            thisTrial = {}
-            for fieldN, fieldName in enumerate(fieldNames):
-                val = trialsArr[trialN][fieldN]
-                
+        # convert whole columns at a time (much faster than indexing the
+        # record array cell by cell) then zip them into rows
+        columns = []
+        for fieldName in fieldNames:
+            colArr = trialsArr[fieldName]
+            if colArr.dtype.kind in 'fc':
+                col = list(colArr)
+                for ii in numpy.flatnonzero(numpy.isnan(colArr)):
+                    col[ii] = None  # if it is a numpy.nan, convert to None
+                columns.append(col)
+                continue
+            elif colArr.dtype.kind != 'O' and colArr.dtype.kind != 'S':
+                columns.append(list(colArr))  # ints, bools: nothing to do
+                continue
+            col = []
+            for val in colArr:
                 if type(val) in [unicode, str]:
                     if val.startswith('[') and val.endswith(']'):
-                        # val = eval('%s' %unicode(val.decode('utf8')))
                         val = eval(val)
                 elif type(val) == numpy.string_:
                     val = unicode(val.decode('utf-8'))
                     # if it looks like a list, convert it:
                     if val.startswith('[') and val.endswith(']'):
-                        # val = eval('%s' %unicode(val.decode('utf8')))
                         val = eval(val)
-                elif numpy.isnan(val): #if it is a numpy.nan, convert to None
-                        val = None
-                thisTrial[fieldName] = val
-            trialList.append(thisTrial)
+                elif numpy.isnan(val):  # if it is a numpy.nan, convert to None
+                    val = None
+                col.append(val)
+            columns.append(col)
+        rows = zip(*columns) if columns else []
     elif fileName.endswith('.pkl'):
         f = open(fileName, 'rU')  # is U needed?
         try:
@@ -2656,79 +3003,68 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
         except Exception:
             raise ImportError('Could not open %s as conditions' % fileName)
         f.close()
-        trialList = []
         fieldNames = trialsArr[0]  # header line first
         _assertValidVarNames(fieldNames, fileName)
-        for row in trialsArr[1:]:
-            thisTrial = {}
-            for fieldN, fieldName in enumerate(fieldNames):
-                # type is correct, being .pkl
-                thisTrial[fieldName] = row[fieldN]
-            trialList.append(thisTrial)
+        # type is correct, being .pkl
+        rows = [tuple(row[:len(fieldNames)]) for row in trialsArr[1:]]
     else:
         if not haveOpenpyxl:
             raise ImportError('openpyxl is required for loading excel '
                               'format files, but it was not found.')
-        if openpyxl.__version__ < "1.8":  # data_only added in 1.8
-            wb = load_workbook(filename=fileName)
+        if StrictVersion(openpyxl.__version__) >= StrictVersion('2.0'):
+            # the read-only (streaming) reader is far faster on big sheets
+            wb = load_workbook(filename=fileName, data_only=True,
+                               read_only=True)
+            try:
+                ws = wb.worksheets[0]
+                sheetRows = [[cell.value for cell in row]
+                             for row in ws.iter_rows()]
+            finally:
+                # the read-only reader keeps the file open until closed
+                if hasattr(wb, 'close'):
+                    wb.close()
+                elif getattr(wb, '_archive', None) is not None:
+                    wb._archive.close()  # openpyxl < 2.4
+            nCols = max([len(row) for row in sheetRows] or [0])
+            sheetRows = [row + [None] * (nCols - len(row))
+                         for row in sheetRows]
+            if not sheetRows:
+                sheetRows = [[]]
         else:
-            wb = load_workbook(filename=fileName, data_only=True)
-        ws = wb.worksheets[0]
-        try:
-            # in new openpyxl (2.3.4+) get_highest_xx is deprecated
-            nCols = ws.max_column
-            nRows = ws.max_row
-        except:
-            # version openpyxl 1.5.8 (in Standalone 1.80) needs this
-            nCols = ws.get_highest_column()
-            nRows = ws.get_highest_row()
+            if openpyxl.__version__ < "1.8":  # data_only added in 1.8
+                wb = load_workbook(filename=fileName)
+            else:
+                wb = load_workbook(filename=fileName, data_only=True)
+            ws = wb.worksheets[0]
+            try:
+                # in new openpyxl (2.3.4+) get_highest_xx is deprecated
+                nCols = ws.max_column
+                nRows = ws.max_row
+            except:
+                # version openpyxl 1.5.8 (in Standalone 1.80) needs this
+                nCols = ws.get_highest_column()
+                nRows = ws.get_highest_row()
+            sheetRows = [[ws.cell(_getExcelCellName(col=colN, row=rowN)).value
+                          for colN in range(nCols)]
+                         for rowN in range(nRows)]
 
         # get parameter names from the first row header
-        fieldNames = []
-        for colN in range(nCols):
-            fieldName = ws.cell(_getExcelCellName(col=colN, row=0)).value
-            fieldNames.append(fieldName)
+        fieldNames = sheetRows[0]
         _assertValidVarNames(fieldNames, fileName)
 
         # loop trialTypes
-        trialList = []
-        for rowN in range(1, nRows):  # skip header first row
-            thisTrial = {}
-            for colN in range(nCols):
-                val = ws.cell(_getExcelCellName(col=colN, row=rowN)).value
+        rows = []
+        for sheetRow in sheetRows[1:]:  # skip header first row
+            row = []
+            for val in sheetRow:
                 # if it looks like a list or tuple, convert it
                 if (type(val) in (unicode, str) and
                         (val.startswith('[') and val.endswith(']') or
                          val.startswith('(') and val.endswith(')'))):
                     val = eval(val)
-                fieldName = fieldNames[colN]
-                thisTrial[fieldName] = val
-            trialList.append(thisTrial)
-    # if we have a selection then try to parse it
-    if isinstance(selection, basestring) and len(selection) > 0:
-        selection = indicesFromString(selection)
-        if not isinstance(selection, slice):
-            for n in selection:
-                try:
-                    assert n == int(n)
-                except Exception:
-                    raise TypeError("importConditions() was given some "
-                                    "`indices` but could not parse them")
-    # the selection might now be a slice or a series of indices
-    if isinstance(selection, slice):
-        trialList = trialList[selection]
-    elif len(selection) > 0:
-        allConds = trialList
-        trialList = []
-        for ii in selection:
-            trialList.append(allConds[int(round(ii))])
-
-    logging.exp('Imported %s as conditions, %d conditions, %d params' %
-                (fileName, len(trialList), len(fieldNames)))
-    if returnFieldNames:
-        return (trialList, fieldNames)
-    else:
-        return trialList
+                row.append(val)
+            rows.append(tuple(row))
+    return fieldNames, rows
 
 
 def createFactorialTrialList(factors):
@@ -3331,6 +3667,16 @@ class StairHandler(_BaseTrialHandler):
             ws = wb.create_sheet()
             ws.title = sheetName
 
+        self._writeExcelSheet(ws, matrixOnly)
+
+        wb.save(filename=fileName)
+        if self.autoLog:
+            logging.info('saved data to %s' % fileName)
+
+    def _writeExcelSheet(self, ws, matrixOnly=False):
+        """Write the data of this staircase into the worksheet `ws` (used
+        by saveAsExcel here and in MultiStairHandler)
+        """
         # write the data
         # reversals data
         ws.cell('A1').value = 'Reversal Intensities'
@@ -3362,10 +3708,6 @@ class StairHandler(_BaseTrialHandler):
                 ws.cell(_cell).value = unicode(val)
                 rowN += 1
 
-        wb.save(filename=fileName)
-        if self.autoLog:
-            logging.info('saved data to %s' % fileName)
-
     def saveAsPickle(self, fileName, fileCollisionMethod='rename'):
         """Basically just saves a copy of self (with data) to a pickle file.
 
@@ -3620,19 +3962,38 @@ class QuestHandler(StairHandler):
     def importData(self, intensities, results):
         """import some data which wasn't previously given to the quest
         algorithm
+
+        All the trials are added to the quest pdf in one vectorized step
+        and the next intensity is calculated once, at the end. If a
+        `stopInterval` is set, or the staircase belongs to an experiment
+        handler, the trials are added one by one instead, so the import
+        stops where the staircase finishes and the experiment receives
+        each response.
         """
         # NOT SURE ABOUT CLASS TO USE FOR RAISING ERROR
         if len(intensities) != len(results):
             raise AttributeError("length of intensities and results input "
                                  "must be the same")
         self.incTrials(len(intensities))
-        for intensity, result in zip(intensities, results):
-            try:
-                self.next()
-                self.addResponse(result, intensity)
-            except StopIteration:
-                # would get a stop iteration if stopInterval set
-                pass    # TODO: might want to check if nTrials is still good
+        if self.stopInterval is not None or self.getExp() is not None:
+            for intensity, result in zip(intensities, results):
+                try:
+                    self.next()
+                    self.addResponse(result, intensity)
+                except StopIteration:
+                    # would get a stop iteration if stopInterval set
+                    pass    # TODO: might want to check if nTrials is still good
+            return
+        if self.finished or not len(intensities):
+            return
+        self._quest.updateMany(intensities, results)
+        self.intensities.extend(intensities)
+        self.data.extend(results)
+        self.thisTrialN += len(intensities)
+
+        self._checkFinished()
+        if not self.finished:
+            self.calculateNextIntensity()
 
     def calculateNextIntensity(self):
         """based on current intensity and counter of correct responses
@@ -3704,6 +4065,36 @@ class QuestHandler(StairHandler):
             tTest = self._quest.quantile()
         return self._quest.simulate(tTest, tActual)
 
+    def simulateObservers(self, tActuals, nTrials=None, rng=None):
+        """Run many simulated staircases at once (e.g. to tune the
+        parameters offline), without changing this staircase.
+
+        Each staircase starts from the current state of this handler,
+        chooses intensities with its `method` (clipped to minVal/maxVal)
+        and simulates an observer whose threshold is the corresponding
+        value of `tActuals`. The staircases are run together as array
+        operations, so thousands of them take little longer than one.
+
+        :Parameters:
+
+            tActuals : list or array of the simulated thresholds
+
+            nTrials : number of trials (defaults to the number of trials
+                this staircase still has to run)
+
+            rng : None (numpy.random), a seed or a numpy RandomState
+
+        :Returns:
+
+            intensities and responses (arrays of nObservers x nTrials) and
+            the final mean threshold estimate of each staircase
+        """
+        if nTrials is None:
+            nTrials = self.nTrials - len(self.intensities)
+        return simulateObservers(self._quest, tActuals, nTrials,
+                                 method=self.method, minVal=self.minVal,
+                                 maxVal=self.maxVal, rng=rng)
+
     def next(self):
         """Advances to next trial and returns it.
         Updates attributes; `thisTrial`, `thisTrialN`, `thisIndex`,
@@ -3756,9 +4147,12 @@ class PsiHandler(StairHandler):
     of the psychometric function, the location (alpha) and slope (beta),
     using Bayes' rule and grid approximation of the posterior distribution.
     It chooses stimuli to present by minimizing the entropy of this grid.
-    Because this grid is represented internally as a 4-D array, one must
-    choose the intensity, alpha, and beta ranges carefully so as to avoid
-    a Memory Error. Maximum likelihood is used to estimate Lambda, the most
+    The posterior is held as a 2-D (alpha x beta) array in log space, but
+    choosing the next stimulus uses tables of (alpha x beta) x intensity
+    values, so the ranges and precisions still need choosing with care.
+    The time taken by each update is stored in `updateDurations` to help
+    with sizing the grids, and `dtype='float32'` halves the memory used by
+    the tables. Maximum likelihood is used to estimate Lambda, the most
     likely location/slope pair. Because Psi estimates the entire
     psychometric function, any threshold defined on the function may be
     estimated once Lambda is determined.
@@ -3795,7 +4189,8 @@ class PsiHandler(StairHandler):
                  prior=None,
                  fromFile=False,
                  extraInfo=None,
-                 name=''):
+                 name='',
+                 dtype='float64'):
         """Initializes the handler and creates an internal Psi Object for
         grid approximation.
 
@@ -3868,6 +4263,11 @@ class PsiHandler(StairHandler):
                 Optional name for the PsiHandler used in PsychoPy's built-in
                 logging system.
 
+            dtype   (str)
+                Precision of the internal likelihood tables. 'float32'
+                halves their memory use (the posterior itself is always
+                kept in double precision). Defaults to 'float64'.
+
         :Raises:
 
             NotImplementedError
@@ -3900,9 +4300,10 @@ class PsiHandler(StairHandler):
         self._psi = PsiObject(
             intensRange, alphaRange, betaRange, intensPrecision,
             alphaPrecision, betaPrecision, delta=delta,
-            stepType=stepType, TwoAFC=twoAFC, prior=prior)
+            stepType=stepType, TwoAFC=twoAFC, prior=prior, dtype=dtype)
 
         self._psi.update(None)
+        self.updateDurations = []  # secs taken by each addResponse update
 
     def addResponse(self, result, intensity=None):
         """Add a 1 or 0 to signify a correct / detected or
@@ -3922,6 +4323,18 @@ class PsiHandler(StairHandler):
             # update the experiment handler too
             self.getExp().addData(self.name + ".response", result)
         self._psi.update(result)
+        self.updateDurations.append(self._psi.updateDuration)
+
+    def setCandidates(self, candidates=None):
+        """Restrict the intensities that can be chosen for the next trials
+        to a subset of the intensity grid (given as indices or a boolean
+        mask over the grid values). Use None to allow all of them again.
+
+        Only the expected entropy of the candidates is computed, so this
+        also shortens the update after each response.
+        """
+        self._psi.candidates = candidates
+        self._psi.chooseNext()
 
     def next(self):
         """Advances to next trial and returns it.
@@ -4139,6 +4552,8 @@ class MultiStairHandler(_BaseTrialHandler):
 
             # This isn't normally part of handler.
             thisStair.condition = condition
+            # position in self.conditions (so next() needn't search for it)
+            thisStair._stairIndex = len(self.staircases)
 
             # And finally, add it to the list.
             self.staircases.append(thisStair)
@@ -4194,8 +4609,11 @@ class MultiStairHandler(_BaseTrialHandler):
                 stair = self.currentStaircase
                 for key, value in stair.condition.items():
                     exp.addData("%s.%s" % (self.name, key), value)
-                exp.addData(self.name + '.thisIndex',
-                            self.conditions.index(stair.condition))
+                if hasattr(stair, '_stairIndex'):
+                    stairIndex = stair._stairIndex
+                else:  # e.g. unpickled from an older version
+                    stairIndex = self.conditions.index(stair.condition)
+                exp.addData(self.name + '.thisIndex', stairIndex)
                 exp.addData(self.name + '.thisRepN', stair.thisTrialN + 1)
                 exp.addData(self.name + '.thisN', self.totalTrials)
                 exp.addData(self.name + '.direction', stair.currentDirection)
@@ -4326,15 +4744,125 @@ class MultiStairHandler(_BaseTrialHandler):
                 logging.debug('StairHandler.saveAsExcel called but no'
                               ' trials completed. Nothing saved')
             return -1
+        if not haveOpenpyxl:
+            raise ImportError('openpyxl is required for saving files in '
+                              'Excel (xlsx) format, but was not found.')
+        from openpyxl.workbook import Workbook
+
+        if not fileName.endswith('.xlsx'):
+            fileName += '.xlsx'
+        # open (or create) the workbook once and add all the sheets to it,
+        # rather than reloading and rewriting the file for each staircase
+        if appendFile and os.path.isfile(fileName):
+            wb = load_workbook(fileName)
+            newWorkbook = False
+        else:
+            if not appendFile:
+                fileName = handleFileCollision(fileName,
+                                               fileCollisionMethod)
+            wb = Workbook()
+            wb.properties.creator = 'PsychoPy' + psychopy.__version__
+            newWorkbook = True
 
-        append = appendFile
         for thisStair in self.staircases:
-            # make a filename
-            label = thisStair.condition['label']
-            thisStair.saveAsExcel(
-                fileName, sheetName=label, matrixOnly=matrixOnly,
-                appendFile=append, fileCollisionMethod=fileCollisionMethod)
-            append = True
+            if thisStair.thisTrialN < 1:
+                continue  # as for StairHandler.saveAsExcel, nothing to save
+            if newWorkbook:
+                ws = wb.worksheets[0]
+                newWorkbook = False
+            else:
+                ws = wb.create_sheet()
+            ws.title = thisStair.condition['label']
+            thisStair._writeExcelSheet(ws, matrixOnly)
+
+        wb.save(filename=fileName)
+        if self.autoLog:
+            logging.info('saved data to %s' % fileName)
+
+    def saveCheckpoint(self, fileName):
+        """Save the state of all the staircases to a compact numpy (.npz)
+        file, without pickling, so that a session can be resumed with
+        :func:`loadCheckpoint`.
+
+        The state is stored as one array per attribute across staircases
+        (e.g. the next intensity of every staircase), with the per-trial
+        lists (intensities, responses, reversals) concatenated and
+        indexed by their lengths. `otherData` is stored as JSON.
+
+        The extension `.npz` will be added if not given already.
+        """
+        if not fileName.endswith('.npz'):
+            fileName += '.npz'
+        stairs = self.staircases
+        state = {}
+        for name in _stairScalarAttrs:
+            state[name] = numpy.array(
+                [getattr(s, name, numpy.nan) for s in stairs], float)
+        state['currentDirection'] = numpy.array(
+            [s.currentDirection for s in stairs], 'U')
+        for name in _stairListAttrs:
+            lists = [getattr(s, name) for s in stairs]
+            state[name + '_len'] = numpy.array([len(l) for l in lists], int)
+            state[name] = numpy.fromiter(itertools.chain(*lists), float)
+        state['otherData'] = numpy.array(
+            json.dumps([s.otherData for s in stairs], default=unicode), 'U')
+        # the handler itself (prefixed to keep apart from staircase attrs)
+        running = [s in self.runningStaircases for s in stairs]
+        state['running'] = numpy.array(running, bool)
+        state['thisPassRemaining'] = numpy.array(
+            [stairs.index(s) for s in self.thisPassRemaining], int)
+        state['handler.currentStaircase'] = stairs.index(self.currentStaircase)
+        state['handler.totalTrials'] = self.totalTrials
+        state['handler.finished'] = self.finished
+        numpy.savez(fileName, **state)
+        if self.autoLog:
+            logging.info('saved checkpoint to %s' % fileName)
+
+    def loadCheckpoint(self, fileName):
+        """Restore the state saved by :func:`saveCheckpoint` into this
+        handler, which must have been created with the same conditions.
+        QUEST staircases recompute their pdf from the restored trials.
+        """
+        state = numpy.load(fileName, allow_pickle=False)
+        stairs = self.staircases
+        if len(state['running']) != len(stairs):
+            raise ValueError('Checkpoint %s has %i staircases but this '
+                             'handler has %i' %
+                             (fileName, len(state['running']), len(stairs)))
+        for name in _stairScalarAttrs:
+            for stair, val in zip(stairs, state[name]):
+                if not numpy.isnan(val) and hasattr(stair, name):
+                    if name == 'finished':
+                        val = bool(val)
+                    elif name in _stairIntAttrs:
+                        val = int(val)
+                    setattr(stair, name, val)
+        for stair, val in zip(stairs, state['currentDirection']):
+            stair.currentDirection = unicode(val)
+        for name in _stairListAttrs:
+            ends = numpy.cumsum(state[name + '_len'])
+            starts = ends - state[name + '_len']
+            values = state[name]
+            for stair, start, end in zip(stairs, starts, ends):
+                vals = values[start:end]
+                if name in _stairIntAttrs:
+                    vals = vals.astype(int)
+                setattr(stair, name, vals.tolist())
+        otherData = json.loads(unicode(state['otherData']))
+        for stair, other in zip(stairs, otherData):
+            stair.otherData = other
+            if hasattr(stair, '_quest'):
+                stair._quest.intensity = list(stair.intensities[:len(stair.data)])
+                stair._quest.response = list(stair.data)
+                stair._quest.recompute()
+        self.runningStaircases = [s for s, running
+                                  in zip(stairs, state['running']) if running]
+        self.thisPassRemaining = [stairs[i]
+                                  for i in state['thisPassRemaining']]
+        self.currentStaircase = stairs[int(state['handler.currentStaircase'])]
+        self._nextIntensity = self.currentStaircase._nextIntensity
+        self.totalTrials = int(state['handler.totalTrials'])
+        self.finished = bool(state['handler.finished'])
 
     def saveAsText(self, fileName,
                    delim=None,
@@ -4413,6 +4941,16 @@ class MultiStairHandler(_BaseTrialHandler):
                                  matrixOnly=thisMatrixOnly)
 
 
+# staircase attributes saved by MultiStairHandler.saveCheckpoint
+_stairScalarAttrs = ('thisTrialN', 'correctCounter', 'initialRule',
+                     'finished', 'nTrials', 'stepSizeCurrent',
+                     '_nextIntensity', '_questNextIntensity')
+_stairListAttrs = ('data', 'intensities', 'reversalPoints',
+                   'reversalIntensities')
+_stairIntAttrs = ('thisTrialN', 'correctCounter', 'initialRule', 'nTrials',
+                  'data', 'reversalPoints')
+
+
 class DataHandler(dict):
     """For handling data (used by TrialHandler, principally, rather than
     by users directly)
@@ -4423,6 +4961,11 @@ class DataHandler(dict):
     to a standard (not masked) numpy array with dtype='O' and where missing
     entries have value = "--".
 
+    Each data type is backed by its own preallocated column buffer that
+    grows in chunks (doubling its capacity) when a value falls outside the
+    current shape. The arrays in the dict are views onto those buffers, so
+    reading them (e.g. from saveAsWideText or saveAsExcel) never copies.
+
     Attributes:
         - ['key']=data arrays containing values for that key
             (e.g. data['accuracy']=...)
@@ -4435,6 +4978,7 @@ class DataHandler(dict):
         self.trials = trials
         self.dataTypes = []  # names will be added during addDataType
         self.isNumeric = {}
+        self._buffers = {}  # the (possibly larger) arrays behind the views
         # if given dataShape use it - otherwise guess!
         if dataShape:
             self.dataShape = dataShape
@@ -4447,6 +4991,17 @@ class DataHandler(dict):
             for thisType in dataTypes:
                 self.addDataType(thisType)
 
+    def __getstate__(self):
+        # only the views (the used part of each buffer) need pickling
+        state = self.__dict__.copy()
+        state['_buffers'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_buffers' not in state:  # pickled by an older version
+            self._buffers = {}
+
     def addDataType(self, names, shape=None):
         """Add a new key to the data dictionary of particular shape if
         specified (otherwise the shape of the trial matrix in the trial
@@ -4468,6 +5023,7 @@ class DataHandler(dict):
             # dytpe='O' together - they don't unpickle
             self[names] = numpy.ma.zeros(shape, 'f')  # masked array of floats
             self[names].mask = True
+            self._buffers[names] = self[names]
             # add the name to the list
             self.dataTypes.append(names)
             self.isNumeric[names] = True  # until we need otherwise
@@ -4486,36 +5042,82 @@ class DataHandler(dict):
             # make a list where 1st digit is trial number
             position = [self.trials.thisIndex]
             position.append(repN)
+        position = (int(position[0]), int(position[1]))
 
         # check whether data falls within bounds
-        posArr = numpy.asarray(position)
-        shapeArr = numpy.asarray(self.dataShape)
-        if not numpy.alltrue(posArr < shapeArr):
+        if not all(p < n for p, n in zip(position, self[thisType].shape)):
             # array isn't big enough
             logging.warning('need a bigger array for: ' + thisType)
-            # not implemented yet!
-            self[thisType] = extendArr(self[thisType], posArr)
+            self._extendTo(thisType, position)
         # check for ndarrays with more than one value and for non-numeric data
-        if (self.isNumeric[thisType] and
-                ((type(value) == numpy.ndarray and len(value) > 1) or
-                 (type(value) not in [float, int]))):
+        if self.isNumeric[thisType] and not _isNumericScalar(value):
             self._convertToObjectArray(thisType)
-        # insert the value
-        self[thisType][position[0], int(position[1])] = value
+        # insert the value (the view in self[thisType] shares its memory)
+        self._getBuffer(thisType)[position] = value
+
+    def _getBuffer(self, thisType):
+        """Return the array holding the values of this datatype
+        """
+        if thisType not in self._buffers:
+            # e.g. after unpickling or if the user replaced the array
+            self._buffers[thisType] = self[thisType]
+        return self._buffers[thisType]
+
+    def _extendTo(self, thisType, position):
+        """Enlarge the arrays so that `position` is valid.
+
+        All datatypes sharing the shape of `thisType` are grown together so
+        they stay aligned. Buffers are reallocated only when their capacity
+        is exceeded, and then to at least double the size, so repeated
+        out-of-bounds additions cost amortised constant time.
+        """
+        oldShape = self[thisType].shape
+        newShape = tuple(max(n, p + 1) for n, p in zip(oldShape, position))
+        for name in self.dataTypes:
+            if name != thisType and self[name].shape != oldShape:
+                continue
+            buff = self._getBuffer(name)
+            if any(n > c for n, c in zip(newShape, buff.shape)):
+                capacity = [max(n, 2 * c) for n, c in zip(newShape, buff.shape)]
+                if self.isNumeric[name]:
+                    newBuff = numpy.ma.zeros(capacity, buff.dtype)
+                    newBuff.mask = True
+                else:
+                    newBuff = numpy.empty(capacity, 'O')
+                    newBuff.fill('--')
+                used = tuple(slice(0, n) for n in self[name].shape)
+                newBuff[used] = self[name]
+                self._buffers[name] = buff = newBuff
+            self[name] = buff[tuple(slice(0, n) for n in newShape)]
+        if list(oldShape) == list(self.dataShape):
+            self.dataShape = list(newShape)
 
     def _convertToObjectArray(self, thisType):
         """Convert this datatype from masked numeric array to unmasked
         object array
         """
-        dat = self[thisType]
-        # create an array of Object type
-        self[thisType] = numpy.array(dat.data, dtype='O')
-        # masked vals should be "--", others keep data
-        # we have to repeat forcing to 'O' or text gets truncated to 4chars
-        self[thisType] = numpy.where(dat.mask, '--', dat).astype('O')
+        buff = self._getBuffer(thisType)
+        # create an array of Object type in a single pass over the buffer:
+        # masked vals should be "--", others keep data (assigning into the
+        # object array avoids the text being truncated to 4 chars)
+        newBuff = numpy.empty(buff.shape, 'O')
+        newBuff.fill('--')
+        mask = numpy.ma.getmaskarray(buff)
+        newBuff[~mask] = buff.data[~mask]
+        self._buffers[thisType] = newBuff
+        used = tuple(slice(0, n) for n in self[thisType].shape)
+        self[thisType] = newBuff[used]
         self.isNumeric[thisType] = False
 
 
+def _isNumericScalar(value):
+    """True if `value` can be stored in a numeric (masked float) array
+    """
+    if isinstance(value, (bool, numpy.bool_)):
+        return False  # keep True/False rather than 1.0/0.0
+    return isinstance(value, (int, long, float, numpy.integer, numpy.floating))
+
+
 class FitFunction(object):
     """Deprecated: - use the specific functions; FitWeibull, FitLogistic...
     """
@@ -4557,8 +5159,10 @@ class _baseFunctionFit(object):
         #    (self.xx,self.yy,self.sems),disp=self.display)
         global _chance
         _chance = self.expectedMin
+        # curve_fit needs one sigma per point (not a scalar)
+        sigma = self.sems * numpy.ones(self.xx.shape)
         self.params, self.covar = optimize.curve_fit(
-            self._eval, self.xx, self.yy, p0=self.guess, sigma=self.sems)
+            self._eval, self.xx, self.yy, p0=self.guess, sigma=sigma)
         self.ssq = self._getErr(self.params, self.xx, self.yy, 1.0)
         self.chi = self._getErr(self.params, self.xx, self.yy, self.sems)
         self.rms = self.ssq / len(self.xx)
@@ -4592,6 +5196,88 @@ class _baseFunctionFit(object):
         xx = self._inverse(yy, *params)
         return xx
 
+    def bootstrapCI(self, n=1000, ci=95, rng=None, nProcesses=1,
+                    chunkSize=1000):
+        """Confidence intervals for the fitted parameters, by refitting the
+        function to `n` bootstrapped resamples of the (xx, yy, sems) points.
+
+        :Parameters:
+
+            n : number of resamples
+
+            ci : width of the confidence interval in percent
+
+            rng : None (use numpy.random), an integer seed or a
+                numpy RandomState/Generator
+
+            nProcesses : number of processes to fit resamples in parallel.
+                None uses one per CPU, 1 (default) fits in this process
+
+            chunkSize : number of resamples drawn (and sent to the
+                processes) at once, to bound memory use
+
+        :Returns:
+
+            an array of shape (2, nParams) with the lower and upper bounds
+            of each parameter. The fitted parameters of every resample are
+            also stored (as an n x nParams array) in `self.paramsBoot`
+            (rows are NaN where the fit failed)
+        """
+        nPoints = len(self.xx)
+        sems = self.sems * numpy.ones(self.xx.shape)
+        pool = None
+        if nProcesses != 1:
+            pool = multiprocessing.Pool(nProcesses)
+        paramsBoot = []
+        try:
+            for indices in _bootstrapIndices(nPoints, n, rng, chunkSize):
+                jobs = [(self.__class__, self.xx[ii], self.yy[ii], sems[ii],
+                         self.params, self.expectedMin) for ii in indices]
+                if pool is None:
+                    paramsBoot.extend(map(_fitResample, jobs))
+                else:
+                    paramsBoot.extend(pool.map(_fitResample, jobs))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        # leave the module-level chance value as it was for this fit
+        global _chance
+        _chance = self.expectedMin
+        self.paramsBoot = numpy.array(paramsBoot, float)
+        alpha = (100 - ci) / 2.0
+        return numpy.array([_nanPercentile(self.paramsBoot, alpha),
+                            _nanPercentile(self.paramsBoot, 100 - alpha)])
+
+
+def _fitResample(args):
+    """Fit one bootstrapped resample (module-level so that it can be
+    pickled for a multiprocessing.Pool). Returns NaNs if the fit fails
+    """
+    fitClass, xx, yy, sems, guess, expectedMin = args
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            fit = fitClass(xx, yy, sems=sems, guess=guess,
+                           expectedMin=expectedMin)
+        except Exception:
+            return [numpy.nan] * len(guess)
+    return list(fit.params)
+
+
+def _nanPercentile(arr, q):
+    """Percentile of each column ignoring NaNs (nanpercentile is not in
+    older numpy versions)
+    """
+    out = []
+    for col in numpy.asarray(arr).T:
+        col = col[~numpy.isnan(col)]
+        if len(col):
+            out.append(numpy.percentile(col, q))
+        else:
+            out.append(numpy.nan)
+    return numpy.array(out)
+
 
 class FitWeibull(_baseFunctionFit):
     """Fit a Weibull function (either 2AFC or YN)
@@ -4743,10 +5429,12 @@ class FitCumNormal(_baseFunctionFit):
 ######################### End psychopy.data classes #########################
 
 
-def bootStraps(dat, n=1):
+def bootStraps(dat, n=1, rng=None, chunkSize=1000):
     """Create a list of n bootstrapped resamples of the data
 
-    SLOW IMPLEMENTATION (Python for-loop)
+    All the resamples are drawn with a single random index array and one
+    gather (in chunks of `chunkSize` resamples to bound the memory used
+    by the indices).
 
     Usage:
         ``out = bootStraps(dat, n=1)``
@@ -4757,6 +5445,11 @@ def bootStraps(dat, n=1):
             column is a different trial)
         n
             number of bootstrapped resamples to create
+        rng
+            None (use numpy.random), an integer seed or a numpy
+            RandomState/Generator
+        chunkSize
+            number of resamples drawn at once
 
         out
             - dim[0]=conditions
@@ -4769,18 +5462,43 @@ def bootStraps(dat, n=1):
         # adds a dimension (arraynow has shape (1,Ntrials))
         dat = numpy.array([dat])
 
-    nTrials = dat.shape[1]
+    nStims, nTrials = dat.shape[:2]
     # initialise a matrix to store output
     resamples = numpy.zeros(dat.shape + (n,), dat.dtype)
-    rand = numpy.random.rand
-    for stimulusN in range(dat.shape[0]):
-        thisStim = dat[stimulusN, :]  # fetch data for this stimulus
-        for sampleN in range(n):
-            indices = numpy.floor(nTrials * rand(nTrials)).astype('i')
-            resamples[stimulusN, :, sampleN] = numpy.take(thisStim, indices)
+    stimN = numpy.arange(nStims)[:, None, None]
+    sampleN = 0
+    for indices in _bootstrapIndices(nTrials, n, rng, chunkSize,
+                                     nSets=nStims):
+        # indices has shape (nStims, thisChunk, nTrials)
+        thisChunk = indices.shape[1]
+        gathered = dat[stimN, indices]
+        resamples[:, :, sampleN:sampleN + thisChunk] = \
+            gathered.transpose(0, 2, 1)
+        sampleN += thisChunk
     return resamples
 
 
+def _bootstrapIndices(nTrials, n, rng=None, chunkSize=1000, nSets=None):
+    """Yield random resampling indices (with replacement) for `n`
+    resamples of `nTrials` values, `chunkSize` resamples at a time.
+
+    Each chunk has shape (thisChunk, nTrials), or (nSets, thisChunk,
+    nTrials) if nSets is given.
+    """
+    if rng is None:
+        rng = numpy.random
+    elif isinstance(rng, (int, long)):
+        rng = numpy.random.RandomState(rng)
+    # numpy Generators have integers(), RandomState has randint()
+    randint = getattr(rng, 'integers', None) or rng.randint
+    chunkSize = max(1, int(chunkSize))
+    for start in range(0, n, chunkSize):
+        shape = (min(chunkSize, n - start), nTrials)
+        if nSets is not None:
+            shape = (nSets,) + shape
+        yield randint(0, nTrials, size=shape)
+
+
 def functionFromStaircase(intensities, responses, bins=10):
     """Create a psychometric function by binning data from a staircase
     procedure. Although the default is 10 bins Jon now always uses 'unique'
@@ -4823,34 +5541,31 @@ def functionFromStaircase(intensities, responses, bins=10):
         intensities = numpy.array(intensities)
         responses = numpy.array(responses)
 
-    # sort the responses
-    sort_ii = numpy.argsort(intensities)
-    sortedInten = numpy.take(intensities, sort_ii)
-    sortedResp = numpy.take(responses, sort_ii)
-
-    binnedResp = []
-    binnedInten = []
-    nPoints = []
     if bins == 'unique':
         intensities = numpy.round(intensities, decimals=8)
-        uniqueIntens = numpy.unique(intensities)
-        for thisInten in uniqueIntens:
-            theseResps = responses[intensities == thisInten]
-            binnedInten.append(thisInten)
-            binnedResp.append(numpy.mean(theseResps))
-            nPoints.append(len(theseResps))
+        binnedInten, binN = numpy.unique(intensities, return_inverse=True)
+        nPoints = numpy.bincount(binN)
+        binnedResp = numpy.bincount(binN, weights=responses) / nPoints
     else:
+        # sort the responses
+        sort_ii = numpy.argsort(intensities)
+        sortedInten = numpy.take(intensities, sort_ii)
+        sortedResp = numpy.take(responses, sort_ii)
+        # bin edges and per-bin sums from cumulative sums
         pointsPerBin = len(intensities) / float(bins)
-        for binN in range(bins):
-            start = int(round(binN * pointsPerBin))
-            stop = int(round((binN + 1) * pointsPerBin))
-            thisResp = sortedResp[start:stop]
-            thisInten = sortedInten[start:stop]
-            binnedResp.append(numpy.mean(thisResp))
-            binnedInten.append(numpy.mean(thisInten))
-            nPoints.append(len(thisInten))
-
-    return binnedInten, binnedResp, nPoints
+        edges = numpy.round(numpy.arange(bins + 1) * pointsPerBin)
+        edges = edges.astype(int)
+        nPoints = numpy.diff(edges)
+        cumInten = numpy.cumsum(sortedInten, dtype=float)
+        cumInten = numpy.concatenate([[0], cumInten])
+        cumResp = numpy.cumsum(sortedResp, dtype=float)
+        cumResp = numpy.concatenate([[0], cumResp])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            # empty bins give NaN, as the mean of an empty array would
+            binnedInten = numpy.diff(cumInten[edges]) / nPoints
+            binnedResp = numpy.diff(cumResp[edges]) / nPoints
+
+    return list(binnedInten), list(binnedResp), list(nPoints)
 
 
 def getDateStr(format="%Y_%b_%d_%H%M"):
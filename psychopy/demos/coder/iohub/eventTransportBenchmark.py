@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+"""
+Compares the two ways ioHubConnection.getEvents() can get events from the
+ioHub Process running on the same computer:
+
+    * 'udp': a GET_EVENTS request / reply over UDP (the default)
+    * 'shm': reading the shared memory event ring
+      (launchHubServer(shared_memory_events=True))
+
+For each transport it reports:
+
+    * latency: the duration of getEvents() calls when no events are waiting
+      and when a batch of events is waiting.
+    * throughput: how many events per second can be retrieved when the ioHub
+      is generating events as fast as it can (message events are sent in
+      bursts and read back with getEvents()).
+
+No PsychoPy Window is created for this demo; results are printed to stdout.
+Run with a transport name as the argument to test only that transport.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import subprocess
+
+import numpy
+
+from psychopy.iohub import launchHubServer, Computer
+
+getTime = Computer.getTime
+
+
+def percentiles(durations):
+    d = numpy.array(durations) * 1000.0
+    return 'median %.3f ms, 95%% %.3f ms, max %.3f ms' % (
+        numpy.median(d), numpy.percentile(d, 95), d.max())
+
+
+def benchmark(transport, n_calls=2000, batch_size=200, n_batches=50):
+    io = launchHubServer(shared_memory_events=(transport == 'shm'))
+    try:
+        io.clearEvents('all')
+
+        # getEvents() with nothing waiting
+        empty = []
+        for i in range(n_calls):
+            t0 = getTime()
+            io.getEvents()
+            empty.append(getTime() - t0)
+
+        # getEvents() with a batch of events waiting, and throughput
+        full = []
+        n_events = 0
+        for b in range(n_batches):
+            for m in range(batch_size):
+                io.sendMessageEvent('msg %d' % m, category='benchmark')
+            time.sleep(0.02)  # let the ioHub process the messages
+            t0 = getTime()
+            events = io.getEvents(as_type='list')
+            full.append(getTime() - t0)
+            n_events += len(events)
+        read_time = sum(full)
+
+        print('%s transport:' % transport)
+        print('  getEvents(), no events:     ', percentiles(empty))
+        print('  getEvents(), %4d events:   ' % batch_size, percentiles(full))
+        print('  events read: %d, %.0f events/s of getEvents() time'
+              % (n_events, n_events / read_time))
+    finally:
+        io.quit()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1])
+    else:
+        # each transport gets a fresh ioHub Process (and python process)
+        for transport in ('udp', 'shm'):
+            subprocess.call([sys.executable, __file__, transport])
@@ -0,0 +1,125 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+"""
+Measures the EventPublisher -> RemoteEventSubscriber event pipeline between
+two ioHub Processes running on the same computer.
+
+The 'publisher' ioHub Process runs an EventPublisher device publishing
+MessageEvents, which this script creates in bursts with sendMessageEvent().
+A second python process starts the 'subscriber' ioHub Process, which runs a
+RemoteEventSubscriber device subscribed to the publisher's MessageEvents,
+and reports:
+
+    * throughput: events per second received by the subscriber ioHub.
+    * latency: the time from the sendMessageEvent() call creating an event
+      to the event being received by the subscriber ioHub
+      (event.logged_time - event.time, both in the subscriber's time base).
+
+Each EventPublisher batch_size and payload_format setting is tested with
+new ioHub Processes. No PsychoPy Window is created for this demo; results
+are printed to stdout.
+
+** IMPORTANT: The Python packages 'pyzmq' and 'msgpack' must be available in
+    your python environment to run this demo.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import subprocess
+
+import numpy
+
+from psychopy.iohub import launchHubServer, Computer
+
+getTime = Computer.getTime
+
+PUBLISHER_UDP_PORT = 9034
+SUBSCRIBER_UDP_PORT = 9035
+PUBLISHING_PROTOCAL = 'tcp://127.0.0.1:5555'
+
+SETTINGS = [(1, 'msgpack'), (16, 'msgpack'), (64, 'msgpack'), (16, 'numpy'), (64, 'numpy')]
+
+
+def percentiles(durations):
+    d = numpy.array(durations) * 1000.0
+    return 'median %.3f ms, 95%% %.3f ms, max %.3f ms' % (
+        numpy.median(d), numpy.percentile(d, 95), d.max())
+
+
+def publisher(batch_size, payload_format, n_events=20000, burst_size=100):
+    io = launchHubServer(udp_port=PUBLISHER_UDP_PORT, **{
+        'network.EventPublisher': dict(name='evt_pub', device_number=1,
+                                       monitor_event_types=['MessageEvent'],
+                                       publishing_protocal=PUBLISHING_PROTOCAL,
+                                       batch_size=batch_size,
+                                       payload_format=payload_format)})
+    try:
+        sub = subprocess.Popen([sys.executable, __file__, 'subscriber', str(n_events)],
+                               stdout=subprocess.PIPE)
+        # wait until the subscriber ioHub is running and connected
+        sub.stdout.readline()
+        time.sleep(1.0)
+
+        t0 = getTime()
+        for i in range(n_events):
+            io.sendMessageEvent('benchmark %d' % i, category='benchmark')
+            if i % burst_size == burst_size - 1:
+                time.sleep(0.002)
+        send_time = getTime() - t0
+
+        results = sub.communicate()[0]
+        print('batch_size %d, payload_format %s:' % (batch_size, payload_format))
+        print('  events sent: %d, %.0f events/s' % (n_events, n_events / send_time))
+        print(results)
+    finally:
+        io.quit()
+
+
+def subscriber(n_events, timeout=5.0):
+    io = launchHubServer(udp_port=SUBSCRIBER_UDP_PORT, **{
+        'network.RemoteEventSubscriber': dict(name='evt_sub',
+                                              subscription_protocal=PUBLISHING_PROTOCAL,
+                                              monitor_event_types=['MessageEvent'],
+                                              event_buffer_length=2048,
+                                              remote_iohub_address=['127.0.0.1',
+                                                                    PUBLISHER_UDP_PORT])})
+    try:
+        evt_sub = io.devices.evt_sub
+        print('ready')
+        sys.stdout.flush()
+
+        latencies = []
+        received = []
+        last_event_time = getTime()
+        while len(latencies) < n_events and getTime() - last_event_time < timeout:
+            events = evt_sub.getEvents()
+            for e in events:
+                latencies.append(e.logged_time - e.time)
+                received.append(e.logged_time)
+            if events:
+                last_event_time = getTime()
+            time.sleep(0.002)
+
+        if len(received) > 1:
+            print('  events received: %d, %.0f events/s'
+                  % (len(received), (len(received) - 1) / (received[-1] - received[0])))
+            print('  latency:', percentiles(latencies))
+        else:
+            print('  events received: %d' % len(received))
+    finally:
+        io.quit()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'subscriber':
+        subscriber(int(sys.argv[2]))
+    elif len(sys.argv) > 2:
+        publisher(int(sys.argv[1]), sys.argv[2])
+    else:
+        # each setting gets fresh ioHub Processes (and python processes)
+        for batch_size, payload_format in SETTINGS:
+            subprocess.call([sys.executable, __file__, str(batch_size), payload_format])
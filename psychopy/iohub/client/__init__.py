@@ -15,8 +15,10 @@ import os,sys
 import time
 import subprocess
 from collections import deque
+from operator import itemgetter
 import json
 import signal
+import select
 from weakref import proxy
 
 import psychopy.logging as psycho_logging
@@ -29,6 +31,8 @@ from .. import print2err,printExceptionDetailsToStdErr,ioHubError
 from ..devices import Computer, DeviceEvent, import_device
 from ..devices.experiment import MessageEvent, LogEvent
 from ..constants import DeviceConstants, EventConstants
+from ..eventarrays import eventsToArrays, unpackEventArrays, mergeEventArrays
+from ..rpctickets import RPCTicketTable
 from .. import _DATA_STORE_AVAILABLE
 
 currentSec= Computer.currentSec
@@ -56,6 +60,19 @@ class DeviceRPC(object):
 
     def __call__(self, *args,**kwargs):
         r = self.sendToHub(('EXP_DEVICE','DEV_RPC',self.device_class,self.method_name,args,kwargs))
+        return self._processReply(r,kwargs)
+
+    def callAsync(self, *args,**kwargs):
+        """
+        Call the device method without waiting for the ioHub Process to
+        reply. Returns an RPCTicket right away; ticket.result() returns what
+        calling the method normally would have.
+        """
+        hub=self.sendToHub.__self__
+        return hub._sendToHubServerAsync(('EXP_DEVICE','DEV_RPC',self.device_class,self.method_name,args,kwargs),
+                                         convert=lambda r: self._processReply(r,kwargs))
+
+    def _processReply(self,r,kwargs):
         r=r[1:]
         if len(r)==1:
             r=r[0]
@@ -251,6 +268,12 @@ class ioHubConnection(object):
         # udp port setup
         self.udp_client = None
 
+        # shared memory event ring (see 'shared_memory_events' config)
+        self._event_ring = None
+
+        # requests sent with _sendToHubServerAsync() awaiting a reply
+        self._rpc_tickets = None
+
         # the dynamically generated object that contains an attribute for
         # each device registed for monitoring with the ioHub server so
         # that devices can be accessed experiment process side by device name.
@@ -344,6 +367,7 @@ class ioHubConnection(object):
 		* 'astuple': Each event is converted to a namedtuple object. Event attributes are accessed using natural naming style (dot name style), or by the index of the event attribute for the event type. The namedtuple class definition is created once for each Event type at the start of the experiment, so memory overhead is almost the same as the event value list, and conversion from the event list to the namedtuple is very fast. This is the default, and normally most useful, event representation type.
 		* 'dict': Each event converted to a dict object, keys equaling the event attribute names, values being, well the attribute values for the event.
 		* 'object': Each event is converted into an instance of the ioHub DeviceEvent subclass based on the event's type. This conversion process can take a bit of time if the number of events returned is large, and currently there is no real benefit converting events into DeviceEvent Class instances vs. the default namedtuple object type. Therefore this option should be used rarely.
+		* 'numpy': Events are returned as a dict of {event_type_id: numpy structured array}, with one array per type of event returned. Each array uses the NUMPY_DTYPE of the event type, so an attribute of all the events of one type can be accessed as a column, e.g. events[EventConstants.MOUSE_MOVE]['x_position']. Events are ordered by time within each array. No object is created per event (the ioHub Process sends the arrays as binary data), so this is the most efficient way to retrieve high rate sample streams.
 
         Args:
             device_label (str): Indicates what device to retrieve events for. If None ( the default ) returns device events from all devices.
@@ -353,15 +377,15 @@ class ioHubConnection(object):
         Returns:
             tuple: A tuple of event objects, where the event object type is defined by the 'as_type' parameter.
         """
+        if as_type == 'numpy':
+            return self._getEventArrays(device_label)
 
         r=None
         if device_label is None:
-            events = self._sendToHubServer(('GET_EVENTS',))[1]
-            if events is None:
-                r=self.allEvents
-            else:
+            events = self._getHubEvents()
+            if events:
                 self.allEvents.extend(events)
-                r=self.allEvents
+            r=self.allEvents
             self.allEvents=[]
         else:
             r=self.deviceByLabel[device_label].getEvents()
@@ -409,16 +433,16 @@ class ioHubConnection(object):
         """
         if device_label is None:
             self.allEvents=[]
-            self._sendToHubServer(('RPC','clearEventBuffer',[False,]))
+            self._clearHubEvents(False)
         elif device_label.lower() == 'all':
             self.allEvents=[]
-            self._sendToHubServer(('RPC','clearEventBuffer',[True,]))
+            self._clearHubEvents(True)
         else:
             d=self.deviceByLabel.get(device_label,None)
             if d:
                 d.clearEvents()
 
-    def sendMessageEvent(self,text,category='',offset=0.0,sec_time=None):
+    def sendMessageEvent(self,text,category='',offset=0.0,sec_time=None,wait=True):
         """
         Create and send an Experiment MessageEvent to the ioHub Server Process
         for storage with the rest of the event data being recorded in the ioDataStore.
@@ -436,12 +460,33 @@ class ioHubConnection(object):
 
             sec_time (float): The time stamp to use for the message in sec.msec format. If not provided, or None, then the MessageEvent is time stamped when this method is called using the global timer.
 
+            wait (bool): If True (the default), wait until the ioHub Process has received the message. If False, return right away (so the call does not delay the experiment, e.g. within a frame loop); the message is still time stamped when this method is called.
+
         Returns:
-            bool: True
+            bool: True, or if wait is False an RPCTicket for the request.
         """
-        self._sendToHubServer(('EXP_DEVICE','EVENT_TX',[MessageEvent._createAsList(text,category=category,msg_offset=offset,sec_time=sec_time),]))
+        request=('EXP_DEVICE','EVENT_TX',[MessageEvent._createAsList(text,category=category,msg_offset=offset,sec_time=sec_time),])
+        if not wait:
+            return self._sendToHubServerAsync(request)
+        self._sendToHubServer(request)
         return True
 
+    def waitForTickets(self,timeout=None):
+        """
+        Wait until every request sent without waiting for its reply (for
+        example with sendMessageEvent(wait=False) or a device method's
+        callAsync()) has been replied to, or until timeout sec.msec.
+
+        Args:
+            timeout (float): Maximum time to wait, or None to wait until done.
+
+        Returns:
+            bool: True if no requests are still waiting for a reply.
+        """
+        if self._rpc_tickets is None:
+            return True
+        return self._rpc_tickets.wait(timeout=timeout)
+
     def getHubServerConfig(self):
         """
         Returns a dict containing the ioHub Server configuration that is being
@@ -815,6 +860,66 @@ class ioHubConnection(object):
         print "flushIODataStoreFile: ",r[2]
         return r[2]
 
+    def getDataStoreStats(self):
+        """
+        Get the statistics of the ioDataStore background writer, which
+        writes events to the hdf5 file in batches.
+
+        Args:
+            None
+
+        Returns:
+            dict: queue_length and max_queue_length_seen (events waiting to be written), rows_written, batches_written, write_time_mean and write_time_max (sec.msec taken by each set of writes), latency_mean and latency_max (sec.msec from an event being received to it being written), blocked_puts and blocked_time (times, and total sec.msec, that the ioHub event loop had to wait because the queue was full), dropped_rows and write_errors. None if the ioDataStore is not enabled or events are not written in the background.
+        """
+        return self._sendToHubServer(('RPC','getDataStoreStats'))[2]
+
+    def getDroppedEventCounts(self):
+        """
+        Get the number of events of each type that were removed from the
+        ioHub Process's global event buffer without being read by getEvents(),
+        because the buffer already held global_event_buffer events.
+
+        Args:
+            None
+
+        Returns:
+            dict: event type id : dropped event count.
+        """
+        return self._sendToHubServer(('RPC','getDroppedEventCounts'))[2]
+
+    def getDroppedRingEventCount(self):
+        """
+        Get the number of events the ioHub Process could not put in the
+        shared memory event ring (see the 'shared_memory_events' config
+        setting) and then dropped from its global event buffer, because both
+        were full. These events are also counted by getDroppedEventCounts();
+        any are a gap in the events returned by getEvents(), since the older
+        events in the ring are still returned.
+
+        Args:
+            None
+
+        Returns:
+            int: dropped event count, or None if the ring is not in use.
+        """
+        if self._event_ring:
+            return self._event_ring.dropped
+        return None
+
+    def getDeviceTelemetry(self, device_name=None, reset=False):
+        """
+        Get the latency and throughput telemetry the ioHub Process records
+        for each device (see the 'device_telemetry' config setting).
+
+        Args:
+            device_name (str): The name of the device to get the telemetry of. None (the default) returns the telemetry of every device.
+            reset (bool): If True, restart the telemetry after it is read.
+
+        Returns:
+            dict: For each device name (or for device_name only), a dict with polls, events, filtered_events, unknown_delays (events with a delay < 0), max_native_backlog (most native events waiting to be processed), duration (sec.msec the telemetry has run), events_per_sec, and for each of poll_time, event_delay, dispatch_time and filter_time a dict with the count, mean, min, max and p50, p90, p99 and p99.9 percentiles (sec.msec).
+        """
+        return self._sendToHubServer(('RPC','getDeviceTelemetry',(device_name,reset)))[2]
+
     def shutdown(self):
         """
         Tells the ioHub Process to close all ioHub Devices, the ioDataStore,
@@ -873,6 +978,17 @@ class ioHubConnection(object):
         if ioHubConfig:
             updateDict(ioHubConfig,hub_defaults_config)
 
+        # create the shared memory event ring, if enabled; the server is
+        # told where it is through the config, so the config must be
+        # passed on as a temp file even if it was loaded from a file.
+        ring_path=None
+        shm_config=ioHubConfig.get('shared_memory_events',{})
+        if shm_config.get('enable',False):
+            from psychopy.iohub.eventring import createRingFile
+            ring_path=createRingFile(shm_config.get('ring_size',4*1024*1024))
+            shm_config['path']=ring_path
+            ioHubConfigAbsPath=None
+
         if ioHubConfig and ioHubConfigAbsPath is None:
                 if isinstance(ioHubConfig.get('monitor_devices'),dict):
                     #short hand device spec is being used. Convert dict of
@@ -892,6 +1008,8 @@ class ioHubConnection(object):
         from psychopy.iohub.net import UDPClientConnection
 
         self.udp_client=UDPClientConnection(remote_port=ioHubConfig.get('udp_port',9000))
+        self._rpc_tickets=RPCTicketTable(self.udp_client.sendTo,self._receiveFromHubServer,
+                                         self._isErrorReply,Computer.getTime)
 
         run_script=os.path.join(IO_HUB_DIRECTORY,'launchHubProcess.py')
         subprocessArgList=[sys.executable,
@@ -971,10 +1089,16 @@ class ioHubConnection(object):
             except Exception as e:
                 raise e
             finally:
+                if ring_path:
+                    os.remove(ring_path)
                 return "ioHub startup timed out. iohub Server startup Failed. "+stdout_read_data
 
         #print '* IOHUB SERVER ONLINE *'
         ioHubConnection.ACTIVE_CONNECTION=proxy(self)
+
+        if ring_path:
+            from psychopy.iohub.eventring import SharedEventRing
+            self._event_ring=SharedEventRing(ring_path)
         # save ioHub ProcessID to file so next time it is started,
         # it can be checked and killed if necessary
 
@@ -1124,28 +1248,73 @@ class ioHubConnection(object):
             printExceptionDetailsToStdErr()
         return None
 
+    def _getHubEvents(self):
+        """
+        Get the events from the ioHub Global Event Buffer: read from the
+        shared memory ring when it is in use (no request is sent to the
+        ioHub Process unless events had to be held back because the ring
+        was full); otherwise requested over UDP.
+        """
+        ring=self._event_ring
+        if ring is None:
+            return self._sendToHubServer(('GET_EVENTS',))[1]
+        events=ring.read()
+        # the ioHub sorts GET_EVENTS replies by time, so do the same here
+        events.sort(key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
+        if ring.pending:
+            # events that did not fit in the ring are newer than those in it
+            held_events=self._sendToHubServer(('GET_EVENTS',))[1]
+            if held_events:
+                events.extend(held_events)
+        return events
+
+    def _getEventArrays(self,device_label=None):
+        """
+        getEvents(as_type='numpy'): returns a dict of {event_type_id:
+        numpy structured array}. Over UDP the ioHub Process sends the
+        arrays as binary data; events read from the shared memory event
+        ring, or from a device, are grouped into arrays here.
+        """
+        if device_label is not None:
+            events=self.deviceByLabel[device_label].getEvents()
+            return eventsToArrays(events or [],EventConstants.getClass)
+
+        held_events=self.allEvents
+        self.allEvents=[]
+        arrays={}
+        if held_events:
+            arrays=eventsToArrays(held_events,EventConstants.getClass)
+        if self._event_ring is None:
+            packed=self._sendToHubServer(('GET_EVENT_ARRAYS',))[1]
+            if packed:
+                arrays=mergeEventArrays(arrays,unpackEventArrays(packed,EventConstants.getClass))
+        else:
+            events=self._getHubEvents()
+            if events:
+                arrays=mergeEventArrays(arrays,eventsToArrays(events,EventConstants.getClass))
+        return arrays
+
+    def _clearHubEvents(self,clear_device_level_buffers):
+        """
+        Clear the ioHub Global Event Buffer and, when it is in use, the
+        events in the shared memory ring written before the buffer was
+        cleared (events written to the ring while the request is handled
+        are cleared too, later ones are kept).
+        """
+        ring_position=self._sendToHubServer(('RPC','clearEventBuffer',[clear_device_level_buffers,]))[2]
+        if self._event_ring and ring_position is not None:
+            self._event_ring.discard(ring_position)
+
     def _sendToHubServer(self,ioHubMessage):
         """
         General purpose message sending routine, used to send a message from
         the PsychoPy Process to the ioHub Process, and then wait for the reply
         from the ioHub Process before returning.
 
-        The ioHubConnection currently blocks until the request is fulfilled and
-        and a response is received from the ioHub server.
-
-        TODO: An aysnc. version could be added if desired.
-
-        Instead of using callbacks, I prefer the idea of the client sending a
-        request and getting a request ticket # back from the ioHub server
-        right away, indicating that the job has been submitted for processing.
-        The ioHubConnection can then ask the ioHub Server for the status of the
-        job ticket based on ticket number.
-
-        When the ticket number result is ready, it is sent back as the reply to
-        the status request. This **aysnc. mode will be necessary** when the
-        worker process is added to the ioHub framework to handle long running
-        job requests from the PsychoPy process; for example to load an image
-        into a shared memory space, perform long running computations, etc.
+        This method blocks until the request is fulfilled and a response is
+        received from the ioHub server; see _sendToHubServerAsync() for the
+        non blocking version. Replies to async. requests that arrive while
+        waiting are passed on to their tickets.
 
         Args:
             messageList (tuple): ioHub Server Message to send.
@@ -1163,9 +1332,12 @@ class ioHubConnection(object):
 
         try:
             # wait for response from ioHub server, return is result ( decoded already ), and Hub address (ip4,port).
-            result = self.udp_client.receive()
-            if result:
-                result, address = result
+            while True:
+                result = self.udp_client.receive()
+                if result:
+                    result, address = result
+                if self._rpc_tickets is None or not self._rpc_tickets.handleReply(result):
+                    break
         except Exception, e:
             import traceback
             traceback.print_exc()
@@ -1183,6 +1355,42 @@ class ioHubConnection(object):
         #Otherwise return the result
         return result
 
+    def _sendToHubServerAsync(self,ioHubMessage,timeout=None,retries=None,convert=None):
+        """
+        Send a message to the ioHub Process without waiting for the reply.
+        Returns an RPCTicket right away, so several requests can be in flight
+        at once; the reply is matched to the ticket by its ticket id. If no
+        reply arrives within timeout sec.msec the request is sent again, up to
+        retries times (the ioHub Process only runs it once).
+
+        Args:
+            ioHubMessage (tuple): ioHub Server Message to send.
+            timeout (float): sec.msec to wait for each reply. Default: 0.5.
+            retries (int): times to resend a request. Default: 3.
+            convert (callable): applied to the reply to give the ticket result.
+
+        Return (RPCTicket): the ticket for the request.
+        """
+        try:
+            return self._rpc_tickets.submit(ioHubMessage,timeout,retries,convert)
+        except Exception, e:
+            import traceback
+            traceback.print_exc()
+            self.shutdown()
+            raise e
+
+    def _receiveFromHubServer(self,wait):
+        """
+        Returns the next message from the ioHub Process, if one arrives
+        within wait sec.msec; otherwise None.
+        """
+        if not select.select([self.udp_client.sock],[],[],wait)[0]:
+            return None
+        result=self.udp_client.receive()
+        if result:
+            return result[0]
+        return None
+
 #    @classmethod
 #    def _addResponseToHistory(cls,result,bytes_sent,address):
 #        """
@@ -1323,8 +1531,19 @@ class ioHubConnection(object):
                 self._server_process=None
                 Computer.iohub_process_id=None
                 Computer.iohub_process=None
+                self._closeEventRing()
             return True
 
+    def _closeEventRing(self):
+        if self._event_ring:
+            ring_path=self._event_ring.path
+            self._event_ring.close()
+            self._event_ring=None
+            try:
+                os.remove(ring_path)
+            except Exception:
+                pass
+
     def _isErrorReply(self,data):
         """
 
@@ -1409,6 +1628,15 @@ def launchHubServer(**kwargs):
     if psychopy_monitor_name:
         del kwargs['psychopy_monitor_name']
 
+    # True, or a dict of 'shared_memory_events' settings (see default_config.yaml)
+    shared_memory_events=kwargs.pop('shared_memory_events',None)
+    if shared_memory_events is True:
+        shared_memory_events=dict(enable=True)
+
+    # the ioHub Server UDP port; use a different port for each ioHub
+    # Server running on the same computer.
+    udp_port=kwargs.pop('udp_port',None)
+
     datastore_name=None
     if _DATA_STORE_AVAILABLE is True:
         datastore_name=kwargs.get('datastore_name',None)
@@ -1499,6 +1727,12 @@ def launchHubServer(**kwargs):
         ioConfig['data_store']=dict(enable=True,filename=datastore_name,experiment_info=dict(code=experiment_code),
                                             session_info=dict(code=session_code))
 
+    if shared_memory_events:
+        ioConfig['shared_memory_events']=shared_memory_events
+
+    if udp_port:
+        ioConfig['udp_port']=udp_port
+
     #print "IOHUB CONFIG: ",ioConfig
     # Start the ioHub Server
     return ioHubConnection(ioConfig)
@@ -6,6 +6,21 @@ Created on Thu Nov 08 15:13:55 2012
 
 """
 
+# Indices of the attributes that all event types start with in the list form
+# of an ioHub event. DeviceEvent has these as class attributes; they are
+# defined here so that modules DeviceEvent depends on can use them too.
+EVENT_EXPERIMENT_ID_INDEX=0
+EVENT_SESSION_ID_INDEX=1
+DEVICE_ID_INDEX=2
+EVENT_ID_INDEX=3
+EVENT_TYPE_ID_INDEX=4
+EVENT_DEVICE_TIME_INDEX=5
+EVENT_LOGGED_TIME_INDEX=6
+EVENT_HUB_TIME_INDEX=7
+EVENT_CONFIDENCE_INTERVAL_INDEX=8
+EVENT_DELAY_INDEX=9
+EVENT_FILTER_ID_INDEX=10
+
 try:
     
     class Constants(object):
@@ -12,6 +12,8 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 
 """
 import os, atexit
+import threading
+from functools import wraps
 
 import tables
 from tables import *
@@ -19,7 +21,8 @@ from tables import parameters
 
 import numpy as N
 
-from psychopy.iohub import printExceptionDetailsToStdErr, print2err, ioHubError, DeviceEvent, EventConstants
+from psychopy.iohub import printExceptionDetailsToStdErr, print2err, ioHubError, DeviceEvent, EventConstants, Computer
+from psychopy.iohub.datastore.writer import BatchWriter
 
 
 parameters.MAX_NUMEXPR_THREADS=None
@@ -43,6 +46,52 @@ FILE_VERSION = '0.8.1.1'
 SCHEMA_AUTHORS = 'Sol Simpson'
 SCHEMA_MODIFIED_DATE = 'Dec 19th, 2014'
 
+
+def _tablesFunction(obj,name,name_2x):
+    # PyTables 3.x renamed the camelCase functions and methods of 2.x
+    function=getattr(obj,name,None)
+    if function is None:
+        function=getattr(obj,name_2x)
+    return function
+
+def _tableFilters(layout_settings):
+    # blosc is not available in all pytables builds; fall back to zlib
+    complib=layout_settings.get('complib','blosc')
+    which_lib_version=_tablesFunction(tables,'which_lib_version','whichLibVersion')
+    if complib.startswith('blosc') and which_lib_version('blosc') is None:
+        complib='zlib'
+    return Filters(complevel=layout_settings.get('complevel',5), complib=complib,
+                   shuffle=layout_settings.get('shuffle',True), fletcher32=False)
+
+def _tableChunkshape(layout_settings,table_label,np_dtype):
+    # chunks of about chunk_bytes bytes, which can be set per table label
+    chunk_bytes=layout_settings.get('table_chunk_bytes',{}).get(table_label,
+                            layout_settings.get('chunk_bytes',65536))
+    if not chunk_bytes:
+        return None
+    return (max(int(chunk_bytes//N.dtype(np_dtype).itemsize),1),)
+
+def _indexTableColumns(table,column_names):
+    # completely sorted indexes are created once, when the file is closed;
+    # tables that are already indexed are re-indexed if rows were added.
+    for cname in column_names:
+        if cname not in table.colnames:
+            continue
+        column=table.cols._f_col(cname)
+        if column.is_indexed:
+            _tablesFunction(column,'reindex_dirty','reIndexDirty')()
+        else:
+            _tablesFunction(column,'create_csindex','createCSIndex')()
+
+def _withFileLock(method):
+    # the hdf5 file is also written by the background writer thread, so all
+    # other access to it must hold the file lock
+    @wraps(method)
+    def lockedMethod(self,*args,**kwargs):
+        with self._fileLock:
+            return method(self,*args,**kwargs)
+    return lockedMethod
+
         
 class ioHubpyTablesFile():
     
@@ -61,7 +110,10 @@ class ioHubpyTablesFile():
         
         self.TABLES = dict()
         self._eventGroupMappings = dict()
-        self.emrtFile = openFile(self.filePath, mode = fmode)
+        self._tableLayout = self.settings.get('table_layout', {})
+        self._fileLock = threading.RLock()
+        self._writer = None
+        self.emrtFile = _tablesFunction(tables,'open_file','openFile')(self.filePath, mode = fmode)
                
         atexit.register(close_open_data_files, False)
         
@@ -70,9 +122,24 @@ class ioHubpyTablesFile():
             self.flush()
         else:
             self.loadTableMappings()
+
+        writer_settings = self.settings.get('background_writer', {})
+        if writer_settings.get('enable', True):
+            # flush_interval < 0 means only flush when asked to
+            file_flush = None
+            if self.flushCounter >= 0:
+                file_flush = self._flushFile
+            self._writer = BatchWriter(self._appendBatch, file_flush,
+                                       batch_size=writer_settings.get('batch_size', 512),
+                                       max_delay=writer_settings.get('max_delay', 0.1),
+                                       max_queue_length=writer_settings.get('max_queue_length', 100000),
+                                       when_full=writer_settings.get('when_full', 'block'),
+                                       block_timeout=writer_settings.get('block_timeout', None),
+                                       error_handler=self._writerError)
     
+    @_withFileLock    
     def updateDataStoreStructure(self,device_instance,event_class_dict):
-        dfilter = Filters(complevel=0, complib='zlib', shuffle=False, fletcher32=False)
+        dfilter = _tableFilters(self._tableLayout)
         
         def eventTableLabel2ClassName(event_table_label):
             tokens=str(event_table_label[0]+event_table_label[1:].lower()+'Event').split('_') 
@@ -83,8 +150,9 @@ class ioHubpyTablesFile():
                 event_table_label=event_cls.IOHUB_DATA_TABLE
                 if event_table_label not in self.TABLES.keys():
                     try:
-                        self.TABLES[event_table_label]=self.emrtFile.createTable(self._eventGroupMappings[event_table_label],eventTableLabel2ClassName(event_table_label),event_cls.NUMPY_DTYPE, title="%s Data"%(device_instance.__class__.__name__,),filters=dfilter.copy())
-                        self.flush()
+                        self.TABLES[event_table_label]=_tablesFunction(self.emrtFile,'create_table','createTable')(self._eventGroupMappings[event_table_label],eventTableLabel2ClassName(event_table_label),event_cls.NUMPY_DTYPE, title="%s Data"%(device_instance.__class__.__name__,),filters=dfilter.copy(),
+                                                                                 chunkshape=_tableChunkshape(self._tableLayout,event_table_label,event_cls.NUMPY_DTYPE))
+                        self._flushFile()
                         #print2err("----------- CREATED TABLES ENTRY ------------")
                         #print2err("\tevent_cls: {0}".format(event_cls))
                         #print2err("\tevent_cls_name: {0}".format(event_cls_name))
@@ -93,7 +161,7 @@ class ioHubpyTablesFile():
                         #print2err("\t_eventGroupMappings[event_table_label]: {0}".format(self._eventGroupMappings[event_table_label]))
                         #print2err("----------------------------------------------")
                     except NodeError:
-                        self.TABLES[event_table_label]=self._eventGroupMappings[event_table_label]._f_get_child(eventTableLabel2ClassName(event_table_label))# self.emrtFile.createTable(,eventTableLabel2ClassName(event_table_label),event_cls.NUMPY_DTYPE, title="%s Data"%(device_instance.__class__.__name__,),filters=dfilter.copy())
+                        self.TABLES[event_table_label]=_tablesFunction(self._eventGroupMappings[event_table_label],'_f_get_child','_f_getChild')(eventTableLabel2ClassName(event_table_label))# self.emrtFile.createTable(,eventTableLabel2ClassName(event_table_label),event_cls.NUMPY_DTYPE, title="%s Data"%(device_instance.__class__.__name__,),filters=dfilter.copy())
                         #print2err("----------- USED EXISTING TABLE FOR TABLES ENTRY ------------")
                         #print2err("\tevent_cls: {0}".format(event_cls))
                         #print2err("\tevent_cls_name: {0}".format(event_cls_name))
@@ -114,6 +182,8 @@ class ioHubpyTablesFile():
                         print2err("--------------------------------------")
 
                 if self.TABLES.has_key(event_table_label):
+                        # indexes are only updated when the file is closed
+                        self.TABLES[event_table_label].autoindex=False
                         #print2err("---------------ADDING CLASS MAPPING------------------")
                         #print2err("\tevent_cls: {0}".format(event_cls))
                         #print2err("\tevent_cls_name: {0}".format(event_cls_name))
@@ -274,6 +344,11 @@ class ioHubpyTablesFile():
         except Exception:
             # Just means the table for this event type has not been created as the event type is not being recorded
             pass
+
+        # indexes of existing event tables are only updated when the file is closed
+        for event_table_label in self._eventGroupMappings:
+            if event_table_label in self.TABLES:
+                self.TABLES[event_table_label].autoindex=False
         
     def buildOutTemplate(self): 
         self.emrtFile.title=DATA_FILE_TITLE
@@ -282,34 +357,36 @@ class ioHubpyTablesFile():
         self.emrtFile.SCHEMA_MODIFIED=SCHEMA_MODIFIED_DATE
         
         #CREATE GROUPS
+        createGroup=_tablesFunction(self.emrtFile,'create_group','createGroup')
+        createTable=_tablesFunction(self.emrtFile,'create_table','createTable')
 
         #self.emrtFile.createGroup(self.emrtFile.root, 'analysis', title='Data Analysis Files, notebooks, scripts and saved results tables.')
 
-        self.TABLES['CLASS_TABLE_MAPPINGS']=self.emrtFile.createTable(self.emrtFile.root,'class_table_mapping', ClassTableMappings, title='Mapping of ioHub DeviceEvent Classes to ioHub DataStore Tables.')
+        self.TABLES['CLASS_TABLE_MAPPINGS']=createTable(self.emrtFile.root,'class_table_mapping', ClassTableMappings, title='Mapping of ioHub DeviceEvent Classes to ioHub DataStore Tables.')
 
-        self.emrtFile.createGroup(self.emrtFile.root, 'data_collection', title='Data Collected using the ioHub Event Framework.')
+        createGroup(self.emrtFile.root, 'data_collection', title='Data Collected using the ioHub Event Framework.')
         self.flush()
 
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection, 'events', title='All Events that were Saved During Experiment Sessions.')
+        createGroup(self.emrtFile.root.data_collection, 'events', title='All Events that were Saved During Experiment Sessions.')
 
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection, 'condition_variables', title="Tables created to Hold Experiment DV and IV's Values Saved During an Experiment Session.")
+        createGroup(self.emrtFile.root.data_collection, 'condition_variables', title="Tables created to Hold Experiment DV and IV's Values Saved During an Experiment Session.")
         self.flush()
 
         
-        self.TABLES['EXPERIMENT_METADETA']=self.emrtFile.createTable(self.emrtFile.root.data_collection,'experiment_meta_data', ExperimentMetaData, title='Information About Experiments Saved to This ioHub DataStore File.')
-        self.TABLES['SESSION_METADETA']=self.emrtFile.createTable(self.emrtFile.root.data_collection,'session_meta_data', SessionMetaData, title='Information About Sessions Saved to This ioHub DataStore File.')
+        self.TABLES['EXPERIMENT_METADETA']=createTable(self.emrtFile.root.data_collection,'experiment_meta_data', ExperimentMetaData, title='Information About Experiments Saved to This ioHub DataStore File.')
+        self.TABLES['SESSION_METADETA']=createTable(self.emrtFile.root.data_collection,'session_meta_data', SessionMetaData, title='Information About Sessions Saved to This ioHub DataStore File.')
         self.flush()
 
 
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'experiment', title='Experiment Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'keyboard', title='Keyboard Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'mouse', title='Mouse Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'touch', title='Touch Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'gamepad', title='GamePad Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'analog_input', title='AnalogInput Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'eyetracker', title='EyeTracker Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'mcu', title='MCU Device Events.')
-        self.emrtFile.createGroup(self.emrtFile.root.data_collection.events, 'serial', title='Serial Interface Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'experiment', title='Experiment Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'keyboard', title='Keyboard Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'mouse', title='Mouse Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'touch', title='Touch Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'gamepad', title='GamePad Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'analog_input', title='AnalogInput Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'eyetracker', title='EyeTracker Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'mcu', title='MCU Device Events.')
+        createGroup(self.emrtFile.root.data_collection.events, 'serial', title='Serial Interface Events.')
         self.flush()
 
         self._buildEventGroupMappingDict()
@@ -340,6 +417,7 @@ class ioHubpyTablesFile():
         self._eventGroupMappings['BLINK_END']=self.emrtFile.root.data_collection.events.eyetracker
 
     
+    @_withFileLock
     def addClassMapping(self,ioClass,ctable):
         names = [ x['class_id'] for x in self.TABLES['CLASS_TABLE_MAPPINGS'].where("(class_id == %d)"%(ioClass.EVENT_TYPE_ID)) ]
         if len(names)==0:
@@ -349,8 +427,9 @@ class ioHubpyTablesFile():
             trow['class_name'] = ioClass.__name__
             trow['table_path']  = ctable._v_pathname
             trow.append()            
-            self.flush()    
+            self._flushFile()    
           
+    @_withFileLock
     def createOrUpdateExperimentEntry(self,experimentInfoList):
         #ioHub.print2err("createOrUpdateExperimentEntry called with: ",experimentInfoList)
         experiment_metadata=self.TABLES['EXPERIMENT_METADETA']
@@ -370,10 +449,11 @@ class ioHubpyTablesFile():
         self.active_experiment_id=max_id+1
         experimentInfoList[0]=self.active_experiment_id
         experiment_metadata.append([experimentInfoList,])
-        self.flush()
+        self._flushFile()
         #ioHub.print2err("Experiment ID set to: ",self.active_experiment_id)
         return self.active_experiment_id
     
+    @_withFileLock
     def createExperimentSessionEntry(self,sessionInfoDict):
         #ioHub.print2err("createExperimentSessionEntry called with: ",sessionInfoDict)
         session_metadata=self.TABLES['SESSION_METADETA']
@@ -387,11 +467,12 @@ class ioHubpyTablesFile():
         
         values=(self.active_session_id,self.active_experiment_id,sessionInfoDict['code'],sessionInfoDict['name'],sessionInfoDict['comments'],sessionInfoDict['user_variables'])
         session_metadata.append([values,])
-        self.flush()
+        self._flushFile()
 
         #ioHub.print2err("Session ID set to: ",self.active_session_id)
         return self.active_session_id
 
+    @_withFileLock
     def _initializeConditionVariableTable(self,experiment_id,session_id,np_dtype):
         experimentConditionVariableTable=None
         exp_session=[('EXPERIMENT_ID','i4'),('SESSION_ID','i4')]
@@ -401,11 +482,11 @@ class ioHubpyTablesFile():
         self._EXP_COND_DTYPE=N.dtype(np_dtype)
         try:
             expCondTableName="EXP_CV_%d"%(experiment_id)
-            experimentConditionVariableTable=self.emrtFile.root.data_collection.condition_variables._f_getChild(expCondTableName)
+            experimentConditionVariableTable=_tablesFunction(self.emrtFile.root.data_collection.condition_variables,'_f_get_child','_f_getChild')(expCondTableName)
             self.TABLES['EXP_CV']=experimentConditionVariableTable
         except NoSuchNodeError, nsne:
             try:
-                experimentConditionVariableTable=self.emrtFile.createTable(self.emrtFile.root.data_collection.condition_variables,expCondTableName,self._EXP_COND_DTYPE,title='Condition Variable Values for Experiment ID %d'%(experiment_id))
+                experimentConditionVariableTable=_tablesFunction(self.emrtFile,'create_table','createTable')(self.emrtFile.root.data_collection.condition_variables,expCondTableName,self._EXP_COND_DTYPE,title='Condition Variable Values for Experiment ID %d'%(experiment_id))
                 self.TABLES['EXP_CV']=experimentConditionVariableTable
                 self.emrtFile.flush()
             except Exception:
@@ -418,6 +499,7 @@ class ioHubpyTablesFile():
         self._activeRunTimeConditionVariableTable=experimentConditionVariableTable
         return True
 
+    @_withFileLock
     def _addRowToConditionVariableTable(self,experiment_id,session_id,data):
         if self.emrtFile and 'EXP_CV' in self.TABLES and self._EXP_COND_DTYPE is not None:
             temp=[experiment_id,session_id]
@@ -444,6 +526,42 @@ class ioHubpyTablesFile():
     def addMetaDataToFile(self,metaData):
         pass
 
+    @_withFileLock
+    def addDeviceTelemetry(self,device_stats):
+        """
+        Save the telemetry stats (DeviceTelemetry.getStats() dicts) of each
+        device to the device_telemetry table for the active session.
+        """
+        try:
+            dc=self.emrtFile.root.data_collection
+            if 'device_telemetry' in dc:
+                ttable=dc.device_telemetry
+            else:
+                ttable=_tablesFunction(self.emrtFile,'create_table','createTable')(dc,'device_telemetry',DeviceTelemetryData,title='ioHub Device Latency and Throughput Telemetry For Each Session.')
+            row=ttable.row
+            for stats in device_stats:
+                for metric in ('poll_time','event_delay','dispatch_time','filter_time'):
+                    hstats=stats[metric]
+                    row['experiment_id']=self.active_experiment_id or 0
+                    row['session_id']=self.active_session_id or 0
+                    row['device_name']=stats['device_name']
+                    row['metric']=metric
+                    row['count']=hstats['count']
+                    for col,key in (('mean','mean'),('min','min'),('max','max'),('p50','p50'),
+                                    ('p90','p90'),('p99','p99'),('p99_9','p99.9')):
+                        value=hstats[key]
+                        row[col]=N.NaN if value is None else value
+                    row['device_events']=stats['events']
+                    row['device_polls']=stats['polls']
+                    row['events_per_sec']=stats['events_per_sec']
+                    row['max_native_backlog']=stats['max_native_backlog']
+                    row.append()
+            ttable.flush()
+            return True
+        except Exception:
+            printExceptionDetailsToStdErr()
+        return False
+
     def checkForExperimentAndSessionIDs(self,event=None):
         if self.active_experiment_id is None or self.active_session_id is None:
             exp_id=self.active_experiment_id
@@ -458,6 +576,7 @@ class ioHubpyTablesFile():
             return False
         return True
         
+    @_withFileLock
     def checkIfSessionCodeExists(self,sessionCode):
         if self.emrtFile:
             sessionsForExperiment=self.emrtFile.root.data_collection.session_meta_data.where("experiment_id == %d"%(self.active_experiment_id,))
@@ -478,12 +597,15 @@ class ioHubpyTablesFile():
 #            print2err("*** ",DeviceEvent.EVENT_TYPE_ID_INDEX, '_handleEvent: ',etype,' : event list: ',event)
             eventClass=EventConstants.getClass(etype)
                 
-            etable=self.TABLES[eventClass.IOHUB_DATA_TABLE]
             event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=self.active_experiment_id
             event[DeviceEvent.EVENT_SESSION_ID_INDEX]=self.active_session_id
 
+            if self._writer:
+                self._writer.put(eventClass.IOHUB_DATA_TABLE,eventClass.NUMPY_DTYPE,tuple(event))
+                return
+
             np_array= N.array([tuple(event),],dtype=eventClass.NUMPY_DTYPE)
-            etable.append(np_array)
+            self._appendBatch(eventClass.IOHUB_DATA_TABLE,np_array)
 
             self.bufferedFlush()
 
@@ -492,33 +614,32 @@ class ioHubpyTablesFile():
             printExceptionDetailsToStdErr()
 
     def _handleEvents(self, events):
-        # saves many events to pytables table at once.
-        # EVENTS MUST ALL BE OF SAME TYPE!!!!!
+        # saves many events to pytables tables at once, one array per table.
+        # Events can be of mixed types.
         try:
             #ioHub.print2err("_handleEvent: ",self.active_experiment_id,self.active_session_id)
 
             if self.checkForExperimentAndSessionIDs(len(events)) is False:
                 return False
 
-            event=events[0]
-
-            etype=event[DeviceEvent.EVENT_TYPE_ID_INDEX]
-            #ioHub.print2err("etype: ",etype)
-            eventClass=EventConstants.getClass(etype)
-            etable=self.TABLES[eventClass.IOHUB_DATA_TABLE]
-            #ioHub.print2err("eventClass: etable",eventClass,etable)
-
-            np_events=[]
+            table_events=dict()
             for event in events:
+                eventClass=EventConstants.getClass(event[DeviceEvent.EVENT_TYPE_ID_INDEX])
                 event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=self.active_experiment_id
                 event[DeviceEvent.EVENT_SESSION_ID_INDEX]=self.active_session_id
-                np_events.append(tuple(event))
+                if self._writer:
+                    self._writer.put(eventClass.IOHUB_DATA_TABLE,eventClass.NUMPY_DTYPE,tuple(event))
+                    continue
+                if eventClass.IOHUB_DATA_TABLE not in table_events:
+                    table_events[eventClass.IOHUB_DATA_TABLE]=(eventClass.NUMPY_DTYPE,[])
+                table_events[eventClass.IOHUB_DATA_TABLE][1].append(tuple(event))
 
-            np_array= N.array(np_events,dtype=eventClass.NUMPY_DTYPE)
-            #ioHub.print2err('np_array:',np_array)
-            etable.append(np_array)
+            for table_label,(np_dtype,np_events) in table_events.iteritems():
+                np_array= N.array(np_events,dtype=np_dtype)
+                self._appendBatch(table_label,np_array)
 
-            self.bufferedFlush(len(np_events))
+            if table_events:
+                self.bufferedFlush(len(events))
 
         except ioHubError, e:
             print2err(e)
@@ -530,17 +651,35 @@ class ioHubpyTablesFile():
         # flush only occurs when command is sent to ioHub, so do nothing here.
         if self.flushCounter>=0:
             if self.flushCounter==0:
-                self.flush()
+                self._flushFile()
                 return True
             if self.flushCounter<=self._eventCounter:
-                self.flush()
+                self._flushFile()
                 self._eventCounter=0
                 return True
             self._eventCounter+=eventCount
             return False
 
 
-    def flush(self):
+    @_withFileLock
+    def _appendBatch(self,table_label,np_array):
+        self.TABLES[table_label].append(np_array)
+
+    def _writerError(self,e):
+        print2err("Error in ioDataStore background writer: ",e)
+        printExceptionDetailsToStdErr()
+
+    def getWriterStats(self):
+        """
+        Returns the background writer statistics (see BatchWriter.getStats),
+        or None if events are written as they are received.
+        """
+        if self._writer:
+            return self._writer.getStats()
+        return None
+
+    @_withFileLock
+    def _flushFile(self):
         try:
             if self.emrtFile:
                 self.emrtFile.flush()
@@ -549,10 +688,41 @@ class ioHubpyTablesFile():
         except Exception:
             printExceptionDetailsToStdErr()
 
+    def flush(self):
+        # events queued for the background writer are written first
+        if self._writer:
+            self._writer.flush()
+        self._flushFile()
+
+    def _indexEventTables(self):
+        # sorting the columns of long sample tables can take a while, so the
+        # time taken is logged; set index_columns to [] to skip indexing.
+        index_columns=self._tableLayout.get('index_columns',['experiment_id','session_id','type','time'])
+        if not index_columns or self.emrtFile.mode == 'r':
+            return
+        for event_table_label in self._eventGroupMappings:
+            etable=self.TABLES.get(event_table_label)
+            if etable is None or etable.nrows == 0:
+                continue
+            try:
+                index_start=Computer.getTime()
+                _indexTableColumns(etable,index_columns)
+                print2err("Indexed ioDataStore table {0} ({1} rows) in {2:.3f} sec.".format(
+                          event_table_label,etable.nrows,Computer.getTime()-index_start))
+            except Exception:
+                print2err("Error indexing ioDataStore table: ",event_table_label)
+                printExceptionDetailsToStdErr()
+        self.emrtFile.flush()
+
     def close(self):
+        if self._writer:
+            self._writer.close()
         self.flush()
         self._activeRunTimeConditionVariableTable=None
-        self.emrtFile.close()
+        with self._fileLock:
+            if self.emrtFile.isopen:
+                self._indexEventTables()
+            self.emrtFile.close()
         
     def __del__(self):
         try:
@@ -610,6 +780,25 @@ class SessionMetaData(IsDescription):
     comments  = StringCol(256,pos=5)
     user_variables = StringCol(2048,pos=6) # will hold json encoded version of user variable dict for session
 
+class DeviceTelemetryData(IsDescription):
+    # one row per device telemetry histogram, see psychopy.iohub.telemetry
+    experiment_id = UInt32Col(pos=1)
+    session_id = UInt32Col(pos=2)
+    device_name = StringCol(32,pos=3)
+    metric = StringCol(16,pos=4)
+    count = UInt64Col(pos=5)
+    mean = Float64Col(pos=6, dflt=N.NaN)
+    min = Float64Col(pos=7, dflt=N.NaN)
+    max = Float64Col(pos=8, dflt=N.NaN)
+    p50 = Float64Col(pos=9, dflt=N.NaN)
+    p90 = Float64Col(pos=10, dflt=N.NaN)
+    p99 = Float64Col(pos=11, dflt=N.NaN)
+    p99_9 = Float64Col(pos=12, dflt=N.NaN)
+    device_events = UInt64Col(pos=13)
+    device_polls = UInt64Col(pos=14)
+    events_per_sec = Float64Col(pos=15)
+    max_native_backlog = UInt32Col(pos=16)
+
 
 """
 # NEEDS TO BE COMPLETED    
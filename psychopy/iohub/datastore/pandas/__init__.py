@@ -17,6 +17,8 @@ try:
 except ImportError:
     import json
 
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 #import matplotlib as mpl
@@ -33,8 +35,73 @@ def getEventConstants():
     return EventConstants._names
 
 
+# Default max. bytes of event DataFrames kept by an ioHubPandasDataView.
+DEFAULT_CACHE_SIZE=256*1024*1024
+
+# Columns every event DataFrame includes, whatever columns are requested.
+_INDEX_COLUMNS=['experiment_id','session_id','time','type']
+
+GLOBAL_EVENT_FIELDS=['time','device_id','event_id','type','device_time',
+                     'logged_time','confidence_interval','delay',
+                     'filter_id']
+
+
+class _FrameCache(object):
+    """
+    Least recently used cache of DataFrames, holding up to max_bytes
+    (as given by DataFrame.memory_usage) of frames. A frame larger than
+    max_bytes is not cached.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes=max_bytes
+        self._frames=OrderedDict()
+        self.size=0
+
+    def get(self, key):
+        item=self._frames.pop(key,None)
+        if item is None:
+            return None
+        self._frames[key]=item
+        return item[0]
+
+    def put(self, key, df):
+        if key in self._frames:
+            self.size-=self._frames.pop(key)[1]
+        nbytes=int(df.memory_usage(index=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        self._frames[key]=df,nbytes
+        self.size+=nbytes
+        while self.size > self.max_bytes:
+            self.size-=self._frames.popitem(last=False)[1][1]
+
+    def clear(self):
+        self._frames.clear()
+        self.size=0
+
+
 class ioHubPandasDataView(object):
-    def __init__(self,datastore_file):
+    """
+    Pandas DataFrame view of an ioDataStore file.
+
+    Event DataFrames (indexed by experiment_id and session_id, ordered by
+    time) are read from the file when they are first used. The rows and
+    columns of an event table are selected in the HDF5 file (using the
+    table's column indexes if it has them), so only the selected data is
+    read into memory:
+
+        selectEvents() returns the events of a type matching a pytables
+            'where' condition, experiment, session and time range, with
+            only the requested columns.
+        iterSessions() and iterTimeWindows() return the events of a type
+            one session, or one time window, at a time.
+
+    Frames that have been read are kept in a least recently used cache of
+    up to cache_size bytes. Accessing an event type as an attribute of the
+    view (for example view.MONOCULAR_EYE_SAMPLE) returns all events of the
+    type.
+    """
+    def __init__(self,datastore_file,cache_size=DEFAULT_CACHE_SIZE):
         self._hdf_store=pd.HDFStore(datastore_file)
         self._event_constants=None
         self._event_table_info=None
@@ -42,7 +109,7 @@ class ioHubPandasDataView(object):
         self._session_meta_data=None
         self._condition_variables=None
 
-        self._event_data_by_type=dict()
+        self._event_frames=_FrameCache(cache_size)
         self._all_events=None
 
     @property
@@ -207,47 +274,125 @@ class ioHubPandasDataView(object):
         return self._all_events
 
     def __getattr__(self,n):
-        if not self._event_data_by_type.get(n):
-            try:
-                row=self.event_table_info.ix[n]
-#                #if not row['table_path'].endswith('KeyboardCharEvent'):
-                event_data=self._hdf_store.select(row['table_path'])
-                event_data=event_data[event_data.type == self.event_constants[n]]
-                event_data['type']=n
-                event_data.set_index(['experiment_id','session_id','time'],inplace=True)
-                event_data.sort_index(inplace=True)
-                event_data.reset_index('time',inplace=True)
-                self._event_data_by_type[n]=event_data
-#                else:
-#                    raise AttributeError(self.__class__.__name__+" does not support "+n)
-            except Exception, e:
-                raise AttributeError(self.__class__.__name__+" does not have a data frame for "+n)
-                raise e
-        return self._event_data_by_type[n]
+        if n.startswith('_'):
+            raise AttributeError(n)
+        try:
+            return self.selectEvents(n)
+        except Exception:
+            raise AttributeError(self.__class__.__name__+" does not have a data frame for "+n)
+
+    def selectEvents(self,event_type,columns=None,where=None,experiment_id=None,
+                     session_id=None,start_time=None,end_time=None):
+        """
+        DataFrame of the events of event_type (an event type name, for example
+        'MONOCULAR_EYE_SAMPLE'), in the same form as the event type attribute
+        of the view, holding only the rows and columns selected:
+
+            columns: list of the event columns wanted (experiment_id,
+                session_id, time and type are always included). None for all.
+            where: a pytables condition on the event columns, for example
+                'left_gaze_x > 0', evaluated in the HDF5 file.
+            experiment_id, session_id: only events of the experiment / session.
+            start_time, end_time: only events with start_time <= time < end_time.
+
+        Frames are cached (see cache_size), so selecting the same events
+        again does not read the file.
+        """
+        table_path=self.event_table_info.ix[event_type]['table_path']
+        conditions=['(type == %d)'%(self.event_constants[event_type])]
+        for col,op,value in (('experiment_id','==',experiment_id),
+                             ('session_id','==',session_id),
+                             ('time','>=',start_time),('time','<',end_time)):
+            if value is not None:
+                conditions.append('(%s %s %r)'%(col,op,value))
+        if where:
+            conditions.append('(%s)'%(where,))
+        condition=' & '.join(conditions)
+        if columns is not None:
+            columns=tuple(columns)
+
+        key=(event_type,condition,columns)
+        event_data=self._event_frames.get(key)
+        if event_data is None:
+            event_data=self._readEvents(table_path,condition,columns)
+            event_data['type']=event_type
+            event_data.set_index(['experiment_id','session_id','time'],inplace=True)
+            event_data.sort_index(inplace=True)
+            event_data.reset_index('time',inplace=True)
+            self._event_frames.put(key,event_data)
+        return event_data
+
+    def _readEvents(self,table_path,condition,columns):
+        table=self._hdf_store.get_node(table_path)
+        if columns is None:
+            columns=table.colnames
+        else:
+            columns=[c for c in table.colnames if c in columns or c in _INDEX_COLUMNS]
+        # one read of the selected rows; reading them again for each column
+        # costs a full read per column
+        events=table.read_where(condition)
+        return pd.DataFrame(OrderedDict((c,events[c]) for c in columns))
+
+    def iterSessions(self,event_type,columns=None,where=None):
+        """
+        Yields ((experiment_id, session_id), DataFrame) for each session in
+        the file, the DataFrame holding the session's events of event_type
+        (see selectEvents for columns and where).
+        """
+        for experiment_id,session_id in self.session_meta_data.index:
+            yield (experiment_id,session_id),self.selectEvents(event_type,columns,where,
+                                                               experiment_id,session_id)
+
+    def iterTimeWindows(self,event_type,duration,columns=None,where=None,
+                        experiment_id=None,session_id=None):
+        """
+        Yields ((start_time, end_time), DataFrame) for each duration sec.msec
+        long time window from the first to the last event of event_type in
+        the file (or in the experiment / session given), the DataFrame
+        holding the events with start_time <= time < end_time (see
+        selectEvents for columns and where). Only the time column of the
+        events is read to find the first and last event.
+        """
+        table=self._hdf_store.get_node(self.event_table_info.ix[event_type]['table_path'])
+        conditions=['(type == %d)'%(self.event_constants[event_type])]
+        if experiment_id is not None:
+            conditions.append('(experiment_id == %r)'%(experiment_id,))
+        if session_id is not None:
+            conditions.append('(session_id == %r)'%(session_id,))
+        times=table.read_coordinates(table.get_where_list(' & '.join(conditions)),field='time')
+        if len(times) == 0:
+            return
+        start_time=times.min()
+        last_time=times.max()
+        del times
+        while start_time <= last_time:
+            end_time=start_time+duration
+            yield (start_time,end_time),self.selectEvents(event_type,columns,where,experiment_id,
+                                                          session_id,start_time,end_time)
+            start_time=end_time
+
+    def clearCache(self):
+        """Remove all event DataFrames from the view's cache."""
+        self._event_frames.clear()
+        self._all_events=None
 
     def _createGlobalEventData(self):
         SKIP_EVENT_TYPES=['KEYBOARD_KEY','MOUSE_INPUT', 'TOUCH'] #KEYBOARD_CHAR
-        global_event_fields=['time','device_id','event_id','type','device_time',
-                             'logged_time','confidence_interval','delay',
-                             'filter_id']
 
+        # only the global event columns are read from each event table
+        frames=[]
         for index,row in self.event_table_info.iterrows():
             if index not in SKIP_EVENT_TYPES:
-                event_data=getattr(self,index,None)
-                if event_data is None:
-                    raise AttributeError("_createGlobalEventData:"+index+" event type does not exist.")
-
-                if self._all_events is None:
-                    self._all_events=event_data[global_event_fields]
-                else:
-                    self._all_events=pd.concat([self._all_events,event_data[global_event_fields]],axis=0)
+                event_data=self.selectEvents(index,GLOBAL_EVENT_FIELDS)
+                frames.append(event_data[GLOBAL_EVENT_FIELDS])
 
+        self._all_events=pd.concat(frames,axis=0)
         self._all_events.set_index(['time'],append=True,inplace=True)
         self._all_events.sort_index(inplace=True)
         self._all_events.reset_index('time',inplace=True)
 
     def close(self):
-        if self._hdf_store:
+        if self._hdf_store is not None:
             self._hdf_store.close()
             self._hdf_store=None
 
@@ -258,5 +403,5 @@ class ioHubPandasDataView(object):
         self._experiment_meta_data=None
         self._session_meta_data=None
         self._condition_variables=None
-        self._event_data_by_type.clear()
+        self._event_frames.clear()
         self._all_events=None
\ No newline at end of file
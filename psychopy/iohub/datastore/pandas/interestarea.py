@@ -13,6 +13,8 @@ Distributed under the terms of the GNU General Public License
                   Pierce Edmiston <pierce.edmiston@gmail.com>
 """
 
+import numpy as np
+import pandas as pd
 import shapely
 import shapely.geometry
 import shapely.affinity
@@ -29,6 +31,7 @@ class Polygon(shapely.geometry.Polygon):
             self.name=self.__class__.__name__+'_'+str(self._ia_id)
         self._last_target_df=None
         shapely.geometry.Polygon.__init__(self,points)
+        self._vertices=np.asarray(self.exterior.coords,dtype=np.float64)
 
     @property
     def name(self):
@@ -40,12 +43,32 @@ class Polygon(shapely.geometry.Polygon):
 
     def contains(self,v):
         return shapely.geometry.Polygon.contains(self,spy.geometry.Point(v[0],v[1]))
-            
+
+    def containsPoints(self,x,y):
+        """
+        Boolean array, True for each point (x[i], y[i]) inside the area.
+        Uses an even-odd (ray crossing) test of the polygon edges, each
+        edge tested against all the points at once.
+        """
+        x=np.asarray(x,dtype=np.float64)
+        y=np.asarray(y,dtype=np.float64)
+        inside=np.zeros(x.shape,dtype=bool)
+        vx=self._vertices[:,0]
+        vy=self._vertices[:,1]
+        with np.errstate(invalid='ignore'):
+            for i in range(len(vx)-1):
+                x1,y1,x2,y2=vx[i],vy[i],vx[i+1],vy[i+1]
+                if y1 == y2:
+                    continue
+                crosses=(y1 > y) != (y2 > y)
+                inside^=crosses&(x < x1+(y-y1)*((x2-x1)/(y2-y1)))
+        return inside
+
     def filter(self,target_df,x_col='x_position',y_col='y_position'):
         if self._last_target_df is not target_df:
             self._last_target_df=proxy(target_df)
             self._ia_df=None
-            self._ia_df=target_df[target_df[[x_col,y_col]].apply(self.contains,axis = 1)]
+            self._ia_df=target_df[self.containsPoints(target_df[x_col].values,target_df[y_col].values)]
             self._ia_df['ia_name']=self.name
             self._ia_df['ia_id']=self.ia_id
             self._ia_df['ia_name']=self.name
@@ -56,6 +79,15 @@ class Circle(Polygon):
     def __init__(self,name,center_point,radius):
         point=shapely.geometry.Point(*center_point).buffer(radius,resolution=16)
         Polygon.__init__(self,name,point.exterior.coords)
+        self._center=np.asarray(center_point,dtype=np.float64)
+        self._radius=float(radius)
+
+    def containsPoints(self,x,y):
+        """Points within radius of the center (not of the polygon outline)."""
+        dx=np.asarray(x,dtype=np.float64)-self._center[0]
+        dy=np.asarray(y,dtype=np.float64)-self._center[1]
+        with np.errstate(invalid='ignore'):
+            return dx*dx+dy*dy < self._radius*self._radius
 
 class Ellipse(Polygon):
     def __init__(self,name,center_point,min_axis,max_axis,angle,use_radians=False):     
@@ -63,6 +95,25 @@ class Ellipse(Polygon):
         point=spy.affinity.scale(point, xfact=1.0, yfact=max_axis/min_axis, origin='center')
         point=spy.affinity.rotate(point, angle, origin='center', use_radians=use_radians)
         Polygon.__init__(self,name,point.exterior.coords)
+        self._center=np.asarray(center_point,dtype=np.float64)
+        self._axes=(float(min_axis),float(max_axis))
+        if not use_radians:
+            angle=np.deg2rad(angle)
+        self._cos_sin=(np.cos(angle),np.sin(angle))
+
+    def containsPoints(self,x,y):
+        """
+        Points inside the ellipse (min_axis along x and max_axis along y,
+        rotated counter clockwise by angle), not the polygon outline.
+        """
+        dx=np.asarray(x,dtype=np.float64)-self._center[0]
+        dy=np.asarray(y,dtype=np.float64)-self._center[1]
+        c,s=self._cos_sin
+        # rotate the points back by angle
+        ex=(c*dx+s*dy)/self._axes[0]
+        ey=(c*dy-s*dx)/self._axes[1]
+        with np.errstate(invalid='ignore'):
+            return ex*ex+ey*ey < 1.0
         
 class Rectangle(Polygon):
     def __init__(self,name,minx,miny,maxx,maxy,ccw=True):
@@ -70,6 +121,102 @@ class Rectangle(Polygon):
         if not ccw:
             coords = coords[::-1]
         Polygon.__init__(self,name,coords)
+        self._box=(min(minx,maxx),min(miny,maxy),max(minx,maxx),max(miny,maxy))
+
+    def containsPoints(self,x,y):
+        x=np.asarray(x,dtype=np.float64)
+        y=np.asarray(y,dtype=np.float64)
+        minx,miny,maxx,maxy=self._box
+        with np.errstate(invalid='ignore'):
+            return (x > minx)&(x < maxx)&(y > miny)&(y < maxy)
+
+class InterestAreaSet(object):
+    """
+    Hit testing of points against many interest areas (Polygon, Circle,
+    Ellipse and Rectangle objects) at once.
+
+    The bounding boxes of the areas are binned into a grid_size x grid_size
+    grid. Points are sorted by grid cell once, and each area only tests
+    the points in the cells its bounding box overlaps.
+    """
+    def __init__(self,areas,grid_size=None):
+        self.areas=list(areas)
+        bounds=np.array([a.bounds for a in self.areas],dtype=np.float64).reshape(-1,4)
+        if grid_size is None:
+            grid_size=max(int(np.ceil(np.sqrt(len(self.areas))))*4,1)
+        self.grid_size=grid_size
+        if len(bounds):
+            self._origin=bounds[:,:2].min(axis=0)
+            extent=bounds[:,2:].max(axis=0)-self._origin
+        else:
+            self._origin=np.zeros(2)
+            extent=np.ones(2)
+        self._cell_size=np.maximum(extent/grid_size,1e-9)
+        # for each area, the (first, last) cell id of each grid column the
+        # area's bounding box overlaps
+        self._area_cell_ranges=[]
+        for b in bounds:
+            c0=self._cellIndexes(b[:2])
+            c1=self._cellIndexes(b[2:])
+            columns=np.arange(c0[0],c1[0]+1)*grid_size
+            self._area_cell_ranges.append((columns+c0[1],columns+c1[1]))
+
+    def _cellIndexes(self,xy):
+        cells=np.floor((xy-self._origin)/self._cell_size)
+        return np.clip(cells,0,self.grid_size-1).astype(np.int64)
+
+    def containsPoints(self,x,y):
+        """
+        Boolean array of shape (len(x), len(areas)); element [i, j] is True
+        if the point (x[i], y[i]) is inside areas[j].
+        """
+        x=np.asarray(x,dtype=np.float64)
+        y=np.asarray(y,dtype=np.float64)
+        hits=np.zeros((len(x),len(self.areas)),dtype=bool)
+        gx=(x-self._origin[0])/self._cell_size[0]
+        gy=(y-self._origin[1])/self._cell_size[1]
+        with np.errstate(invalid='ignore'):
+            in_grid=(gx >= 0)&(gx <= self.grid_size)&(gy >= 0)&(gy <= self.grid_size)
+        candidates=np.flatnonzero(in_grid)
+        cells=(np.minimum(gx[candidates].astype(np.int64),self.grid_size-1)*self.grid_size+
+               np.minimum(gy[candidates].astype(np.int64),self.grid_size-1))
+        order=np.argsort(cells,kind='mergesort')
+        cells=cells[order]
+        candidates=candidates[order]
+        for j,(area,(first,last)) in enumerate(zip(self.areas,self._area_cell_ranges)):
+            lo=np.searchsorted(cells,first,'left')
+            hi=np.searchsorted(cells,last,'right')
+            points=[candidates[l:h] for l,h in zip(lo,hi) if h > l]
+            if points:
+                points=np.concatenate(points)
+                hits[points,j]=area.containsPoints(x[points],y[points])
+        return hits
+
+    def labels(self,x,y):
+        """
+        Index (in areas) of the first area each point is inside, or -1 for
+        points outside every area.
+        """
+        if not self.areas:
+            return -np.ones(len(x),int)
+        hits=self.containsPoints(x,y)
+        return np.where(hits.any(axis=1),hits.argmax(axis=1),-1)
+
+    def filter(self,target_df,x_col='x_position',y_col='y_position'):
+        """
+        The rows of target_df inside each area, as returned by the filter()
+        method of each area, concatenated (in area order). A row inside
+        several areas is included once for each.
+        """
+        hits=self.containsPoints(target_df[x_col].values,target_df[y_col].values)
+        frames=[]
+        for j,area in enumerate(self.areas):
+            ia_df=target_df[hits[:,j]]
+            ia_df['ia_name']=area.name
+            ia_df['ia_id']=area.ia_id
+            ia_df['ia_id_num']=range(1,len(ia_df)+1)
+            frames.append(ia_df)
+        return pd.concat(frames)
 
 if __name__ == '__main__':
     circle = Circle('Circle IA',[0,0],400)
@@ -16,6 +16,70 @@ Distributed under the terms of the GNU General Public License
 import numpy as np
 import pandas as pd
 
+def _sessionCodes(*dfs):
+    """
+    Integer codes of the (experiment_id, session_id) index of each df,
+    shared across the dfs.
+    """
+    codes = 0
+    for level in (0, 1):
+        values = np.concatenate([df.index.get_level_values(level).values for df in dfs])
+        level_codes, uniques = pd.factorize(values)
+        codes = codes*len(uniques)+level_codes
+    return np.split(codes, np.cumsum([len(df) for df in dfs[:-1]]))
+
+def _intervalJoin(target, ip_df):
+    """
+    Vectorized interval join of the target event times and the interest
+    periods of ip_df, see InterestPeriodDefinition.intervalIndex.
+
+    Interest periods are sorted by (session, start_time) and each event is
+    searchsorted into them, giving the last interest period of the event's
+    session that starts at or before the event. Interest periods before it
+    are then stepped through, in one vectorized pass per step, while the
+    running max of their end_time (per session) can still reach the event,
+    so the number of passes is the maximum interest period overlap depth.
+    """
+    times = np.asarray(target['time'], dtype=np.float64)
+    starts = np.asarray(ip_df['start_time'], dtype=np.float64)
+    ends = np.asarray(ip_df['end_time'], dtype=np.float64)
+    if len(times) == 0 or len(starts) == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+    codes, ip_codes = _sessionCodes(target, ip_df)
+    # exact (session, time) sort keys from the rank of each time
+    ranks = np.unique(np.concatenate((starts, times)), return_inverse=True)[1]
+    width = ranks.max()+1
+    ip_keys = ip_codes*width+ranks[:len(starts)]
+    keys = codes*width+ranks[len(starts):]
+
+    ip_order = np.argsort(ip_keys, kind='mergesort')
+    ip_keys = ip_keys[ip_order]
+    ends = ends[ip_order]
+    reach = pd.Series(ends).groupby(ip_codes[ip_order]).cummax().values
+
+    lo = np.searchsorted(ip_keys, codes*width, 'left')
+    hi = np.searchsorted(ip_keys, keys, 'right')
+    rows = np.flatnonzero(hi > lo)
+    k = hi[rows]-1
+    matched_rows = []
+    matched_ips = []
+    while len(rows):
+        t = times[rows]
+        live = reach[k] >= t
+        rows, k, t = rows[live], k[live], t[live]
+        hit = ends[k] >= t
+        matched_rows.append(rows[hit])
+        matched_ips.append(ip_order[k[hit]])
+        k = k-1
+        more = k >= lo[rows]
+        rows, k = rows[more], k[more]
+
+    rows = np.concatenate(matched_rows) if matched_rows else np.zeros(0, dtype=np.intp)
+    ip_rows = np.concatenate(matched_ips) if matched_ips else np.zeros(0, dtype=np.intp)
+    order = np.lexsort((ip_rows, rows))
+    return rows[order], ip_rows[order]
+
 class InterestPeriodDefinition(object):
     """
     InterestPeriodDefinition Class
@@ -41,57 +105,54 @@ class InterestPeriodDefinition(object):
     def ipid(self):
         return self._ipid
     
+    def intervalIndex(self, target):
+        """
+        Return the (event_rows, ip_rows) int arrays of the row positions in
+        target and in ip_df of each event and interest period pair where the
+        event is from the same experiment and session as the interest period
+        and start_time <= time <= end_time. Interest periods can overlap, so
+        an event can be paired with more than one interest period. Pairs are
+        ordered by event row, then by interest period row.
+        """
+        return _intervalJoin(target, self.ip_df)
+
     def find(self, target, ip_cols=None):
-        df = target[:]
-        df['ip_id_num'] = np.nan 
-        df['ip_id'] = self.ipid
-        df['ip_name'] = self.name
-        df = df.groupby(level=[0,1], group_keys=False).apply(self.__find)
-        
+        """
+        Return the rows of target that are within each interest period,
+        grouped by interest period. A row within overlapping interest periods
+        is repeated for each of them.
+        """
+        rows, ip_rows = self.intervalIndex(target)
+        order = np.lexsort((rows, ip_rows))
+        df = self._labelRows(target, rows[order], ip_rows[order])
+
         if ip_cols is not None:
             df = self._merge_ip_cols(df, ip_cols)
-        
+
         return df
-    
-    def __find(self, target_group):
-        group_id = target_group.index[0]
-        group_ips = self.ip_df.ix[group_id]
-        if len(group_ips) > 0:
-            overlapping = []
-            for index, ip in group_ips.iterrows():
-                in_ip = ((target_group['time'] >= ip['start_time']) &
-                         (target_group['time'] <= ip['end_time']))
-                target_in_ip = target_group[in_ip]
-                target_in_ip['ip_id_num'] = ip['ip_id_num']
-                overlapping += [target_in_ip]
-            target_filtered = pd.concat(overlapping)
-        else:
-            target_filtered = target_group[[False]*len(target_group)]
-        return target_filtered
-    
+
     def filter(self, target, ip_cols=None):
-        df = target[:]
-        df['ip_id'] = self.ipid
-        df['ip_name'] = self.name
-        df = target.groupby(level=[0,1], group_keys=False).apply(self.__filter)
-        
+        """
+        Return the rows of target that are within an interest period, in
+        target order. A row within overlapping interest periods is labeled
+        with the first of them.
+        """
+        rows, ip_rows = self.intervalIndex(target)
+        rows, first = np.unique(rows, return_index=True)
+        df = self._labelRows(target, rows, ip_rows[first])
+
         if ip_cols is not None:
             df = self._merge_ip_cols(df, ip_cols)
-        
+
         return df
-    
-    def __filter(self, group):
-        """
-        HT http://stackoverflow.com/a/21370058/2506078
-        """
-        ips = self.ip_df.ix[group.index[0]]
-        start_idx = np.searchsorted(ips['start_time'], group['time'])-1
-        end_idx = np.searchsorted(ips['end_time'], group['time'])
-        mask = (start_idx == end_idx)
-        group['ip_id_num'] = np.nan
-        group['ip_id_num'][mask] = start_idx
-        return group[mask]
-    
+
+    def _labelRows(self, target, rows, ip_rows):
+        df = target.iloc[rows].copy()
+        df['ip_id_num'] = self.ip_df['ip_id_num'].values[ip_rows]
+        df['ip_id'] = self.ipid
+        df['ip_name'] = self.name
+        return df
+
     def _merge_ip_cols(self, target, cols):
         if not isinstance(cols, dict):
             if not hasattr(cols, '__iter__'):
@@ -124,18 +185,11 @@ class InterestPeriodDefinition(object):
         
         return matches
     
-    def __enumerate_ips(self, group):
-        group['ip_id_num'] = range(len(group))
-        return group
-    
     def _ip_zipper(self, start, end, temp_index='ip_id_num'):
         # TODO: make sure the two dfs "zip" nicely
-        _start = start.groupby(level=[0,1]).apply(self.__enumerate_ips)
-        _end = end.groupby(level=[0,1]).apply(self.__enumerate_ips)
-        
-        _start.set_index(temp_index, append=True, inplace=True)
-        _end.set_index(temp_index, append=True, inplace=True)
-        
+        _start = start.set_index(start.groupby(level=[0,1]).cumcount().rename(temp_index), append=True)
+        _end = end.set_index(end.groupby(level=[0,1]).cumcount().rename(temp_index), append=True)
+
         _all = pd.merge(_start, _end, left_index=True, right_index=True)
         return _all.reset_index(temp_index)
 
@@ -10,22 +10,42 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 """
 
 
+import tables
 from tables import *
 import os
 from collections import namedtuple
 import json
 
+import numpy as N
+
 from psychopy import gui, iohub
 from psychopy.iohub import FileDialog
+from psychopy.iohub.datastore import _tablesFunction
 
 _hubFiles=[]
 
+def _rowsInTimeRanges(times,starts,ends):
+    """
+    For sorted times, and ranges [starts[i], ends[i]] (inclusive), returns
+    (row_indices, range_indices): the index of every time that falls within
+    a range, and the index of that range. Ranges may overlap.
+    """
+    first=N.searchsorted(times,starts,'left')
+    last=N.searchsorted(times,ends,'right')
+    counts=N.maximum(last-first,0)
+    total=counts.sum()
+    range_indices=N.repeat(N.arange(len(counts)),counts)
+    # row index = first row of the range + position within the range
+    offsets=N.arange(total)-N.repeat(N.cumsum(counts)-counts,counts)
+    row_indices=N.repeat(first,counts)+offsets
+    return row_indices,range_indices
+
 def openHubFile(filepath,filename,mode):
     """
     Open an HDF5 DataStore file and register it so that it is closed even on interpreter crash.
     """
     global _hubFiles
-    hubFile=openFile(os.path.join(filepath,filename), mode)
+    hubFile=_tablesFunction(tables,'open_file','openFile')(os.path.join(filepath,filename), mode)
     _hubFiles.append(hubFile)
     return hubFile
 
@@ -137,8 +157,8 @@ class ExperimentDataAccessUtility(object):
         """
         if self.hdfFile:
             hubFile=self.hdfFile
-            for group in hubFile.walkGroups("/"):
-                for table in hubFile.listNodes(group, classname='Table'):
+            for group in _tablesFunction(hubFile,'walk_groups','walkGroups')("/"):
+                for table in _tablesFunction(hubFile,'list_nodes','listNodes')(group, classname='Table'):
                     if table.name == tableName:
                         print '------------------'
                         print "Path:", table
@@ -201,7 +221,7 @@ class ExperimentDataAccessUtility(object):
         """
         Given a valid table path within the DataStore file, return the accociated table.
         """
-        self.hdfFile.getNode(path)
+        return _tablesFunction(self.hdfFile,'get_node','getNode')(path)
 
     def getEventTable(self,event_type):
         """
@@ -239,7 +259,7 @@ class ExperimentDataAccessUtility(object):
                 return None
 
             tablePathString=result[0][3]
-            return self.hdfFile.getNode(tablePathString)
+            return _tablesFunction(self.hdfFile,'get_node','getNode')(tablePathString)
         return None
 
     def getEventMappingInformation(self):
@@ -271,7 +291,7 @@ class ExperimentDataAccessUtility(object):
                     cond="(type == %d)"%(event_type_id)
                     if condition_str:
                         cond+=" & "+condition_str
-                    events_by_type[event_type_id]= self.hdfFile.getNode(event_mapping_info.table_path).where(cond).next()
+                    events_by_type[event_type_id]= _tablesFunction(self.hdfFile,'get_node','getNode')(event_mapping_info.table_path).where(cond).next()
                 except StopIteration:
                     pass
             return events_by_type
@@ -359,15 +379,7 @@ class ExperimentDataAccessUtility(object):
             Values for the specified event type and event attribute columns which match the provided experiment condition variable filter, starting condition filer, and ending condition filter criteria.
         """
         if self.hdfFile:
-            klassTables=self.hdfFile.root.class_table_mapping
-
-            deviceEventTable=None
-
-            result=[row.fetch_all_fields() for row in klassTables.where('(class_id == %d) & (class_type_id == 1)'%(event_type_id))]
-            if len(result) is not 1:
-                raise ExperimentDataAccessException("event_type_id passed to getEventAttribute should only return one row from CLASS_MAPPINGS.")
-            tablePathString=result[0][3]
-            deviceEventTable=self.hdfFile.getNode(tablePathString)
+            deviceEventTable=self._getEventTableForType(event_type_id)
 
             for ename in event_attribute_names:
                 if ename not in deviceEventTable.colnames:
@@ -407,7 +419,7 @@ class ExperimentDataAccessUtility(object):
                         resultSetList.append([])
 
                         for ename in event_attribute_names:
-                            resultSetList[-1].append(deviceEventTable.readWhere(wclause, field=ename))
+                            resultSetList[-1].append(_tablesFunction(deviceEventTable,'read_where','readWhere')(wclause, field=ename))
                         resultSetList[-1].append(wclause)
                         resultSetList[-1].append(cv)
 
@@ -448,7 +460,7 @@ class ExperimentDataAccessUtility(object):
                         wclause+=" ) "
 
                     for ename in event_attribute_names:
-                        resultSetList[-1].append(deviceEventTable.readWhere(wclause, field=ename))
+                        resultSetList[-1].append(_tablesFunction(deviceEventTable,'read_where','readWhere')(wclause, field=ename))
                     resultSetList[-1].append(wclause)
                     resultSetList[-1].append(cv)
 
@@ -459,6 +471,101 @@ class ExperimentDataAccessUtility(object):
 
             return None
 
+    def getEventAttributeValuesForTrials(self,event_type_id,event_attribute_names,startTimeVariable,endTimeVariable,filter_id=None,conditionVariablesFilter=None,asDataFrame=False):
+        """
+        Bulk version of getEventAttributeValues for selecting the events
+        that occurred during each trial (condition variable row). The event
+        table is queried once, for the event type in all the sessions, and
+        the events are assigned to trials by searching the event times for
+        each trial's start and end time.
+
+        Args:
+            event_type_id (int): The EventConstants type of the events.
+            event_attribute_names (str or list): The event attributes (columns) to return.
+            startTimeVariable (str): The condition variable holding the start time of each trial (events with time >= the start time are included). Can also be given as '@name@'.
+            endTimeVariable (str): The condition variable holding the end time of each trial (events with time <= the end time are included).
+            filter_id (int): Only return events with this filter_id.
+            conditionVariablesFilter (dict): Selects the trials, as for getEventAttributeValues.
+            asDataFrame (bool): Return a pandas DataFrame instead of a numpy array.
+
+        Returns:
+            A numpy structured array (or DataFrame) with a row per event in each trial, ordered by trial and time. It has the columns trial_index (the index of the trial in the list returned by getConditionVariables for the same filter), session_id, and the requested event attributes.
+        """
+        if not self.hdfFile:
+            return None
+        if not isinstance(event_attribute_names,(list,tuple)):
+            event_attribute_names=[event_attribute_names,]
+
+        deviceEventTable=self._getEventTableForType(event_type_id)
+        for ename in event_attribute_names:
+            if ename not in deviceEventTable.colnames:
+                raise ExperimentDataAccessException("getEventAttributeValuesForTrials: %s does not have a column named %s"%(deviceEventTable.title,ename))
+
+        if conditionVariablesFilter is None:
+            filteredConditionVariableList=self.getConditionVariables()
+        else:
+            filteredConditionVariableList=self.getConditionVariables(conditionVariablesFilter)
+        startTimeVariable=startTimeVariable.strip('@')
+        endTimeVariable=endTimeVariable.strip('@')
+        cvNames=self.getConditionVariableNames() or []
+        for cvname in (startTimeVariable,endTimeVariable):
+            if cvname not in cvNames:
+                raise ExperimentDataAccessException("getEventAttributeValuesForTrials: {0} is not a valid attribute name in {1}".format(cvname,cvNames))
+
+        # one query (and read) for all the events of the type
+        wclause="( experiment_id == {0} ) & ( type == {1} )".format(self._experimentID,event_type_id)
+        if filter_id is not None:
+            wclause += " & ( filter_id == {0} )".format(filter_id)
+        self._lastWhereClause=wclause
+        events=_tablesFunction(deviceEventTable,'read_where','readWhere')(wclause)
+        order=N.lexsort((events['time'],events['session_id']))
+        event_sessions=events['session_id'][order]
+        event_times=events['time'][order]
+
+        trial_sessions=N.array([cv.session_id for cv in filteredConditionVariableList],dtype=N.uint32)
+        trial_starts=N.array([getattr(cv,startTimeVariable) for cv in filteredConditionVariableList],dtype=N.float64)
+        trial_ends=N.array([getattr(cv,endTimeVariable) for cv in filteredConditionVariableList],dtype=N.float64)
+
+        row_indices=[]
+        trial_indices=[]
+        for session_id in N.unique(trial_sessions):
+            session_trials=N.flatnonzero(trial_sessions == session_id)
+            session_start,session_end=N.searchsorted(event_sessions,[session_id,session_id+1])
+            rows,ranges=_rowsInTimeRanges(event_times[session_start:session_end],
+                                          trial_starts[session_trials],trial_ends[session_trials])
+            row_indices.append(rows+session_start)
+            trial_indices.append(session_trials[ranges])
+        if row_indices:
+            row_indices=N.concatenate(row_indices)
+            trial_indices=N.concatenate(trial_indices)
+        else:
+            row_indices=N.zeros(0,dtype=N.int64)
+            trial_indices=N.zeros(0,dtype=N.int64)
+        # order by trial, then time; row_indices then index the query result
+        by_trial=N.argsort(trial_indices,kind='mergesort')
+        row_indices=order[row_indices[by_trial]]
+        trial_indices=trial_indices[by_trial]
+
+        columns=[('trial_index',N.int32),('session_id',event_sessions.dtype)]
+        columns.extend([(ename,deviceEventTable.coldtypes[ename]) for ename in event_attribute_names
+                        if ename not in ('trial_index','session_id')])
+        results=N.zeros(len(row_indices),dtype=columns)
+        results['trial_index']=trial_indices
+        for cname,cdtype in columns[1:]:
+            results[cname]=events[cname][row_indices]
+
+        if asDataFrame:
+            import pandas
+            return pandas.DataFrame.from_records(results)
+        return results
+
+    def _getEventTableForType(self,event_type_id):
+        klassTables=self.hdfFile.root.class_table_mapping
+        result=[row.fetch_all_fields() for row in klassTables.where('(class_id == %d) & (class_type_id == 1)'%(event_type_id))]
+        if len(result) is not 1:
+            raise ExperimentDataAccessException("event_type_id passed to getEventAttribute should only return one row from CLASS_MAPPINGS.")
+        return _tablesFunction(self.hdfFile,'get_node','getNode')(result[0][3])
+
     def getEventIterator(self,event_type):
         """
         **Docstr TBC.**
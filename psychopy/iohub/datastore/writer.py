@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/datastore/writer.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+Background writer for the ioDataStore: rows (events) are queued by the ioHub
+Server's event loop and written by a separate thread, in one numpy array per
+table, so HDF5 writes do not delay device polling.
+"""
+import threading
+import Queue
+from timeit import default_timer
+
+import numpy as N
+
+# the queue item used by BatchWriter.flush() to mark what must be written
+_FLUSH_MARKER=object()
+
+
+class BatchWriter(object):
+    """
+    Collects rows put() for each table key and, on a thread, converts them
+    to a numpy array per table and calls write(key, array) whenever
+    batch_size rows are waiting, or the oldest has waited max_delay sec.msec.
+    Rows of each table are written in the order they were put(). After each
+    set of writes, flush() (if given) is called.
+
+    The queue holds at most max_queue_length rows. What happens when it is
+    full is set by when_full:
+
+        'block': put() waits (for up to block_timeout sec.msec if given,
+                 then drops the row) until the writer has made space.
+        'drop': put() drops the row straight away.
+
+    Either way, getStats() reports the blocked time and dropped rows.
+    """
+    def __init__(self, write, flush=None, batch_size=512, max_delay=0.1,
+                 max_queue_length=100000, when_full='block', block_timeout=None,
+                 error_handler=None, get_time=default_timer):
+        if when_full not in ('block','drop'):
+            raise ValueError("when_full must be 'block' or 'drop', not %r"%(when_full,))
+        self._write=write
+        self._flush=flush
+        self.batch_size=max(int(batch_size),1)
+        self.max_delay=max_delay
+        self.max_queue_length=int(max_queue_length)
+        self.when_full=when_full
+        self.block_timeout=block_timeout
+        self._error_handler=error_handler
+        self._get_time=get_time
+
+        self._queue=Queue.Queue(self.max_queue_length)
+        self._stats_lock=threading.Lock()
+        self._resetStats()
+
+        self._running=True
+        self._thread=threading.Thread(target=self._run,name='ioDataStoreWriter')
+        self._thread.daemon=True
+        self._thread.start()
+
+    def _resetStats(self):
+        self._stats=dict(rows_written=0, batches_written=0, write_count=0,
+                         write_time_total=0.0, write_time_max=0.0,
+                         latency_total=0.0, latency_max=0.0,
+                         max_queue_length_seen=0, blocked_puts=0,
+                         blocked_time=0.0, dropped_rows=0, write_errors=0)
+
+    def put(self, key, dtype, row):
+        """
+        Queue row (a tuple of values matching dtype) to be written to the
+        table identified by key. Returns False if the row was dropped
+        because the queue was full.
+        """
+        if not self._running:
+            with self._stats_lock:
+                self._stats['dropped_rows']+=1
+            return False
+        item=(key,dtype,row,self._get_time())
+        queue=self._queue
+        try:
+            queue.put_nowait(item)
+        except Queue.Full:
+            if self.when_full == 'drop':
+                with self._stats_lock:
+                    self._stats['dropped_rows']+=1
+                return False
+            stime=self._get_time()
+            try:
+                queue.put(item,True,self.block_timeout)
+                dropped=False
+            except Queue.Full:
+                dropped=True
+            with self._stats_lock:
+                self._stats['blocked_puts']+=1
+                self._stats['blocked_time']+=self._get_time()-stime
+                if dropped:
+                    self._stats['dropped_rows']+=1
+            if dropped:
+                return False
+        qlen=queue.qsize()
+        if qlen > self._stats['max_queue_length_seen']:
+            self._stats['max_queue_length_seen']=qlen
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Wait until every row put() before the call has been written (and
+        flush() called), or until timeout sec.msec. Returns True if done.
+        """
+        if not self._thread.is_alive():
+            return self._queue.empty()
+        done=threading.Event()
+        self._queue.put((_FLUSH_MARKER,done,None,None))
+        done.wait(timeout)
+        return done.is_set()
+
+    def getStats(self):
+        """
+        A dict of the writer statistics: the current queue_length,
+        max_queue_length_seen, rows_written, batches_written (one per table
+        per write), the mean and max time taken by each set of writes
+        (write_time_mean, write_time_max) and between a row being put() and
+        being written (latency_mean, latency_max), blocked_puts,
+        blocked_time, dropped_rows and write_errors.
+        """
+        with self._stats_lock:
+            stats=dict(self._stats)
+        stats['queue_length']=self._queue.qsize()
+        write_count=stats.pop('write_count')
+        write_time=stats.pop('write_time_total')
+        latency=stats.pop('latency_total')
+        stats['write_time_mean']=write_time/write_count if write_count else 0.0
+        stats['latency_mean']=latency/stats['rows_written'] if stats['rows_written'] else 0.0
+        return stats
+
+    def close(self, timeout=None):
+        """Write any queued rows and stop the writer thread."""
+        if self._running:
+            self._running=False
+            self._queue.put((None,None,None,None))
+            self._thread.join(timeout)
+
+    def _run(self):
+        queue=self._queue
+        pending={}
+        pending_count=0
+        oldest=None
+        while True:
+            timeout=None
+            if pending_count:
+                timeout=max(oldest+self.max_delay-self._get_time(),0.0)
+            try:
+                key,dtype,row,put_time=queue.get(True,timeout)
+            except Queue.Empty:
+                key=None
+            else:
+                if key is None:
+                    self._writePending(pending)
+                    return
+                if key is _FLUSH_MARKER:
+                    self._writePending(pending)
+                    pending={}
+                    pending_count=0
+                    # dtype is the threading.Event to set
+                    dtype.set()
+                    continue
+                batch=pending.get(key)
+                if batch is None:
+                    batch=pending[key]=(dtype,[],[])
+                batch[1].append(row)
+                batch[2].append(put_time)
+                if pending_count == 0:
+                    oldest=put_time
+                pending_count+=1
+                if pending_count < self.batch_size and \
+                        self._get_time()-oldest < self.max_delay:
+                    continue
+            if pending_count:
+                self._writePending(pending)
+                pending={}
+                pending_count=0
+
+    def _writePending(self, pending):
+        if not pending:
+            if self._flush:
+                self._callFlush()
+            return
+        stime=self._get_time()
+        rows_written=0
+        batches=0
+        latency_total=0.0
+        latency_max=0.0
+        errors=0
+        for key,(dtype,rows,put_times) in pending.iteritems():
+            try:
+                self._write(key,N.array(rows,dtype=dtype))
+            except Exception, e:
+                errors+=1
+                if self._error_handler:
+                    self._error_handler(e)
+                continue
+            rows_written+=len(rows)
+            batches+=1
+            write_done=self._get_time()
+            latency_total+=len(put_times)*write_done-sum(put_times)
+            latency_max=max(latency_max,write_done-put_times[0])
+        if self._flush:
+            self._callFlush()
+        dur=self._get_time()-stime
+        with self._stats_lock:
+            s=self._stats
+            s['rows_written']+=rows_written
+            s['batches_written']+=batches
+            s['write_count']+=1
+            s['write_time_total']+=dur
+            s['write_time_max']=max(s['write_time_max'],dur)
+            s['latency_total']+=latency_total
+            s['latency_max']=max(s['latency_max'],latency_max)
+            s['write_errors']+=errors
+
+    def _callFlush(self):
+        try:
+            self._flush()
+        except Exception, e:
+            with self._stats_lock:
+                self._stats['write_errors']+=1
+            if self._error_handler:
+                self._error_handler(e)
@@ -15,10 +15,11 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 import gc, os, sys, copy
 import collections
 from collections import deque
-from operator import itemgetter
 import numpy as N
 import psutil
+from .. import constants
 from ..util import convertCamelToSnake, print2err,printExceptionDetailsToStdErr
+from ..eventbuffer import TimeOrderedEventBuffer
 from psychopy.clock import monotonicClock
 
 class ioDeviceError(Exception):
@@ -706,6 +707,12 @@ class Computer(object):
         Computer._nextEventID+=1
         return n
 
+    @staticmethod
+    def _getNextEventIDs(count):
+        n = Computer._nextEventID
+        Computer._nextEventID+=count
+        return n
+
     @staticmethod
     def getPhysicalSystemMemoryInfo():
         """
@@ -889,7 +896,7 @@ class Device(ioObject):
         ioObject.__init__(self, *args, **kwargs)
 
         self._is_reporting_events = kwargs.get('auto_report_events', False)
-        self._iohub_event_buffer = dict()
+        self._iohub_event_buffer = TimeOrderedEventBuffer(max_run_length=self.event_buffer_length)
         self._event_listeners = dict()
         self._configuration = kwargs
         self._last_poll_time = 0
@@ -932,6 +939,10 @@ class Device(ioObject):
 
             asType (str): Optional kwarg giving the object type to return events as. Valid values are 'namedtuple' (the default), 'dict', 'list', or 'object'.
 
+            start_time (float): Optional kwarg; only return (and clear) events with an ioHub time >= start_time.
+
+            end_time (float): Optional kwarg; only return (and clear) events with an ioHub time <= end_time.
+
         Returns:
             (list): New events that the ioHub has received since the last getEvents() or clearEvents() call to the device. Events are ordered by the ioHub time of each event, older event at index 0. The event object type is determined by the asType parameter passed to the method. By default a namedtuple object is returned for each event.
         """
@@ -952,27 +963,25 @@ class Device(ioObject):
 
         filter_id=kwargs.get('filter_id',None)
 
-        currentEvents=[]
-        if eventTypeID:
-            currentEvents=list(self._iohub_event_buffer.get(eventTypeID,[]))
-
-            if filter_id:
-                currentEvents = [e for e in currentEvents if e[DeviceEvent.EVENT_FILTER_ID_INDEX] == filter_id]
+        # the event buffer is kept in time order, so no sorting is needed
+        return self._iohub_event_buffer.getEvents(eventTypeID, filter_id,
+                                                  kwargs.get('start_time',None),
+                                                  kwargs.get('end_time',None),
+                                                  clear=clearEvents is True)
 
-            if clearEvents is True and len(currentEvents)>0:
-                self.clearEvents(eventTypeID,filter_id=filter_id, call_proc_events=False)
-        else:
-            if filter_id:
-                [currentEvents.extend([fe for fe in l if fe[DeviceEvent.EVENT_FILTER_ID_INDEX] == filter_id]) for l in self._iohub_event_buffer.values()]
-            else:
-                [currentEvents.extend(l) for l in self._iohub_event_buffer.values()]
+    def getDroppedEventCounts(self):
+        """
+        Number of events of each type that have been removed from the device
+        event buffer without being read, because the buffer held
+        event_buffer_length events of the type.
 
-            if clearEvents is True and len(currentEvents)>0:
-                self.clearEvents(filter_id=filter_id, call_proc_events=False)
+        Args:
+            None
 
-        if len(currentEvents)>0:
-            currentEvents=sorted(currentEvents, key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
-        return currentEvents
+        Returns:
+            (dict): event type id : dropped event count.
+        """
+        return self._iohub_event_buffer.getDroppedCounts()
 
 
     def clearEvents(self, event_type=None, filter_id=None, call_proc_events=True):
@@ -993,21 +1002,7 @@ class Device(ioObject):
         if call_proc_events:
             self._iohub_server.processDeviceEvents()
 
-        if event_type:
-            if filter_id:
-                event_que = self._iohub_event_buffer[event_type]
-                newque = deque([e for e in event_que if e[DeviceEvent.EVENT_FILTER_ID_INDEX] != filter_id], maxlen=self.event_buffer_length)
-                self._iohub_event_buffer[event_type] = newque
-            else:
-                self._iohub_event_buffer.setdefault(event_type,
-                                deque(maxlen=self.event_buffer_length)).clear()
-        else:
-            if filter_id:
-                for event_type, event_deque in self._iohub_event_buffer.items():
-                    newque = deque([e for e in event_deque if e[DeviceEvent.EVENT_FILTER_ID_INDEX] != filter_id], maxlen=self.event_buffer_length)
-                    self._iohub_event_buffer[event_type] = newque
-            else:
-                self._iohub_event_buffer.clear()
+        self._iohub_event_buffer.clear(event_type, filter_id)
 
     def enableEventReporting(self,enabled=True):
         """
@@ -1108,8 +1103,7 @@ class Device(ioObject):
 
     def _handleEvent(self,e):
         event_type_id = e[DeviceEvent.EVENT_TYPE_ID_INDEX]
-        self._iohub_event_buffer.setdefault(event_type_id,
-                               deque(maxlen=self.event_buffer_length)).append(e)
+        self._iohub_event_buffer.append(e)
 
         # Add the event to any filters bound to the device which
         # list wanting the event's type and events filter_id
@@ -1145,7 +1139,7 @@ class Device(ioObject):
     def getCurrentDeviceState(self, clear_events=True):
         result_dict={}
         self._iohub_server.processDeviceEvents()
-        events = {key:tuple(value) for key, value in self._iohub_event_buffer.items()}
+        events = self._iohub_event_buffer.getEventsByType()
         result_dict['events'] = events
         if clear_events:
             self.clearEvents(call_proc_events=False)
@@ -1327,17 +1321,17 @@ class DeviceEvent(ioObject):
     KeyboardPressEvent, KeyboardReleaseEvent, etc.) also has access to the
     methods and attributes of the DeviceEvent class.
     """
-    EVENT_EXPERIMENT_ID_INDEX=0
-    EVENT_SESSION_ID_INDEX=1
-    DEVICE_ID_INDEX=2
-    EVENT_ID_INDEX=3
-    EVENT_TYPE_ID_INDEX=4
-    EVENT_DEVICE_TIME_INDEX=5
-    EVENT_LOGGED_TIME_INDEX=6
-    EVENT_HUB_TIME_INDEX=7
-    EVENT_CONFIDENCE_INTERVAL_INDEX=8
-    EVENT_DELAY_INDEX=9
-    EVENT_FILTER_ID_INDEX=10
+    EVENT_EXPERIMENT_ID_INDEX=constants.EVENT_EXPERIMENT_ID_INDEX
+    EVENT_SESSION_ID_INDEX=constants.EVENT_SESSION_ID_INDEX
+    DEVICE_ID_INDEX=constants.DEVICE_ID_INDEX
+    EVENT_ID_INDEX=constants.EVENT_ID_INDEX
+    EVENT_TYPE_ID_INDEX=constants.EVENT_TYPE_ID_INDEX
+    EVENT_DEVICE_TIME_INDEX=constants.EVENT_DEVICE_TIME_INDEX
+    EVENT_LOGGED_TIME_INDEX=constants.EVENT_LOGGED_TIME_INDEX
+    EVENT_HUB_TIME_INDEX=constants.EVENT_HUB_TIME_INDEX
+    EVENT_CONFIDENCE_INTERVAL_INDEX=constants.EVENT_CONFIDENCE_INTERVAL_INDEX
+    EVENT_DELAY_INDEX=constants.EVENT_DELAY_INDEX
+    EVENT_FILTER_ID_INDEX=constants.EVENT_FILTER_ID_INDEX
     BASE_EVENT_MAX_ATTRIBUTE_INDEX=EVENT_FILTER_ID_INDEX
 
     # The Device Class that generates the given type of event.
@@ -1,6 +1,8 @@
 __author__ = 'Sol'
+import heapq
 import numpy as np
 from collections import deque
+from numpy.lib.stride_tricks import as_strided
 from psychopy.iohub.util import NumPyRingBuffer
 from psychopy.iohub import EventConstants, DeviceEvent, print2err, Computer
 
@@ -122,6 +124,156 @@ class DeviceEventFilter(object):
 
 ####################### Device Event Field Filter Types ########################
 
+class EventWindow(object):
+    """
+    Holds the last 'length' events (iohub events in list form) added, in a
+    fixed size list used as a ring buffer. Index 0 is the oldest event
+    in the window, index -1 the latest.
+    """
+    __slots__ = ['_events', '_length', '_count']
+    def __init__(self, length):
+        self._length = length
+        self._events = [None]*length
+        self._count = 0
+
+    def append(self, event):
+        self._events[self._count%self._length] = event
+        self._count += 1
+
+    def extend(self, events):
+        self._count += max(len(events)-self._length, 0)
+        for e in events[-self._length:]:
+            self._events[self._count%self._length] = e
+            self._count += 1
+
+    def isFull(self):
+        return self._count >= self._length
+
+    def __len__(self):
+        return min(self._count, self._length)
+
+    def __getitem__(self, i):
+        size = len(self)
+        if i < 0:
+            i += size
+        if i < 0 or i >= size:
+            raise IndexError("EventWindow index out of range")
+        return self._events[(self._count-size+i)%self._length]
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def clear(self):
+        self._events = [None]*self._length
+        self._count = 0
+
+# ------
+
+class SlidingMedian(object):
+    """
+    Median of the last 'length' values added, updated in O(log length) time
+    per value using two heaps: a max heap of the lower half of the window
+    values and a min heap of the upper half. Values that leave the window
+    are removed from a heap lazily, when they reach its top.
+
+    Values are stored as float32, and the median is that returned by
+    numpy.median for the float32 window values (NaN if the window holds a
+    NaN).
+    """
+    def __init__(self, length):
+        self.length = length
+        self._window = deque()
+        self._low = []      # negated values
+        self._high = []
+        self._low_count = 0
+        self._high_count = 0
+        self._removed = dict()
+        self._nan_count = 0
+
+    def add(self, value):
+        value = float(np.float32(value))
+        if len(self._window) == self.length:
+            self._remove(self._window.popleft())
+        self._window.append(value)
+        if value != value:
+            self._nan_count += 1
+            return
+        if not self._low or value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_count += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_count += 1
+        self._balance()
+
+    def median(self):
+        if self._nan_count or not self._window:
+            return np.float32(np.NaN)
+        if self._low_count > self._high_count:
+            return np.float32(-self._low[0])
+        return np.float32((np.float32(-self._low[0])+np.float32(self._high[0]))/2.0)
+
+    def clear(self):
+        self.__init__(self.length)
+
+    def _remove(self, value):
+        if value != value:
+            self._nan_count -= 1
+            return
+        self._removed[value] = self._removed.get(value, 0)+1
+        if value <= -self._low[0]:
+            self._low_count -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, -1)
+        else:
+            self._high_count -= 1
+            if value == self._high[0]:
+                self._prune(self._high, 1)
+        self._balance()
+
+    def _prune(self, heap, sign):
+        removed = self._removed
+        while heap:
+            value = sign*heap[0]
+            count = removed.get(value)
+            if not count:
+                return
+            if count == 1:
+                del removed[value]
+            else:
+                removed[value] = count-1
+            heapq.heappop(heap)
+
+    def _balance(self):
+        # keep _low_count == _high_count or _high_count+1
+        if self._low_count > self._high_count+1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_count -= 1
+            self._high_count += 1
+            self._prune(self._low, -1)
+        elif self._low_count < self._high_count:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._high_count -= 1
+            self._low_count += 1
+            self._prune(self._high, 1)
+
+# ------
+
+def slidingWindows(values, length):
+    """
+    Return a 2D read only view of the 1D array values with one row for each
+    'length' long window of consecutive values.
+    """
+    values = np.ascontiguousarray(values)
+    count = len(values)-length+1
+    if count <= 0:
+        return values[:0].reshape(0, length)
+    stride = values.strides[0]
+    return as_strided(values, shape=(count, length), strides=(stride, stride))
+
+# ------
+
 class MovingWindowFilter(object):
     """
     Maintains a moving window of size 'length', for a specific event
@@ -134,11 +286,13 @@ class MovingWindowFilter(object):
 
     If the windowing buffer is full, a filtered value is returned when a
     value is added to the MovingWindow using MovingWindow.add.
-    None is returned until the MovingWindow is full.
+    None is returned until the MovingWindow is full. MovingWindow.add_many
+    adds a sequence of events or values, filtering all the windows that
+    become full in one vectorized call.
 
     The base class implements a moving window averaging filter, no weights.
     To change the filter used, extend this class and replace the filteredValue
-    method.
+    and filterWindows methods.
     """
     def __init__(self, **kwargs):
         self._inplace = kwargs.get('inplace')
@@ -166,7 +320,7 @@ class MovingWindowFilter(object):
         self._events = None
         if event_type and event_field_name:
             self._event_field_index = EventConstants.getClass(event_type).CLASS_ATTRIBUTE_NAMES.index(event_field_name)
-            self._events = deque(maxlen=length)
+            self._events = EventWindow(length)
 
         self._filtering_buffer = NumPyRingBuffer(length)
 
@@ -179,6 +333,17 @@ class MovingWindowFilter(object):
         """
         return self._filtering_buffer.mean()
 
+    def filterWindows(self, windows):
+        """
+        Returns the filtered value of each row of windows, a 2D float32 array
+        of window values (oldest first), as filteredValue would for a window
+        holding the row values. Raises NotImplementedError if a sub class
+        has a filteredValue method but no filterWindows method.
+        """
+        if type(self).filteredValue.__func__ is not MovingWindowFilter.filteredValue.__func__:
+            raise NotImplementedError("%s does not implement filterWindows."%(type(self).__name__))
+        return windows.mean(axis=1)
+
     def add(self, event):
         """
         Add the given iohub event ( in list form ) to the moving window.
@@ -189,17 +354,77 @@ class MovingWindowFilter(object):
         been filtered, and the filtered value of the field being filtered.
         """
         if isinstance(event, (list,tuple)):
-            self._filtering_buffer.append(event[self._event_field_index])
+            self._appendValue(event[self._event_field_index])
             self._events.append(event)
             if self.isFull():
                 if self._inplace:
                     self._events[self._active_index][self._event_field_index] = self.filteredValue()
                 return self._events[self._active_index], self.filteredValue()
         else:
-            self._filtering_buffer.append(event)
+            self._appendValue(event)
             if self.isFull():
                 return None, self.filteredValue()
 
+    def add_many(self, events):
+        """
+        Add each of the events (iohub events in list form), or values, to
+        the moving window, as add() would one at a time.
+
+        Returns (filtered_events, filtered_values): the numpy array of the
+        filtered values of the windows that became full, and the list of
+        events they are for (None if values were given). The
+        filtered values are all calculated with one filterWindows call.
+        """
+        if len(events) and isinstance(events[0], (list,tuple)):
+            fi = self._event_field_index
+            values = np.asarray([e[fi] for e in events], dtype=np.float32)
+        else:
+            values = np.asarray(events, dtype=np.float32)
+            events = None
+        length = self._filtering_buffer.max_size
+        previous_count = len(self._filtering_buffer)
+        previous_values = self._filtering_buffer.getElements()
+        windows = slidingWindows(np.concatenate((previous_values, values)), length)
+        # only the windows ending with one of the new values are filtered
+        first_window = max(previous_count-length+1, 0)
+        windows = windows[first_window:]
+        try:
+            filtered_values = self.filterWindows(windows)
+        except NotImplementedError:
+            filtered_values = None
+
+        if filtered_values is None:
+            filtered_events = []
+            filtered_values = []
+            for e in (events if events is not None else values):
+                r = self.add(e)
+                if r:
+                    filtered_events.append(r[0])
+                    filtered_values.append(r[1])
+            if events is None:
+                filtered_events = None
+            return filtered_events, np.asarray(filtered_values)
+
+        filtered_events = None
+        if events is not None:
+            # each window filters the event at _active_index in the window
+            first = first_window+self._active_index
+            all_events = list(self._events)+list(events)
+            filtered_events = all_events[first:first+len(windows)]
+            if self._inplace:
+                fi = self._event_field_index
+                for e, v in zip(filtered_events, filtered_values):
+                    e[fi] = v
+            self._events.extend(events)
+        self._extendValues(values)
+        return filtered_events, filtered_values
+
+    def _appendValue(self, value):
+        self._filtering_buffer.append(value)
+
+    def _extendValues(self, values):
+        self._filtering_buffer.extend(values)
+
     def isFull(self):
         return self._filtering_buffer.isFull()
 
@@ -221,17 +446,40 @@ class PassThroughFilter(MovingWindowFilter):
     def filteredValue(self):
         return self._filtering_buffer[0]
 
+    def filterWindows(self, windows):
+        return windows[:, 0]
+
 # ------
 
 class MedianFilter(MovingWindowFilter):
     """
     Returns the median value of the moving window. Length must be odd.
+
+    The median is kept up to date by a SlidingMedian as values are added,
+    instead of being recalculated from the whole window.
     """
     def __init__(self, **kwargs):
         MovingWindowFilter.__init__(self, **kwargs)
+        self._sliding_median = SlidingMedian(self._filtering_buffer.max_size)
 
     def filteredValue(self):
-        return np.median(self._filtering_buffer.getElements())
+        return self._sliding_median.median()
+
+    def filterWindows(self, windows):
+        return np.median(windows, axis=1)
+
+    def _appendValue(self, value):
+        self._filtering_buffer.append(value)
+        self._sliding_median.add(value)
+
+    def _extendValues(self, values):
+        self._filtering_buffer.extend(values)
+        for v in values[-self._filtering_buffer.max_size:]:
+            self._sliding_median.add(v)
+
+    def clear(self):
+        MovingWindowFilter.clear(self)
+        self._sliding_median.clear()
 
 # ------
 
@@ -253,7 +501,10 @@ class WeightedAverageFilter(MovingWindowFilter):
         self._weights = weights / np.sum(weights)
 
     def filteredValue(self):
-        return np.convolve(self._filtering_buffer.getElements(), self._weights, 'valid')
+        return np.convolve(self._filtering_buffer.getElements(), self._weights, 'valid')[0]
+
+    def filterWindows(self, windows):
+        return np.dot(windows.astype(np.float64), self._weights[::-1])
 
 
 # ------
@@ -293,6 +544,11 @@ class StampFilter(MovingWindowFilter):
             return (e1+e3)/2.0
         return e2
 
+    def filterWindows(self, windows):
+        if self.sub_filter:
+            raise NotImplementedError("StampFilter.filterWindows only supports level 1.")
+        return (windows[:, 0]+windows[:, 2])/2.0
+
     def add(self, event):
         if self.sub_filter:
             sub_result =  self.sub_filter.add(event)
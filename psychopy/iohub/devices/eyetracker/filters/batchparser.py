@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub Eye Tracker Offline (Batch) Sample Event Parser
+
+Parses a whole session's eye samples, given as a numpy structured array
+(for example an ioDataStore BinocularEyeSampleEvent table read with
+table.read()), into the same monocular samples and fixation, saccade and
+blink start / end events that EyeTrackerEventParser outputs when the
+samples are streamed to it one at a time, using vectorized numpy
+operations instead of per sample python calls.
+
+Use it through EyeTrackerEventParser.parseSampleArray(), so that the same
+display, sampling rate, adaptive velocity threshold and field filter
+settings are used by both parsers.
+
+Copyright (C) 2012-2014 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License
+(GPL version 3 or any later version).
+
+NOTES:
+
+* Event field values are those an event has when the streaming parser
+outputs it, i.e. when the samples are processed one at a time as they
+would be when saved to the ioDataStore. The streaming position filters change
+the angle_x, angle_y fields of a sample in place, so a sample output before
+its filter window is full keeps its unfiltered angles.
+* Samples are parsed as a new session: the state of the parser instance
+(filter windows, open events, ...) is not used or changed.
+"""
+from __future__ import division
+
+import numpy as np
+
+import psychopy.iohub.devices.eventfilters as eventfilters
+from psychopy.iohub import EventConstants, Computer
+
+MONOCULAR_EYE_SAMPLE = EventConstants.MONOCULAR_EYE_SAMPLE
+BINOCULAR_EYE_SAMPLE = EventConstants.BINOCULAR_EYE_SAMPLE
+
+LEFT_EYE = 1
+
+# sample categories, as returned by getSampleEventCategory()
+MIS = 0
+FIX = 1
+SAC = 2
+
+_START_EVENT_TYPES = {MIS: EventConstants.BLINK_START,
+                      FIX: EventConstants.FIXATION_START,
+                      SAC: EventConstants.SACCADE_START}
+_END_EVENT_TYPES = {MIS: EventConstants.BLINK_END,
+                    FIX: EventConstants.FIXATION_END,
+                    SAC: EventConstants.SACCADE_END}
+
+# sample attributes copied to the start_ / end_ fields of end events
+_EDGE_FIELDS = ('gaze_x', 'gaze_y', 'angle_x', 'angle_y', 'raw_x', 'raw_y',
+                'pupil_measure1', 'pupil_measure1_type',
+                'velocity_x', 'velocity_y', 'velocity_xy')
+# sample attributes copied to fixation and saccade start events
+_START_FIELDS = ('eye', 'gaze_x', 'gaze_y', 'angle_x', 'angle_y', 'raw_x',
+                 'raw_y', 'pupil_measure1', 'pupil_measure1_type',
+                 'velocity_x', 'velocity_y', 'velocity_xy', 'status')
+_EVENT_HEADER_FIELDS = ('experiment_id', 'session_id', 'device_id',
+                        'device_time', 'logged_time', 'time')
+
+# number of float64 values in each block of adaptive threshold windows
+_THRESHOLD_BLOCK_SIZE = 2**21
+
+
+def parseSampleArray(parser, samples, first_event_id=None):
+    """
+    Parse samples (a structured numpy array of BinocularEyeSampleEvent or
+    MonocularEyeSampleEvent rows, in time order) using the settings of
+    parser (an EyeTrackerEventParser).
+
+    Returns a dict of {event_type_id: structured numpy array}, the arrays
+    holding the output monocular samples and the parsed events of each type
+    in the order the streaming parser outputs them. The event_id of the
+    output events are first_event_id, first_event_id+1, ... in that output
+    order; if first_event_id is None, the ids are taken from the ioHub
+    event id counter (as addOutputEvent() does).
+    """
+    samples = np.asarray(samples)
+    if len(samples) == 0:
+        return {}
+
+    columns, valid = _monocularColumns(samples)
+    vpos = np.flatnonzero(valid)
+
+    output_keys = []
+    outputs = []
+    if len(vpos):
+        stream = _SampleStream(parser, columns, valid, vpos[0], vpos[-1])
+        stream.updateMonocularColumns(columns)
+        for etype, event_array, keys in stream.parsedEvents(parser.filter_id):
+            outputs.append((etype, event_array))
+            output_keys.append(keys)
+    else:
+        stream = None
+
+    # every input sample is output; invalid samples as soon as they are
+    # received, valid samples after any events they end or start.
+    mono_dtype = EventConstants.getClass(MONOCULAR_EYE_SAMPLE).NUMPY_DTYPE
+    mono = np.zeros(len(samples), dtype=mono_dtype)
+    for name in mono_dtype.names:
+        mono[name] = columns[name]
+    mono['filter_id'] = parser.filter_id
+    sample_subkey = np.zeros(len(samples), dtype=np.int64)
+    if stream is not None:
+        sample_subkey[stream.first:stream.last+1] = np.arange(stream.length)*3+2
+        sample_subkey[~valid] = 0
+    outputs.insert(0, (MONOCULAR_EYE_SAMPLE, mono))
+    output_keys.insert(0, (np.arange(len(samples)), sample_subkey))
+
+    # event ids follow the streaming parser output order
+    input_index = np.concatenate([k[0] for k in output_keys])
+    subkey = np.concatenate([k[1] for k in output_keys])
+    order = np.lexsort((subkey, input_index))
+    event_ids = np.empty(len(order), dtype=np.int64)
+    if first_event_id is None:
+        first_event_id = Computer._getNextEventIDs(len(order))
+    event_ids[order] = np.arange(first_event_id, first_event_id+len(order))
+
+    parsed = {}
+    offset = 0
+    for etype, event_array in outputs:
+        event_array['event_id'] = event_ids[offset:offset+len(event_array)]
+        offset += len(event_array)
+        if etype == MONOCULAR_EYE_SAMPLE:
+            event_array = event_array[np.argsort(event_array['event_id'], kind='mergesort')]
+        if len(event_array):
+            parsed[etype] = event_array
+    return parsed
+
+
+def _monocularColumns(samples):
+    """
+    Return a dict of monocular sample field name : numpy array (the
+    _convertToMonoAveraged() conversion of binocular samples), and the
+    boolean array of valid samples.
+    """
+    mono_names = EventConstants.getClass(MONOCULAR_EYE_SAMPLE).CLASS_ATTRIBUTE_NAMES
+    columns = dict()
+    if samples['type'][0] == BINOCULAR_EYE_SAMPLE:
+        binoc_names = EventConstants.getClass(BINOCULAR_EYE_SAMPLE).CLASS_ATTRIBUTE_NAMES
+        status = samples['status']
+        unknown = ~np.in1d(status, (0, 2, 20, 22))
+        if unknown.any():
+            raise ValueError("Unknown Sample Status: %d"%(status[unknown][0]))
+        use_right = status == 20
+        average = status == 0
+        for field in mono_names:
+            if field in binoc_names:
+                columns[field] = samples[field]
+            elif field == 'eye':
+                columns[field] = np.ones(len(samples), dtype=np.uint8)*LEFT_EYE
+            elif field.endswith('_type'):
+                columns[field] = samples['left_%s'%(field)].astype(np.int64)
+            else:
+                left = samples['left_%s'%(field)].astype(np.float64)
+                right = samples['right_%s'%(field)].astype(np.float64)
+                values = np.where(use_right, right, left)
+                values[average] = (left[average]+right[average])/2.0
+                columns[field] = values
+        valid = status != 22
+    else:
+        for field in mono_names:
+            columns[field] = samples[field]
+        valid = samples['status'] == 0
+    columns['type'] = np.ones(len(samples), dtype=np.uint8)*MONOCULAR_EYE_SAMPLE
+    for field in ('time', 'gaze_x', 'gaze_y', 'angle_x', 'angle_y', 'raw_x',
+                  'raw_y', 'pupil_measure1', 'velocity_x', 'velocity_y',
+                  'velocity_xy'):
+        columns[field] = columns[field].astype(np.float64)
+    return columns, valid
+
+
+def _fieldFilterFunction(field_filter):
+    """
+    Return (window length, knot index, function) for a MovingWindowFilter
+    used by the streaming parser, the function returning the filtered
+    value of each row of a 2D float32 array of windows.
+    """
+    length = field_filter._filtering_buffer.max_size
+    knot = field_filter._active_index
+    if not isinstance(field_filter, eventfilters.MovingWindowFilter) or \
+            getattr(field_filter, 'sub_filter', None) is not None:
+        raise ValueError("%s field filters are not supported by the batch parser."%(type(field_filter).__name__))
+    func = field_filter.filterWindows
+    return length, knot, func
+
+
+class _SampleStream(object):
+    """
+    The samples added to the streaming parser's field filters: the samples
+    from the first to the last valid input sample, with the position and
+    pupil data of missing data runs linearly interpolated. Positions are
+    stream indexes (0 == input sample 'first').
+    """
+    def __init__(self, parser, columns, valid, first, last):
+        self.first = first
+        self.last = last
+        self.length = last-first+1
+        self.columns = columns
+        sl = slice(first, last+1)
+        self.valid = valid[sl]
+        self.vpos = np.flatnonzero(self.valid)
+
+        for vel_filter in (parser.x_velocity_filter, parser.y_velocity_filter, parser.xy_velocity_filter):
+            if type(vel_filter) is not eventfilters.PassThroughFilter:
+                raise ValueError("The batch parser only supports a PassThroughFilter velocity filter.")
+        flength, self.knot, self.filter_func = _fieldFilterFunction(parser.x_position_filter)
+        # a sample is filtered when the filter receives the sample 'lag'
+        # samples after it (and the window holds 'flength' samples)
+        self.filter_length = flength
+        self.lag = flength-1-self.knot
+
+        # the stream index of the valid sample whose processing adds
+        # (and parses) each stream sample.
+        self.processed_at = self.vpos[np.searchsorted(self.vpos, np.arange(self.length))]
+
+        self.time = columns['time'][sl]
+        self.pupil = columns['pupil_measure1'][sl].copy()
+        self.raw_angle = dict()
+        self.filtered_angle = dict()
+        angle_x = columns['angle_x'][sl].copy()
+        angle_y = columns['angle_y'][sl].copy()
+        v = self.valid
+        angle_x[v], angle_y[v] = parser.pix2deg(columns['gaze_x'][sl][v], columns['gaze_y'][sl][v])
+        self.raw_angle['angle_x'] = angle_x
+        self.raw_angle['angle_y'] = angle_y
+        self._interpolateMissingData()
+        for field in ('angle_x', 'angle_y'):
+            self.filtered_angle[field] = self._filtered(self.raw_angle[field])
+
+        self._addVelocity()
+        self._addThresholds(parser)
+        vx = self.velocity['velocity_x']
+        vy = self.velocity['velocity_y']
+        with np.errstate(invalid='ignore'):
+            saccade = (vx >= self.threshold['raw_x']) | (vy >= self.threshold['raw_y'])
+        self.category = np.where(self.valid, np.where(saccade, SAC, FIX), MIS)
+
+    def _filtered(self, raw, positions=None):
+        """
+        Filtered values of the stream positions whose filter window is in the
+        stream (NaN for others), for all positions or the given ones.
+        """
+        windows = eventfilters.slidingWindows(raw.astype(np.float32), self.filter_length)
+        if positions is None:
+            filtered = np.empty(self.length)
+            filtered.fill(np.nan)
+            filtered[self.knot:self.knot+len(windows)] = self.filter_func(windows)
+            return filtered
+        return self.filter_func(windows[positions-self.knot])
+
+    def angleAt(self, field, positions, processed):
+        """
+        The angle_x or angle_y value of stream positions as they are when the
+        sample at stream position processed has been added to the filters.
+        """
+        use_filtered = (positions >= self.knot) & (positions+self.lag <= processed)
+        return np.where(use_filtered, self.filtered_angle[field][positions], self.raw_angle[field][positions])
+
+    def _interpolateMissingData(self):
+        missing = np.flatnonzero(~self.valid)
+        if not len(missing):
+            return
+        run_starts = missing[np.r_[True, np.diff(missing) > 1]]
+        run_ends = missing[np.r_[np.diff(missing) > 1, True]]
+        if self.lag == 0 and self.filter_length > 1:
+            # the interpolation starts at the filtered value of the previous
+            # valid sample, which can depend on earlier interpolated data.
+            for start, end in zip(run_starts, run_ends):
+                self._interpolateRuns(np.array([start]), np.array([end]))
+        else:
+            self._interpolateRuns(run_starts, run_ends)
+
+    def _interpolateRuns(self, run_starts, run_ends):
+        before = run_starts-1
+        after = run_ends+1
+        run_lengths = run_ends-run_starts+1
+        # stream positions and 1 based offsets of the samples in the runs
+        run_index = np.repeat(np.arange(len(run_starts)), run_lengths)
+        positions = np.arange(run_lengths.sum())-np.repeat(np.cumsum(run_lengths)-run_lengths, run_lengths)
+        offsets = positions+1
+        positions = positions+run_starts[run_index]
+        divisors = (run_lengths+1)[run_index]
+        for field in ('angle_x', 'angle_y', None):
+            if field is None:
+                values = self.pupil
+                start_values = values[before]
+            else:
+                values = self.raw_angle[field]
+                start_values = values[before]
+                if self.lag == 0 and self.filter_length > 1:
+                    filtered = before >= self.knot
+                    if filtered.any():
+                        start_values[filtered] = self._filtered(values, before[filtered])
+                elif self.lag == 0:
+                    start_values = start_values.astype(np.float32).astype(np.float64)
+            # numpy.linspace(start, end, num=run_length+2)[1:-1]
+            delta = (values[after]-start_values)[run_index]
+            step = delta/divisors
+            interp = offsets*step
+            zero_step = step == 0
+            interp[zero_step] = offsets[zero_step]/divisors[zero_step]*delta[zero_step]
+            values[positions] = interp+start_values[run_index]
+
+    def _addVelocity(self):
+        self.velocity = dict()
+        columns = self.columns
+        sl = slice(self.first, self.last+1)
+        dt = np.diff(self.time)
+        prev_position = np.arange(self.length-1)
+        deltas = []
+        for field in ('angle_x', 'angle_y'):
+            raw = self.raw_angle[field]
+            prev = self.angleAt(field, prev_position, prev_position)
+            d = np.empty(self.length)
+            d[1:] = np.abs(raw[1:]-prev)
+            deltas.append(d)
+        vx = columns['velocity_x'][sl].copy()
+        vy = columns['velocity_y'][sl].copy()
+        vxy = columns['velocity_xy'][sl].copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vx[1:] = deltas[0][1:]/dt
+            vy[1:] = deltas[1][1:]/dt
+            if self.first > 0:
+                # velocity of the first valid sample is calculated from
+                # the (missing data) sample received before it.
+                p = self.first-1
+                t = self.time[0]-columns['time'][p]
+                vx[0] = np.abs(self.raw_angle['angle_x'][0]-columns['angle_x'][p])/t
+                vy[0] = np.abs(self.raw_angle['angle_y'][0]-columns['angle_y'][p])/t
+                vxy[0] = np.hypot(vx[0], vy[0])
+            vxy[1:] = np.hypot(vx[1:], vy[1:])
+        # the velocity (pass through) filters store float32 values
+        self.velocity['velocity_x'] = vx.astype(np.float32).astype(np.float64)
+        self.velocity['velocity_y'] = vy.astype(np.float32).astype(np.float64)
+        self.velocity['velocity_xy'] = vxy.astype(np.float32).astype(np.float64)
+
+    def _addThresholds(self, parser):
+        # the adaptive velocity thresholds are stored in raw_x / raw_y of
+        # valid samples; interpolated samples keep their raw_x / raw_y.
+        self.threshold = dict()
+        buffer_length = int(parser.vel_thresh_history_dur*parser.sampling_rate)
+        sl = slice(self.first, self.last+1)
+        for field, vfield in (('raw_x', 'velocity_x'), ('raw_y', 'velocity_y')):
+            values = self.columns[field][sl].copy()
+            values[self.vpos] = adaptiveVelocityThresholds(self.velocity[vfield][self.vpos], buffer_length)
+            self.threshold[field] = values
+
+    def updateMonocularColumns(self, columns):
+        """Set the columns of the valid samples to their output values."""
+        rows = self.first+self.vpos
+        for field in ('angle_x', 'angle_y'):
+            columns[field] = columns[field].copy()
+            columns[field][rows] = self.angleAt(field, self.vpos, self.vpos)
+        for fields in (self.velocity, self.threshold):
+            for field, values in fields.iteritems():
+                columns[field] = columns[field].copy()
+                columns[field][rows] = values[self.vpos]
+
+    def sampleField(self, field, positions, processed):
+        """Values of a sample field at the stream positions."""
+        if field in self.raw_angle:
+            return self.angleAt(field, positions, processed)
+        if field in self.velocity:
+            return self.velocity[field][positions]
+        if field in self.threshold:
+            return self.threshold[field][positions]
+        if field == 'pupil_measure1':
+            return self.pupil[positions]
+        return self.columns[field][self.first+positions]
+
+    def parsedEvents(self, filter_id):
+        """
+        Yield (event_type, structured array, (input index, subkey)) for each
+        type of parsed event, the keys giving the output order.
+        """
+        category = self.category
+        # the first sample of each category run; the first run of the stream
+        # has no start event (and so no end event).
+        changes = np.flatnonzero(category[1:] != category[:-1])+1
+        for cat in (MIS, FIX, SAC):
+            starts = changes[category[changes] == cat]
+            if len(starts):
+                p = self.processed_at[starts]
+                event_array = self._startEvents(cat, starts, p, filter_id)
+                yield _START_EVENT_TYPES[cat], event_array, (self.first+p, starts*3+1)
+
+            run_starts = changes[:-1][category[changes[:-1]] == cat]
+            next_starts = changes[1:][category[changes[:-1]] == cat]
+            if len(run_starts):
+                p = self.processed_at[next_starts]
+                event_array = self._endEvents(cat, run_starts, next_starts, p, filter_id)
+                yield _END_EVENT_TYPES[cat], event_array, (self.first+p, next_starts*3)
+
+    def _newEvents(self, event_type, positions, processed, filter_id):
+        event_array = np.zeros(len(positions), dtype=EventConstants.getClass(event_type).NUMPY_DTYPE)
+        for field in _EVENT_HEADER_FIELDS:
+            event_array[field] = self.sampleField(field, positions, processed)
+        event_array['type'] = event_type
+        event_array['filter_id'] = filter_id
+        event_array['eye'] = self.sampleField('eye', positions, processed)
+        event_array['status'] = self.sampleField('status', positions, processed)
+        return event_array
+
+    def _startEvents(self, cat, positions, processed, filter_id):
+        event_array = self._newEvents(_START_EVENT_TYPES[cat], positions, processed, filter_id)
+        if cat != MIS:
+            for field in _START_FIELDS:
+                event_array[field] = self.sampleField(field, positions, processed)
+        return event_array
+
+    def _endEvents(self, cat, run_starts, next_starts, processed, filter_id):
+        last = next_starts-1
+        event_array = self._newEvents(_END_EVENT_TYPES[cat], last, processed, filter_id)
+        event_array['duration'] = self.time[last]-self.time[run_starts]
+        if cat == MIS:
+            return event_array
+        for field in _EDGE_FIELDS:
+            event_array['start_'+field] = self.sampleField(field, run_starts, processed)
+            event_array['end_'+field] = self.sampleField(field, last, processed)
+        if cat == SAC:
+            x_diff = self.sampleField('gaze_x', last, processed)-self.sampleField('gaze_x', run_starts, processed)
+            y_diff = self.sampleField('gaze_y', last, processed)-self.sampleField('gaze_y', run_starts, processed)
+            event_array['amplitude_x'] = x_diff
+            event_array['amplitude_y'] = y_diff
+            event_array['angle'] = np.rad2deg(np.arctan2(y_diff, x_diff))
+        else:
+            all_positions = np.arange(self.length)
+            for field in ('gaze_x', 'gaze_y', 'pupil_measure1'):
+                values = self.sampleField(field, all_positions, None)
+                event_array['average_'+field] = _runReduce(np.add, values, run_starts, next_starts)/(next_starts-run_starts)
+            event_array['average_pupil_measure1_type'] = event_array['end_pupil_measure1_type']
+        for field in ('velocity_x', 'velocity_y', 'velocity_xy'):
+            values = self.velocity[field]
+            event_array['average_'+field] = _runReduce(np.add, values, run_starts, next_starts)/(next_starts-run_starts)
+            event_array['peak_'+field] = _runReduce(np.maximum, values, run_starts, next_starts)
+        return event_array
+
+
+def _runReduce(ufunc, values, run_starts, run_ends):
+    """ufunc.reduce of values[run_starts[i]:run_ends[i]] for each run."""
+    indexes = np.empty(len(run_starts)*2, dtype=np.intp)
+    indexes[0::2] = run_starts
+    indexes[1::2] = run_ends
+    return ufunc.reduceat(values, indexes)[0::2]
+
+
+def adaptiveVelocityThresholds(velocity, buffer_length):
+    """
+    The adaptive velocity threshold EyeTrackerEventParser calculates for each
+    of the velocity values (of valid samples, in order). The threshold uses the
+    last buffer_length velocities > 0: starting with
+    PT = min + 3 * std, PT = mean + 3 * std of the velocities < PT is
+    repeated until PT changes by less than 1. It is NaN for a velocity <= 0,
+    or until buffer_length velocities > 0 have been seen before it.
+    """
+    velocity = np.asarray(velocity, dtype=np.float64)
+    thresholds = np.empty(len(velocity))
+    thresholds.fill(np.nan)
+    with np.errstate(invalid='ignore'):
+        positive = np.flatnonzero(velocity > 0.0)
+    if buffer_length <= 0 or len(positive) <= buffer_length:
+        return thresholds
+    # window w holds the velocities up to and including positive[w+buffer_length]
+    windows = eventfilters.slidingWindows(velocity[positive], buffer_length)[1:]
+    values = np.empty(len(windows))
+    block = max(_THRESHOLD_BLOCK_SIZE//buffer_length, 1)
+    for b in xrange(0, len(windows), block):
+        values[b:b+block] = _iterateThresholds(windows[b:b+block])
+    thresholds[positive[buffer_length:]] = values
+    return thresholds
+
+
+def _iterateThresholds(windows):
+    # the sums of the values (and squared values) below the threshold of
+    # each window give its mean and std without copying the values out.
+    w = np.ascontiguousarray(windows)
+    w2 = w*w
+    thresholds = np.empty(len(w))
+    pending = np.arange(len(w))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = w.mean(axis=1)
+        std = np.sqrt(np.maximum(np.einsum('ij->i', w2)/w.shape[1]-mean*mean, 0.0))
+        previous = w.min(axis=1)+std*3.0
+        while len(pending):
+            below = w < previous[:, np.newaxis]
+            count = below.sum(axis=1)
+            mean = np.einsum('ij,ij->i', w, below)/count
+            std = np.sqrt(np.maximum(np.einsum('ij,ij->i', w2, below)/count-mean*mean, 0.0))
+            current = mean+3.0*std
+            done = ~(np.abs(current-previous) >= 1.0)
+            thresholds[pending[done]] = current[done]
+            if done.any():
+                keep = ~done
+                pending = pending[keep]
+                w = w[keep]
+                w2 = w2[keep]
+                current = current[keep]
+            previous = current
+    return thresholds
@@ -129,6 +129,7 @@ Data is filtered once, similar to what a 'normal' filter level would be in the
   setting of eyelink<tm>.
 """
 
+import numpy as np
 import psychopy.iohub.devices.eventfilters as eventfilters
 from psychopy.iohub import EventConstants, DeviceEvent, print2err
 from collections import OrderedDict
@@ -183,9 +184,10 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
         else:
             vel_filter_class, vel_filter_kwargs = eventfilters.PassThroughFilter, {}
 
-        self.adaptive_x_vthresh_buffer = np.zeros(self.vel_thresh_history_dur*sampling_rate)
+        vthresh_buffer_length = int(self.vel_thresh_history_dur*sampling_rate)
+        self.adaptive_x_vthresh_buffer = np.zeros(vthresh_buffer_length)
         self.x_vthresh_buffer_index = 0
-        self.adaptive_y_vthresh_buffer = np.zeros(self.vel_thresh_history_dur*sampling_rate)
+        self.adaptive_y_vthresh_buffer = np.zeros(vthresh_buffer_length)
         self.y_vthresh_buffer_index = 0
 
         pos_filter_kwargs['event_type'] = MONOCULAR_EYE_SAMPLE
@@ -277,6 +279,22 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
 
         self.clearInputEvents()
 
+    def parseSampleArray(self, samples, first_event_id=None):
+        """
+        Parse a whole session's samples at once: samples is a numpy
+        structured array of binocular or monocular eye samples (for example
+        an ioDataStore eye sample table read with table.read()), in time
+        order.
+
+        Returns a dict of {event_type_id: structured numpy array} holding the
+        monocular samples and fixation, saccade and blink start / end events
+        that would be output if the samples were given to the parser one at
+        a time, with the same settings. The parser state is not changed.
+        See batchparser.parseSampleArray for details.
+        """
+        from psychopy.iohub.devices.eyetracker.filters.batchparser import parseSampleArray
+        return parseSampleArray(self, samples, first_event_id)
+
     def parseEvent(self, sample):
         if self._last_parser_sample:
             last_sec = self.getSampleEventCategory(self._last_parser_sample)
@@ -488,8 +506,8 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
     def _addVelocity(self, prev_event, current_event):
         io_ix = self.io_event_ix
 
-        dx = np_abs(current_event[io_ix('angle_x')] - prev_event[io_ix('angle_x')])
-        dy = np_abs(current_event[io_ix('angle_y')] - prev_event[io_ix('angle_y')])
+        dx = np.abs(current_event[io_ix('angle_x')] - prev_event[io_ix('angle_x')])
+        dy = np.abs(current_event[io_ix('angle_y')] - prev_event[io_ix('angle_y')])
         dt = current_event[io_ix('time')] - prev_event[io_ix('time')]
 
         current_event[io_ix('velocity_x')] = dx/dt
@@ -498,9 +516,10 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
 
     def _convertMonoFields(self, prev_event, current_event):
         if self.isValidSample(current_event):
-            self._convertPosToAngles(self, current_event)
+            self._convertPosToAngles(current_event)
             if prev_event:
                 self._addVelocity(prev_event, current_event)
+        return current_event
 
     def _convertToMonoAveraged(self, prev_event, current_event):
         mono_evt=[]
@@ -528,7 +547,7 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
                     # both eyes have missing data, so use data from left eye (does not really matter)
                     mono_evt.append(float(current_event[binoc_field_names.index('left_%s'%(field))]))
                 else:
-                    ValueError("Unknown Sample Status: %d"%(status))
+                    raise ValueError("Unknown Sample Status: %d"%(status))
         mono_evt[self.io_event_fields.index('type')] = EventConstants.MONOCULAR_EYE_SAMPLE
         if self.isValidSample(mono_evt):
             self._convertPosToAngles(mono_evt)
@@ -717,7 +736,7 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
                 sample[self.io_event_ix('time')]-existing_start_event[self.io_event_ix('time')],
                 xDiff,
                 yDiff,
-                rad2deg(arctan(yDiff, xDiff)),
+                np.rad2deg(np.arctan2(yDiff, xDiff)),
                 existing_start_event[gx],
                 existing_start_event[gy],
                 0.0,
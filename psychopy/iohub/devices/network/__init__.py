@@ -13,18 +13,15 @@ Distributed under the terms of the GNU General Public License
 """
 
 import gevent
+from gevent.event import Event
 import zmq.green as zmq
-import copy
-import msgpack
-try:
-    import msgpack_numpy as m
-    m.patch()
-except Exception:
-    pass
 
 from .. import Computer, Device, DeviceEvent
 from ...constants import DeviceConstants,EventConstants
 from ... import print2err,printExceptionDetailsToStdErr
+from ...eventbatches import (EXIT_TOPIC, PAYLOAD_MSGPACK, PAYLOAD_NUMPY, PAYLOAD_FORMATS,
+                             eventTopic, eventClassTopic, packEventBatch, unpackEventBatch,
+                             EventBatcher)
 
 class EventPublisher(Device):
     """
@@ -40,19 +37,17 @@ class EventPublisher(Device):
     connected RemoteEventSubscriber devices that have indicated interest in the
     event type being dispatched.
     """
-    _packer=msgpack.Packer()
-    pack=_packer.pack
-    _unpacker=msgpack.Unpacker(use_list=True)
-    unpack=_unpacker.unpack      
-    feed=_unpacker.feed
-
     _newDataTypes=[]    
     EVENT_CLASS_NAMES=[]    
     DEVICE_TYPE_ID=DeviceConstants.EVENTPUBLISHER
     DEVICE_LABEL = 'EVENTPUBLISHER'
-    __slots__=[e[0] for e in _newDataTypes]+['_zmq_context','_pub_socket','_sub_listener','_publishing_protocal','_sub_protocal']
+    __slots__=[e[0] for e in _newDataTypes]+['_zmq_context','_pub_socket','_sub_listener','_publishing_protocal','_sub_protocal',
+                                             '_batch_interval','_payload_format','_batcher','_batch_pending','_flusher']
     def __init__(self, *args,**kwargs):
         self._pub_socket=None
+        self._flusher=None
+        self._batcher=None
+        self._batch_pending=Event()
         try:            
             Device.__init__(self,*args,**kwargs['dconfig'])
             device_config=self.getConfiguration()
@@ -64,6 +59,16 @@ class EventPublisher(Device):
             self._pub_socket.setsockopt(zmq.LINGER, 0)
             self._publishing_protocal=device_config.get('publishing_protocal',"tcp://127.0.0.1:5555")
             self._pub_socket.bind(self._publishing_protocal)
+
+            # Events are sent one at a time unless batch_size is > 1, when
+            # events of each type are sent in batches of up to batch_size
+            # events; a batch is also sent when its oldest event has waited
+            # batch_interval sec.msec.
+            self._batcher=EventBatcher(self._sendBatch,device_config.get('batch_size',1))
+            self._batch_interval=device_config.get('batch_interval',0.001)
+            self._payload_format=PAYLOAD_FORMATS[device_config.get('payload_format','msgpack')]
+            if self._batcher.batch_size > 1:
+                self._flusher=gevent.spawn(self._flushBatches)
         except Exception, e:
             print2err("** Exception during EventPublisher.__init__: ",e)
             printExceptionDetailsToStdErr()
@@ -92,23 +97,48 @@ class EventPublisher(Device):
             #                 data[8] = confidence_interval, 
             #                 data[9] = delay, 
             #                 data[10] = filter_id, # always 0, not used currently
-    
-            event_array=copy.deepcopy(e)
-            event_array[0]=0
-            event_array[1]=0
-            event_array[2]=self.device_number
-            event_array[3] = 0
-            
+            #
+            # The event list is shared with the other event listeners, so
+            # a new list is created rather than changing the event in place.
+            event_array=[0,0,self.device_number,0]
+            event_array.extend(e[4:])
+
+            if self._batcher.add(e_id,event_array):
+                # wake the flusher to send the batch after batch_interval
+                self._batch_pending.set()
+
+    def _sendBatch(self,event_type_id,events):
+        if self._pub_socket is not None:
+            self._pub_socket.send_multipart([eventTopic(event_type_id),self._payload_format,
+                                             packEventBatch(event_type_id,events,self._payload_format)],
+                                            0,copy=False)
+
+    def _flushBatches(self):
+        """
+        Send the pending batches of events batch_interval sec.msec after the
+        first of them was added, so no event waits longer than that to be
+        published. Sleeps until an event is left waiting in a batch.
+        """
+        while self._pub_socket is not None:
+            self._batch_pending.wait()
+            gevent.sleep(self._batch_interval)
+            self._batch_pending.clear()
+            try:
+                self._batcher.flush()
+            except zmq.ZMQError:
+                break
+            except Exception:
+                printExceptionDetailsToStdErr()
 
-            # send event to subscribers        
-            # 
-            self._pub_socket.send_multipart([EventConstants.getClass(e_id).__name__,self.pack(event_array)], 0)
- 
     def _close(self):
         if self._pub_socket is not None:
-            self._pub_socket.send_multipart([u'EXIT',''])
+            if self._batcher:
+                self._batcher.flush()
+            self._pub_socket.send_multipart([EXIT_TOPIC,'',''])
             self._pub_socket.close()
             self._pub_socket=None
+            # let the flusher see that the socket is closed
+            self._batch_pending.set()
             Device._close(self)
 
     def __del__(self):
@@ -150,12 +180,6 @@ class RemoteEventSubscriber(Device):
                 evt_type=event.type,evt_time=event.time,evt_delay=event.delay)
             
     """
-    _packer=msgpack.Packer()
-    pack=_packer.pack
-    _unpacker=msgpack.Unpacker(use_list=True)
-    unpack=_unpacker.unpack      
-    feed=_unpacker.feed
-
     _newDataTypes=[]    
     EVENT_CLASS_NAMES=[]    
     DEVICE_TYPE_ID=DeviceConstants.REMOTEEVENTSUBSCRIBER
@@ -174,14 +198,15 @@ class RemoteEventSubscriber(Device):
             
                 self._subscription_filter=device_config.get('monitor_event_types',[u''])
     
-                # If sub channel is filtering by category / event type, then auto add
-                # the EXIT category to the sub channels filter list of categories to include.
+                # Subscribe to the topic of each event type, and the EXIT
+                # topic; an empty filter subscribes to all topics.
                 #
                 if len(self._subscription_filter)>0 and self._subscription_filter[0]!='':  
-                    self._sub_socket.setsockopt_string(zmq.SUBSCRIBE, u'EXIT')
-            
-                for sf in self._subscription_filter:
-                    self._sub_socket.setsockopt_string(zmq.SUBSCRIBE, sf)
+                    self._sub_socket.setsockopt(zmq.SUBSCRIBE, EXIT_TOPIC)
+                    for sf in self._subscription_filter:
+                        self._sub_socket.setsockopt(zmq.SUBSCRIBE, eventClassTopic(sf))
+                else:
+                    self._sub_socket.setsockopt(zmq.SUBSCRIBE, '')
                 self._sub_socket.connect(self._subscription_protocal)
     
                 self._time_sync_manager=None
@@ -221,30 +246,36 @@ class RemoteEventSubscriber(Device):
         self._running=True
         while self._running is True and self._time_sync_manager:
             try:
-                category,data=self._sub_socket.recv_multipart(0)
+                topic,payload_format,payload=self._sub_socket.recv_multipart(0,copy=False)
                 logged_time=Computer.currentSec()
-                if category == u'EXIT':
+                topic=topic.bytes
+                if topic == EXIT_TOPIC:
                     self._running=False
                     break
-                self.feed(data)
-                data=self.unpack()
-                network_delay=0.0
+                if payload_format.bytes == PAYLOAD_NUMPY:
+                    payload=payload.buffer
+                else:
+                    payload=payload.bytes
+                events=unpackEventBatch(ord(topic),payload_format.bytes,payload)
 
-                data[0]=0
-                data[1]=0
-                data[3]=Computer._getNextEventID() #set event id
-                network_delay=0.0
-                
                 if time_sync_manager:
-                    remote_logged_time=data[6]
-                    data[6]=logged_time #update logged time
-                    remote_hub_time=data[7]
-                    data[7]=time_sync_state.remote2LocalTime(remote_hub_time)
-                    data[8]=time_sync_state.getAccuracy()*2.0 
-                    network_delay=time_sync_state.local2RemoteTime(logged_time)-remote_logged_time
-                    data[9]+=network_delay
+                    remote2LocalTime=time_sync_state.remote2LocalTime
+                    accuracy=time_sync_state.getAccuracy()*2.0
+                    logged_remote_time=time_sync_state.local2RemoteTime(logged_time)
+
+                for data in events:
+                    data[0]=0
+                    data[1]=0
+                    data[3]=Computer._getNextEventID() #set event id
+
+                    if time_sync_manager:
+                        network_delay=logged_remote_time-data[6]
+                        data[6]=logged_time #update logged time
+                        data[7]=remote2LocalTime(data[7])
+                        data[8]=accuracy
+                        data[9]+=network_delay
 
-                self._nativeEventCallback(data)
+                    self._nativeEventCallback(data)
                 gevent.sleep(0)
             except zmq.ZMQError,z:
                 break
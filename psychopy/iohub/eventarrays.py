@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/eventarrays.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+Columnar (one numpy structured array per event type) representation of ioHub
+events, used by ioHubConnection.getEvents(as_type='numpy').
+
+Each array uses the NUMPY_DTYPE of the event's DeviceEvent class, so a
+column of the array can be accessed by event attribute name, for example
+arrays[EventConstants.MOUSE_MOVE]['x_position'].
+
+The arrays are filled a column (event attribute) at a time. On the wire an
+array is sent as [event_type_id, event_count, raw_bytes], so the receiver
+only needs the event type id to know the dtype of the data and creates no
+per event objects.
+"""
+from itertools import izip
+
+import numpy as N
+
+from .devices import DeviceEvent
+
+EVENT_TYPE_ID_INDEX=DeviceEvent.EVENT_TYPE_ID_INDEX
+
+
+def eventsToArrays(events, getEventClass):
+    """
+    Convert a list of events (each an ordered list or tuple of attribute
+    values) to a dict of {event_type_id: structured numpy array}. Events keep
+    their relative order within each array.
+
+    getEventClass(event_type_id) must return the DeviceEvent class of the
+    type id (i.e. EventConstants.getClass).
+    """
+    grouped={}
+    for e in events:
+        etype=e[EVENT_TYPE_ID_INDEX]
+        rows=grouped.get(etype)
+        if rows is None:
+            rows=grouped[etype]=[]
+        rows.append(e)
+    arrays={}
+    for etype,rows in grouped.iteritems():
+        dtype=getEventClass(etype).NUMPY_DTYPE
+        a=N.zeros(len(rows),dtype=dtype)
+        for name,column in izip(dtype.names,izip(*rows)):
+            a[name]=column
+        arrays[etype]=a
+    return arrays
+
+
+def packEventArrays(arrays):
+    """
+    Return the wire format of a dict of event arrays: a list of
+    [event_type_id, event_count, raw_bytes] entries.
+    """
+    return [[etype,len(a),a.tostring()] for etype,a in arrays.iteritems()]
+
+
+def unpackEventArrays(packed, getEventClass):
+    """
+    Inverse of packEventArrays, returns a dict of
+    {event_type_id: structured numpy array}.
+    """
+    arrays={}
+    for etype,count,data in packed:
+        dtype=getEventClass(etype).NUMPY_DTYPE
+        arrays[etype]=N.frombuffer(data,dtype=dtype,count=count).copy()
+    return arrays
+
+
+def mergeEventArrays(*array_dicts):
+    """
+    Combine dicts of event arrays, concatenating the arrays of event types
+    found in more than one dict (in the order the dicts are given).
+    """
+    merged={}
+    for arrays in array_dicts:
+        for etype,a in arrays.iteritems():
+            if etype in merged:
+                merged[etype]=N.concatenate((merged[etype],a))
+            else:
+                merged[etype]=a
+    return merged
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/eventbatches.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+Message format and batching of the events sent by an EventPublisher device
+to RemoteEventSubscriber devices. Kept separate from the devices (which
+need zmq and gevent) so it can be used and tested on its own.
+
+Each message is:
+
+  [topic, payload_format, payload]
+
+topic is the event type id of the events in the message as one byte, so a
+subscriber can subscribe to event types by id. The EXIT topic (event type
+id 0 is never used) is sent when the publisher closes. payload_format is
+PAYLOAD_MSGPACK, for a msgpack'ed list of event lists, or PAYLOAD_NUMPY, for
+the raw bytes of a numpy array of the events using the event class
+NUMPY_DTYPE.
+"""
+import msgpack
+import numpy as N
+try:
+    import msgpack_numpy as m
+    m.patch()
+except Exception:
+    pass
+
+from .constants import EventConstants
+from . import convertCamelToSnake
+
+EXIT_TOPIC='\x00'
+PAYLOAD_MSGPACK='m'
+PAYLOAD_NUMPY='n'
+PAYLOAD_FORMATS={'msgpack':PAYLOAD_MSGPACK,'numpy':PAYLOAD_NUMPY}
+
+def eventTopic(event_type_id):
+    return chr(event_type_id)
+
+def eventClassTopic(event_class_name):
+    """
+    The topic of an event class name as used in monitor_event_types,
+    e.g. 'KeyboardPressEvent'.
+    """
+    return eventTopic(getattr(EventConstants,convertCamelToSnake(event_class_name[:-5],False)))
+
+def packEventBatch(event_type_id,events,payload_format=PAYLOAD_MSGPACK):
+    """
+    Return the payload of a message with the given events, all of type
+    event_type_id. A PAYLOAD_NUMPY payload is a numpy array, which zmq
+    sends without copying it.
+    """
+    if payload_format == PAYLOAD_NUMPY:
+        return N.array([tuple(e) for e in events],EventConstants.getClass(event_type_id).NUMPY_DTYPE)
+    return msgpack.packb(events)
+
+def unpackEventBatch(event_type_id,payload_format,payload):
+    """
+    Return the list of event lists in a message payload. payload can be
+    any object supporting the buffer interface.
+    """
+    if payload_format == PAYLOAD_NUMPY:
+        events=N.frombuffer(payload,EventConstants.getClass(event_type_id).NUMPY_DTYPE)
+        return [list(e) for e in events.tolist()]
+    return msgpack.unpackb(payload,use_list=True)
+
+
+class EventBatcher(object):
+    """
+    Groups events by event type id into batches of up to batch_size events.
+    send(event_type_id, events) is called with each batch when it is full,
+    or when flush() is called. With a batch_size of 1 every event is sent
+    as soon as it is added.
+    """
+    def __init__(self, send, batch_size=1):
+        self._send=send
+        self.batch_size=max(1,batch_size)
+        self._batches=dict()
+
+    @property
+    def pending(self):
+        """Number of events waiting in partly filled batches."""
+        return sum(len(b) for b in self._batches.itervalues())
+
+    def add(self, event_type_id, event):
+        """
+        Add an event to the batch of its type, sending the batch if it is
+        full. Returns True if the event is left waiting to be sent (so a
+        flush() is needed), otherwise False.
+        """
+        if self.batch_size == 1:
+            self._send(event_type_id,[event])
+            return False
+        batch=self._batches.get(event_type_id)
+        if batch is None:
+            batch=self._batches[event_type_id]=[]
+        batch.append(event)
+        if len(batch) >= self.batch_size:
+            self._send(event_type_id,self._batches.pop(event_type_id))
+            return False
+        return True
+
+    def flush(self):
+        """Send every partly filled batch."""
+        for event_type_id in self._batches.keys():
+            events=self._batches.pop(event_type_id,None)
+            if events:
+                self._send(event_type_id,events)
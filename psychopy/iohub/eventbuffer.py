@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/eventbuffer.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+Bounded event buffer used for the ioHub Server's global event buffer and each
+Device's event buffer.
+
+Events (ordered lists of attribute values) are kept in one run per
+(event type, filter id), each ordered by event hub time. The runs are k-way
+merged when events are read, so the events returned are time ordered without
+sorting the buffer, and the cost of reading or clearing events is
+proportional to the number of events read, not to the size of the buffer.
+Events can also be read by hub time range.
+
+When the buffer is full, adding an event drops the oldest event, and the
+number of events dropped is counted by event type.
+"""
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from itertools import izip, repeat, count
+
+from .constants import EVENT_TYPE_ID_INDEX, EVENT_HUB_TIME_INDEX, EVENT_FILTER_ID_INDEX
+
+
+class _EventRun(object):
+    """
+    The events of one (event type, filter id), ordered by hub time, in a list
+    that events are removed from the front of by moving a start index. The
+    removed slots are deleted once they are half of the list.
+    """
+    __slots__=['times','events','start']
+    def __init__(self):
+        self.times=[]
+        self.events=[]
+        self.start=0
+
+    def __len__(self):
+        return len(self.times)-self.start
+
+    def append(self, event_time, event):
+        times=self.times
+        if len(times) > self.start and event_time < times[-1]:
+            # rare; keep the run time ordered
+            i=bisect_right(times,event_time,self.start)
+            times.insert(i,event_time)
+            self.events.insert(i,event)
+        else:
+            times.append(event_time)
+            self.events.append(event)
+
+    def oldestTime(self):
+        return self.times[self.start]
+
+    def popOldest(self):
+        self.removeBefore(self.start+1)
+
+    def removeBefore(self, index):
+        """Remove the events before list index 'index'."""
+        self.start=index
+        if self.start*2 >= len(self.times):
+            del self.times[:self.start]
+            del self.events[:self.start]
+            self.start=0
+
+    def removeRange(self, lo, hi):
+        if lo == self.start:
+            self.removeBefore(hi)
+        else:
+            del self.times[lo:hi]
+            del self.events[lo:hi]
+
+    def indexRange(self, start_time=None, end_time=None):
+        """List index range (lo, hi) of the events with start_time <= time <= end_time."""
+        lo=self.start
+        hi=len(self.times)
+        if start_time is not None:
+            lo=bisect_left(self.times,start_time,lo,hi)
+        if end_time is not None:
+            hi=bisect_right(self.times,end_time,lo,hi)
+        return lo,hi
+
+
+class TimeOrderedEventBuffer(object):
+    """
+    Holds up to max_length events in total (None for no limit), and up to
+    max_run_length events of each event type and filter id (None for no
+    limit). Iterating over the buffer gives the events in hub time order.
+    """
+    def __init__(self, max_length=None, max_run_length=None):
+        self.max_length=max_length
+        self.max_run_length=max_run_length
+        self._runs={}
+        self._length=0
+        self._dropped={}
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self.getEvents())
+
+    def append(self, event):
+        key=(event[EVENT_TYPE_ID_INDEX],event[EVENT_FILTER_ID_INDEX])
+        run=self._runs.get(key)
+        if run is None:
+            run=self._runs[key]=_EventRun()
+        run.append(event[EVENT_HUB_TIME_INDEX],event)
+        self._length+=1
+        if self.max_run_length is not None and len(run) > self.max_run_length:
+            self._dropOldest(key,run)
+        if self.max_length is not None and self._length > self.max_length:
+            key,run=min(((k,r) for k,r in self._runs.iteritems() if len(r)),
+                        key=lambda kr: kr[1].oldestTime())
+            self._dropOldest(key,run)
+
+    def extend(self, events):
+        for e in events:
+            self.append(e)
+
+    def _dropOldest(self, key, run):
+        run.popOldest()
+        self._length-=1
+        self._dropped[key[0]]=self._dropped.get(key[0],0)+1
+
+    def _selectRuns(self, event_type=None, filter_id=None):
+        if not event_type and not filter_id:
+            return [(k,r) for k,r in self._runs.iteritems() if len(r)]
+        return [(k,r) for k,r in self._runs.iteritems() if len(r) and
+                (not event_type or k[0] == event_type) and
+                (not filter_id or k[1] == filter_id)]
+
+    def getEvents(self, event_type=None, filter_id=None, start_time=None, end_time=None, clear=False):
+        """
+        Return the events of event_type (all types if None) and filter_id
+        (any filter id if None) with start_time <= hub time <= end_time (an
+        open range for None), ordered by hub time. If clear is True, the
+        events returned are removed from the buffer.
+        """
+        slices=[]
+        for key,run in self._selectRuns(event_type,filter_id):
+            lo,hi=run.indexRange(start_time,end_time)
+            if hi > lo:
+                slices.append((run,lo,hi))
+
+        if len(slices) == 1:
+            run,lo,hi=slices[0]
+            events=run.events[lo:hi]
+        else:
+            # k-way merge of the time ordered runs; the run and position
+            # break time ties so events are never compared.
+            merged=merge(*[izip(run.times[lo:hi],repeat(i),count(),run.events[lo:hi])
+                           for i,(run,lo,hi) in enumerate(slices)])
+            events=[m[3] for m in merged]
+
+        if clear:
+            for run,lo,hi in slices:
+                run.removeRange(lo,hi)
+            self._length-=len(events)
+        return events
+
+    def getEventsByType(self):
+        """Dict of {event_type: tuple of the events of the type}."""
+        event_types=set(key[0] for key,run in self._selectRuns())
+        return dict((etype,tuple(self.getEvents(etype))) for etype in event_types)
+
+    def clear(self, event_type=None, filter_id=None):
+        """Remove the events of event_type and filter_id (all events if both are None)."""
+        if not event_type and not filter_id:
+            self._runs.clear()
+            self._length=0
+            return
+        for key,run in self._selectRuns(event_type,filter_id):
+            self._length-=len(run)
+            del self._runs[key]
+
+    def getDroppedCounts(self):
+        """Dict of {event_type: number of events dropped because the buffer was full}."""
+        return dict(self._dropped)
+
+    @property
+    def dropped(self):
+        """Total number of events dropped because the buffer was full."""
+        return sum(self._dropped.itervalues())
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/eventring.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+Shared memory event transport between the ioHub Process and the PsychoPy
+Process, for when both run on the same computer.
+
+The ioHub Process (the single producer) writes each event, packed with
+msgpack, into a ring buffer in a memory mapped file. The PsychoPy Process
+(the single consumer) reads all the events written since it last looked,
+without sending a request to the ioHub Process. The header holds two
+monotonically increasing byte counters, the total written and the total
+read; each is only ever written by one side, so no locking is needed. The
+producer copies an event into the ring before it advances the written
+counter, and the consumer copies events out before it advances the read
+counter.
+"""
+
+import os
+import sys
+import mmap
+import ctypes
+import struct
+import tempfile
+
+import msgpack
+try:
+    import msgpack_numpy as m
+    m.patch()
+except Exception:
+    pass
+
+RING_MAGIC = 'IOHRING1'
+# header layout (byte offsets); the two counters are on separate cache lines
+_CAPACITY_OFFSET = 8
+_WRITTEN_OFFSET = 64
+_READ_OFFSET = 128
+_PENDING_OFFSET = 192  # events waiting in the ioHub eventBuffer instead
+_DROPPED_OFFSET = 200  # events lost because the eventBuffer was full too
+HEADER_SIZE = 256
+
+DEFAULT_RING_SIZE = 4 * 1024 * 1024
+
+
+def createRingFile(size=DEFAULT_RING_SIZE, directory=None):
+    """
+    Create (and zero) a file to be memory mapped by SharedEventRing
+    instances, returning its path. On Linux the file is created in /dev/shm
+    (when it exists) so that it is never written to disk.
+    """
+    if directory is None and sys.platform.startswith('linux') and \
+            os.path.isdir('/dev/shm'):
+        directory = '/dev/shm'
+    fd, path = tempfile.mkstemp(prefix='iohub_events_', suffix='.ring',
+                                dir=directory)
+    with os.fdopen(fd, 'r+b') as f:
+        f.truncate(HEADER_SIZE + size)
+        f.write(RING_MAGIC)
+        f.seek(_CAPACITY_OFFSET)
+        f.write(struct.pack('<Q', size))
+    return path
+
+
+class SharedEventRing(object):
+    """
+    One end of a single producer / single consumer ring buffer of packed
+    ioHub events, backed by the memory mapped file at `path` (see
+    createRingFile).
+
+    The ioHub Process uses write(), the PsychoPy Process uses read().
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        if self._mmap[:len(RING_MAGIC)] != RING_MAGIC:
+            self.close()
+            raise ValueError('%s is not an ioHub event ring file' % path)
+        self.capacity = ctypes.c_uint64.from_buffer(self._mmap,
+                                                    _CAPACITY_OFFSET).value
+        # aligned 8 byte counters, each updated with a single store
+        self._written = ctypes.c_uint64.from_buffer(self._mmap,
+                                                    _WRITTEN_OFFSET)
+        self._read = ctypes.c_uint64.from_buffer(self._mmap, _READ_OFFSET)
+        self._pending = ctypes.c_uint64.from_buffer(self._mmap,
+                                                    _PENDING_OFFSET)
+        self._dropped = ctypes.c_uint64.from_buffer(self._mmap,
+                                                    _DROPPED_OFFSET)
+        self._packer = msgpack.Packer()
+        self._unpacker = msgpack.Unpacker(use_list=True)
+
+    def _getPending(self):
+        return self._pending.value
+
+    def _setPending(self, value):
+        self._pending.value = value
+
+    pending = property(_getPending, _setPending, doc="""
+        Number of events the ioHub Process is holding in its own event
+        buffer (because the ring was full), which must be requested
+        over UDP. Set by the producer.""")
+
+    def _getDropped(self):
+        return self._dropped.value
+
+    def _setDropped(self, value):
+        self._dropped.value = value
+
+    dropped = property(_getDropped, _setDropped, doc="""
+        Number of events the ioHub Process has dropped from its event
+        buffer while the ring was full, so that they were never read by
+        the consumer. Set by the producer.""")
+
+    @property
+    def written(self):
+        """Total number of bytes written to the ring so far."""
+        return self._written.value
+
+    def freeSpace(self):
+        return self.capacity - (self._written.value - self._read.value)
+
+    def write(self, event):
+        """
+        Producer side: pack `event` and add it to the ring. Returns False
+        (and writes nothing) if there is not enough free space.
+        """
+        return self.writePacked(self._packer.pack(event))
+
+    def writePacked(self, data):
+        """
+        Producer side: add already packed event data (one or more complete
+        msgpack objects) to the ring. Returns False if it does not fit.
+        """
+        nBytes = len(data)
+        written = self._written.value
+        if nBytes > self.capacity - (written - self._read.value):
+            return False
+        start = HEADER_SIZE + written % self.capacity
+        end = start + nBytes
+        ringEnd = HEADER_SIZE + self.capacity
+        if end <= ringEnd:
+            self._mmap[start:end] = data
+        else:
+            split = ringEnd - start
+            self._mmap[start:ringEnd] = data[:split]
+            self._mmap[HEADER_SIZE:HEADER_SIZE + nBytes - split] = \
+                data[split:]
+        # publish the event only once it has been copied
+        self._written.value = written + nBytes
+        return True
+
+    def read(self):
+        """
+        Consumer side: return a list of all the events written since the
+        last read (oldest first).
+        """
+        written = self._written.value
+        read = self._read.value
+        nBytes = written - read
+        if nBytes == 0:
+            return []
+        start = HEADER_SIZE + read % self.capacity
+        end = start + nBytes
+        ringEnd = HEADER_SIZE + self.capacity
+        if end <= ringEnd:
+            data = self._mmap[start:end]
+        else:
+            data = (self._mmap[start:ringEnd] +
+                    self._mmap[HEADER_SIZE:HEADER_SIZE + end - ringEnd])
+        # the space can be reused once it has been copied
+        self._read.value = written
+        self._unpacker.feed(data)
+        return list(self._unpacker)
+
+    def discard(self, written):
+        """
+        Consumer side: skip the events that had been written when the
+        written counter was `written` (as returned by the producer's
+        `written`), without reading them. Events written after that are
+        kept.
+        """
+        if written > self._read.value:
+            self._read.value = written
+
+    def close(self):
+        # the ctypes views must be released before the mmap can be closed
+        self._written = self._read = self._pending = self._dropped = None
+        try:
+            if self._mmap is not None:
+                self._mmap.close()
+        except Exception:
+            pass
+        self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
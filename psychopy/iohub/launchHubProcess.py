@@ -56,7 +56,7 @@ def run(rootScriptPathDir,configFilePath):
             for m in s.deviceMonitors:
                 m.start()
     
-            gevent.spawn(s.processEventsTasklet, 0.01)
+            gevent.spawn(s.processEventsTasklet, s.processEventsInterval())
 
             sys.stdout.write("IOHUB_READY\n\r\n\r")
 
@@ -75,7 +75,7 @@ def run(rootScriptPathDir,configFilePath):
             for m in s.deviceMonitors:
                 m.start()
                 glets.append(m)
-            glets.append(gevent.spawn(s.processEventsTasklet,0.01))
+            glets.append(gevent.spawn(s.processEventsTasklet,s.processEventsInterval()))
     
             sys.stdout.write("IOHUB_READY\n\r\n\r")
             sys.stdout.flush()
@@ -19,6 +19,7 @@ except Exception:
     pass
 import struct
 from weakref import proxy
+import numpy
 from psychopy.iohub.util import NumPyRingBuffer as RingBuffer
 from psychopy.iohub import print2err, printExceptionDetailsToStdErr
 getTime=Computer.getTime
@@ -129,6 +130,11 @@ class ioHubTimeSyncConnection(UDPClientConnection):
         self.sync_batch_size=5
     
     def sync(self):
+        """
+        Send sync_batch_size time sync requests to the remote ioHub Server,
+        one at a time. Returns a list of (local_send_time, remote_time,
+        local_receive_time) tuples, one for each request.
+        """
         sync_count=self.sync_batch_size
         sync_data=['SYNC_REQ',]
 
@@ -141,11 +147,8 @@ class ioHubTimeSyncConnection(UDPClientConnection):
 
         remote_address=self.remote_iohub_address
         sendto=self.sock.sendto
-        
-        min_delay=1000.0
-        min_local_time=0.0
-        min_remote_time=0.0
-                
+
+        round_trips=[]
         for s in xrange(sync_count):
             # send sync request
             sync_start=Computer.currentSec()
@@ -156,16 +159,9 @@ class ioHubTimeSyncConnection(UDPClientConnection):
             feed(recvfrom(rcvBufferLength)[0])
             sync_rep,remote_time=unpack()
             sync_end=Computer.currentSec()
-            rtt=sync_end-(sync_start+sync_start2)/2.0
+            round_trips.append(((sync_start+sync_start2)/2.0,remote_time,sync_end))
 
-            old_delay=min_delay
-            min_delay=min(min_delay,rtt)
-            
-            if old_delay!=min_delay:
-                min_local_time=(sync_end+sync_start)/2.0
-                min_remote_time=remote_time
-                
-        return min_delay, min_local_time, min_remote_time
+        return round_trips
 
 class ioHubTimeGreenSyncManager(Greenlet):
     """
@@ -192,9 +188,8 @@ class ioHubTimeGreenSyncManager(Greenlet):
             
     def _run(self):
         self._running=True
-        while self._sync(False) is False:
+        while self._sync() is False:
             sleep(0.5)
-        self._sync(False)
         while self._running is True:
             sleep(self.initial_sync_interval)
             r=self._sync()
@@ -202,25 +197,10 @@ class ioHubTimeGreenSyncManager(Greenlet):
                 print2err("SYNC FAILED: ioHubTimeGreenSyncManager {0}.".format(self._remote_address))              
         self._close()
         
-    def _sync(self,calc_drift_and_offset=True):
+    def _sync(self):
         try:
             if self._sync_socket:
-                min_delay, min_local_time, min_remote_time=self._sync_socket.sync()     
-                sync_state_target=self.sync_state_target
-                sync_state_target.RTTs.append(min_delay)
-                sync_state_target.L_times.append(min_local_time)
-                sync_state_target.R_times.append(min_remote_time)
-                
-                if calc_drift_and_offset is True:
-                    l1=sync_state_target.L_times[-2]
-                    l2=sync_state_target.L_times[-1]
-                    r1=sync_state_target.R_times[-2]
-                    r2=sync_state_target.R_times[-1]
-                    self.sync_state_target.drifts.append((r2-r1)/(l2-l1))
-        
-                    l=sync_state_target.L_times[-1]
-                    r=sync_state_target.R_times[-1]
-                    self.sync_state_target.offsets=(r-l)
+                self.sync_state_target.addRoundTrips(self._sync_socket.sync())
                 return True
         except Exception, e:
             return False            
@@ -245,24 +225,9 @@ class ioHubTimeSyncManager(object):
         self._sync_socket=ioHubTimeSyncConnection(remote_address)
         self.sync_state_target=proxy(sync_state_target)
         
-    def sync(self,calc_drift_and_offset=True):
+    def sync(self):
         if self._sync_socket:
-            min_delay, min_local_time, min_remote_time=self._sync_socket.sync()     
-            sync_state_target=self.sync_state_target
-            sync_state_target.RTTs.append(min_delay)
-            sync_state_target.L_times.append(min_local_time)
-            sync_state_target.R_times.append(min_remote_time)
-            
-            if calc_drift_and_offset is True:
-                l1=sync_state_target.L_times[-2]
-                l2=sync_state_target.L_times[-1]
-                r1=sync_state_target.R_times[-2]
-                r2=sync_state_target.R_times[-1]
-                self.sync_state_target.drifts.append((r2-r1)/(l2-l1))
-    
-                l=sync_state_target.L_times[-1]
-                r=sync_state_target.R_times[-1]
-                self.sync_state_target.offsets=(r-l)
+            self.sync_state_target.addRoundTrips(self._sync_socket.sync())
 
     def close(self):           
         if self._sync_socket:        
@@ -275,36 +240,114 @@ class ioHubTimeSyncManager(object):
 
 class TimeSyncState(object):
     """
-    Container class used by an ioHubSyncManager to hold the data necessary to
-    calculate the current time base offset and drift between an ioHub Server
-    and a ioHubRemoteEventSubscriber client.
+    Estimates the relation between the local and a remote time base, used by
+    an ioHubSyncManager to convert the times of events received by a
+    ioHubRemoteEventSubscriber client.
+
+    Each time sync round trip sent at local time ls, answered with remote
+    time r and received at local time lr gives a sample of the remote time
+    at local time (ls+lr)/2, with an error of at most (lr-ls)/2 depending on
+    how the round trip time was split between the two directions. The last
+    window_length round trips are kept; round trips longer than the
+    rtt_percentile percentile of the window are discarded as outliers and
+    the remaining samples are fit by least squares to:
+
+        remote_time = local_time + offset + (drift-1.0)*(local_time-ref_time)
+
+    where ref_time is the mean local time of the samples. Since the fit
+    changes a little with each new round trip, converted times do not jump
+    when the state is updated, and the drift between the two clocks is
+    accounted for.
     """
-    RTTs=RingBuffer(10)
-    L_times=RingBuffer(10)
-    R_times=RingBuffer(10)
-    drifts=RingBuffer(20)
-    offsets=RingBuffer(20)
-    
+    def __init__(self,window_length=256,rtt_percentile=50.0):
+        self.rtt_percentile=rtt_percentile
+        self.RTTs=RingBuffer(window_length,dtype=numpy.float64)
+        self.L_times=RingBuffer(window_length,dtype=numpy.float64)
+        self.R_times=RingBuffer(window_length,dtype=numpy.float64)
+        self._fit=None
+
+    def addRoundTrips(self,round_trips):
+        """
+        Add (local_send_time, remote_time, local_receive_time) round trips, as
+        returned by ioHubTimeSyncConnection.sync(), and update the fit.
+        """
+        for local_send_time,remote_time,local_receive_time in round_trips:
+            self.RTTs.append(local_receive_time-local_send_time)
+            self.L_times.append((local_send_time+local_receive_time)/2.0)
+            self.R_times.append(remote_time)
+        self._fit=self._fitSamples()
+
+    def _fitSamples(self):
+        """
+        (ref_time, offset, drift, residual_std, count, sxx, rtt) of the
+        least squares fit of the round trips within the rtt_percentile.
+        """
+        if len(self.RTTs) == 0:
+            return None
+        rtts=self.RTTs.getElements()
+        kept=rtts <= numpy.percentile(rtts,self.rtt_percentile)
+        rtts=rtts[kept]
+        local_times=self.L_times.getElements()[kept]
+        # fit the remote - local time difference, which is small compared to
+        # the times, to keep the full float64 precision
+        diffs=self.R_times.getElements()[kept]-local_times
+        count=len(local_times)
+        ref_time=local_times.mean()
+        dx=local_times-ref_time
+        sxx=numpy.dot(dx,dx)
+        offset=diffs.mean()
+        slope=numpy.dot(dx,diffs-offset)/sxx if sxx > 0.0 else 0.0
+        residual_std=0.0
+        if count > 2:
+            residuals=diffs-offset-slope*dx
+            residual_std=numpy.sqrt(numpy.dot(residuals,residuals)/(count-2))
+        return ref_time,offset,1.0+slope,residual_std,count,sxx,numpy.median(rtts)
+
     def getDrift(self):
         """
-        Current drift between two time bases.
+        Current drift between two time bases: the remote time elapsed per
+        local sec.msec.
         """
-        return self.drifts.mean()
+        if self._fit is None:
+            return 1.0
+        return self._fit[2]
         
-    def getOffset(self):
+    def getOffset(self,local_time=None):
         """
-        Current offset between two time bases.
+        Current offset between two time bases (remote time - local time) at
+        local_time, which defaults to the current local time.
         """
-        return self.offsets.mean()
+        if self._fit is None:
+            return 0.0
+        if local_time is None:
+            local_time=Computer.currentSec()
+        ref_time,offset,drift=self._fit[:3]
+        return offset+(drift-1.0)*(local_time-ref_time)
 
     def getAccuracy(self):
         """
         Current accuracy of the time syncronization, as calculated as the 
-        average of the last 10 round trip time sync request - response delays
-        divided by two.
+        median of the round trip time sync request - response delays used by
+        the fit divided by two. This is the largest error caused by an
+        asymmetric split of the round trip time.
         """
-        return self.RTTs.mean()/2.0
-        
+        if self._fit is None:
+            return numpy.NaN
+        return self._fit[6]/2.0
+
+    def getError(self,local_time=None):
+        """
+        Standard error of the fitted remote time at local_time, which
+        defaults to the current local time.
+        """
+        if self._fit is None:
+            return numpy.NaN
+        if local_time is None:
+            local_time=Computer.currentSec()
+        ref_time,offset,drift,residual_std,count,sxx=self._fit[:6]
+        dx2=(local_time-ref_time)**2
+        return residual_std*numpy.sqrt(1.0/count+(dx2/sxx if sxx > 0.0 else 0.0))
+
     def local2RemoteTime(self,local_time=None):
         """
         Converts a local time (sec.msec format) to the corresponding remote
@@ -312,11 +355,24 @@ class TimeSyncState(object):
         """        
         if local_time is None:
             local_time=Computer.currentSec()
-        return self.getDrift()*local_time+self.getOffset()
+        return local_time+self.getOffset(local_time)
           
     def remote2LocalTime(self,remote_time):
         """
         Converts a remote computer time (sec.msec format) to the corresponding local
         time, using the current offset and drift measures.       
         """
-        return (remote_time-self.getOffset())/self.getDrift()
\ No newline at end of file
+        if self._fit is None:
+            return remote_time
+        ref_time,offset,drift=self._fit[:3]
+        # remote_time=ref_time+offset+drift*(local_time-ref_time)
+        return ref_time+(remote_time-ref_time-offset)/drift
+
+    def remote2LocalTimeWithError(self,remote_time):
+        """
+        Converts a remote computer time (sec.msec format) to the corresponding
+        local time, returning the (local_time, error) tuple, where error is
+        the standard error of the fit at local_time.
+        """
+        local_time=self.remote2LocalTime(remote_time)
+        return local_time,self.getError(local_time)
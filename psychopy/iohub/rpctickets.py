@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/rpctickets.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+Asynchronous (ticket based) requests from the PsychoPy Process to the ioHub
+Process.
+
+Instead of blocking until the ioHub Process replies, a request is sent
+wrapped as ('IOHUB_TICKET', ticket_id, request) and an RPCTicket is returned
+right away, so several requests can be in flight at once. The ioHub Process
+wraps its reply as ('IOHUB_TICKET_REPLY', ticket_id, reply), which is matched
+to the ticket when it is received. A request that has not been answered
+within its timeout is sent again (with the same ticket id, so the ioHub
+Process replies to it without running it twice); once all the retries have
+been used the ticket fails with an RPCTimeoutError.
+
+The ioHub Process only remembers the last TICKET_REPLY_CACHE_SIZE tickets, so
+at most MAX_PENDING_TICKETS are kept in flight: submit() waits for replies
+when that many tickets are pending, so that a retried request is never run a
+second time.
+"""
+
+TICKET_REQUEST='IOHUB_TICKET'
+TICKET_REPLY='IOHUB_TICKET_REPLY'
+# number of ticket replies kept by the ioHub Process to answer retries
+TICKET_REPLY_CACHE_SIZE=256
+# number of tickets a client may have waiting for a reply
+MAX_PENDING_TICKETS=128
+
+
+class RPCError(Exception):
+    """The ioHub Process replied to a ticket request with an error."""
+    pass
+
+
+class RPCTimeoutError(RPCError):
+    """No reply was received for a ticket request."""
+    pass
+
+
+class RPCTicket(object):
+    """
+    Handle for a request sent with RPCTicketTable.submit(). Use done() to
+    check whether the reply has arrived and result() to get it.
+    """
+    def __init__(self, table, ticket_id, request, timeout, retries, convert=None):
+        self._table=table
+        self.ticket_id=ticket_id
+        self.request=request
+        self.timeout=timeout
+        self.retries_left=retries
+        self.convert=convert
+        self.sent_time=None
+        self.deadline=None
+        self._done=False
+        self._result=None
+        self._error=None
+
+    def done(self):
+        """
+        True once a reply has been received (or the request has timed out).
+        Processes any replies waiting to be read, but does not block.
+        """
+        if not self._done:
+            self._table.poll()
+        return self._done
+
+    def result(self, timeout=None):
+        """
+        Wait for the reply and return it. Raises the RPCError if the ioHub
+        Process replied with an error or the request timed out, or an
+        RPCTimeoutError if timeout (sec.msec) passes before the ticket is
+        done.
+        """
+        if not self._table.wait(self, timeout):
+            raise RPCTimeoutError("No reply for ticket %d within %.3f sec."%(self.ticket_id,timeout),self.request)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def exception(self):
+        """The RPCError of a failed ticket, otherwise None."""
+        return self._error
+
+    def _setResult(self, reply):
+        if self.convert:
+            try:
+                reply=self.convert(reply)
+            except Exception, e:
+                self._setError(e)
+                return
+        self._result=reply
+        self._done=True
+
+    def _setError(self, error):
+        self._error=error
+        self._done=True
+
+    def __repr__(self):
+        return "RPCTicket(%d, done=%s)"%(self.ticket_id,self._done)
+
+
+class RPCTicketTable(object):
+    """
+    The requests waiting for a reply, with the callables used to talk to the
+    ioHub Process:
+
+        send(request): sends a request.
+        receive(wait): returns the next reply received within wait sec.msec
+            (0 to not block), or None.
+        get_error(reply): returns the error described by a reply, or a false
+            value if the reply is not an error.
+        get_time(): the current time in sec.msec.
+
+    max_pending tickets can be waiting for a reply at once; it must not be
+    more than TICKET_REPLY_CACHE_SIZE.
+    """
+    def __init__(self, send, receive, get_error, get_time, timeout=0.5, retries=3,
+                 max_pending=MAX_PENDING_TICKETS):
+        if not 0 < max_pending <= TICKET_REPLY_CACHE_SIZE:
+            raise ValueError("max_pending must be between 1 and %d."%(TICKET_REPLY_CACHE_SIZE))
+        self._send=send
+        self._receive=receive
+        self._get_error=get_error
+        self._get_time=get_time
+        self.timeout=timeout
+        self.retries=retries
+        self.max_pending=max_pending
+        self._next_id=1
+        self._tickets={}
+
+    @property
+    def pending(self):
+        """Number of tickets still waiting for a reply."""
+        return len(self._tickets)
+
+    def submit(self, request, timeout=None, retries=None, convert=None):
+        """
+        Send request and return its RPCTicket without waiting for the reply.
+        convert(reply), if given, is applied to the reply to get the result
+        of the ticket. If max_pending tickets are already waiting for a
+        reply, blocks until one of them is done.
+        """
+        while len(self._tickets) >= self.max_pending:
+            now=self._get_time()
+            wait=min([t.deadline for t in self._tickets.values()])-now
+            self.poll(max(wait,0.0))
+        if timeout is None:
+            timeout=self.timeout
+        if retries is None:
+            retries=self.retries
+        ticket=RPCTicket(self,self._next_id,request,timeout,retries,convert)
+        self._next_id+=1
+        self._tickets[ticket.ticket_id]=ticket
+        self._sendTicket(ticket)
+        return ticket
+
+    def _sendTicket(self, ticket):
+        ticket.sent_time=self._get_time()
+        ticket.deadline=ticket.sent_time+ticket.timeout
+        self._send((TICKET_REQUEST,ticket.ticket_id,ticket.request))
+
+    def handleReply(self, reply):
+        """
+        If reply is the reply to a ticket request, complete the ticket and
+        return True; other replies are left for the caller (False).
+        """
+        try:
+            if reply[0] != TICKET_REPLY:
+                return False
+        except (TypeError, IndexError, KeyError):
+            return False
+        ticket=self._tickets.pop(reply[1],None)
+        if ticket is not None:
+            # otherwise a duplicate reply to a retried request
+            error=self._get_error(reply[2])
+            if error:
+                ticket._setError(RPCError(error))
+            else:
+                ticket._setResult(reply[2])
+        return True
+
+    def poll(self, wait=0.0):
+        """
+        Process the replies that have been received, waiting up to wait
+        sec.msec for the first one, and resend or fail requests that have
+        timed out.
+        """
+        reply=self._receive(wait)
+        while reply is not None:
+            self.handleReply(reply)
+            reply=self._receive(0.0)
+        self._checkTimeouts()
+
+    def _checkTimeouts(self):
+        now=self._get_time()
+        for ticket in self._tickets.values():
+            if now < ticket.deadline:
+                continue
+            if ticket.retries_left > 0:
+                ticket.retries_left-=1
+                self._sendTicket(ticket)
+            else:
+                del self._tickets[ticket.ticket_id]
+                ticket._setError(RPCTimeoutError("No reply for ticket %d."%(ticket.ticket_id),ticket.request))
+
+    def wait(self, ticket=None, timeout=None):
+        """
+        Wait until ticket (or every pending ticket if None) is done, or
+        until timeout sec.msec has passed. Returns True if it is done.
+        """
+        end_time=None
+        if timeout is not None:
+            end_time=self._get_time()+timeout
+        while True:
+            if ticket is None:
+                if not self._tickets:
+                    return True
+            elif ticket._done:
+                return True
+            now=self._get_time()
+            if end_time is not None and now >= end_time:
+                return False
+            # wake up for the next retry / timeout even if nothing arrives
+            wait=min([t.deadline for t in self._tickets.values()] or [now])-now
+            if end_time is not None:
+                wait=min(wait,end_time-now)
+            self.poll(max(wait,0.0))
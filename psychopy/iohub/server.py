@@ -14,7 +14,6 @@ import gevent
 from gevent.server import DatagramServer
 from gevent import Greenlet
 import os,sys
-from operator import itemgetter
 from collections import deque
 import psychopy.iohub
 from psychopy.iohub import OrderedDict, convertCamelToSnake, IO_HUB_DIRECTORY
@@ -23,6 +22,11 @@ from psychopy.iohub import print2err, printExceptionDetailsToStdErr, ioHubError
 from psychopy.iohub import DeviceConstants, EventConstants
 from psychopy.iohub import Computer, DeviceEvent, import_device
 from psychopy.iohub.devices.deviceConfigValidation import validateDeviceConfiguration
+from psychopy.iohub.eventring import SharedEventRing
+from psychopy.iohub.eventarrays import eventsToArrays, packEventArrays
+from psychopy.iohub.eventbuffer import TimeOrderedEventBuffer
+from psychopy.iohub.telemetry import DeviceTelemetry
+from psychopy.iohub.rpctickets import TICKET_REQUEST, TICKET_REPLY, TICKET_REPLY_CACHE_SIZE
 currentSec= Computer.currentSec
 
 try:
@@ -41,7 +45,20 @@ import psutil
 
 MAX_PACKET_SIZE = 64*1024
 
+class _TicketAddress(tuple):
+    """
+    The (host, port) address to reply to for a ticket request, also holding
+    the ticket id so that sendResponse() can tag the reply with it.
+    """
+    def __new__(cls,address,ticket_id):
+        t=tuple.__new__(cls,address)
+        t.ticket_id=ticket_id
+        return t
+
 class udpServer(DatagramServer):
+    # number of ticket replies kept to answer retried ticket requests
+    TICKET_REPLY_CACHE_SIZE=TICKET_REPLY_CACHE_SIZE
+
     def __init__(self,ioHubServer,address,coder='msgpack'):
         global MAX_PACKET_SIZE
         import psychopy.iohub.net
@@ -57,6 +74,7 @@ class udpServer(DatagramServer):
             self.unpacker=msgpack.Unpacker(use_list=True)
             self.unpack=self.unpacker.unpack      
             self.feed=self.unpacker.feed
+        self._ticket_replies=OrderedDict()
         DatagramServer.__init__(self,address)
          
     def handle(self, request, replyTo):
@@ -65,6 +83,9 @@ class udpServer(DatagramServer):
         
         self.feed(request)
         request = self.unpack()   
+        return self.handleRequest(request,replyTo)
+
+    def handleRequest(self,request,replyTo):
         request_type= request.pop(0)
         if request_type == 'SYNC_REQ':
             self.sendResponse(['SYNC_REPLY',currentSec()],replyTo)  
@@ -78,6 +99,10 @@ class udpServer(DatagramServer):
                 return True
         elif request_type == 'GET_EVENTS':
             return self.handleGetEvents(replyTo)
+        elif request_type == 'GET_EVENT_ARRAYS':
+            return self.handleGetEvents(replyTo,as_arrays=True)
+        elif request_type == TICKET_REQUEST:
+            return self.handleTicketRequest(request,replyTo)
         elif request_type == 'EXP_DEVICE':
             return self.handleExperimentDeviceRequest(request,replyTo)
         elif request_type == 'RPC':
@@ -133,14 +158,33 @@ class udpServer(DatagramServer):
             self.sendResponse('RPC_NOT_CALLABLE_ERROR', replyTo)
             return False
             
-    def handleGetEvents(self,replyTo):
+    def handleTicketRequest(self,request,replyTo):
+        ticket_id,ticket_request=request
+        key=(replyTo,ticket_id)
+        if key in self._ticket_replies:
+            # a retry of a request that has already been handled, so resend
+            # the reply (if it is ready) instead of running it again
+            reply=self._ticket_replies[key]
+            if reply is not None:
+                self.sendResponse(reply,replyTo)
+            return True
+        self._ticket_replies[key]=None
+        while len(self._ticket_replies)>self.TICKET_REPLY_CACHE_SIZE:
+            self._ticket_replies.popitem(last=False)
+        return self.handleRequest(ticket_request,_TicketAddress(replyTo,ticket_id))
+
+    def handleGetEvents(self,replyTo,as_arrays=False):
         try:
             self.iohub.processDeviceEvents()
-            currentEvents=list(self.iohub.eventBuffer)
-            self.iohub.eventBuffer.clear()
+            # the global event buffer is kept in time order, so is not sorted
+            currentEvents=self.iohub.eventBuffer.getEvents(clear=True)
+            if self.iohub.eventRing:
+                self.iohub.eventRing.pending=0
 
             if len(currentEvents)>0:
-                currentEvents=sorted(currentEvents, key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
+                if as_arrays:
+                    # one structured array per event type, sent as raw bytes
+                    currentEvents=packEventArrays(eventsToArrays(currentEvents,EventConstants.getClass))
                 self.sendResponse(('GET_EVENTS_RESULT',currentEvents),replyTo)
             else:
                 self.sendResponse(('GET_EVENTS_RESULT', None),replyTo)
@@ -274,6 +318,12 @@ class udpServer(DatagramServer):
             
     def sendResponse(self,data,address):
         packet_data=None
+        ticket_id=getattr(address,'ticket_id',None)
+        if ticket_id is not None:
+            address=tuple(address)
+            data=(TICKET_REPLY,ticket_id,data)
+            if (address,ticket_id) in self._ticket_replies:
+                self._ticket_replies[(address,ticket_id)]=data
         try:
             num_packets = -1
             packet_data_length = -1
@@ -390,6 +440,11 @@ class udpServer(DatagramServer):
                     device.clearEvents(call_proc_events=False)
                 except Exception:
                     pass
+        # the shared memory ring position at the time of the clear, so that
+        # the client can discard the events written to the ring before it
+        if self.iohub.eventRing:
+            return self.iohub.eventRing.written
+        return None
 
     def getTime(self):
         """
@@ -420,10 +475,34 @@ class udpServer(DatagramServer):
 
     def flushIODataStoreFile(self):
         if self.iohub.emrt_file:
-            self.iohub.emrt_file.emrtFile.flush()
+            self.iohub.emrt_file.flush()
             return True
         return False
 
+    def getDataStoreStats(self):
+        if self.iohub.emrt_file:
+            return self.iohub.emrt_file.getWriterStats()
+        return None
+
+    def getDroppedEventCounts(self):
+        return self.iohub.eventBuffer.getDroppedCounts()
+
+    def getDeviceTelemetry(self, device_name=None, reset=False):
+        """
+        Dict of {device name: telemetry stats} (see DeviceTelemetry.getStats)
+        for every device, or the telemetry stats of device_name. If reset is
+        True, the telemetry is restarted after being read.
+        """
+        stats={}
+        for telemetry in self.iohub.deviceTelemetry.values():
+            if device_name is None or telemetry.device_name == device_name:
+                stats[telemetry.device_name]=telemetry.getStats()
+                if reset:
+                    telemetry.reset()
+        if device_name is not None:
+            return stats.get(device_name)
+        return stats
+
     def shutDown(self):
         try:
             self.setPriority('normal')
@@ -436,19 +515,24 @@ class udpServer(DatagramServer):
             sys.exit(1)
 
 class DeviceMonitor(Greenlet):
-    def __init__(self, device,sleep_interval):
+    def __init__(self, device,sleep_interval,telemetry=None):
         Greenlet.__init__(self)
         self.device = device
         self.sleep_interval=sleep_interval
+        self.telemetry=telemetry
         self.running=False
         
     def _run(self):
         self.running = True
         ctime=Computer.currentSec
+        telemetry=self.telemetry
         while self.running is True:
             stime=ctime()
             self.device._poll()
-            i=self.sleep_interval-(ctime()-stime)
+            dur=ctime()-stime
+            if telemetry:
+                telemetry.addPoll(dur)
+            i=self.sleep_interval-dur
             if i > 0.0:
                 gevent.sleep(i)
             else:
@@ -460,6 +544,7 @@ class DeviceMonitor(Greenlet):
 
 class ioServer(object):
     eventBuffer=None
+    eventRing=None
     deviceDict={}
     _logMessageBuffer=deque(maxlen=128)
     _pyglet_window_hnds=[]
@@ -480,7 +565,21 @@ class ioServer(object):
         self.filterLookupByOutput={}
         self.filterLookupByName={}  
         self._hookDevice=None
-        ioServer.eventBuffer=deque(maxlen=config.get('global_event_buffer',2048))
+        ioServer.eventBuffer=TimeOrderedEventBuffer(max_length=config.get('global_event_buffer',2048))
+
+        # per device latency and throughput telemetry, {device: DeviceTelemetry}
+        self.deviceTelemetry={}
+        self._telemetry_config=config.get('device_telemetry',{})
+
+        # shared memory event transport, if the client created the ring
+        shm_config=config.get('shared_memory_events',{})
+        if shm_config.get('enable',False) and shm_config.get('path'):
+            try:
+                self.eventRing=SharedEventRing(shm_config['path'])
+            except Exception:
+                print2err("Error opening shared memory event ring: ",shm_config['path'])
+                printExceptionDetailsToStdErr()
+                self.eventRing=None
 
         self._running=True
         
@@ -705,14 +804,14 @@ class ioServer(object):
                     
                 if  device_class_name == 'Mouse' and 'Mouse' not in self._hookDevice:
                     #print2err("Hooking OSX Mouse.....")
-                    mouseHookMonitor=DeviceMonitor(deviceDict['Mouse'],0.004)
+                    mouseHookMonitor=DeviceMonitor(deviceDict['Mouse'],0.004,self.deviceTelemetry.get(deviceDict['Mouse']))
                     self.deviceMonitors.append(mouseHookMonitor)
                     deviceDict['Mouse']._CGEventTapEnable(deviceDict['Mouse']._tap, True)
                     self._hookDevice.append('Mouse')
                     #print2err("Done Hooking OSX Mouse.....")
                 if device_class_name == 'Keyboard'  and 'Keyboard' not in self._hookDevice:
                     #print2err("Hooking OSX Keyboard.....")
-                    kbHookMonitor=DeviceMonitor(deviceDict['Keyboard'],0.004)
+                    kbHookMonitor=DeviceMonitor(deviceDict['Keyboard'],0.004,self.deviceTelemetry.get(deviceDict['Keyboard']))
                     self.deviceMonitors.append(kbHookMonitor)
                     deviceDict['Keyboard']._CGEventTapEnable(deviceDict['Keyboard']._tap, True)
                     self._hookDevice.append('Keyboard')
@@ -785,11 +884,13 @@ class ioServer(object):
 
             self.devices.append(deviceInstance)
             ioServer.deviceDict[device_class_name]=deviceInstance
+            if self._telemetry_config.get('enable',True):
+                self.deviceTelemetry[deviceInstance]=DeviceTelemetry(device_config.get('name',device_class_name),Computer.getTime)
 
             if 'device_timer' in device_config:
                 interval = device_config['device_timer']['interval']
                 self.log("%s has requested a timer with period %.5f"%(device_class_name, interval))
-                dPoller=DeviceMonitor(deviceInstance,interval)
+                dPoller=DeviceMonitor(deviceInstance,interval,self.deviceTelemetry.get(deviceInstance))
                 self.deviceMonitors.append(dPoller)
 
             monitoringEventIDs=[]
@@ -843,6 +944,16 @@ class ioServer(object):
             pytablesfile.flush()
             pytablesfile.close()
             
+    def processEventsInterval(self):
+        """
+        Seconds between processEventsTasklet runs. Events only reach the
+        shared memory ring when processed, so it runs more often when the
+        ring is in use.
+        """
+        if self.eventRing:
+            return self.config.get('shared_memory_events',{}).get('process_interval',0.001)
+        return 0.01
+
     def processEventsTasklet(self,sleep_interval):
         while self._running:
             stime=Computer.getTime()
@@ -851,18 +962,31 @@ class ioServer(object):
             gevent.sleep(max(0.0, dur))
 
     def processDeviceEvents(self):
+        getTime=Computer.getTime
         for device in self.devices:
             try:
                 events = device._getNativeEventBuffer()
+                telemetry = self.deviceTelemetry.get(device)
+                native_count = len(events)
+                stime=getTime()
 
                 while len(events) > 0:
                     evt = events.popleft()
                     e = device._getIOHubEventObject(evt)
                     if e is not None:
+                        if telemetry:
+                            telemetry.addEvent(e[DeviceEvent.EVENT_DELAY_INDEX])
                         for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
                             l._handleEvent(e)
 
+                if telemetry and native_count > 0:
+                    telemetry.addDispatch(getTime()-stime)
+                    telemetry.addNativeBacklog(native_count)
+
+                if not device._filters:
+                    continue
 
+                stime=getTime()
                 filtered_events = []
                 for filter in device._filters.values():
                     filtered_events.extend(filter._removeOutputEvents())
@@ -872,6 +996,9 @@ class ioServer(object):
                     for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
                         l._handleEvent(e)
 
+                if telemetry and filtered_events:
+                    telemetry.addFiltering(getTime()-stime,len(filtered_events))
+
 
             except Exception:
                 printExceptionDetailsToStdErr()
@@ -880,13 +1007,29 @@ class ioServer(object):
                 print2err("--------------------------------------")
 
     def _handleEvent(self,event):
-        self.eventBuffer.append(event)
+        ring=self.eventRing
+        if ring:
+            # once the ring has been full, keep using the eventBuffer until
+            # the client has fetched it so event order is preserved.
+            if not self.eventBuffer and ring.write(event):
+                return
+            eventBuffer=self.eventBuffer
+            if eventBuffer.max_length is not None and len(eventBuffer) >= eventBuffer.max_length:
+                # an event held back from the ring is about to be dropped,
+                # leaving a gap in the events the client reads
+                ring.dropped+=1
+            eventBuffer.append(event)
+            ring.pending=len(eventBuffer)
+        else:
+            self.eventBuffer.append(event)
 
     def clearEventBuffer(self, call_proc_events=True):
         if call_proc_events is True:
             self.processDeviceEvents()
         l= len(self.eventBuffer)
         self.eventBuffer.clear()
+        if self.eventRing:
+            self.eventRing.pending=0
         return l
 
     def checkForPsychopyProcess(self, sleep_interval):
@@ -924,11 +1067,18 @@ class ioServer(object):
             if self.eventBuffer:
                 self.clearEventBuffer()
 
+            if self.emrt_file and self._telemetry_config.get('save_to_datastore',False):
+                self.emrt_file.addDeviceTelemetry([t.getStats() for t in self.deviceTelemetry.values()])
+
             try:
                 self.closeDataStoreFile()
             except Exception:
                 pass
 
+            if self.eventRing:
+                self.eventRing.close()
+                self.eventRing=None
+
             while len(self.devices) > 0:
                 d=self.devices.pop(0)
                 try:
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+ioHub
+.. file: ioHub/telemetry.py
+
+Copyright (C) 2012-2013 iSolver Software Solutions
+Distributed under the terms of the GNU General Public License (GPL version 3 or any later version).
+
+Per device latency and throughput telemetry for the ioHub Server.
+
+For each monitored device, the ioHub Server records into fixed bucket
+histograms:
+
+    poll_time: sec.msec taken by each call of the device's _poll().
+    event_delay: the delay field of each event the device creates.
+    dispatch_time: sec.msec taken to convert the native events read from
+        the device in one processDeviceEvents() pass to ioHub events and
+        hand them to the event listeners (the global buffer, datastore,
+        device buffer and any event filters).
+    filter_time: sec.msec taken to collect and dispatch the output events
+        of the device's event filters in one processDeviceEvents() pass.
+
+plus counters of the events, polls and native event backlog. Recording a
+value is a bisect into the bucket edges and a few additions, so telemetry
+can stay enabled while an experiment runs.
+"""
+from bisect import bisect_right
+
+# Histogram bucket upper edges in sec.msec: 1 usec to 10 sec, 8 per decade.
+# Values above the last edge go into an overflow bucket.
+DEFAULT_BUCKET_EDGES=tuple(10.0**(e/8.0) for e in range(-48,9))
+
+PERCENTILES=(50,90,99,99.9)
+
+
+class Histogram(object):
+    """
+    Counts of the values added in fixed buckets, with the exact count, sum,
+    min and max. Percentiles are estimated as the upper edge of the bucket
+    holding the percentile, limited to the min and max values added.
+    """
+    __slots__=['edges','counts','count','total','min','max']
+    def __init__(self, edges=DEFAULT_BUCKET_EDGES):
+        self.edges=edges
+        self.reset()
+
+    def reset(self):
+        self.counts=[0]*(len(self.edges)+1)
+        self.count=0
+        self.total=0.0
+        self.min=None
+        self.max=None
+
+    def add(self, value):
+        self.counts[bisect_right(self.edges,value)]+=1
+        self.count+=1
+        self.total+=value
+        if self.count == 1:
+            self.min=self.max=value
+        elif value < self.min:
+            self.min=value
+        elif value > self.max:
+            self.max=value
+
+    def percentile(self, p):
+        """Estimated value below which p percent of the values added are."""
+        if self.count == 0:
+            return None
+        target=self.count*p/100.0
+        cumulative=0
+        for i,c in enumerate(self.counts):
+            cumulative+=c
+            if c and cumulative >= target:
+                if i == len(self.edges):
+                    return self.max
+                return min(max(self.edges[i],self.min),self.max)
+        return self.max
+
+    def getStats(self):
+        """
+        Dict with the count, mean, min and max of the values added, and the
+        p50, p90, p99 and p99.9 percentile estimates.
+        """
+        stats=dict(count=self.count,min=self.min,max=self.max,
+                   mean=self.total/self.count if self.count else None)
+        for p in PERCENTILES:
+            stats['p%s'%(p,)]=self.percentile(p)
+        return stats
+
+
+class DeviceTelemetry(object):
+    """
+    The telemetry histograms and counters of one ioHub Device.
+    """
+    HISTOGRAMS=('poll_time','event_delay','dispatch_time','filter_time')
+
+    def __init__(self, device_name, get_time):
+        self.device_name=device_name
+        self._get_time=get_time
+        self.histograms=dict((h,Histogram()) for h in self.HISTOGRAMS)
+        self.reset()
+
+    def reset(self):
+        for h in self.histograms.itervalues():
+            h.reset()
+        self.start_time=self._get_time()
+        self.polls=0
+        self.events=0
+        self.filtered_events=0
+        self.unknown_delays=0
+        self.max_native_backlog=0
+
+    def addPoll(self, duration):
+        self.polls+=1
+        self.histograms['poll_time'].add(duration)
+
+    def addNativeBacklog(self, length):
+        if length > self.max_native_backlog:
+            self.max_native_backlog=length
+
+    def addEvent(self, delay):
+        self.events+=1
+        # a delay < 0 means the device does not know the event delay
+        if delay < 0.0:
+            self.unknown_delays+=1
+        else:
+            self.histograms['event_delay'].add(delay)
+
+    def addDispatch(self, duration):
+        self.histograms['dispatch_time'].add(duration)
+
+    def addFiltering(self, duration, event_count):
+        self.filtered_events+=event_count
+        self.histograms['filter_time'].add(duration)
+
+    def getStats(self):
+        """
+        Dict of the device telemetry: polls, events, filtered_events,
+        unknown_delays, max_native_backlog, duration (sec.msec since the
+        telemetry was started or reset), events_per_sec, and a dict of
+        histogram statistics (see Histogram.getStats) for each of
+        poll_time, event_delay, dispatch_time and filter_time.
+        """
+        duration=self._get_time()-self.start_time
+        stats=dict(device_name=self.device_name,polls=self.polls,events=self.events,
+                   filtered_events=self.filtered_events,unknown_delays=self.unknown_delays,
+                   max_native_backlog=self.max_native_backlog,duration=duration,
+                   events_per_sec=self.events/duration if duration > 0.0 else 0.0)
+        for name,h in self.histograms.iteritems():
+            stats[name]=h.getStats()
+        return stats
@@ -236,6 +236,28 @@ class NumPyRingBuffer(object):
         self._npa[(i%self.max_size)+self.max_size]=element
         self._index+=1
 
+    def extend(self, elements):
+        """
+        Add each element of the sequence elements to the end of the RingBuffer,
+        as if append() was called for each of them, using one array assignment
+        per half of the backing array.
+
+        :param sequence elements: The elements to add to the RingBuffer.
+        :returns None:
+        """
+        elements=numpy.asarray(elements,dtype=self._dtype)
+        count=len(elements)
+        if count == 0:
+            return
+        max_size=self.max_size
+        # only the last max_size elements remain in the buffer
+        self._index+=max(count-max_size,0)
+        elements=elements[-max_size:]
+        positions=numpy.arange(self._index,self._index+len(elements))%max_size
+        self._npa[positions]=elements
+        self._npa[positions+max_size]=elements
+        self._index+=len(elements)
+
     def getElements(self):
         """
         Return the numpy array being used by the RingBuffer, the length of 
@@ -246,6 +268,8 @@ class NumPyRingBuffer(object):
         :param None:
         :returns numpy.array: The array of data elements that make up the Ring Buffer.
         """
+        if self._index<self.max_size:
+            return self._npa[:self._index]
         return self._npa[self._index%self.max_size:(self._index%self.max_size)+self.max_size]
 
     def isFull(self):
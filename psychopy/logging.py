@@ -25,15 +25,19 @@ messages, (which PsychoPy doesn't use) using the commands::
 # Distributed under the terms of the GNU General Public License (GPL).
 
 # Much of the code below is based conceptually, if not syntactically, on the
-# python logging module but it's simpler (no threading) and maintaining a
+# python logging module but it's simpler and maintaining a
 # stack of log entries for later writing (don't want files written while
-# drawing)
+# drawing). Logging a message never takes a lock; writing can optionally be
+# done by a background thread (see :func:`startFlushThread`)
 
 from __future__ import absolute_import
 
 from os import path
 import sys
 import codecs
+import collections
+import struct
+import threading
 from psychopy import clock
 
 _packagePath = path.split(__file__)[0]
@@ -110,16 +114,30 @@ def setDefaultClock(clock):
 
 
 class _LogEntry(object):
+    # log entries are created for every message so keep them small
+    __slots__ = ('t', 'level', 'message', 'obj')
 
     def __init__(self, level, message, t=None, obj=None):
-        super(_LogEntry, self).__init__()
         self.t = t
-        self.t_ms = t * 1000
         self.level = level
-        self.levelname = getLevel(level)
         self.message = message
         self.obj = obj
 
+    @property
+    def t_ms(self):
+        return self.t * 1000
+
+    @property
+    def levelname(self):
+        return getLevel(self.level)
+
+    def asDict(self):
+        """The attributes available to the logger's format string
+        """
+        return {'t': self.t, 't_ms': self.t * 1000, 'level': self.level,
+                'levelname': getLevel(self.level), 'message': self.message,
+                'obj': self.obj}
+
 
 class LogFile(object):
     """A text stream to receive inputs from the logging system
@@ -192,6 +210,120 @@ class LogFile(object):
             pass
 
 
+_binaryLogMagic = b'PSYLOGB1'
+_binaryLogRecord = struct.Struct('<dhI')  # t, level, message length
+
+
+class BinaryLogFile(object):
+    """A compact binary target for the logging system
+
+    Entries are stored as their time, level and (utf-8 encoded) message,
+    which is much cheaper to write than formatted text. The file can be
+    read back with :func:`readBinaryLog` or converted to a text log with
+    :func:`binaryLogToText`, e.g. after the experiment has finished.
+    """
+
+    def __init__(self, f, level=DEBUG, filemode='a', logger=None):
+        """Create a binary log file as a target for logged entries
+
+        :parameters:
+
+            - f:
+                a path to the file, or a file object opened in binary mode
+
+            - level:
+                The minimum level of importance that a message must have
+                to be logged by this target.
+
+            - filemode: 'a', 'w'
+                Append or overwrite existing log file
+
+        """
+        super(BinaryLogFile, self).__init__()
+        if hasattr(f, 'write'):
+            self.stream = f
+            self.stream.seek(0, 2)
+            isEmpty = self.stream.tell() == 0
+        else:
+            isEmpty = (filemode == 'w' or not path.isfile(f) or
+                       path.getsize(f) == 0)
+            self.stream = open(f, filemode + 'b')
+        # new (or empty) files need the header
+        if isEmpty:
+            self.stream.write(_binaryLogMagic)
+        self.level = level
+        if logger is None:
+            logger = root
+        self.logger = logger
+        self.logger.addTarget(self)
+
+    def setLevel(self, level):
+        """Set a new minimal level for the log file
+        """
+        self.level = level
+        self.logger._calcLowestTarget()
+
+    def writeEntries(self, entries):
+        """Write a sequence of log entries (those below this target's level
+        should already have been removed)
+        """
+        chunks = []
+        for entry in entries:
+            msg = entry.message
+            if not isinstance(msg, str):
+                msg = unicode(msg).encode('utf-8')
+            chunks.append(_binaryLogRecord.pack(entry.t, entry.level,
+                                                len(msg)))
+            chunks.append(msg)
+        self.stream.write(b''.join(chunks))
+        self.stream.flush()
+
+    def close(self):
+        """Stop logging to this file and close it
+        """
+        self.logger.removeTarget(self)
+        self.stream.close()
+
+
+def readBinaryLog(f):
+    """Read the entries from a file written by :class:`BinaryLogFile`
+
+    Returns a list of (t, level, message) tuples
+    """
+    if hasattr(f, 'read'):
+        raw = f.read()
+    else:
+        with open(f, 'rb') as fileObj:
+            raw = fileObj.read()
+    if not raw.startswith(_binaryLogMagic):
+        raise IOError('Not a PsychoPy binary log file')
+    entries = []
+    pos = len(_binaryLogMagic)
+    recSize = _binaryLogRecord.size
+    while pos + recSize <= len(raw):
+        t, level, nBytes = _binaryLogRecord.unpack_from(raw, pos)
+        pos += recSize
+        msg = raw[pos:pos + nBytes].decode('utf-8', 'replace')
+        pos += nBytes
+        entries.append((t, level, msg))
+    return entries
+
+
+def binaryLogToText(f, level=NOTSET,
+                    format="%(t).4f \t%(levelname)s \t%(message)s"):
+    """Render a file written by :class:`BinaryLogFile` as the text that a
+    :class:`LogFile` would have received
+
+    Entries below `level` are skipped. Returns a unicode string
+    """
+    lines = []
+    for t, entryLevel, msg in readBinaryLog(f):
+        if entryLevel >= level:
+            entry = _LogEntry(t=t, level=entryLevel, message=msg)
+            lines.append(format % entry.asDict() + '\n')
+    return u''.join(lines)
+
+
 class _Logger(object):
     """Maintains a set of log targets (text streams such as files of stdout)
 
@@ -199,19 +331,30 @@ class _Logger(object):
 
     """
 
-    def __init__(self, format="%(t).4f \t%(levelname)s \t%(message)s"):
+    def __init__(self, format="%(t).4f \t%(levelname)s \t%(message)s",
+                 keepFlushed=1000):
         """The string-formatted elements %(xxxx)f can be used, where
         each xxxx is an attribute of the LogEntry.
         e.g. t, t_ms, level, levelname, message
+
+        Only the most recent `keepFlushed` entries that have been flushed
+        are kept (in `self.flushed`) so that long sessions don't keep
+        every message in memory (use None to keep them all).
         """
         super(_Logger, self).__init__()
         self.targets = []
-        self.flushed = []
-        self.toFlush = []
+        self.flushed = collections.deque(maxlen=keepFlushed)
+        self.toFlush = collections.deque()
         self.format = format
         self.lowestTarget = 50
+        self._flushLock = threading.Lock()
+        self._flushThread = None
+        self._flushWake = threading.Event()
+        self._flushHeld = False
+        self._flushMaxHeld = None
 
     def __del__(self):
+        self.stopFlushThread()
         self.flush()
         # unicode logged to coder output window can cause logger failure, with
         # error message pointing here. this is despite it being ok to log to
@@ -252,25 +395,116 @@ class _Logger(object):
         # add message to list
         self.toFlush.append(
             _LogEntry(t=t, level=level, message=message, obj=obj))
+        if self._flushThread is not None:
+            nPending = len(self.toFlush)
+            if self._flushHeld:
+                if nPending > self._flushMaxHeld:
+                    self._flushWake.set()
+            elif nPending > self._flushMaxPending:
+                self._flushWake.set()
 
     def flush(self):
         """Process all current messages to each target
         """
-        # loop through targets then entries in toFlush
-        # so that stream.flush can be called just once
-        formatted = {}  # keep a dict - so only do the formatting once
-        for target in self.targets:
-            for thisEntry in self.toFlush:
-                if thisEntry.level >= target.level:
-                    if not thisEntry in formatted:
+        with self._flushLock:
+            # deque append/popleft are atomic so log() needs no lock
+            toFlush = self.toFlush
+            entries = [toFlush.popleft() for n in range(len(toFlush))]
+            if not entries:
+                return
+            # loop through targets then entries
+            # so that each target is written (and flushed) just once
+            formatted = [None] * len(entries)  # only do the formatting once
+            for target in self.targets:
+                targetEntries = [(n, thisEntry)
+                                 for n, thisEntry in enumerate(entries)
+                                 if thisEntry.level >= target.level]
+                if not targetEntries:
+                    continue
+                if hasattr(target, 'writeEntries'):
+                    target.writeEntries([e for n, e in targetEntries])
+                    continue
+                lines = []
+                for n, thisEntry in targetEntries:
+                    if formatted[n] is None:
                         # convert the entry into a formatted string
-                        formatted[thisEntry] = self.format % thisEntry.__dict__
-                    target.write(formatted[thisEntry] + '\n')
-            if hasattr(target.stream, 'flush'):
-                target.stream.flush()
-        # finished processing entries - move them to self.flushed
-        self.flushed.extend(self.toFlush)
-        self.toFlush = []  # a new empty list
+                        formatted[n] = (self.format % thisEntry.asDict() +
+                                        '\n')
+                    lines.append(formatted[n])
+                try:
+                    txt = ''.join(lines)
+                except UnicodeError:
+                    # mixed byte and unicode strings; write them one by one
+                    for line in lines[:-1]:
+                        target.write(line)
+                    txt = lines[-1]
+                target.write(txt)
+            # finished processing entries - move them to self.flushed
+            self.flushed.extend(entries)
+
+    def startFlushThread(self, interval=0.5, maxPending=1000):
+        """Flush the log from a background thread rather than the main
+        thread (and stop calls to :func:`flush` from stalling frames).
+
+        The flushing policy is:
+
+            - pending messages are written every `interval` seconds, or as
+              soon as more than `maxPending` messages are waiting
+            - nothing is written while flushing is held (see
+              :meth:`holdFlush`), e.g. during time-critical presentation.
+              Messages are kept until :meth:`releaseFlush` is called,
+              unless more than the hold's `maxHeld` are waiting
+            - calling :meth:`flush` still writes everything immediately
+
+        """
+        self.stopFlushThread()
+        self._flushInterval = interval
+        self._flushMaxPending = maxPending
+        self._flushWake.clear()
+        self._flushThread = threading.Thread(target=self._flushLoop,
+                                             name='psychopy.logging flush')
+        self._flushThread.daemon = True
+        self._flushThread.start()
+
+    def stopFlushThread(self):
+        """Stop the background flushing thread (if running) and flush
+        any pending messages
+        """
+        thread = getattr(self, '_flushThread', None)
+        if thread is None:
+            return
+        self._flushThread = None
+        self._flushWake.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def holdFlush(self, maxHeld=100000):
+        """Stop the background thread from writing to the log targets
+        until :meth:`releaseFlush` is called.
+
+        So that memory doesn't grow without limit if the hold is never
+        released, the pending messages are written anyway once more than
+        `maxHeld` are waiting.
+        """
+        self._flushMaxHeld = maxHeld
+        self._flushHeld = True
+
+    def releaseFlush(self):
+        """Allow the background thread to write again (it will do so
+        straight away if there are messages waiting)
+        """
+        self._flushHeld = False
+        self._flushWake.set()
+
+    def _flushLoop(self):
+        thread = threading.current_thread()
+        while self._flushThread is thread:
+            self._flushWake.wait(self._flushInterval)
+            self._flushWake.clear()
+            if self._flushHeld and len(self.toFlush) <= self._flushMaxHeld:
+                continue
+            self.flush()
 
 root = _Logger()
 console = LogFile()
@@ -282,6 +516,34 @@ def flush(logger=root):
     logger.flush()
 
 
+def startFlushThread(interval=0.5, maxPending=1000, logger=root):
+    """Write log messages from a background thread, every `interval`
+    seconds (or when more than `maxPending` are waiting) unless held with
+    :func:`holdFlush`. See :meth:`_Logger.startFlushThread`
+    """
+    logger.startFlushThread(interval=interval, maxPending=maxPending)
+
+
+def stopFlushThread(logger=root):
+    """Stop the background flushing thread and flush any pending messages
+    """
+    logger.stopFlushThread()
+
+
+def holdFlush(maxHeld=100000, logger=root):
+    """Prevent the background thread from writing to log targets, e.g.
+    during a time-critical sequence of frames (until more than `maxHeld`
+    messages are waiting)
+    """
+    logger.holdFlush(maxHeld=maxHeld)
+
+
+def releaseFlush(logger=root):
+    """Allow the background thread to write to log targets again
+    """
+    logger.releaseFlush()
+
+
 def critical(msg, t=None, obj=None):
     """log.critical(message)
     Send the message to any receiver of logging info (e.g. a LogFile)
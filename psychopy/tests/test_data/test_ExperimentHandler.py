@@ -3,6 +3,7 @@
 from psychopy import data, logging
 from numpy import random
 import os, glob, shutil
+import pytest
 logging.console.setLevel(logging.DEBUG)
 from tempfile import mkdtemp
 
@@ -119,6 +120,54 @@ class TestExperimentHandler(object):
         exp.saveAsWideText(fileName)
         exp.saveAsPickle(fileName)
 
+    def test_streamWideText(self):
+        exp = data.ExperimentHandler(
+            name='testExp',
+            savePickle=False,
+            saveWideText=True,
+            streamWideText=True,
+            dataFileName=self.tmpDir + 'streamed'
+            )
+        exp.addData('resp', 'left')
+        exp.nextEntry()
+        exp.addData('resp', 'right')
+        exp.addData('rt', 0.5)  # a column that appears late
+        exp.nextEntry()
+        assert exp.entries == []  # not kept in memory
+
+        exp.closeStream()
+        # the late column is added to the rows and to the header on closing
+        contents = open(exp.dataFileName+'.csv', 'rU').read()
+        assert contents == "resp,rt,\nleft,\nright,0.5,\n"
+        assert not os.path.exists(exp.dataFileName+'.csv.tmp')
+        # pickling must still work without the stream
+        exp.saveAsPickle(exp.dataFileName)
+
+    def test_streamWideTextError(self):
+        exp = data.ExperimentHandler(
+            name='testExp',
+            savePickle=False,
+            saveWideText=True,
+            streamWideText=True,
+            dataFileName=self.tmpDir + 'streamError'
+            )
+        stream = exp._stream
+        exp.addData('resp', 'left')
+        exp.nextEntry()
+        stream._queue.join()  # the first entry has been written
+        stream._file.close()  # as if the disk had gone away
+        exp.addData('resp', 'right')
+        exp.nextEntry()
+        stream._queue.join()
+        assert stream._error is not None
+        assert stream._thread.is_alive()  # the writer thread keeps running
+        with pytest.raises(ValueError):
+            exp.addData('resp', 'up')
+            exp.nextEntry()
+        with pytest.raises(ValueError):
+            exp.closeStream()
+        assert exp._stream is None
+
 
 if __name__ == '__main__':
     import pytest
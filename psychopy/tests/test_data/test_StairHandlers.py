@@ -361,6 +361,61 @@ class TestQuestHandler(_BaseTestStairHandler):
         assert self.stairs._quest.x[0] == -range/2
         assert self.stairs._quest.x[-1] == range/2
 
+    def test_QuestHandlerImportData(self):
+        kwargs = dict(startVal=50, startValSd=50, pThreshold=0.82,
+                      nTrials=10, beta=3.5, gamma=0.5, delta=0.01,
+                      grain=0.01, range=100, minVal=0, maxVal=100)
+        intensities = [50, 45, 37, 58, 80, 75, 71, 79, 90, 88]
+        responses = makeBasicResponseCycles(
+            cycles=3, nCorrect=2, nIncorrect=2, length=10
+        )
+        # one trial at a time
+        stepwise = data.QuestHandler(**kwargs)
+        for intensity, response in zip(intensities, responses):
+            stepwise._quest.update(intensity, response)
+        # all at once
+        stairs = data.QuestHandler(**kwargs)
+        stairs.importData(intensities, responses)
+
+        assert stairs.nTrials == 20
+        assert stairs.intensities == intensities
+        assert stairs.data == list(responses)
+        assert np.allclose(stairs._quest.pdf, stepwise._quest.pdf)
+        assert np.allclose(stairs.quantile(), stepwise.quantile())
+        # recompute replays the history to the same pdf
+        stairs._quest.recompute()
+        assert np.allclose(stairs._quest.pdf, stepwise._quest.pdf)
+
+        # responses can only be 0 or 1
+        try:
+            stairs._quest.updateMany([50], [2])
+        except RuntimeError:
+            pass
+        else:
+            assert False, 'updateMany accepted a response of 2'
+
+        # with a stopInterval the import ends where the staircase finishes
+        stairs = data.QuestHandler(stopInterval=1000, **kwargs)
+        stairs.importData(intensities, responses)
+        assert stairs.finished
+        assert stairs.intensities == intensities[:1]
+        assert stairs.data == responses[:1]
+
+    def test_QuestHandlerSimulateObservers(self):
+        stairs = data.QuestHandler(
+            startVal=0.5, startValSd=2, pThreshold=0.82, nTrials=40,
+            minVal=-2, maxVal=3
+        )
+        tActuals = np.linspace(-1, 1, 50)
+        intensities, responses, estimates = stairs.simulateObservers(
+            tActuals, rng=0)
+        assert intensities.shape == responses.shape == (50, 40)
+        assert intensities.min() >= -2 and intensities.max() <= 3
+        # the staircase itself is untouched
+        assert stairs._quest.intensity == []
+        # estimates should track the simulated thresholds
+        assert np.corrcoef(estimates, tActuals)[0, 1] > 0.9
+
 
 class TestMultiStairHandler(_BaseTestMultiStairHandler):
     """
@@ -442,6 +497,100 @@ class TestMultiStairHandler(_BaseTestMultiStairHandler):
 
 
 
+class TestPsiHandler(_BaseTestStairHandler):
+    """
+    Test PsiHandler, but with the ExperimentHandler attached as well.
+    """
+    def test_PsiHandler(self):
+        self.stairs = data.PsiHandler(
+            nTrials=10, intensRange=[0, 1], alphaRange=[0, 1],
+            betaRange=[0.05, 0.5], intensPrecision=0.05,
+            alphaPrecision=0.05, betaPrecision=0.05, delta=0.02
+        )
+        self.responses = makeBasicResponseCycles(
+            cycles=3, nCorrect=2, nIncorrect=2, length=10
+        )
+        # as given by the original dense (4-D) implementation
+        self.intensities = [0.6, 0.55, 0.5, 0.7, 0.85, 0.85, 0.8, 0.9,
+                            0.85, 0.9]
+
+        self.simulate()
+        self.checkSimulationResults()
+
+        assert np.allclose(self.stairs.estimateLambda(),
+                           (0.8430063658474769, 0.30072591357292294))
+        assert len(self.stairs.updateDurations) == 10
+
+    def test_PsiHandlerCandidates(self):
+        stairs = data.PsiHandler(
+            nTrials=10, intensRange=[0, 1], alphaRange=[0, 1],
+            betaRange=[0.05, 0.5], intensPrecision=0.05,
+            alphaPrecision=0.05, betaPrecision=0.05, delta=0.02,
+            dtype='float32'
+        )
+        stairs.setCandidates([0, 1, 2])
+        for trialN, intensity in enumerate(stairs):
+            assert intensity <= 0.1
+            stairs.addResponse(trialN % 2)
+        stairs.setCandidates(None)
+        assert stairs._psi.nextIntensity > 0.1
+
+
+class TestMultiStairCheckpoint(object):
+    def setup(self):
+        self.tmpDir = mkdtemp(prefix='psychopy-tests-checkpoint')
+
+    def teardown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _run(self, stairs, responses):
+        for response in responses:
+            try:
+                stairs.next()
+            except StopIteration:
+                break
+            stairs.addResponse(response)
+            stairs.addOtherData('RT', 0.5)
+
+    def test_checkpoint(self):
+        for stairType in ['simple', 'quest']:
+            conditions = [{'label': 'stair%i' % n, 'startVal': 0.5 + n,
+                           'startValSd': 1, 'nReversals': 2,
+                           'stepSizes': [1, 0.5], 'stepType': 'lin'}
+                          for n in range(5)]
+            responses = makeBasicResponseCycles(cycles=20, nCorrect=3,
+                                                nIncorrect=2)
+            # run half the trials then save a checkpoint
+            stairs = data.MultiStairHandler(stairType=stairType,
+                                            conditions=conditions,
+                                            nTrials=10)
+            self._run(stairs, responses[:20])
+            fileName = self.tmpDir + '/checkpoint_' + stairType
+            stairs.saveCheckpoint(fileName)
+            # restore into a new handler and finish both
+            resumed = data.MultiStairHandler(stairType=stairType,
+                                             conditions=conditions,
+                                             nTrials=10)
+            resumed.loadCheckpoint(fileName + '.npz')
+            np.random.seed(1)
+            self._run(stairs, responses[20:])
+            np.random.seed(1)
+            self._run(resumed, responses[20:])
+            for orig, new in zip(stairs.staircases, resumed.staircases):
+                assert new.finished == orig.finished
+                assert new.data == orig.data
+                assert np.allclose(new.intensities, orig.intensities)
+                assert new.reversalPoints == orig.reversalPoints
+                assert new.otherData == orig.otherData
+            assert resumed.totalTrials == stairs.totalTrials
+
+            # all sheets end up in one workbook
+            stairs.saveAsExcel(self.tmpDir + '/multi_' + stairType)
+            from openpyxl.reader.excel import load_workbook
+            wb = load_workbook(self.tmpDir + '/multi_' + stairType + '.xlsx')
+            assert wb.get_sheet_names() == [c['label'] for c in conditions]
+
+
 def makeBasicResponseCycles(cycles=10, nCorrect=4, nIncorrect=4,
                             length=None):
     """
@@ -145,6 +145,50 @@ class TestTrialHandler(object):
         trials.saveAsWideText(pjoin(self.temp_dir, 'testRandom.csv'), delim=',', appendFile=False)#this omits values
         utils.compareTextFiles(pjoin(self.temp_dir, 'testRandom.csv'), pjoin(fixturesPath,'corrRandom.csv'))
 
+class TestDataHandler(object):
+    def test_extend_beyond_shape(self):
+        dat = data.DataHandler(dataTypes=['rt', 'resp'], dataShape=[2, 3])
+        dat.add('rt', 0.5, position=[1, 2])
+        dat.add('rt', 0.25, position=[1, 7])  # beyond nReps
+        # all columns of the same shape grow together
+        assert dat['rt'].shape == (2, 8)
+        assert dat['resp'].shape == (2, 8)
+        assert dat.dataShape == [2, 8]
+        assert dat['rt'][1, 2] == 0.5
+        assert dat['rt'][1, 7] == 0.25
+        assert dat['rt'].mask.sum() == 14
+        # capacity doubles, so the next few additions need no reallocation
+        dat.add('rt', 1.0, position=[1, 8])
+        buff = dat._buffers['rt']
+        dat.add('rt', 1.0, position=[1, 12])
+        assert dat._buffers['rt'] is buff
+        assert dat['rt'].shape == (2, 13)
+
+    def test_numeric_and_object_columns(self):
+        import numpy
+        dat = data.DataHandler(dataTypes=['rt', 'key'], dataShape=[2, 2])
+        dat.add('rt', numpy.float64(0.5), position=[0, 0])
+        dat.add('rt', 2, position=[0, 1])
+        assert dat.isNumeric['rt']
+        dat.add('key', 'left', position=[1, 1])
+        assert not dat.isNumeric['key']
+        assert dat['key'].tolist() == [['--', '--'], ['--', 'left']]
+        # object columns also grow in place
+        dat.add('key', 'right', position=[1, 3])
+        assert dat['key'].tolist() == [['--', '--', '--', '--'],
+                                       ['--', 'left', '--', 'right']]
+
+    def test_pickle(self):
+        import cPickle
+        dat = data.DataHandler(dataTypes=['rt'], dataShape=[1, 2])
+        dat.add('rt', 0.5, position=[0, 4])
+        dat2 = cPickle.loads(cPickle.dumps(dat, 2))
+        assert dat2['rt'].shape == (1, 5)
+        dat2.add('rt', 0.75, position=[0, 0])
+        assert dat2['rt'][0, 0] == 0.75
+        assert dat2['rt'][0, 4] == 0.5
+
+
 class TestMultiStairs(object):
     def setup_class(self):
         self.temp_dir = mkdtemp(prefix='psychopy-tests-testdata')
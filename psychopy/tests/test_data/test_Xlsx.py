@@ -51,6 +51,92 @@ def test_TrialTypeImport():
                 print(header, trialCSV[header], trialXLSX[header])
             assert trialXLSX[header] == trialCSV[header]
 
+def test_importConditionsCache():
+    tempDir = mkdtemp(prefix='psychopy-tests-testdata')
+    data._conditionsCacheDir = os.path.join(tempDir, 'conditionsCache')
+    try:
+        fileName = os.path.join(tempDir, 'conds.csv')
+        with open(fileName, 'w') as f:
+            f.write('ori,pos\n0,"[1, 2]"\n90,"[3, 4]"\n180,"[5, 6]"\n')
+        first = data.importConditions(fileName)
+        assert os.path.abspath(fileName) in data._conditionsCache
+        # modifying the returned conditions mustn't alter the cached ones
+        first[0]['ori'] = 45
+        first[0]['pos'].append(0)
+        second = data.importConditions(fileName)
+        assert second[0] == {'ori': 0, 'pos': [1, 2]}
+        assert data.importConditions(fileName, selection='1:') == second[1:]
+        assert data.importConditions(fileName, selection=[2, 0]) == \
+            [second[2], second[0]]
+        # the binary cache on disk gives the same result
+        data._conditionsCache.clear()
+        assert data.importConditions(fileName) == second
+        # a changed file is parsed again
+        with open(fileName, 'w') as f:
+            f.write('ori,pos\n270,"[7, 8]"\n')
+        os.utime(fileName, (0, 0))
+        assert data.importConditions(fileName) == [{'ori': 270, 'pos': [7, 8]}]
+    finally:
+        data._conditionsCacheDir = None
+        shutil.rmtree(tempDir)
+
+def test_pruneConditionsCache():
+    tempDir = mkdtemp(prefix='psychopy-tests-testdata')
+    cacheDir = os.path.join(tempDir, 'conditionsCache')
+    data._conditionsCacheDir = cacheDir
+    maxFiles = data._conditionsCacheMaxFiles
+    maxBytes = data._conditionsCacheMaxBytes
+    data._conditionsCacheMaxFiles = 2
+    try:
+        cacheNames = []
+        for n in range(3):
+            fileName = os.path.join(tempDir, 'conds%i.csv' % n)
+            with open(fileName, 'w') as f:
+                f.write('ori\n%i\n' % n)
+            data.importConditions(fileName)
+            cacheNames.append(data._conditionsCacheName(
+                os.path.abspath(fileName)))
+            # the second file becomes the least recently used
+            os.utime(cacheNames[-1], (1, 1) if n == 1 else (10, 10))
+        assert sorted(os.listdir(cacheDir)) == \
+            sorted(os.path.basename(name) for name in cacheNames[::2])
+        # the size limit applies too
+        data._conditionsCacheMaxBytes = 1
+        data._pruneConditionsCache(cacheDir)
+        assert os.listdir(cacheDir) == []
+    finally:
+        data._conditionsCacheDir = None
+        data._conditionsCacheMaxFiles = maxFiles
+        data._conditionsCacheMaxBytes = maxBytes
+        shutil.rmtree(tempDir)
+
+def test_conditionsCacheMaxEntries():
+    tempDir = mkdtemp(prefix='psychopy-tests-testdata')
+    data._conditionsCacheDir = os.path.join(tempDir, 'conditionsCache')
+    maxEntries = data._conditionsCacheMaxEntries
+    data._conditionsCacheMaxEntries = 2
+    data._conditionsCache.clear()
+    try:
+        paths = []
+        for n in range(3):
+            fileName = os.path.join(tempDir, 'conds%i.csv' % n)
+            with open(fileName, 'w') as f:
+                f.write('ori\n%i\n' % n)
+            paths.append(os.path.abspath(fileName))
+        data.importConditions(paths[0])
+        data.importConditions(paths[1])
+        # using the first file again makes the second the least recent
+        data.importConditions(paths[0])
+        data.importConditions(paths[2])
+        assert list(data._conditionsCache) == [paths[0], paths[2]]
+        assert data.importConditions(paths[1]) == [{'ori': 1}]
+        assert list(data._conditionsCache) == [paths[2], paths[1]]
+    finally:
+        data._conditionsCacheDir = None
+        data._conditionsCacheMaxEntries = maxEntries
+        data._conditionsCache.clear()
+        shutil.rmtree(tempDir)
+
 if __name__=='__main__':
     t=TestXLSX()
     t.setup_class()
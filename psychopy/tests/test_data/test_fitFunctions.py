@@ -86,6 +86,35 @@ def test_logistic():
     if PLOTTING:
         plotFit(modResps, thresh, 'Logistic (thresh=%.2f, params=%s)' %(fit.inverse(0.75), fit.params))
 
+def test_bootStraps():
+    dat = numpy.array([[1, 2, 3, 4], [10, 20, 30, 40]])
+    boot = data.bootStraps(dat, n=25, rng=1, chunkSize=10)
+    assert boot.shape == (2, 4, 25)
+    # every resampled value comes from the right condition
+    assert set(boot[0].flat) <= set(dat[0])
+    assert set(boot[1].flat) <= set(dat[1])
+    # the same seed gives the same resamples
+    assert numpy.all(boot == data.bootStraps(dat, n=25, rng=1, chunkSize=10))
+
+def test_functionFromStaircase():
+    intens = [0.1, 0.3, 0.2, 0.1, 0.3, 0.3]
+    resps = [0, 1, 1, 1, 1, 0]
+    x, y, n = data.functionFromStaircase(intens, resps, bins='unique')
+    assert numpy.allclose(x, [0.1, 0.2, 0.3])
+    assert numpy.allclose(y, [0.5, 1.0, 2/3.])
+    assert list(n) == [2, 1, 3]
+    x, y, n = data.functionFromStaircase(intens, resps, bins=2)
+    assert numpy.allclose(x, [0.4/3, 0.9/3])
+    assert numpy.allclose(y, [2/3., 2/3.])
+    assert list(n) == [3, 3]
+
+def test_bootstrapCI():
+    fit = data.FitCumNormal(contrasts, responses, display=0, expectedMin=0.5)
+    ci = fit.bootstrapCI(n=50, rng=0)
+    assert ci.shape == (2, 2)
+    assert fit.paramsBoot.shape == (50, 2)
+    assert numpy.all(ci[0] <= ci[1])
+
 def teardown():
     if PLOTTING:
         pylab.show()
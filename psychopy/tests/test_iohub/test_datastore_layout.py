@@ -0,0 +1,65 @@
+"""Tests the compression, chunk shape and column index helpers used for the
+event tables of the ioHub DataStore"""
+import os
+import shutil
+import tempfile
+
+import numpy
+import tables
+
+from psychopy.iohub.datastore import _tableFilters, _tableChunkshape, _indexTableColumns
+
+_DTYPE = numpy.dtype([('experiment_id', 'u4'), ('session_id', 'u4'),
+                      ('time', 'f8')])
+
+_tmpdir = None
+
+
+def setup_module(module):
+    global _tmpdir
+    _tmpdir = tempfile.mkdtemp()
+
+
+def teardown_module(module):
+    shutil.rmtree(_tmpdir)
+
+
+def test_tableFilters():
+    filters = _tableFilters(dict(complib='zlib', complevel=3, shuffle=False))
+    assert filters.complib == 'zlib' and filters.complevel == 3
+    assert not filters.shuffle and not filters.fletcher32
+
+    filters = _tableFilters({})
+    assert filters.complib in ('blosc', 'zlib') and filters.complevel == 5
+    assert filters.shuffle
+
+
+def test_tableChunkshape():
+    layout = dict(chunk_bytes=1600, table_chunk_bytes=dict(SAMPLE=16000))
+    assert _tableChunkshape(layout, 'MESSAGE', _DTYPE) == (100,)
+    assert _tableChunkshape(layout, 'SAMPLE', _DTYPE) == (1000,)
+    assert _tableChunkshape({}, 'MESSAGE', _DTYPE) == (65536//16,)
+    assert _tableChunkshape(dict(chunk_bytes=8), 'MESSAGE', _DTYPE) == (1,)
+    assert _tableChunkshape(dict(chunk_bytes=None), 'MESSAGE', _DTYPE) is None
+
+
+def test_indexTableColumns():
+    path = os.path.join(_tmpdir, 'index.hdf5')
+    rows = numpy.zeros(1000, dtype=_DTYPE)
+    rows['time'] = numpy.random.RandomState(0).uniform(0, 100, 1000)
+    with tables.open_file(path, 'w') as f:
+        table = f.create_table('/', 'events', _DTYPE, filters=_tableFilters({}),
+                               chunkshape=_tableChunkshape({}, 'events', _DTYPE))
+        table.autoindex = False
+        table.append(rows)
+        _indexTableColumns(table, ['time', 'session_id', 'not_a_column'])
+        assert table.cols.time.is_indexed and table.cols.time.index.is_csi
+        assert table.cols.session_id.is_indexed
+        assert not table.cols.experiment_id.is_indexed
+
+        # rows added while recording leave the index dirty until it is rebuilt
+        table.append(rows)
+        assert table.cols.time.index.dirty
+        _indexTableColumns(table, ['time'])
+        assert not table.cols.time.index.dirty and table.cols.time.index.is_csi
+        assert len(table.read_where('time < 50')) == 2*(rows['time'] < 50).sum()
@@ -0,0 +1,110 @@
+"""Tests the bulk selection of the events of each trial by
+ExperimentDataAccessUtility.getEventAttributeValuesForTrials"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+import tables
+
+from psychopy.iohub.datastore.util import ExperimentDataAccessUtility, _rowsInTimeRanges
+
+_EVENT_TYPE = 51
+_EVENT_DTYPE = numpy.dtype([('experiment_id', 'u4'), ('session_id', 'u4'), ('type', 'u1'),
+                            ('filter_id', 'i2'), ('time', 'f8'), ('gaze_x', 'f4')])
+# (session_id, trial_start, trial_end): overlapping trials, and a trial
+# without events
+_TRIALS = [(1, 0.5, 2.0), (1, 1.5, 3.0), (1, 20.0, 21.0), (2, 0.0, 1.0), (2, 5.0, 5.5)]
+
+_tmpdir = None
+
+
+def setup_module(module):
+    global _tmpdir
+    _tmpdir = tempfile.mkdtemp()
+
+
+def teardown_module(module):
+    shutil.rmtree(_tmpdir)
+
+
+def _createDataStoreFile():
+    rs = numpy.random.RandomState(0)
+    events = numpy.zeros(2000, dtype=_EVENT_DTYPE)
+    events['experiment_id'] = 1
+    events['session_id'] = numpy.repeat([1, 2], 1000)
+    events['type'] = _EVENT_TYPE
+    events['filter_id'] = rs.choice([0, 7], 2000)
+    # times on a 10 msec grid, so trial bounds fall exactly on events
+    events['time'] = numpy.tile(numpy.arange(1000)/100.0, 2)
+    events['gaze_x'] = rs.normal(0, 100, 2000)
+    events = events[rs.permutation(2000)]
+
+    with tables.open_file(os.path.join(_tmpdir, 'trials.hdf5'), 'w') as f:
+        mapping = f.create_table('/', 'class_table_mapping', numpy.dtype(
+            [('class_id', 'u4'), ('class_type_id', 'u4'), ('class_name', 'S32'),
+             ('table_path', 'S128')]))
+        mapping.append([(_EVENT_TYPE, 1, 'MonocularEyeSampleEvent',
+                         '/data_collection/events/MonocularEyeSampleEvent')])
+        dc = f.create_group('/', 'data_collection')
+        experiments = f.create_table(dc, 'experiment_meta_data', numpy.dtype(
+            [('experiment_id', 'u4'), ('code', 'S24')]))
+        experiments.append([(1, 'exp')])
+        sessions = f.create_table(dc, 'session_meta_data', numpy.dtype(
+            [('session_id', 'u4'), ('experiment_id', 'u4'), ('code', 'S24'),
+             ('user_variables', 'S64')]))
+        sessions.append([(1, 1, 's1', json.dumps({})), (2, 1, 's2', json.dumps({}))])
+        cvs = f.create_table(f.create_group(dc, 'condition_variables'), 'EXP_CV_1', numpy.dtype(
+            [('session_id', 'u4'), ('trial_start', 'f8'), ('trial_end', 'f8')]))
+        cvs.append(_TRIALS)
+        f.create_table(f.create_group(dc, 'events'), 'MonocularEyeSampleEvent', events)
+    return events
+
+
+def test_rowsInTimeRanges():
+    rs = numpy.random.RandomState(1)
+    times = numpy.sort(rs.randint(0, 100, 300)).astype(numpy.float64)
+    starts = rs.randint(-10, 110, 40).astype(numpy.float64)
+    ends = starts+rs.randint(-5, 30, 40)
+    rows, ranges = _rowsInTimeRanges(times, starts, ends)
+    expected = [(r, i) for i in range(40) for r in range(300) if starts[i] <= times[r] <= ends[i]]
+    assert zip(rows, ranges) == expected
+    rows, ranges = _rowsInTimeRanges(times[:0], starts, ends)
+    assert len(rows) == 0 and len(ranges) == 0
+
+
+def test_eventAttributeValuesForTrials():
+    _createDataStoreFile()
+    data = ExperimentDataAccessUtility(_tmpdir, 'trials.hdf5')
+    try:
+        for filter_id in (None, 7):
+            per_trial = data.getEventAttributeValues(_EVENT_TYPE, ['time', 'gaze_x'],
+                                                     filter_id=filter_id,
+                                                     startConditions={'time': (' >= ', '@trial_start@')},
+                                                     endConditions={'time': (' <= ', '@trial_end@')})
+            results = data.getEventAttributeValuesForTrials(_EVENT_TYPE, ['time', 'gaze_x'],
+                                                            'trial_start', '@trial_end@',
+                                                            filter_id=filter_id)
+            assert len(per_trial) == len(_TRIALS)
+            assert list(results['trial_index']) == sorted(results['trial_index'])
+            for trial_index, trial in enumerate(per_trial):
+                trial_rows = results[results['trial_index'] == trial_index]
+                order = numpy.argsort(trial.time)
+                assert (trial_rows['session_id'] == _TRIALS[trial_index][0]).all()
+                assert list(trial_rows['time']) == list(trial.time[order])
+                assert list(trial_rows['gaze_x']) == list(trial.gaze_x[order])
+            # the overlapping trials share events, the last session 1 trial has none
+            assert (results['trial_index'] == 2).sum() == 0
+            assert len(numpy.intersect1d(results[results['trial_index'] == 0]['time'],
+                                         results[results['trial_index'] == 1]['time'])) > 0
+
+        df = data.getEventAttributeValuesForTrials(_EVENT_TYPE, 'gaze_x', 'trial_start',
+                                                   'trial_end', asDataFrame=True)
+        assert list(df.columns) == ['trial_index', 'session_id', 'gaze_x']
+        results = data.getEventAttributeValuesForTrials(_EVENT_TYPE, 'gaze_x', 'trial_start',
+                                                        'trial_end')
+        assert (df['trial_index'].values == results['trial_index']).all()
+        assert (df['gaze_x'].values == results['gaze_x']).all()
+    finally:
+        data.close()
@@ -0,0 +1,97 @@
+"""Tests for the ioDataStore background writer"""
+import threading
+
+import numpy
+
+from psychopy.iohub.datastore.writer import BatchWriter
+
+_dtypeA = numpy.dtype([('event_id', numpy.uint32), ('x', numpy.float32)])
+_dtypeB = numpy.dtype([('event_id', numpy.uint32), ('text', numpy.str, 8)])
+
+
+class _Tables(object):
+    def __init__(self):
+        self.tables = {}
+        self.writes = []
+        self.flushes = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def write(self, key, array):
+        self.release.wait()
+        self.writes.append((key, len(array)))
+        self.tables.setdefault(key, []).append(array)
+
+    def flush(self):
+        self.flushes += 1
+
+    def getTable(self, key):
+        return numpy.concatenate(self.tables[key])
+
+
+def test_batchWriter():
+    out = _Tables()
+    writer = BatchWriter(out.write, out.flush, batch_size=100, max_delay=10)
+    try:
+        # mixed tables are batched together, each written as one array
+        for i in range(250):
+            if i % 5:
+                writer.put('A', _dtypeA, (i, i * 0.5))
+            else:
+                writer.put('B', _dtypeB, (i, 'e%d' % i))
+        assert writer.flush(timeout=5)
+        a = out.getTable('A')
+        b = out.getTable('B')
+        assert list(a['event_id']) == [i for i in range(250) if i % 5]
+        assert list(b['text'][:2]) == ['e0', 'e5']
+        assert len(out.writes) == 6 and out.flushes == 3
+        stats = writer.getStats()
+        assert stats['rows_written'] == 250
+        assert stats['batches_written'] == 6
+        assert stats['queue_length'] == 0
+        assert stats['dropped_rows'] == 0
+        assert stats['latency_max'] >= stats['latency_mean'] > 0
+    finally:
+        writer.close()
+    assert not writer.put('A', _dtypeA, (0, 0))
+
+    # rows are written once max_delay has passed
+    out = _Tables()
+    writer = BatchWriter(out.write, batch_size=1000, max_delay=0.01)
+    try:
+        writer.put('A', _dtypeA, (1, 1))
+        for i in range(100):
+            if out.writes:
+                break
+            threading.Event().wait(0.01)
+        assert out.writes == [('A', 1)]
+    finally:
+        writer.close()
+
+
+def test_batchWriterFull():
+    # while the writer is stuck, the queue fills; rows are then dropped or
+    # put() blocks, as requested, and both are counted
+    for when_full in ('drop', 'block'):
+        out = _Tables()
+        out.release.clear()
+        writer = BatchWriter(out.write, batch_size=1, max_delay=0,
+                             max_queue_length=10, when_full=when_full,
+                             block_timeout=0.01)
+        try:
+            results = [writer.put('A', _dtypeA, (i, 0)) for i in range(20)]
+            stats = writer.getStats()
+            assert not all(results)
+            assert stats['dropped_rows'] == results.count(False)
+            assert stats['max_queue_length_seen'] == 10
+            if when_full == 'block':
+                assert stats['blocked_puts'] >= stats['dropped_rows']
+                assert stats['blocked_time'] > 0
+            else:
+                assert stats['blocked_puts'] == 0
+            out.release.set()
+            assert writer.flush(timeout=5)
+            assert writer.getStats()['rows_written'] == results.count(True)
+        finally:
+            out.release.set()
+            writer.close()
@@ -0,0 +1,56 @@
+"""Tests for the numpy structured array event representation used by
+ioHubConnection.getEvents(as_type='numpy')"""
+import numpy
+
+from psychopy.iohub.eventarrays import (eventsToArrays, packEventArrays,
+                                        unpackEventArrays, mergeEventArrays)
+
+
+class _SampleEvent(object):
+    NUMPY_DTYPE = numpy.dtype([('experiment_id', numpy.uint32),
+                               ('session_id', numpy.uint32),
+                               ('device_id', numpy.uint16),
+                               ('event_id', numpy.uint32),
+                               ('type', numpy.uint8),
+                               ('time', numpy.float64),
+                               ('x', numpy.float32)])
+
+
+class _MessageEvent(object):
+    NUMPY_DTYPE = numpy.dtype([('experiment_id', numpy.uint32),
+                               ('session_id', numpy.uint32),
+                               ('device_id', numpy.uint16),
+                               ('event_id', numpy.uint32),
+                               ('type', numpy.uint8),
+                               ('time', numpy.float64),
+                               ('text', numpy.str, 16)])
+
+_classes = {1: _SampleEvent, 2: _MessageEvent}
+
+
+def test_eventArrays():
+    events = []
+    for i in range(100):
+        if i % 10 == 0:
+            events.append([0, 0, 1, i, 2, i * 0.001, 'msg %d' % i])
+        else:
+            events.append([0, 0, 0, i, 1, i * 0.001, i * 0.5])
+    arrays = eventsToArrays(events, _classes.get)
+    assert sorted(arrays.keys()) == [1, 2]
+    assert len(arrays[1]) == 90 and len(arrays[2]) == 10
+    assert arrays[1].dtype == _SampleEvent.NUMPY_DTYPE
+    assert list(arrays[2]['text'][:2]) == ['msg 0', 'msg 10']
+    assert list(arrays[1]['event_id'][:3]) == [1, 2, 3]
+    assert numpy.allclose(arrays[1]['x'][:3], [0.5, 1.0, 1.5])
+
+    # the wire format round trips exactly (and gives writable arrays)
+    unpacked = unpackEventArrays(packEventArrays(arrays), _classes.get)
+    for etype in arrays:
+        assert (unpacked[etype] == arrays[etype]).all()
+    unpacked[1]['x'][0] = -1
+
+    merged = mergeEventArrays(eventsToArrays(events[:50], _classes.get),
+                              eventsToArrays(events[50:], _classes.get))
+    for etype in arrays:
+        assert (merged[etype] == arrays[etype]).all()
+    assert eventsToArrays([], _classes.get) == {}
@@ -0,0 +1,121 @@
+"""Tests for the time ordered event buffer used for the ioHub global and
+device event buffers"""
+import random
+from operator import itemgetter
+
+from psychopy.iohub.eventbuffer import (TimeOrderedEventBuffer, EVENT_TYPE_ID_INDEX,
+                                        EVENT_HUB_TIME_INDEX, EVENT_FILTER_ID_INDEX)
+
+
+def _event(event_id, event_type, hub_time, filter_id=0):
+    e = [0]*11
+    e[3] = event_id
+    e[EVENT_TYPE_ID_INDEX] = event_type
+    e[EVENT_HUB_TIME_INDEX] = hub_time
+    e[EVENT_FILTER_ID_INDEX] = filter_id
+    return e
+
+
+def _events(count, seed):
+    """Events of 3 types, each type in time order, types interleaved."""
+    rs = random.Random(seed)
+    events = []
+    for i in range(count):
+        etype = rs.choice((1, 2, 3))
+        events.append(_event(i, etype, rs.randint(0, 50)*0.01+(i//8)*0.5,
+                             rs.choice((0, 0, 7))))
+    last = {}
+    for e in events:
+        key = (e[EVENT_TYPE_ID_INDEX], e[EVENT_FILTER_ID_INDEX])
+        e[EVENT_HUB_TIME_INDEX] = max(e[EVENT_HUB_TIME_INDEX], last.get(key, 0.0))
+        last[key] = e[EVENT_HUB_TIME_INDEX]
+    return events
+
+
+def _ids(events):
+    return [e[3] for e in events]
+
+
+def _sorted(events):
+    return sorted(events, key=itemgetter(EVENT_HUB_TIME_INDEX))
+
+
+def _assertSameEvents(got, expected):
+    # events with equal times can be in either order
+    assert sorted(_ids(got)) == sorted(_ids(expected))
+    assert [e[EVENT_HUB_TIME_INDEX] for e in got] == [e[EVENT_HUB_TIME_INDEX] for e in _sorted(expected)]
+
+
+def test_timeOrder():
+    events = _events(500, 0)
+    buf = TimeOrderedEventBuffer()
+    buf.extend(events)
+    assert len(buf) == 500
+    _assertSameEvents(buf.getEvents(), events)
+    _assertSameEvents(buf.getEvents(2), [e for e in events if e[EVENT_TYPE_ID_INDEX] == 2])
+    _assertSameEvents(buf.getEvents(filter_id=7), [e for e in events if e[EVENT_FILTER_ID_INDEX] == 7])
+    assert len(buf) == 500
+
+    by_type = buf.getEventsByType()
+    assert sorted(by_type.keys()) == [1, 2, 3]
+    assert sum(len(v) for v in by_type.values()) == 500
+
+
+def test_outOfOrderAppend():
+    buf = TimeOrderedEventBuffer()
+    for i, t in enumerate((1.0, 3.0, 2.0, 0.5, 4.0)):
+        buf.append(_event(i, 1, t))
+    assert _ids(buf.getEvents()) == [3, 0, 2, 1, 4]
+
+
+def test_timeRange():
+    events = _events(300, 1)
+    buf = TimeOrderedEventBuffer()
+    buf.extend(events)
+    in_range = [e for e in _sorted(events) if 3.0 <= e[EVENT_HUB_TIME_INDEX] <= 6.0]
+    _assertSameEvents(buf.getEvents(start_time=3.0, end_time=6.0), in_range)
+    _assertSameEvents(buf.getEvents(start_time=3.0, end_time=6.0, clear=True), in_range)
+    assert len(buf) == 300-len(in_range)
+    assert buf.getEvents(start_time=3.0, end_time=6.0) == []
+    rest = [e for e in _sorted(events) if not 3.0 <= e[EVENT_HUB_TIME_INDEX] <= 6.0]
+    _assertSameEvents(buf.getEvents(), rest)
+    _assertSameEvents(buf.getEvents(end_time=1.0), [e for e in rest if e[EVENT_HUB_TIME_INDEX] <= 1.0])
+
+
+def test_clear():
+    events = _events(400, 2)
+    buf = TimeOrderedEventBuffer()
+    buf.extend(events)
+    first = buf.getEvents(1, clear=True)
+    assert first and buf.getEvents(1) == []
+    buf.clear(filter_id=7)
+    remaining = [e for e in events if e[EVENT_TYPE_ID_INDEX] != 1 and e[EVENT_FILTER_ID_INDEX] != 7]
+    assert len(buf) == len(remaining)
+    assert sorted(_ids(buf.getEvents())) == sorted(_ids(remaining))
+    # events read and cleared a few at a time, as by polling
+    buf.extend(_event(1000+i, 1, 100.0+i) for i in range(10))
+    assert _ids(buf.getEvents(clear=True))[-10:] == range(1000, 1010)
+    assert len(buf) == 0 and buf.getEvents() == []
+    buf.extend(events)
+    buf.clear()
+    assert len(buf) == 0 and buf.getEvents() == []
+
+
+def test_bounded():
+    events = _events(400, 3)
+    buf = TimeOrderedEventBuffer(max_length=100)
+    buf.extend(events)
+    assert len(buf) == 100
+    assert buf.dropped == 300
+    dropped = buf.getDroppedCounts()
+    assert sorted(dropped.keys()) == [1, 2, 3]
+    assert sum(dropped.values()) == 300
+    # the newest events are kept
+    kept_times = [e[EVENT_HUB_TIME_INDEX] for e in buf.getEvents()]
+    assert min(kept_times) >= sorted(e[EVENT_HUB_TIME_INDEX] for e in events)[299]
+
+    buf = TimeOrderedEventBuffer(max_run_length=20)
+    buf.extend(events)
+    for etype in (1, 2, 3):
+        assert len(buf.getEvents(etype, 7)) == 20
+    assert buf.dropped == 400-len(buf)
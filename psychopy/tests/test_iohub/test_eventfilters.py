@@ -0,0 +1,120 @@
+"""Tests the iohub MovingWindowFilter classes: the SlidingMedian used by
+MedianFilter, the EventWindow event buffer and the batched add_many()"""
+import numpy
+
+from psychopy.iohub.util import NumPyRingBuffer
+from psychopy.iohub.devices.eventfilters import (SlidingMedian, EventWindow,
+    MovingWindowFilter, PassThroughFilter, MedianFilter, WeightedAverageFilter,
+    StampFilter)
+
+_FIELD_INDEX = 2
+
+_FILTERS = ((MovingWindowFilter, dict(length=4, knot_pos='latest')),
+            (PassThroughFilter, dict()),
+            (MedianFilter, dict(length=5, knot_pos='center')),
+            (MedianFilter, dict(length=3, knot_pos=0)),
+            (WeightedAverageFilter, dict(weights=(1, 2, 3), knot_pos='oldest')),
+            (StampFilter, dict(level=1)),
+            (StampFilter, dict(level=2)))
+
+
+def _createFilter(filter_class, kwargs, events):
+    f = filter_class(inplace=True, **kwargs)
+    sub_filter = f
+    while events and sub_filter:
+        # as set up by event_type and event_field_name kwargs
+        sub_filter._event_field_index = _FIELD_INDEX
+        sub_filter._events = EventWindow(sub_filter._filtering_buffer.max_size)
+        sub_filter = getattr(sub_filter, 'sub_filter', None)
+    return f
+
+
+def _values(count, seed):
+    rs = numpy.random.RandomState(seed)
+    # rounded so the windows often hold equal values
+    return numpy.round(rs.normal(0, 5, count)).astype(numpy.float32)
+
+
+def test_slidingMedian():
+    for length in (1, 2, 5, 8):
+        for seed in range(3):
+            values = _values(300, seed)
+            values[numpy.random.RandomState(seed).randint(0, 300, 4)] = numpy.NaN
+            median = SlidingMedian(length)
+            for i, v in enumerate(values):
+                median.add(v)
+                expected = numpy.median(values[max(i-length+1, 0):i+1])
+                got = median.median()
+                assert type(got) is numpy.float32
+                assert got == expected or (numpy.isnan(got) and numpy.isnan(expected)), (length, i)
+    median.clear()
+    assert numpy.isnan(median.median())
+
+
+def test_eventWindow():
+    window = EventWindow(3)
+    assert len(window) == 0 and not window.isFull()
+    window.append('a')
+    window.append('b')
+    assert list(window) == ['a', 'b'] and window[-1] == 'b'
+    window.extend(['c', 'd'])
+    assert window.isFull()
+    assert list(window) == ['b', 'c', 'd'] and window[0] == 'b'
+    window.extend(list('efghi'))
+    assert list(window) == ['g', 'h', 'i']
+    try:
+        window[3]
+    except IndexError:
+        pass
+    else:
+        assert False, "EventWindow[3] did not raise IndexError"
+    window.clear()
+    assert len(window) == 0
+
+
+def test_ringBufferExtend():
+    for count in (2, 7, 25):
+        appended = NumPyRingBuffer(6)
+        extended = NumPyRingBuffer(6)
+        values = numpy.arange(3+count)
+        for v in values:
+            appended.append(v)
+        extended.extend(values[:3])
+        extended.extend(values[3:])
+        assert len(appended) == len(extended) == min(3+count, 6)
+        assert list(extended.getElements()) == list(values[-6:])
+        assert list(appended.getElements()) == list(values[-6:])
+
+
+def test_addManyValues():
+    values = _values(200, 1)
+    # a StampFilter with sub filters only filters events
+    for filter_class, kwargs in _FILTERS[:-1]:
+        single = _createFilter(filter_class, kwargs, False)
+        expected = [r[1] for r in (single.add(v) for v in values) if r]
+        many = _createFilter(filter_class, kwargs, False)
+        got = []
+        for chunk in numpy.array_split(values, [1, 2, 30, 31, 120]):
+            events, filtered = many.add_many(chunk)
+            assert events is None
+            got.extend(filtered)
+        assert numpy.allclose(got, expected, rtol=1e-6), filter_class.__name__
+        assert numpy.isclose(single.filteredValue(), many.filteredValue(), rtol=1e-6)
+
+
+def test_addManyEvents():
+    values = _values(100, 2)
+    for filter_class, kwargs in _FILTERS:
+        single = _createFilter(filter_class, kwargs, True)
+        events = [[0, 0, v, i] for i, v in enumerate(values)]
+        expected = [r[0] for r in (single.add(e) for e in events) if r]
+        many = _createFilter(filter_class, kwargs, True)
+        many_events = [[0, 0, v, i] for i, v in enumerate(values)]
+        got = []
+        for chunk in (many_events[:3], many_events[3:4], many_events[4:60], many_events[60:]):
+            filtered_events, filtered = many.add_many(chunk)
+            assert [e[_FIELD_INDEX] for e in filtered_events] == list(filtered)
+            got.extend(filtered_events)
+        assert [e[3] for e in got] == [e[3] for e in expected], filter_class.__name__
+        assert numpy.allclose([e[_FIELD_INDEX] for e in many_events],
+                              [e[_FIELD_INDEX] for e in events], rtol=1e-6)
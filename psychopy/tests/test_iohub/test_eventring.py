@@ -0,0 +1,50 @@
+"""Tests for the shared memory event ring used between the PsychoPy and
+ioHub Processes"""
+import os
+
+from psychopy.iohub.eventring import createRingFile, SharedEventRing
+
+
+def test_eventRing():
+    path = createRingFile(size=1000)
+    producer = SharedEventRing(path)
+    consumer = SharedEventRing(path)
+    try:
+        assert producer.capacity == 1000
+        received = []
+        n = 0
+        # many small writes and reads, so the ring wraps around many times
+        for rep in range(200):
+            for k in range(rep % 7):
+                if not producer.write([n, 'x' * (n % 37), n * 0.5]):
+                    break
+                n += 1
+            received.extend(consumer.read())
+        received.extend(consumer.read())
+        assert [e[0] for e in received] == range(n)
+        assert received[5] == [5, 'xxxxx', 2.5]
+        assert consumer.read() == []
+
+        # events that don't fit are refused
+        assert not producer.write(['y' * 2000])
+        producer.pending = 3
+        assert consumer.pending == 3
+        producer.dropped = 2
+        assert consumer.dropped == 2
+
+        # discarding the events written up to a position (as done when
+        # the events are cleared) keeps the events written after it
+        producer.write([1])
+        producer.write([2])
+        position = producer.written
+        producer.write([3])
+        consumer.discard(position)
+        assert consumer.read() == [[3]]
+        # a position that has already been read does nothing
+        producer.write([4])
+        consumer.discard(position)
+        assert consumer.read() == [[4]]
+    finally:
+        producer.close()
+        consumer.close()
+        os.remove(path)
@@ -0,0 +1,156 @@
+"""Tests that EyeTrackerEventParser.parseSampleArray() (the vectorized batch
+parser) outputs the same samples and events as the streaming parser"""
+import copy
+
+import numpy
+
+from psychopy.iohub import EventConstants, Computer
+from psychopy.iohub.devices.eyetracker import EyeTrackerDevice, eye_events
+from psychopy.iohub.devices.eyetracker.filters.parser import EyeTrackerEventParser
+
+_EVENT_CLASSES = (eye_events.MonocularEyeSampleEvent,
+                  eye_events.BinocularEyeSampleEvent,
+                  eye_events.FixationStartEvent, eye_events.FixationEndEvent,
+                  eye_events.SaccadeStartEvent, eye_events.SaccadeEndEvent,
+                  eye_events.BlinkStartEvent, eye_events.BlinkEndEvent)
+
+_FILTERS = (None,
+            dict(name='MovingWindowFilter', length=3, knot_pos='center'),
+            dict(name='MovingWindowFilter', length=3, knot_pos='latest'),
+            dict(name='MedianFilter', length=5, knot_pos='oldest'),
+            dict(name='StampFilter', level=1),
+            dict(name='WeightedAverageFilter', weights=(1, 2, 3), knot_pos=2))
+
+
+def setup_module(module):
+    EventConstants.addClassMappings(EyeTrackerDevice,
+                                    [c.EVENT_TYPE_ID for c in _EVENT_CLASSES],
+                                    dict((c.__name__, c) for c in _EVENT_CLASSES))
+
+
+def _binocularSamples(count, seed, leading_missing=5):
+    """Fixations and saccades at 500 Hz, with blinks and one eye dropouts."""
+    rs = numpy.random.RandomState(seed)
+    samples = numpy.zeros(count, dtype=eye_events.BinocularEyeSampleEvent.NUMPY_DTYPE)
+    samples['type'] = EventConstants.BINOCULAR_EYE_SAMPLE
+    samples['experiment_id'] = 1
+    samples['session_id'] = 2
+    samples['event_id'] = numpy.arange(count)+1000
+    samples['time'] = numpy.arange(count)*0.002+10.0
+    samples['device_time'] = samples['logged_time'] = samples['time']
+    x = numpy.zeros(count)
+    y = numpy.zeros(count)
+    i, px, py = 0, 0.0, 0.0
+    while i < count:
+        n = len(x[i:i+rs.randint(50, 200)])
+        x[i:i+n] = px+rs.normal(0, 1.5, n)
+        y[i:i+n] = py+rs.normal(0, 1.5, n)
+        i += n
+        n = len(x[i:i+rs.randint(8, 25)])
+        tx, ty = rs.uniform(-800, 800), rs.uniform(-400, 400)
+        k = numpy.linspace(0, 1, n+2)[1:-1]
+        x[i:i+n] = px+(tx-px)*k
+        y[i:i+n] = py+(ty-py)*k
+        i += n
+        px, py = tx, ty
+    for eye in ('left', 'right'):
+        samples[eye+'_gaze_x'] = x+rs.normal(0, 0.5, count)
+        samples[eye+'_gaze_y'] = y+rs.normal(0, 0.5, count)
+        samples[eye+'_pupil_measure1'] = rs.uniform(800, 900, count)
+        samples[eye+'_pupil_measure1_type'] = 3
+        samples[eye+'_raw_x'] = rs.uniform(0, 1, count)
+        samples[eye+'_velocity_x'] = rs.uniform(0, 1, count)
+    status = numpy.zeros(count, dtype=numpy.uint8)
+    for b in range(count//400):
+        s = rs.randint(0, count-40)
+        status[s:s+rs.randint(1, 40)] = 22
+    for b in range(count//300):
+        s = rs.randint(0, count)
+        status[s:s+3] = rs.choice([2, 20])
+    status[:leading_missing] = 22
+    status[-3:] = 22
+    samples['status'] = status
+    return samples
+
+
+def _createParser(position_filter):
+    return EyeTrackerEventParser(sampling_rate=500,
+                                 adaptive_vel_thresh_history=0.3,
+                                 position_filter=copy.deepcopy(position_filter),
+                                 display_device=dict(mm_size=dict(width=500, height=280),
+                                                     pixel_res=(1920, 1080),
+                                                     eye_distance=600))
+
+
+def _streamingParse(samples, position_filter):
+    """Give the samples to the streaming parser one at a time."""
+    parser = _createParser(position_filter)
+    Computer._nextEventID = 1
+    rows = dict()
+    for sample in samples:
+        parser._addInputEvent(list(sample.tolist()))
+        for e in parser._removeOutputEvents():
+            row = tuple(numpy.asarray(v).item() if isinstance(v, numpy.ndarray) else v for v in e)
+            rows.setdefault(e[4], []).append(row)
+    return dict((etype, numpy.array(r, dtype=EventConstants.getClass(etype).NUMPY_DTYPE))
+                for etype, r in rows.iteritems())
+
+
+def _assertSameEvents(streamed, batched):
+    assert sorted(streamed.keys()) == sorted(batched.keys())
+    for etype, expected in streamed.iteritems():
+        got = batched[etype]
+        assert got.dtype == expected.dtype
+        assert len(got) == len(expected), EventConstants.getName(etype)
+        for field in expected.dtype.names:
+            if expected.dtype[field].kind == 'f':
+                same = numpy.isclose(got[field], expected[field], rtol=1e-5,
+                                     atol=1e-6, equal_nan=True)
+            else:
+                same = got[field] == expected[field]
+            assert same.all(), (EventConstants.getName(etype), field)
+
+
+def test_binocularSamples():
+    for position_filter in _FILTERS:
+        for seed in (0, 1):
+            samples = _binocularSamples(3000, seed, leading_missing=5*(1-seed))
+            streamed = _streamingParse(samples, position_filter)
+            assert len(streamed[EventConstants.FIXATION_END]) > 10
+            assert len(streamed[EventConstants.BLINK_END]) > 2
+            batched = _createParser(position_filter).parseSampleArray(samples, first_event_id=1)
+            _assertSameEvents(streamed, batched)
+
+
+def test_monocularSamples():
+    binocular = _binocularSamples(2000, 3)
+    samples = numpy.zeros(len(binocular), dtype=eye_events.MonocularEyeSampleEvent.NUMPY_DTYPE)
+    for field in samples.dtype.names:
+        if field in binocular.dtype.names:
+            samples[field] = binocular[field]
+        elif field != 'eye':
+            samples[field] = binocular['left_'+field]
+    samples['type'] = EventConstants.MONOCULAR_EYE_SAMPLE
+    samples['eye'] = 1
+    samples['status'] = numpy.where(binocular['status'] == 22, 2, 0)
+    for position_filter in _FILTERS[:2]:
+        streamed = _streamingParse(samples, position_filter)
+        batched = _createParser(position_filter).parseSampleArray(samples, first_event_id=1)
+        _assertSameEvents(streamed, batched)
+
+
+def test_eventIds():
+    samples = _binocularSamples(1000, 4)
+    Computer._nextEventID = 50
+    parsed = _createParser(None).parseSampleArray(samples)
+    event_ids = numpy.sort(numpy.concatenate([a['event_id'] for a in parsed.values()]))
+    assert event_ids[0] == 50
+    assert (numpy.diff(event_ids) == 1).all()
+    assert Computer._nextEventID == 50+len(event_ids)
+    assert _createParser(None).parseSampleArray(samples[:0]) == {}
+
+    # all samples missing: only the samples are output
+    samples['status'] = 22
+    parsed = _createParser(None).parseSampleArray(samples, first_event_id=1)
+    assert parsed.keys() == [EventConstants.MONOCULAR_EYE_SAMPLE]
+    assert list(parsed[EventConstants.MONOCULAR_EYE_SAMPLE]['event_id']) == range(1, 1001)
@@ -0,0 +1,80 @@
+"""Tests the vectorized point in interest area tests of
+psychopy.iohub.datastore.pandas.interestarea"""
+import numpy
+import pandas
+import pytest
+
+pytest.importorskip('shapely')
+
+from psychopy.iohub.datastore.pandas.interestarea import (Polygon, Circle, Ellipse,
+                                                          Rectangle, InterestAreaSet)
+
+
+def _points(count, seed):
+    rs = numpy.random.RandomState(seed)
+    x = rs.uniform(-600, 600, count)
+    y = rs.uniform(-600, 600, count)
+    x[:5] = numpy.NaN
+    return x, y
+
+
+def _areas():
+    return [Circle('circle', [0, 0], 400),
+            Rectangle('rect', -200, 200, 200, -200),
+            Ellipse('ellipse', [300, 300], 100, 200, 45),
+            Ellipse('ellipse rad', [-250, 100], 50, 150, numpy.pi/6, use_radians=True),
+            Circle('spot', [300, 300], 10),
+            # a concave, 'C' shaped polygon
+            Polygon('C', [(-500, -500), (-100, -500), (-100, -400), (-400, -400),
+                          (-400, -100), (-100, -100), (-100, 0), (-500, 0)])]
+
+
+def test_closedFormAreas():
+    x, y = _points(5000, 0)
+    circle, rect, ellipse, ellipse_rad = _areas()[:4]
+    with numpy.errstate(invalid='ignore'):
+        assert (circle.containsPoints(x, y) == (x*x+y*y < 400*400)).all()
+        assert (rect.containsPoints(x, y) == ((abs(x) < 200) & (abs(y) < 200))).all()
+        # rotate the points back by 45 degrees: x along min_axis, y along max_axis
+        c = numpy.sqrt(0.5)
+        ex = (c*(x-300)+c*(y-300))/100.0
+        ey = (c*(y-300)-c*(x-300))/200.0
+        assert (ellipse.containsPoints(x, y) == (ex*ex+ey*ey < 1)).all()
+    hits = ellipse_rad.containsPoints(x, y)
+    assert hits.any() and not hits[:5].any()
+
+
+def test_polygonAreas():
+    x, y = _points(3000, 1)
+    for area in _areas():
+        expected = numpy.array([area.contains((px, py)) for px, py in zip(x[5:], y[5:])])
+        outline = Polygon.containsPoints(area, x, y)
+        assert not outline[:5].any()
+        assert (outline[5:] == expected).all(), area.name
+        # the closed form circle and ellipse tests differ from their polygon
+        # outline near the edge
+        assert (area.containsPoints(x, y)[5:] == expected).mean() > 0.99, area.name
+
+
+def test_interestAreaSet():
+    x, y = _points(20000, 2)
+    areas = _areas()
+    expected = numpy.column_stack([a.containsPoints(x, y) for a in areas])
+    for grid_size in (None, 1, 3, 50):
+        area_set = InterestAreaSet(areas, grid_size=grid_size)
+        assert (area_set.containsPoints(x, y) == expected).all(), grid_size
+    labels = area_set.labels(x, y)
+    assert (labels[:5] == -1).all()
+    assert (labels[expected[:, 0]] == 0).all()
+    assert ((labels == -1) == ~expected.any(axis=1)).all()
+
+    df = pandas.DataFrame(dict(x_position=x[:2000], y_position=y[:2000]))
+    filtered = area_set.filter(df)
+    assert len(filtered) == expected[:2000].sum()
+    circle_rows = filtered[filtered['ia_name'] == 'circle']
+    assert list(circle_rows.index) == list(areas[0].filter(df).index)
+    assert list(circle_rows['ia_id_num']) == range(1, len(circle_rows)+1)
+
+    # no areas: every point is outside
+    assert (InterestAreaSet([]).labels(x, y) == -1).all()
+    assert len(InterestAreaSet([]).labels(x, y)) == len(x)
@@ -0,0 +1,99 @@
+"""Tests the vectorized assignment of events to interest periods by
+psychopy.iohub.datastore.pandas.interestperiod"""
+import numpy
+import pandas
+
+from psychopy.iohub.datastore.pandas.interestperiod import (MessageBasedIP,
+                                                            ConditionVariableBasedIP)
+
+
+def _index(experiment_ids, session_ids):
+    return pandas.MultiIndex.from_arrays([experiment_ids, session_ids],
+                                         names=['experiment_id', 'session_id'])
+
+
+def _samples(seed):
+    """Samples of 3 sessions, in time order within each session."""
+    rs = numpy.random.RandomState(seed)
+    sessions = numpy.repeat([1, 2, 3], 400)
+    times = numpy.concatenate([numpy.sort(rs.uniform(0, 10, 400)) for s in range(3)])
+    times[:3] = [1.0, 2.0, 4.0]
+    return pandas.DataFrame(dict(time=times, event_id=numpy.arange(1200)),
+                            index=_index([1]*1200, sessions))
+
+
+def _messages():
+    """TRIAL_START / TRIAL_END messages of 4 trials in sessions 1 and 2."""
+    times, texts, sessions = [], [], []
+    for session in (1, 2):
+        for trial in range(4):
+            times += [trial*2.0+1.0, trial*2.0+2.0]
+            texts += ['TRIAL_START', 'TRIAL_END']
+            sessions += [session, session]
+    return pandas.DataFrame(dict(time=times, text=texts, event_id=range(len(times))),
+                            index=_index([1]*len(times), sessions))
+
+
+def _expected(samples, ip_df):
+    """(sample row, ip row) pairs from a comparison of every pair."""
+    pairs = []
+    for i, (skey, t) in enumerate(zip(samples.index, samples['time'])):
+        for j, (ikey, start, end) in enumerate(zip(ip_df.index, ip_df['start_time'],
+                                                   ip_df['end_time'])):
+            if skey == ikey and start <= t <= end:
+                pairs.append((i, j))
+    return pairs
+
+
+def test_messageBasedIP():
+    samples = _samples(0)
+    trial_ip = MessageBasedIP(name='trial', message_df=_messages())
+    ip_df = trial_ip.ip_df
+    assert len(ip_df) == 8
+    assert list(ip_df['ip_id_num']) == [0, 1, 2, 3]*2
+    assert (ip_df['end_time'] == ip_df['start_time']+1.0).all()
+
+    rows, ip_rows = trial_ip.intervalIndex(samples)
+    assert zip(rows, ip_rows) == _expected(samples, ip_df)
+    # the samples at the start and end times of the first trial are within it
+    assert rows[0] == 0 and rows[1] == 1
+
+    filtered = trial_ip.filter(samples)
+    assert list(filtered['event_id']) == list(samples['event_id'].values[rows])
+    filtered = trial_ip.filter(samples, ip_cols=['start_time'])
+    assert len(filtered) == len(rows)
+    assert (filtered['ip_name'] == 'trial').all()
+    assert (filtered['ip_id'] == trial_ip.ipid).all()
+    assert (filtered['start_time'] <= filtered['time']).all()
+    assert (filtered['time'] <= filtered['start_time']+1.0).all()
+    assert (filtered.index.get_level_values(1) != 3).all()
+
+    found = trial_ip.find(samples)
+    assert len(found) == len(filtered)
+    assert (numpy.diff(found['ip_id_num'].values[:len(found)//2]) >= 0).all()
+
+
+def test_overlappingIPs():
+    samples = _samples(1)
+    ip_index = _index([1]*7, [1, 1, 1, 1, 2, 2, 3])
+    cvs = pandas.DataFrame(dict(TRIAL_START=[0.5, 1.0, 6.0, 2.0, 3.0, 3.5, 9.0],
+                                TRIAL_END=[9.0, 2.5, 7.0, 2.2, 5.0, 4.0, 20.0]),
+                           index=ip_index)
+    cv_ip = ConditionVariableBasedIP(name='cv', source_df=cvs,
+                                     start_col_name='TRIAL_START', end_col_name='TRIAL_END')
+    rows, ip_rows = cv_ip.intervalIndex(samples)
+    expected = _expected(samples, cv_ip.ip_df)
+    assert zip(rows, ip_rows) == expected
+
+    found = cv_ip.find(samples, ip_cols={'start_time': 'ip_start'})
+    assert len(found) == len(expected)
+    assert (found['ip_start'] <= found['time']).all()
+    counts = found.groupby('ip_id_num').size()
+    for j in range(7):
+        assert counts.get(j+1, 0) == sum(1 for pair in expected if pair[1] == j)
+
+    filtered = cv_ip.filter(samples)
+    assert len(filtered) == len(set(rows))
+    assert filtered['event_id'].is_monotonic_increasing
+
+    assert len(cv_ip.find(samples.iloc[:0])) == 0
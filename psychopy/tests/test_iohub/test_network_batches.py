@@ -0,0 +1,67 @@
+"""Tests the message format used by the EventPublisher and
+RemoteEventSubscriber devices"""
+import numpy
+import pytest
+
+pytest.importorskip('msgpack')
+
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.eventbatches import (packEventBatch, unpackEventBatch, eventTopic,
+                                         eventClassTopic, EXIT_TOPIC, EventBatcher,
+                                         PAYLOAD_MSGPACK, PAYLOAD_NUMPY)
+
+
+def _messageEvents(count):
+    dtype = EventConstants.getClass(EventConstants.MESSAGE).NUMPY_DTYPE
+    events = numpy.zeros(count, dtype)
+    events['device_id'] = 1
+    events['type'] = EventConstants.MESSAGE
+    events['time'] = numpy.arange(count)*0.001
+    events['text'] = ['message %d' % i for i in range(count)]
+    return [list(e) for e in events.tolist()]
+
+
+def test_topics():
+    assert eventTopic(EventConstants.MESSAGE) == chr(EventConstants.MESSAGE)
+    assert eventClassTopic('MessageEvent') == eventTopic(EventConstants.MESSAGE)
+    assert eventClassTopic('KeyboardPressEvent') == eventTopic(EventConstants.KEYBOARD_PRESS)
+    # a subscription to one event type does not match other topics
+    assert not eventTopic(EventConstants.MESSAGE).startswith(EXIT_TOPIC)
+
+
+def test_packEventBatch():
+    events = _messageEvents(20)
+    payload = packEventBatch(EventConstants.MESSAGE, events, PAYLOAD_MSGPACK)
+    assert unpackEventBatch(EventConstants.MESSAGE, PAYLOAD_MSGPACK, payload) == events
+
+    payload = packEventBatch(EventConstants.MESSAGE, events, PAYLOAD_NUMPY)
+    assert len(payload) == 20
+    assert unpackEventBatch(EventConstants.MESSAGE, PAYLOAD_NUMPY, buffer(payload)) == events
+
+
+def test_eventBatcher():
+    sent = []
+    events = _messageEvents(7)
+    # the default sends each event straight away
+    batcher = EventBatcher(lambda t, batch: sent.append((t, batch)))
+    assert not batcher.add(EventConstants.MESSAGE, events[0])
+    assert sent == [(EventConstants.MESSAGE, [events[0]])]
+    assert batcher.pending == 0
+
+    del sent[:]
+    batcher = EventBatcher(lambda t, batch: sent.append((t, batch)), batch_size=3)
+    # an event left in a partly filled batch needs a flush
+    assert batcher.add(EventConstants.MESSAGE, events[0])
+    assert batcher.add(EventConstants.KEYBOARD_PRESS, events[1])
+    assert batcher.add(EventConstants.MESSAGE, events[2])
+    assert sent == [] and batcher.pending == 3
+    # a full batch is sent at once, without waiting for a flush
+    assert not batcher.add(EventConstants.MESSAGE, events[3])
+    assert sent == [(EventConstants.MESSAGE, [events[0], events[2], events[3]])]
+    assert batcher.pending == 1
+    batcher.flush()
+    assert sent[1:] == [(EventConstants.KEYBOARD_PRESS, [events[1]])]
+    assert batcher.pending == 0
+    # nothing is sent when no batch is pending
+    batcher.flush()
+    assert len(sent) == 2
@@ -0,0 +1,138 @@
+"""Tests the selection of event rows and columns in the HDF5 file by
+ioHubPandasDataView"""
+import os
+import shutil
+import tempfile
+
+import numpy
+import tables
+
+from psychopy.iohub.datastore.pandas import ioHubPandasDataView
+
+_SAMPLE = 51
+_MESSAGE = 62
+_EVENT_CONSTANTS = {'MONOCULAR_EYE_SAMPLE': _SAMPLE, _SAMPLE: 'MONOCULAR_EYE_SAMPLE',
+                    'MESSAGE': _MESSAGE, _MESSAGE: 'MESSAGE'}
+_GLOBAL_FIELDS = [('experiment_id', 'u4'), ('session_id', 'u4'), ('device_id', 'u2'),
+                  ('event_id', 'u4'), ('type', 'u1'), ('device_time', 'f8'),
+                  ('logged_time', 'f8'), ('time', 'f8'), ('confidence_interval', 'f4'),
+                  ('delay', 'f4'), ('filter_id', 'i2')]
+_SAMPLE_DTYPE = numpy.dtype(_GLOBAL_FIELDS+[('gaze_x', 'f4'), ('gaze_y', 'f4')])
+_MESSAGE_DTYPE = numpy.dtype(_GLOBAL_FIELDS+[('text', 'S16')])
+
+_tmpdir = None
+
+
+def setup_module(module):
+    global _tmpdir
+    _tmpdir = tempfile.mkdtemp()
+
+
+def teardown_module(module):
+    shutil.rmtree(_tmpdir)
+
+
+def _createDataStoreFile():
+    """Samples (from 2 sessions, in shuffled time order) and messages."""
+    path = os.path.join(_tmpdir, 'events.hdf5')
+    rs = numpy.random.RandomState(0)
+    samples = numpy.zeros(2000, dtype=_SAMPLE_DTYPE)
+    samples['experiment_id'] = 1
+    samples['session_id'] = numpy.repeat([1, 2], 1000)
+    samples['event_id'] = numpy.arange(2000)
+    samples['type'] = _SAMPLE
+    samples['time'] = numpy.tile(numpy.arange(1000)*0.002, 2)
+    samples['gaze_x'] = rs.normal(0, 100, 2000)
+    samples['gaze_y'] = rs.normal(0, 100, 2000)
+    samples = samples[rs.permutation(2000)]
+    messages = numpy.zeros(10, dtype=_MESSAGE_DTYPE)
+    messages['experiment_id'] = 1
+    messages['session_id'] = numpy.repeat([1, 2], 5)
+    messages['type'] = _MESSAGE
+    messages['time'] = numpy.tile(numpy.arange(5)*0.4, 2)
+    messages['text'] = 'trial'
+
+    with tables.open_file(path, 'w') as f:
+        mapping = f.create_table('/', 'class_table_mapping', numpy.dtype(
+            [('class_id', 'u4'), ('class_type_id', 'u4'), ('class_name', 'S32'), ('table_path', 'S128')]))
+        mapping.append([(_SAMPLE, 1, 'MonocularEyeSampleEvent', '/data_collection/events/eyetracker/MonocularEyeSampleEvent'),
+                        (_MESSAGE, 1, 'MessageEvent', '/data_collection/events/experiment/MessageEvent')])
+        dc = f.create_group('/', 'data_collection')
+        sessions = f.create_table(dc, 'session_meta_data', numpy.dtype(
+            [('session_id', 'u4'), ('experiment_id', 'u4'), ('code', 'S24')]))
+        sessions.append([(1, 1, 's1'), (2, 1, 's2')])
+        events = f.create_group(dc, 'events')
+        f.create_table(f.create_group(events, 'eyetracker'), 'MonocularEyeSampleEvent', samples)
+        f.create_table(f.create_group(events, 'experiment'), 'MessageEvent', messages)
+    return path, samples
+
+
+def _createView(path, **kwargs):
+    view = ioHubPandasDataView(path, **kwargs)
+    view._event_constants = _EVENT_CONSTANTS
+    return view
+
+
+def test_selectEvents():
+    path, samples = _createDataStoreFile()
+    view = _createView(path)
+    try:
+        all_samples = view.MONOCULAR_EYE_SAMPLE
+        assert len(all_samples) == 2000
+        assert all_samples.index.names == ['experiment_id', 'session_id']
+        assert all_samples.columns[0] == 'time'
+        assert (all_samples['type'] == 'MONOCULAR_EYE_SAMPLE').all()
+        assert (numpy.diff(all_samples.loc[(1, 2)]['time'].values) > 0).all()
+        assert view.MONOCULAR_EYE_SAMPLE is all_samples
+
+        selected = view.selectEvents('MONOCULAR_EYE_SAMPLE', columns=['gaze_x'],
+                                     where='gaze_x > 0', session_id=2,
+                                     start_time=0.5, end_time=1.0)
+        expected = samples[(samples['gaze_x'] > 0) & (samples['session_id'] == 2) &
+                           (samples['time'] >= 0.5) & (samples['time'] < 1.0)]
+        assert sorted(selected.columns) == ['gaze_x', 'time', 'type']
+        assert len(selected) == len(expected)
+        assert numpy.allclose(selected['time'].values, numpy.sort(expected['time']))
+
+        assert len(view.MESSAGE) == 10
+        assert len(view.all_events) == 2010
+        assert 'gaze_x' not in view.all_events.columns
+        try:
+            view.NOT_AN_EVENT_TYPE
+        except AttributeError:
+            pass
+        else:
+            assert False, "unknown event type did not raise AttributeError"
+    finally:
+        view.close()
+
+
+def test_iterSessionsAndTimeWindows():
+    path, samples = _createDataStoreFile()
+    view = _createView(path)
+    try:
+        sessions = list(view.iterSessions('MONOCULAR_EYE_SAMPLE', columns=['gaze_y']))
+        assert [s[0] for s in sessions] == [(1, 1), (1, 2)]
+        assert [len(s[1]) for s in sessions] == [1000, 1000]
+
+        windows = list(view.iterTimeWindows('MONOCULAR_EYE_SAMPLE', 0.5, session_id=1))
+        assert [w[0][0] for w in windows] == [0.0, 0.5, 1.0, 1.5]
+        assert [len(w[1]) for w in windows] == [250, 250, 250, 250]
+    finally:
+        view.close()
+
+
+def test_cacheSize():
+    path, samples = _createDataStoreFile()
+    view = _createView(path, cache_size=60000)
+    try:
+        first = view.selectEvents('MONOCULAR_EYE_SAMPLE', session_id=1)
+        assert view.selectEvents('MONOCULAR_EYE_SAMPLE', session_id=1) is first
+        view.selectEvents('MONOCULAR_EYE_SAMPLE', session_id=2)
+        # the least recently used frame was removed to stay within the budget
+        assert view._event_frames.size <= 60000
+        assert view.selectEvents('MONOCULAR_EYE_SAMPLE', session_id=1) is not first
+        view.clearCache()
+        assert view._event_frames.size == 0
+    finally:
+        view.close()
@@ -0,0 +1,180 @@
+"""Tests for the ticket based (asynchronous) requests sent from the PsychoPy
+Process to the ioHub Process"""
+import pytest
+
+from psychopy.iohub.rpctickets import (RPCTicketTable, RPCError,
+                                       RPCTimeoutError, TICKET_REQUEST,
+                                       TICKET_REPLY, TICKET_REPLY_CACHE_SIZE)
+
+
+class _FakeHub(object):
+    """Replies to ('double', x) requests, optionally dropping some of the
+    requests it receives, and only runs each ticket once (like the ioHub)"""
+    def __init__(self, drop=()):
+        self.time = 0.0
+        self.drop = list(drop)
+        self.received = 0
+        self.handled = []
+        self.replies = []
+        self._done = {}
+
+    def getTime(self):
+        return self.time
+
+    def send(self, request):
+        assert request[0] == TICKET_REQUEST
+        self.received += 1
+        if self.received in self.drop:
+            return
+        ticket_id, (name, value) = request[1], request[2]
+        if ticket_id not in self._done:
+            self.handled.append(ticket_id)
+            if name == 'double':
+                self._done[ticket_id] = ['RPC_RESULT', value * 2]
+            else:
+                self._done[ticket_id] = 'RPC_NOT_CALLABLE_ERROR'
+        self.replies.append((TICKET_REPLY, ticket_id, self._done[ticket_id]))
+
+    def receive(self, wait):
+        if self.replies:
+            return self.replies.pop(0)
+        self.time += wait
+        return None
+
+
+def _getError(reply):
+    if isinstance(reply, str) and 'ERROR' in reply:
+        return reply
+    return False
+
+
+def test_ticketsInFlight():
+    hub = _FakeHub()
+    table = RPCTicketTable(hub.send, hub.receive, _getError, hub.getTime)
+    tickets = [table.submit(('double', i)) for i in range(5)]
+    # all sent before any reply has been read
+    assert hub.received == 5 and table.pending == 5
+    # replies are matched by ticket id, whatever order they are read in
+    hub.replies.reverse()
+    assert tickets[2].result() == ['RPC_RESULT', 4]
+    assert table.pending == 0
+    assert [t.result() for t in tickets] == [['RPC_RESULT', i * 2]
+                                             for i in range(5)]
+
+    ticket = table.submit(('double', 1), convert=lambda r: r[1])
+    assert ticket.result() == 2
+
+    ticket = table.submit(('missing', 1))
+    with pytest.raises(RPCError):
+        ticket.result()
+    assert ticket.done() and isinstance(ticket.exception(), RPCError)
+
+    # other replies are left for the caller
+    assert not table.handleReply(['RPC_RESULT', 1])
+
+
+def test_ticketRetries():
+    # the 1st request is lost, so it is sent again after the timeout
+    hub = _FakeHub(drop=[1])
+    table = RPCTicketTable(hub.send, hub.receive, _getError, hub.getTime,
+                           timeout=0.1, retries=2)
+    ticket = table.submit(('double', 3))
+    assert not ticket.done()
+    assert ticket.result() == ['RPC_RESULT', 6]
+    assert hub.received == 2 and hub.time >= 0.1
+
+    # a lost reply: the request is sent again, but only run once and the
+    # duplicate reply is ignored
+    hub = _FakeHub()
+    table = RPCTicketTable(hub.send, hub.receive, _getError, hub.getTime,
+                           timeout=0.1, retries=2)
+    ticket = table.submit(('double', 3))
+    hub.replies = []
+    assert ticket.result() == ['RPC_RESULT', 6]
+    assert hub.handled == [ticket.ticket_id]
+    table.poll()
+    assert table.pending == 0
+
+    # no replies at all
+    hub = _FakeHub(drop=[1, 2, 3])
+    table = RPCTicketTable(hub.send, hub.receive, _getError, hub.getTime,
+                           timeout=0.1, retries=2)
+    ticket = table.submit(('double', 3))
+    with pytest.raises(RPCTimeoutError):
+        ticket.result(timeout=0.05)
+    assert not ticket.done()
+    with pytest.raises(RPCTimeoutError):
+        ticket.result()
+    assert hub.received == 3 and table.pending == 0
+    assert table.wait(timeout=0)
+
+
+def test_maxPendingTickets():
+    hub = _FakeHub()
+    table = RPCTicketTable(hub.send, hub.receive, _getError, hub.getTime,
+                           max_pending=3)
+    tickets = [table.submit(('double', i)) for i in range(3)]
+    assert hub.received == 3 and table.pending == 3
+    # the 4th request waits for a reply before being sent
+    tickets.append(table.submit(('double', 3)))
+    assert hub.received == 4 and table.pending <= 3
+    assert [t.result() for t in tickets] == [['RPC_RESULT', i * 2]
+                                             for i in range(4)]
+
+    # requests that are never answered time out, so submit() does not
+    # block forever
+    hub = _FakeHub(drop=range(1, 100))
+    table = RPCTicketTable(hub.send, hub.receive, _getError, hub.getTime,
+                           timeout=0.1, retries=1, max_pending=2)
+    tickets = [table.submit(('double', i)) for i in range(3)]
+    assert isinstance(tickets[0].exception(), RPCTimeoutError)
+    assert table.pending <= 2
+
+    with pytest.raises(ValueError):
+        RPCTicketTable(hub.send, hub.receive, _getError, hub.getTime,
+                       max_pending=TICKET_REPLY_CACHE_SIZE + 1)
+
+
+class _FakeSocket(object):
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+
+
+def test_serverTicketReplies():
+    pytest.importorskip('gevent')
+    from psychopy.iohub import OrderedDict
+    from psychopy.iohub.server import udpServer
+
+    server = udpServer.__new__(udpServer)
+    server._ticket_replies = OrderedDict()
+    server.pack = lambda data: data
+    server.socket = _FakeSocket()
+    address = ('127.0.0.1', 9000)
+
+    assert server.handleRequest([TICKET_REQUEST, 1, ['SYNC_REQ']], address)
+    reply, reply_address = server.socket.sent[-1]
+    assert reply_address == address
+    assert reply[:2] == (TICKET_REPLY, 1) and reply[2][0] == 'SYNC_REPLY'
+
+    # a retry gets the same reply, without the request being run again
+    assert server.handleRequest([TICKET_REQUEST, 1, ['SYNC_REQ']], address)
+    assert server.socket.sent[-1] == (reply, address)
+    # the same ticket id from another client is a different ticket
+    server.handleRequest([TICKET_REQUEST, 1, ['SYNC_REQ']], ('127.0.0.1', 9001))
+    assert server.socket.sent[-1][1] == ('127.0.0.1', 9001)
+
+    # a retry of a request that has not been answered yet is ignored
+    server._ticket_replies[(address, 2)] = None
+    sent = len(server.socket.sent)
+    assert server.handleRequest([TICKET_REQUEST, 2, ['SYNC_REQ']], address)
+    assert len(server.socket.sent) == sent
+
+    # the replies to the last TICKET_REPLY_CACHE_SIZE tickets are kept
+    for ticket_id in range(3, 3 + TICKET_REPLY_CACHE_SIZE):
+        server.handleRequest([TICKET_REQUEST, ticket_id, ['SYNC_REQ']], address)
+    assert len(server._ticket_replies) == TICKET_REPLY_CACHE_SIZE
+    assert (address, 1) not in server._ticket_replies
+    assert (address, 3) in server._ticket_replies
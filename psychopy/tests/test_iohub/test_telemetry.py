@@ -0,0 +1,54 @@
+"""Tests for the per device telemetry histograms of the ioHub Server"""
+import numpy
+
+from psychopy.iohub.telemetry import Histogram, DeviceTelemetry, DEFAULT_BUCKET_EDGES
+
+
+def test_histogram():
+    h = Histogram()
+    assert h.getStats()['count'] == 0 and h.percentile(50) is None
+
+    values = numpy.random.RandomState(0).lognormal(-7, 1, 5000)
+    for v in values:
+        h.add(v)
+    stats = h.getStats()
+    assert stats['count'] == 5000
+    assert numpy.isclose(stats['mean'], values.mean())
+    assert stats['min'] == values.min() and stats['max'] == values.max()
+    # estimates are the upper edge of the percentile's bucket (8 per decade)
+    for p in (50, 90, 99, 99.9):
+        exact = numpy.percentile(values, p)
+        assert exact <= stats['p%s' % p] <= exact*10**(1/8.0)+1e-12, p
+    assert stats['p50'] <= stats['p90'] <= stats['p99'] <= stats['p99.9'] <= stats['max']
+
+    h.add(DEFAULT_BUCKET_EDGES[-1]*2)
+    assert h.percentile(100) == DEFAULT_BUCKET_EDGES[-1]*2
+    h.reset()
+    assert h.count == 0 and h.max is None
+
+
+def test_deviceTelemetry():
+    now = [10.0]
+    telemetry = DeviceTelemetry('mouse', lambda: now[0])
+    for i in range(100):
+        telemetry.addPoll(0.0002)
+        telemetry.addEvent(0.001 if i % 10 else -1.0)
+    telemetry.addNativeBacklog(7)
+    telemetry.addNativeBacklog(3)
+    telemetry.addDispatch(0.00005)
+    telemetry.addFiltering(0.0001, 4)
+    now[0] = 12.0
+    stats = telemetry.getStats()
+    assert stats['device_name'] == 'mouse'
+    assert stats['polls'] == 100 and stats['poll_time']['count'] == 100
+    assert stats['events'] == 100 and stats['unknown_delays'] == 10
+    assert stats['event_delay']['count'] == 90
+    assert stats['events_per_sec'] == 50.0
+    assert stats['max_native_backlog'] == 7
+    assert stats['filtered_events'] == 4 and stats['filter_time']['count'] == 1
+    assert stats['dispatch_time']['max'] == 0.00005
+
+    telemetry.reset()
+    stats = telemetry.getStats()
+    assert stats['events'] == 0 and stats['duration'] == 0.0 and stats['events_per_sec'] == 0.0
+    assert stats['poll_time']['count'] == 0
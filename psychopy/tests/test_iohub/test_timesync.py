@@ -0,0 +1,92 @@
+"""Tests the drift aware time base synchronization used for events received
+from a remote ioHub Server"""
+import socket
+import threading
+import time
+
+import msgpack
+import numpy
+
+from psychopy.iohub import Computer
+from psychopy.iohub.net import TimeSyncState, ioHubTimeSyncConnection
+
+_OFFSET = 5000.0
+_DRIFT = 1.001
+
+
+def _remoteTime(local_time):
+    return _OFFSET+_DRIFT*local_time
+
+
+def test_timeSyncState():
+    state = TimeSyncState(window_length=100)
+    assert state.remote2LocalTime(10.0) == 10.0 and numpy.isnan(state.getAccuracy())
+
+    rs = numpy.random.RandomState(0)
+    round_trips = []
+    for local_send_time in numpy.arange(200)*0.05+1000.0:
+        outbound, inbound = rs.uniform(0.0001, 0.0003, 2)
+        if rs.uniform() < 0.2:
+            # a delayed request or reply
+            inbound += rs.uniform(0.005, 0.05)
+        round_trips.append((local_send_time, _remoteTime(local_send_time+outbound),
+                            local_send_time+outbound+inbound))
+    state.addRoundTrips(round_trips[:5])
+    state.addRoundTrips(round_trips[5:])
+    assert len(state.RTTs) == 100
+
+    assert abs(state.getDrift()-_DRIFT) < 1e-5
+    local_time = 1010.0
+    assert abs(state.local2RemoteTime(local_time)-_remoteTime(local_time)) < 0.0002
+    remote_time = _remoteTime(local_time)
+    assert abs(state.remote2LocalTime(remote_time)-local_time) < 0.0002
+    assert abs(state.remote2LocalTime(state.local2RemoteTime(local_time))-local_time) < 1e-9
+    converted, error = state.remote2LocalTimeWithError(remote_time)
+    assert converted == state.remote2LocalTime(remote_time)
+    assert 0.0 < error < 0.0001
+    # the error grows away from the sampled times
+    assert state.getError(local_time+100.0) > error
+    # delayed round trips are not used
+    assert state.getAccuracy() < 0.0003
+
+
+class _RemoteClock(threading.Thread):
+    """Answers ioHub time sync requests on the loopback interface using a
+    clock with an offset and drift from the local clock."""
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.address = self.sock.getsockname()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            if msgpack.unpackb(data)[0] == 'SYNC_REQ':
+                reply = ['SYNC_REPLY', _remoteTime(Computer.currentSec())]
+                self.sock.sendto(msgpack.packb(reply), address)
+
+
+def test_loopbackSync():
+    remote = _RemoteClock()
+    remote.start()
+    connection = ioHubTimeSyncConnection(remote.address)
+    try:
+        state = TimeSyncState()
+        for i in range(40):
+            state.addRoundTrips(connection.sync())
+            time.sleep(0.01)
+        assert abs(state.getDrift()-_DRIFT) < 0.0002
+        local_time = Computer.currentSec()
+        assert abs(state.remote2LocalTime(_remoteTime(local_time))-local_time) < 0.0005
+        assert state.getAccuracy() < 0.001
+    finally:
+        remote.running = False
+        connection.close()
+        remote.join()
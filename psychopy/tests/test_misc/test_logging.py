@@ -0,0 +1,95 @@
+"""Tests for psychopy.logging"""
+import os
+import shutil
+import time
+from tempfile import mkdtemp
+from StringIO import StringIO
+
+from psychopy import logging
+
+
+class TestLogging(object):
+    def setup_method(self, method):
+        self.temp_dir = mkdtemp(prefix='psychopy-tests-logging')
+        self.logger = logging._Logger(keepFlushed=5)
+
+    def teardown_method(self, method):
+        self.logger.stopFlushThread()
+        shutil.rmtree(self.temp_dir)
+
+    def test_flush(self):
+        stream = StringIO()
+        logging.LogFile(stream, level=logging.INFO, logger=self.logger)
+        for n in range(10):
+            self.logger.log('msg%i' % n, level=logging.EXP, t=n)
+        self.logger.log('hidden', level=logging.DEBUG, t=10)
+        self.logger.flush()
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 10
+        assert lines[3] == '3.0000 \tEXP \tmsg3'
+        # only the most recent entries are kept once flushed
+        assert len(self.logger.flushed) == 5
+        assert self.logger.flushed[-1].message == 'msg9'
+        assert len(self.logger.toFlush) == 0
+
+    def test_flushThread(self):
+        stream = StringIO()
+        logging.LogFile(stream, level=logging.INFO, logger=self.logger)
+        self.logger.startFlushThread(interval=0.01)
+        self.logger.holdFlush()
+        self.logger.log('held', level=logging.EXP, t=0)
+        time.sleep(0.1)
+        assert stream.getvalue() == ''
+        self.logger.releaseFlush()
+        for n in range(50):
+            if stream.getvalue():
+                break
+            time.sleep(0.01)
+        assert 'held' in stream.getvalue()
+        self.logger.log('last', level=logging.EXP, t=1)
+        self.logger.stopFlushThread()
+        assert 'last' in stream.getvalue()
+
+    def test_holdFlushLimit(self):
+        stream = StringIO()
+        logging.LogFile(stream, level=logging.INFO, logger=self.logger)
+        self.logger.startFlushThread(interval=0.01)
+        self.logger.holdFlush(maxHeld=5)
+        for n in range(5):
+            self.logger.log('held%i' % n, level=logging.EXP, t=n)
+        time.sleep(0.1)
+        assert stream.getvalue() == ''
+        # too many messages waiting, so they are written despite the hold
+        self.logger.log('held5', level=logging.EXP, t=5)
+        for n in range(50):
+            if stream.getvalue():
+                break
+            time.sleep(0.01)
+        assert 'held5' in stream.getvalue()
+        assert len(self.logger.toFlush) == 0
+        self.logger.releaseFlush()
+        self.logger.stopFlushThread()
+
+    def test_binaryLogFile(self):
+        fileName = os.path.join(self.temp_dir, 'log.psylog')
+        textStream = StringIO()
+        logging.LogFile(textStream, level=logging.DEBUG, logger=self.logger)
+        target = logging.BinaryLogFile(fileName, level=logging.DEBUG,
+                                       logger=self.logger)
+        self.logger.log(u'caf\xe9', level=logging.DATA, t=1.5)
+        self.logger.log('debug', level=logging.DEBUG, t=2.25)
+        self.logger.flush()
+        target.close()
+        # appending keeps a single header
+        target = logging.BinaryLogFile(fileName, logger=self.logger)
+        self.logger.log('again', level=logging.WARNING, t=3)
+        self.logger.flush()
+        target.close()
+        entries = logging.readBinaryLog(fileName)
+        assert entries == [(1.5, logging.DATA, u'caf\xe9'),
+                           (2.25, logging.DEBUG, u'debug'),
+                           (3.0, logging.WARNING, u'again')]
+        text = logging.binaryLogToText(fileName)
+        assert text.startswith(textStream.getvalue())
+        assert logging.binaryLogToText(fileName, level=logging.DATA) == (
+            u'1.5000 \tDATA \tcaf\xe9\n3.0000 \tWARNING \tagain\n')
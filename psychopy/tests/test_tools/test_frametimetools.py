@@ -0,0 +1,105 @@
+import os
+import shutil
+from StringIO import StringIO
+from tempfile import mkdtemp
+
+import numpy
+
+from psychopy import logging
+from psychopy.tools.frametimetools import FrameTimeRecorder, DrawProfiler
+
+
+def test_FrameTimeRecorder():
+    rec = FrameTimeRecorder(capacity=100)
+    rng = numpy.random.RandomState(0)
+    intervals = rng.uniform(0.015, 0.018, 250)
+    intervals[[10, 150, 240]] = 0.05  # dropped frames
+    for n, interval in enumerate(intervals):
+        rec.add(interval, draw=0.001, flip=interval - 0.002,
+                callOnFlip=0.0001 * n, dropThreshold=0.02)
+
+    # only the most recent frames are stored, oldest first
+    assert len(rec) == 100
+    assert rec.intervals.tolist() == intervals[-100:].tolist()
+    assert numpy.allclose(rec.getTimes('callOnFlip')[-1], 0.0249)
+    # but the stats cover all of them
+    stats = rec.getStats(percentiles=(50, 95))
+    assert stats['nFrames'] == 250
+    assert stats['nDropped'] == 3
+    assert numpy.allclose(stats['mean'], intervals.mean())
+    assert numpy.allclose(stats['sd'], intervals.std())
+    assert stats['max'] == 0.05
+    assert abs(stats['p50'] - numpy.percentile(intervals, 50)) < 1e-4
+    assert abs(stats['p95'] - numpy.percentile(intervals, 95)) < 1e-4
+    assert numpy.allclose(stats['drawMean'], 0.001)
+    assert numpy.allclose(stats['callOnFlipMax'], 0.0249)
+
+    tempDir = mkdtemp(prefix='psychopy-tests-frametimes')
+    try:
+        fileName = os.path.join(tempDir, 'frames.npy')
+        rec.save(fileName)
+        loaded = numpy.load(fileName)
+        assert loaded.dtype.names == ('interval', 'draw', 'flip',
+                                      'callOnFlip')
+        assert numpy.all(loaded == rec.getTimes())
+    finally:
+        shutil.rmtree(tempDir)
+
+    rec.clear()
+    assert len(rec) == 0
+    assert rec.getStats() == {'nFrames': 0, 'nDropped': 0}
+
+
+def test_FrameTimeRecorderLast():
+    rec = FrameTimeRecorder(capacity=10)
+    logging.flush()  # earlier messages
+    stream = StringIO()
+    target = logging.LogFile(stream, level=logging.WARNING)
+    try:
+        for n in range(25):
+            rec.add(n)
+            if n == 9:
+                logging.flush()
+                assert stream.getvalue() == ''
+        logging.flush()
+    finally:
+        logging.root.removeTarget(target)
+    # warned once, when the first frame was discarded
+    assert stream.getvalue().count('most recent 10 frame intervals') == 1
+    assert rec.intervals.tolist() == range(15, 25)
+    assert rec.getTimes('interval', last=3).tolist() == [22, 23, 24]
+    assert rec.getTimes(last=50)['interval'].tolist() == range(15, 25)
+
+
+def test_DrawProfiler():
+    frames = []
+    profiler = DrawProfiler(callback=frames.append)
+    for frameN in range(100):
+        profiler.record('grating', 0.002)
+        profiler.record('text', 0.0001 * (frameN + 1))
+        profiler.record('text', 0.0001)
+        profiler.endFrame()
+    profiler.recordGL('grating', 0.001)
+
+    assert len(frames) == 100
+    assert numpy.allclose(frames[0]['text'], 0.0002)
+    report = profiler.getReport()
+    assert [entry['name'] for entry in report] == ['text', 'grating']
+    grating = report[1]
+    assert grating['count'] == 100
+    assert numpy.allclose(grating['mean'], 0.002)
+    assert grating['p95'] == grating['max'] == 0.002
+    assert grating['glMean'] == 0.001
+    text = report[0]
+    assert text['count'] == 200
+    assert numpy.allclose(text['max'], 0.01)
+    # p95 is the upper edge of a histogram bin (4 per octave)
+    trueP95 = numpy.percentile([0.0001 * (n + 1) for n in range(100)] +
+                               [0.0001] * 100, 95)
+    assert trueP95 <= text['p95'] < trueP95 * 2 ** 0.5
+    assert 'glMean' not in text
+    lines = profiler.formatReport().splitlines()
+    assert lines[1].startswith('text') and lines[2].startswith('grating')
+
+    profiler.clear()
+    assert profiler.getReport() == []
@@ -0,0 +1,301 @@
+#!/usr/bin/env python2
+
+# Part of the PsychoPy library
+# Copyright (C) 2015 Jonathan Peirce
+# Distributed under the terms of the GNU General Public License (GPL).
+
+"""Functions and classes related to recording frame timing
+"""
+
+import math
+
+import numpy
+
+from psychopy import logging
+
+# the timings stored for each frame (all in seconds)
+frameTimeFields = ('interval', 'draw', 'flip', 'callOnFlip')
+frameTimeDtype = numpy.dtype([(name, numpy.float64)
+                              for name in frameTimeFields])
+
+
+class FrameTimeRecorder(object):
+    """Records frame intervals (and the time spent in each phase of the
+    frame) into fixed-size arrays, keeping running statistics.
+
+    Only the most recent `capacity` frames are stored, so memory doesn't
+    grow however long the recording runs (a warning is logged when the
+    oldest frames start to be discarded). The drop count, mean, sd and
+    percentiles are updated frame by frame and cover every frame since the
+    last :meth:`clear`, not just the stored ones. Percentiles come from a
+    histogram of intervals with `binWidth` (s) resolution up to `maxInterval`
+    (longer intervals are counted in a final overflow bin).
+
+    The phases of each frame are:
+
+        - draw: drawing the stimuli set to `autoDraw`
+        - flip: from the end of drawing until the buffers have flipped
+        - callOnFlip: running functions queued with `win.callOnFlip()`
+
+    """
+
+    def __init__(self, capacity=100000, binWidth=0.0001, maxInterval=0.5):
+        super(FrameTimeRecorder, self).__init__()
+        self.capacity = int(capacity)
+        self.binWidth = binWidth
+        self.maxInterval = maxInterval
+        self._nBins = int(numpy.ceil(maxInterval / binWidth)) + 1
+        self._times = numpy.zeros(self.capacity, dtype=frameTimeDtype)
+        self._hist = numpy.zeros(self._nBins, dtype=numpy.int64)
+        self.clear()
+
+    def clear(self):
+        """Remove all recorded frames and reset the statistics
+        """
+        self._pos = 0  # where the next frame will be stored
+        self.nFrames = 0  # frames since clear (including unstored ones)
+        self.nDropped = 0
+        self._hist[:] = 0
+        self._sums = dict.fromkeys(frameTimeFields, 0.0)
+        self._maxs = dict.fromkeys(frameTimeFields, 0.0)
+        self._sumSq = 0.0
+        self._min = None
+
+    def __len__(self):
+        return min(self.nFrames, self.capacity)
+
+    def add(self, interval, draw=0.0, flip=0.0, callOnFlip=0.0,
+            dropThreshold=None):
+        """Record one frame.
+
+        The frame counts as dropped if `interval` is longer than
+        `dropThreshold`. Returns True if it was dropped.
+        """
+        self._times[self._pos] = (interval, draw, flip, callOnFlip)
+        self._pos = (self._pos + 1) % self.capacity
+        self.nFrames += 1
+        if self.nFrames == self.capacity + 1:
+            logging.warning('Only the most recent %i frame intervals are '
+                            'stored, older ones are now being discarded '
+                            '(the frame stats still include them)'
+                            % self.capacity)
+
+        sums = self._sums
+        maxs = self._maxs
+        for name, val in (('interval', interval), ('draw', draw),
+                          ('flip', flip), ('callOnFlip', callOnFlip)):
+            sums[name] += val
+            if val > maxs[name]:
+                maxs[name] = val
+        self._sumSq += interval * interval
+        if self._min is None or interval < self._min:
+            self._min = interval
+        binN = int(interval / self.binWidth)
+        self._hist[min(max(binN, 0), self._nBins - 1)] += 1
+
+        dropped = dropThreshold is not None and interval > dropThreshold
+        if dropped:
+            self.nDropped += 1
+        return dropped
+
+    def getTimes(self, field=None, last=None):
+        """The stored frames, oldest first, as a structured array with
+        fields 'interval', 'draw', 'flip' and 'callOnFlip' (or just the
+        values of one `field`). Use `last` to get only the most recent
+        frames.
+        """
+        if last is not None:
+            last = min(last, len(self))
+            inds = numpy.arange(self._pos - last, self._pos) % self.capacity
+            times = self._times[inds]
+        elif self.nFrames > self.capacity:
+            times = numpy.concatenate((self._times[self._pos:],
+                                       self._times[:self._pos]))
+        else:
+            times = self._times[:self.nFrames].copy()
+        if field is not None:
+            return times[field].astype(float)
+        return times
+
+    @property
+    def intervals(self):
+        """The stored frame intervals (s), oldest first
+        """
+        return self.getTimes('interval')
+
+    def getPercentile(self, percent):
+        """The frame interval (s) below which `percent` % of the frames
+        fell, estimated to the resolution of `binWidth`
+        """
+        if not self.nFrames:
+            return None
+        cumCount = numpy.cumsum(self._hist)
+        binN = numpy.searchsorted(cumCount, percent / 100.0 * self.nFrames)
+        binN = min(binN, self._nBins - 1)
+        # report the middle of the bin (clipped to the observed range)
+        val = (binN + 0.5) * self.binWidth
+        return min(max(val, self._min), self._maxs['interval'])
+
+    def getStats(self, percentiles=(50, 95, 99)):
+        """Summary of the frames since the last clear(), as a dict with
+        nFrames, nDropped, mean, sd, min, max, the requested percentiles
+        (e.g. 'p95') and the mean and max time of each frame phase
+        (e.g. 'drawMean', 'drawMax')
+        """
+        n = self.nFrames
+        stats = {'nFrames': n, 'nDropped': self.nDropped}
+        if not n:
+            return stats
+        mean = self._sums['interval'] / n
+        stats['mean'] = mean
+        stats['sd'] = numpy.sqrt(max(self._sumSq / n - mean * mean, 0.0))
+        stats['min'] = self._min
+        stats['max'] = self._maxs['interval']
+        for percent in percentiles:
+            stats['p%g' % percent] = self.getPercentile(percent)
+        for name in frameTimeFields[1:]:
+            stats[name + 'Mean'] = self._sums[name] / n
+            stats[name + 'Max'] = self._maxs[name]
+        return stats
+
+    def save(self, fileName):
+        """Save the stored frames (oldest first) as a compact binary
+        numpy (.npy) file of the structured array from :meth:`getTimes`.
+        Load them again with `numpy.load(fileName)`
+        """
+        numpy.save(fileName, self.getTimes())
+
+
+class DrawTimeStats(object):
+    """Aggregated draw times (s) of one stimulus: the number of draws,
+    total, max and a histogram with 4 log-spaced bins per octave from 1us
+    (so that each draw costs a few arithmetic operations to record)
+    """
+    __slots__ = ('name', 'count', 'total', 'max', 'hist',
+                 'glCount', 'glTotal', 'glMax')
+    nBins = 80  # 1us up to ~1s
+    _binsPerOctave = 4
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.hist = [0] * self.nBins
+        self.glCount = 0
+        self.glTotal = 0.0
+        self.glMax = 0.0
+
+    def add(self, t):
+        """Record one draw that took `t` seconds of CPU time
+        """
+        self.count += 1
+        self.total += t
+        if t > self.max:
+            self.max = t
+        if t > 1e-6:
+            binN = int(math.log(t * 1e6, 2) * self._binsPerOctave)
+            self.hist[min(binN, self.nBins - 1)] += 1
+        else:
+            self.hist[0] += 1
+
+    def addGL(self, t):
+        """Record the GPU time (s) of one draw (where GL timer queries are
+        available)
+        """
+        self.glCount += 1
+        self.glTotal += t
+        if t > self.glMax:
+            self.glMax = t
+
+    def getPercentile(self, percent):
+        """Draw time (s) below which `percent` % of draws fell (the upper
+        edge of the histogram bin)
+        """
+        if not self.count:
+            return None
+        target = percent / 100.0 * self.count
+        cumCount = 0
+        for binN, n in enumerate(self.hist):
+            cumCount += n
+            if cumCount >= target:
+                break
+        upper = 1e-6 * 2 ** ((binN + 1.0) / self._binsPerOctave)
+        return min(upper, self.max)
+
+    def asDict(self):
+        stats = {'name': self.name, 'count': self.count,
+                 'total': self.total, 'max': self.max,
+                 'mean': self.total / self.count if self.count else None,
+                 'p95': self.getPercentile(95)}
+        if self.glCount:
+            stats['glMean'] = self.glTotal / self.glCount
+            stats['glMax'] = self.glMax
+        return stats
+
+
+class DrawProfiler(object):
+    """Collects the draw times of each stimulus (aggregated by stimulus
+    `name`), see `Window.setDrawProfiler()`.
+
+    If given, `callback(frameTimes)` is called at the end of every frame
+    with a dict of {name: CPU seconds spent drawing it in that frame}.
+    """
+
+    def __init__(self, callback=None):
+        super(DrawProfiler, self).__init__()
+        self.callback = callback
+        self.stats = {}
+        self._frameTimes = {}
+
+    def record(self, name, t):
+        """Record that drawing stimulus `name` took `t` seconds
+        """
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = DrawTimeStats(name)
+        stats.add(t)
+        self._frameTimes[name] = self._frameTimes.get(name, 0.0) + t
+
+    def recordGL(self, name, t):
+        """Record the GPU time `t` (s) taken to draw stimulus `name`
+        """
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = DrawTimeStats(name)
+        stats.addGL(t)
+
+    def endFrame(self):
+        """Mark the end of a frame (called by `Window.flip()`)
+        """
+        frameTimes = self._frameTimes
+        self._frameTimes = {}
+        if self.callback is not None:
+            self.callback(frameTimes)
+
+    def clear(self):
+        self.stats = {}
+        self._frameTimes = {}
+
+    def getReport(self):
+        """A list of dicts (one per stimulus name, the most expensive
+        first) with count, total, mean, max and p95 draw times (s) and,
+        where GL timer queries were used, glMean and glMax
+        """
+        report = [stats.asDict() for stats in self.stats.values()]
+        report.sort(key=lambda entry: entry['total'], reverse=True)
+        return report
+
+    def formatReport(self):
+        """The report from :meth:`getReport` as a text table (times in ms)
+        """
+        lines = ['%-24s %8s %10s %8s %8s %8s %8s' %
+                 ('name', 'draws', 'total', 'mean', 'p95', 'max', 'glMean')]
+        for entry in self.getReport():
+            glMean = entry.get('glMean')
+            lines.append('%-24s %8i %10.2f %8.3f %8.3f %8.3f %8s' %
+                         (entry['name'][:24], entry['count'],
+                          entry['total'] * 1000, entry['mean'] * 1000,
+                          entry['p95'] * 1000, entry['max'] * 1000,
+                          '-' if glMean is None else '%.3f' % (glMean * 1000)))
+        return '\n'.join(lines)
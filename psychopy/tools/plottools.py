@@ -12,12 +12,16 @@ def plotFrameIntervals(intervals):
     """Plot a histogram of the frame intervals.
 
     Where `intervals` is either a filename to a file, saved by
-    Window.saveFrameIntervals, or simply a list (or array) of frame intervals
+    Window.saveFrameIntervals (as text or .npy), or simply a list (or array)
+    of frame intervals
 
     """
     from pylab import hist, show, plot
 
-    if type(intervals) == str:
+    if type(intervals) == str and intervals.endswith('.npy'):
+        import numpy
+        intervals = numpy.load(intervals)['interval']
+    elif type(intervals) == str:
         f = open(intervals, 'r')
         intervals = eval("[%s]" % (f.readline()))
     #    hist(intervals, int(len(intervals)/10))
@@ -22,9 +22,11 @@ except ImportError:
 import copy
 import sys
 import os
+import functools
 
 import psychopy  # so we can get the __path__
 from psychopy import logging
+from psychopy.clock import getTime
 
 # tools must only be imported *after* event or MovieStim breaks on win32
 # (JWP has no idea why!)
@@ -1356,3 +1358,81 @@ class BaseVisualStim(MinimalStim, WindowMixin, LegacyVisualMixin):
         # For DotStim
         if attrib in ('nDots', 'coherence'):
             self.coherence = round(self.coherence * self.nDots) / self.nDots
+
+
+
+# Draw profiling (see Window.setDrawProfiler). While any window has a
+# profiler, the draw() methods of all stimulus classes are wrapped to time
+# each draw. Otherwise the original methods are used, so there's no cost.
+_nDrawProfilers = 0
+_drawsBeingTimed = set()
+
+
+def _profiledDraw(draw):
+    """Wrap a stimulus class's draw method so that it reports the time
+    taken to the window's drawProfiler (if it has one)
+    """
+    @functools.wraps(draw)
+    def profiledDraw(self, *args, **kwargs):
+        win = (args[0] if args else kwargs.get('win')) or \
+            getattr(self, 'win', None)
+        profiler = getattr(win, 'drawProfiler', None)
+        # nested calls (e.g. a subclass calling its parent's draw) are only
+        # timed once, by the outermost call
+        if profiler is None or id(self) in _drawsBeingTimed:
+            return draw(self, *args, **kwargs)
+        name = getattr(self, 'name', None) or self.__class__.__name__
+        glTimer = win._drawGLTimer
+        _drawsBeingTimed.add(id(self))
+        if glTimer is not None:
+            glTimer.start(name)
+        t0 = getTime()
+        try:
+            return draw(self, *args, **kwargs)
+        finally:
+            profiler.record(name, getTime() - t0)
+            if glTimer is not None:
+                glTimer.stop()
+            _drawsBeingTimed.discard(id(self))
+    profiledDraw._unprofiledDraw = draw
+    return profiledDraw
+
+
+def _stimClasses():
+    """All the (currently defined) stimulus classes
+    """
+    classes = []
+    toCheck = [MinimalStim, WindowMixin]
+    while toCheck:
+        cls = toCheck.pop()
+        if cls not in classes:
+            classes.append(cls)
+            toCheck.extend(cls.__subclasses__())
+    return classes
+
+
+def _addDrawProfiler():
+    """Called when a window starts profiling; wraps the draw() methods
+    """
+    global _nDrawProfilers
+    _nDrawProfilers += 1
+    if _nDrawProfilers > 1:
+        return
+    for cls in _stimClasses():
+        draw = cls.__dict__.get('draw')
+        if draw is not None and not hasattr(draw, '_unprofiledDraw'):
+            setattr(cls, 'draw', _profiledDraw(draw))
+
+
+def _removeDrawProfiler():
+    """Called when a window stops profiling; restores the draw() methods
+    once no windows are profiling
+    """
+    global _nDrawProfilers
+    _nDrawProfilers = max(_nDrawProfilers - 1, 0)
+    if _nDrawProfilers:
+        return
+    for cls in _stimClasses():
+        draw = cls.__dict__.get('draw')
+        if draw is not None and hasattr(draw, '_unprofiledDraw'):
+            setattr(cls, 'draw', draw._unprofiledDraw)
@@ -61,9 +61,11 @@ import psychopy.event
 # (JWP has no idea why!)
 from psychopy.tools.attributetools import attributeSetter, setAttribute
 from psychopy.tools.arraytools import val2array
+from psychopy.tools.frametimetools import FrameTimeRecorder, DrawProfiler
 from .text import TextStim
 from .grating import GratingStim
 from .helpers import setColor
+from .basevisual import _addDrawProfiler, _removeDrawProfiler
 from . import globalVars
 
 try:
@@ -128,6 +130,8 @@ class Window(object):
     project (we won't be fixing pygame-specific bugs).
 
     """
+    drawProfiler = None  # see setDrawProfiler()
+    _drawGLTimer = None
 
     def __init__(self,
                  size=(800, 600),
@@ -372,7 +376,8 @@ class Window(object):
         # Be able to omit the long timegap that follows each time turn it off
         self.recordFrameIntervalsJustTurnedOn = False
         self.nDroppedFrames = 0
-        self.frameIntervals = []
+        # fixed-size store of frame intervals, phase timings and stats
+        self.frameTimes = FrameTimeRecorder()
 
         self._toDraw = []
         self._toDrawDepths = []
@@ -458,8 +463,12 @@ class Window(object):
         your code, including inter-trial-intervals, `event.waitkeys()`,
         `core.wait()`, or `image.setImage()`.
 
+        Only the most recent `win.frameTimes.capacity` (100000) intervals
+        are stored. A warning is logged when older ones start to be
+        discarded; the stats from `getFrameStats()` still include them.
+
         see also:
-            Window.saveFrameIntervals()
+            Window.saveFrameIntervals(), Window.getFrameStats()
         """
         # was off, and now turning it on
         self.recordFrameIntervalsJustTurnedOn = bool(
@@ -473,6 +482,88 @@ class Window(object):
         """
         setAttribute(self, 'recordFrameIntervals', value, log)
 
+    @property
+    def frameIntervals(self):
+        """The recorded frame intervals (s), as a list. Only the most recent
+        `win.frameTimes.capacity` frames are kept. Set to [] to clear them.
+
+        Each access builds a new list from the stored intervals (up to
+        100000 of them), so avoid reading it every frame: use
+        `win.frameTimes.intervals` for a numpy array,
+        `win.frameTimes.getTimes('interval', last=n)` for just the most
+        recent `n`, or `getFrameStats()` for summary statistics.
+        """
+        return self.frameTimes.intervals.tolist()
+
+    @frameIntervals.setter
+    def frameIntervals(self, value):
+        self.frameTimes.clear()
+        for interval in value:
+            self.frameTimes.add(interval)
+
+    def getFrameStats(self, percentiles=(50, 95, 99)):
+        """Summary statistics of the frames recorded (while
+        `recordFrameIntervals` was True) since they were last cleared.
+
+        Returns a dict with nFrames, nDropped, mean, sd, min, max and
+        the requested percentiles of the intervals (e.g. 'p99') plus the
+        mean and max time spent drawing autoDraw stimuli ('drawMean',
+        'drawMax'), flipping ('flipMean', 'flipMax') and running
+        callOnFlip functions ('callOnFlipMean', 'callOnFlipMax'), all
+        in seconds. These cover all recorded frames, even those no longer
+        stored.
+        """
+        return self.frameTimes.getStats(percentiles)
+
+    def setDrawProfiler(self, enabled=True, glTime=False, callback=None):
+        """Time the draw() of every stimulus drawn in this window (whether
+        by `autoDraw` or explicitly) and aggregate the times by stimulus
+        `name`. Profiling is off by default and costs nothing while off.
+
+        :Parameters:
+
+        enabled : True or False
+            Turn profiling on (a new profiler is started) or off
+
+        glTime : True or False
+            Also measure the GPU time of each draw, using OpenGL timer
+            queries (if the driver supports them). The results arrive a
+            frame or so after the draw.
+
+        callback : None or a function
+            Called at the end of every flip() with a dict of
+            {name: CPU seconds spent drawing it in that frame}
+
+        Returns the :class:`~psychopy.tools.frametimetools.DrawProfiler`
+        (also available as `win.drawProfiler`). Use its `getReport()` or
+        `formatReport()` methods for the summary, e.g.::
+
+            win.setDrawProfiler(True)
+            # ... run some trials
+            print(win.drawProfiler.formatReport())
+            win.setDrawProfiler(False)
+
+        """
+        if self.drawProfiler is not None:
+            # stop the current profiler
+            if self._drawGLTimer is not None:
+                self._drawGLTimer.delete()
+                self._drawGLTimer = None
+            self.drawProfiler = None
+            _removeDrawProfiler()
+        if not enabled:
+            return None
+        profiler = DrawProfiler(callback=callback)
+        if glTime:
+            if _GLDrawTimer.isSupported():
+                self._drawGLTimer = _GLDrawTimer(profiler)
+            else:
+                logging.warning('OpenGL timer queries are not supported so '
+                                'draw profiling will only report CPU times')
+        self.drawProfiler = profiler
+        _addDrawProfiler()
+        return profiler
+
     def saveFrameIntervals(self, fileName=None, clear=True):
         """Save recorded screen frame intervals to disk, as comma-separated
         values.
@@ -482,17 +573,23 @@ class Window(object):
         fileName : *None* or the filename (including path if necessary) in
             which to store the data.
             If None then 'lastFrameIntervals.log' will be used.
+            If it ends with '.npy' then the interval and phase timings of
+            each frame are saved as a (compact binary) numpy structured
+            array instead (see :meth:`getFrameStats`).
 
         """
         if not fileName:
             fileName = 'lastFrameIntervals.log'
-        if len(self.frameIntervals):
-            intervalStr = str(self.frameIntervals)[1:-1]
-            f = open(fileName, 'w')
-            f.write(intervalStr)
-            f.close()
+        if len(self.frameTimes):
+            if fileName.endswith('.npy'):
+                self.frameTimes.save(fileName)
+            else:
+                intervalStr = str(self.frameIntervals)[1:-1]
+                f = open(fileName, 'w')
+                f.write(intervalStr)
+                f.close()
         if clear:
-            self.frameIntervals = []
+            self.frameTimes.clear()
             self.frameClock.reset()
 
     def onResize(self, width, height):
@@ -564,8 +661,10 @@ class Window(object):
         win.flip(clearBuffer=False)  # the screen is not cleared (so represent
                                      # the previous screen)
         """
+        drawStartT = core.getTime()
         for thisStim in self._toDraw:
             thisStim.draw()
+        drawEndT = core.getTime()
 
         flipThisFrame = self._startOfFlip()
         if self.useFBO:
@@ -682,6 +781,7 @@ class Window(object):
 
         # get timestamp
         now = logging.defaultClock.getTime()
+        flipEndT = core.getTime()
 
         # run other functions immediately after flip completes
         for callEntry in self._toCall:
@@ -696,8 +796,12 @@ class Window(object):
             if self.recordFrameIntervalsJustTurnedOn:  # don't do anything
                 self.recordFrameIntervalsJustTurnedOn = False
             else:  # past the first frame since turned on
-                self.frameIntervals.append(deltaT)
-                if deltaT > self._refreshThreshold:
+                dropped = self.frameTimes.add(
+                    deltaT, draw=drawEndT - drawStartT,
+                    flip=flipEndT - drawEndT,
+                    callOnFlip=core.getTime() - flipEndT,
+                    dropThreshold=self._refreshThreshold)
+                if dropped:
                     self.nDroppedFrames += 1
                     if self.nDroppedFrames < reportNDroppedFrames:
                         txt = 't of last frame was %.2fms (=1/%i)'
@@ -708,6 +812,11 @@ class Window(object):
                                         "occurred - I'll stop bothering you "
                                         "about them!")
 
+        if self.drawProfiler is not None:
+            if self._drawGLTimer is not None:
+                self._drawGLTimer.collect()
+            self.drawProfiler.endFrame()
+
         # log events
         for logEntry in self._toLog:
             # {'msg':msg, 'level':level, 'obj':copy.copy(obj)}
@@ -1035,6 +1144,8 @@ class Window(object):
         """Close the window (and reset the Bits++ if necess).
         """
         self._closed = True
+        if self.drawProfiler is not None:
+            self.setDrawProfiler(False)
 
         try:
             openWindows.remove(self)
@@ -1745,10 +1856,11 @@ class Window(object):
         self.recordFrameIntervals = True
         for frameN in range(nMaxFrames):
             self.flip()
-            if (len(self.frameIntervals) >= nIdentical and
-                    (numpy.std(self.frameIntervals[-nIdentical:]) <
-                     (threshold / 1000.0))):
-                rate = 1.0 / numpy.mean(self.frameIntervals[-nIdentical:])
+            if len(self.frameTimes) < nIdentical:
+                continue
+            intervals = self.frameTimes.getTimes('interval', last=nIdentical)
+            if numpy.std(intervals) < (threshold / 1000.0):
+                rate = 1.0 / numpy.mean(intervals)
                 if self.screen is None:
                     scrStr = ""
                 else:
@@ -1757,7 +1869,7 @@ class Window(object):
                     msg = 'Screen%s actual frame rate measured at %.2f'
                     logging.debug(msg % (scrStr, rate))
                 self.recordFrameIntervals = recordFrmIntsOrig
-                self.frameIntervals = []
+                self.frameTimes.clear()
                 return rate
         # if we got here we reached end of maxFrames with no consistent value
         msg = ("Couldn't measure a consistent frame rate.\n"
@@ -1906,6 +2018,79 @@ class Window(object):
             GL.glClear(GL.GL_COLOR_BUFFER_BIT)
 
 
+class _GLDrawTimer(object):
+    """Measures the GPU time of stimulus draws with OpenGL timestamp
+    queries, passing the results to a DrawProfiler once they're available
+    (which avoids stalling the pipeline by waiting for them)
+    """
+
+    def __init__(self, profiler):
+        super(_GLDrawTimer, self).__init__()
+        self.profiler = profiler
+        self._free = []  # query objects available for reuse
+        self._started = []  # (name, startQuery) of draws in progress
+        self._pending = []  # (name, startQuery, endQuery) awaiting results
+
+    @staticmethod
+    def isSupported():
+        if not hasattr(GL, 'glQueryCounter'):
+            return False
+        try:
+            return (GL.gl_info.have_version(3, 3) or
+                    GL.gl_info.have_extension('GL_ARB_timer_query'))
+        except Exception:
+            return False
+
+    def _timestamp(self):
+        if self._free:
+            query = self._free.pop()
+        else:
+            queryId = GL.GLuint()
+            GL.glGenQueries(1, ctypes.byref(queryId))
+            query = queryId.value
+        GL.glQueryCounter(query, GL.GL_TIMESTAMP)
+        return query
+
+    def start(self, name):
+        self._started.append((name, self._timestamp()))
+
+    def stop(self):
+        name, startQuery = self._started.pop()
+        self._pending.append((name, startQuery, self._timestamp()))
+
+    def collect(self):
+        """Pass any available results to the profiler
+        """
+        available = GL.GLint()
+        startT = GL.GLuint64()
+        endT = GL.GLuint64()
+        stillPending = []
+        for name, startQuery, endQuery in self._pending:
+            GL.glGetQueryObjectiv(endQuery, GL.GL_QUERY_RESULT_AVAILABLE,
+                                  ctypes.byref(available))
+            if not available.value:
+                stillPending.append((name, startQuery, endQuery))
+                continue
+            GL.glGetQueryObjectui64v(startQuery, GL.GL_QUERY_RESULT,
+                                     ctypes.byref(startT))
+            GL.glGetQueryObjectui64v(endQuery, GL.GL_QUERY_RESULT,
+                                     ctypes.byref(endT))
+            self.profiler.recordGL(name, (endT.value - startT.value) * 1e-9)
+            self._free.extend((startQuery, endQuery))
+        self._pending = stillPending
+
+    def delete(self):
+        queries = list(self._free)
+        for entry in self._pending + self._started:
+            queries.extend(entry[1:])
+        self._free = []
+        self._pending = []
+        self._started = []
+        if queries:
+            queryIds = (GL.GLuint * len(queries))(*queries)
+            GL.glDeleteQueries(len(queries), queryIds)
+
+
 def getMsPerFrame(myWin, nFrames=60, showVisual=False, msg='', msDelay=0.):
     """
     Deprecated: please use the getMsPerFrame method in the